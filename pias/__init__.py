@@ -1,14 +1,44 @@
 from __future__ import absolute_import
 
-from .agglomeration_model import MulticutAgglomeration
-from .edge_labels import EdgeLabelCache
-from .edges import EdgeFeatureIO
-# TODO needs to come after import of ensure name is present. Combine EdgeFeatureCache and EdgeFeatureIO into one module
-from .edge_feature_cache import EdgeFeatureCache
-from . import pias_logging
-from .random_forest import RandomForestModelCache, LabelsInconsistency, ModelNotTrained
-from .server import ReplySocket, Server, PublishSocket
-from .solver_server import SolverServer, server_main as solver_server_main, client_cli_main
+import importlib
+
 from .version_info import _version as version
-from .workflow import Workflow
-from . import zmq_util
\ No newline at end of file
+
+# Heavy dependencies (numpy, sklearn, nifty, z5py) are only imported on first access of the respective attribute.
+# This keeps `pias-cli' and `import pias' cheap (see client.py).
+_LAZY_ATTRIBUTES = dict(
+    MulticutAgglomeration   = ('.agglomeration_model', 'MulticutAgglomeration'),
+    EdgeLabelCache          = ('.edge_labels', 'EdgeLabelCache'),
+    EdgeFeatureIO           = ('.edges', 'EdgeFeatureIO'),
+    EdgeFeatureCache        = ('.edge_feature_cache', 'EdgeFeatureCache'),
+    RandomForestModelCache  = ('.random_forest', 'RandomForestModelCache'),
+    LabelsInconsistency     = ('.random_forest', 'LabelsInconsistency'),
+    ModelNotTrained         = ('.random_forest', 'ModelNotTrained'),
+    ReplySocket             = ('.server', 'ReplySocket'),
+    Server                  = ('.server', 'Server'),
+    MultiDatasetServer      = ('.multi_server', 'MultiDatasetServer'),
+    PublishSocket           = ('.server', 'PublishSocket'),
+    SolverServer            = ('.solver_server', 'SolverServer'),
+    solver_server_main      = ('.solver_server', 'server_main'),
+    client_cli_main         = ('.client', 'client_cli_main'),
+    Workflow                = ('.workflow', 'Workflow'),
+    UpdateScheduler         = ('.scheduler', 'UpdateScheduler'),
+    Worker                  = ('.worker', 'Worker'),
+    WorkerPool              = ('.worker_pool', 'WorkerPool'),
+    pias_logging            = ('.pias_logging', None),
+    zmq_util                = ('.zmq_util', None))
+
+
+def __getattr__(name):
+    try:
+        module_name, attribute = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError('module {} has no attribute {}'.format(__name__, name))
+    module = importlib.import_module(module_name, __name__)
+    value  = module if attribute is None else getattr(module, attribute)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
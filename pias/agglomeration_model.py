@@ -1,8 +1,11 @@
 from .pias_logging import logging
 
-import nifty.graph.opt.multicut as nifty_mc
 import numpy as np
 
+from .ext import is_module_available
+from .graph import ArrayGraph
+from .greedy_additive import greedy_additive_edge_contraction
+
 _logger = logging.getLogger(__name__)
 
 
@@ -23,11 +26,123 @@ def solve_multicut(graph, costs):
     # the cost can be in ]-inf, inf[ (I usually clip at ~ ]-6, 6[),
     # where negative costs are repulsive (i.e. nodes are more likely to be disconnected)
     # and positive costs are attractive
+    import nifty.graph.opt.multicut as nifty_mc
     objective = nifty_mc.multicutObjective(graph, costs)
     solver = objective.kernighanLinFactory(warmStartGreedy=True).create(objective)
     return solver.optimize()
 
 
+def solve_multicut_nifty_greedy_additive(graph, costs):
+    assert graph.numberOfEdges == len(costs)
+    import nifty.graph.opt.multicut as nifty_mc
+    objective = nifty_mc.multicutObjective(graph, costs)
+    return objective.greedyAdditiveFactory().create(objective).optimize()
+
+
+def solve_multicut_greedy_additive(graph, costs):
+    '''
+    Built-in greedy additive edge contraction, does not depend on nifty (see :mod:`pias.greedy_additive`).
+    '''
+    assert graph.numberOfEdges == len(costs)
+    return greedy_additive_edge_contraction(graph.numberOfNodes, graph.uvIds(), costs)
+
+
+SOLVERS = {
+    'kernighan-lin'         : solve_multicut,
+    'nifty-greedy-additive' : solve_multicut_nifty_greedy_additive,
+    'greedy-additive'       : solve_multicut_greedy_additive}
+
+
+def default_solver():
+    '''
+    :return: `kernighan-lin' if nifty is available, `greedy-additive' otherwise
+    '''
+    return 'kernighan-lin' if is_module_available('nifty') else 'greedy-additive'
+
+
+def make_graph(number_of_nodes, uv_ids):
+    '''
+    :return: `nifty.graph.UndirectedGraph' if nifty is available, :class:`pias.graph.ArrayGraph` otherwise
+    '''
+    if not is_module_available('nifty'):
+        return ArrayGraph(number_of_nodes, uv_ids)
+    import nifty
+    graph = nifty.graph.UndirectedGraph(number_of_nodes)
+    graph.insertEdges(uv_ids)
+    return graph
+
+
+def solve_multicut_uv(number_of_nodes, uv_ids, costs, solver=None):
+    '''
+    Solve multicut problem for graph given as uv-ids, e.g. for an induced subgraph (see :func:`pias.region.solve_region`).
+
+    :param solver: key in :data:`SOLVERS`, :func:`default_solver` if `None'
+    :return: segment id for each node
+    '''
+    solve = SOLVERS[default_solver() if solver is None else solver]
+    return solve(make_graph(number_of_nodes, uv_ids), np.asarray(costs, dtype=np.float64))
+
+
+# Rounds of greedy segment id matching, see :func:`match_segment_ids`. Almost all segments are matched in the first
+# round; each further round only matches segments whose preferred previous segment was taken by a larger overlap.
+_MAX_MATCHING_ROUNDS = 3
+
+
+def match_segment_ids(solution, previous_solution, max_rounds=_MAX_MATCHING_ROUNDS):
+    '''
+    Relabel `solution' such that segments keep the id of the segment of `previous_solution' with which they share
+    the most fragments. Each previous id is kept by at most one segment (the one with the largest overlap), all other
+    segments get fresh ids larger than any id in `previous_solution'. Matching stops after `max_rounds' rounds (see
+    below), segments that are not matched by then get fresh ids.
+
+    :param solution: segment id for each fragment
+    :param previous_solution: segment id for each fragment in previous solution
+    :return: relabeled solution (`solution' if `previous_solution' is `None' or shapes do not match)
+    '''
+    if previous_solution is None or previous_solution.shape != solution.shape or solution.size == 0:
+        return solution
+
+    new_ids, new_inverse = np.unique(solution, return_inverse=True)
+    old_ids, old_inverse = np.unique(previous_solution, return_inverse=True)
+    new_inverse          = new_inverse.reshape(-1).astype(np.int64)
+    old_inverse          = old_inverse.reshape(-1).astype(np.int64)
+
+    # overlap (number of shared fragments) for all pairs of new and old segments that share at least one fragment
+    pairs, overlaps = np.unique(new_inverse * old_ids.size + old_inverse, return_counts=True)
+    pair_new        = pairs // old_ids.size
+    pair_old        = pairs % old_ids.size
+
+    mapping     = np.empty(new_ids.size, dtype=np.uint64)
+    new_matched = np.zeros(new_ids.size, dtype=bool)
+    old_matched = np.zeros(old_ids.size, dtype=bool)
+    num_matched = 0
+    # Greedy matching by overlap, in rounds: in each round, every unmatched new segment proposes to the unmatched old
+    # segment with largest overlap and each old segment accepts the proposal with largest overlap (ties: smallest ids).
+    for _ in range(max_rounds):
+        if pairs.size == 0:
+            break
+        order      = np.lexsort((pair_old, -overlaps, pair_new))
+        _, first   = np.unique(pair_new[order], return_index=True)
+        proposals  = order[first]
+        order      = np.lexsort((pair_new[proposals], -overlaps[proposals], pair_old[proposals]))
+        _, first   = np.unique(pair_old[proposals][order], return_index=True)
+        accepted   = proposals[order[first]]
+
+        mapping[pair_new[accepted]]     = old_ids[pair_old[accepted]]
+        new_matched[pair_new[accepted]] = True
+        old_matched[pair_old[accepted]] = True
+        num_matched                    += accepted.size
+
+        remaining = ~(new_matched[pair_new] | old_matched[pair_old])
+        pairs, overlaps, pair_new, pair_old = pairs[remaining], overlaps[remaining], pair_new[remaining], pair_old[remaining]
+
+    num_fresh              = new_ids.size - num_matched
+    mapping[~new_matched]  = np.uint64(old_ids[-1]) + np.arange(1, num_fresh + 1, dtype=np.uint64)
+    _logger.debug('Kept %d segment ids, assigned %d fresh segment ids', num_matched, num_fresh)
+
+    return mapping[new_inverse].astype(solution.dtype, copy=False)
+
+
 def _default_map_weights(probabilities):
     '''
 
@@ -54,16 +169,25 @@ def _default_map_weights(probabilities):
 
 class MulticutAgglomeration(object):
 
-    def __init__(self, map_weights=_default_map_weights):
+    def __init__(self, map_weights=_default_map_weights, solver=None, worker_pool=None):
+        '''
+        :param solver: key in :data:`SOLVERS`, :func:`default_solver` if `None'
+        :param worker_pool: solve independent components on :class:`pias.worker_pool.WorkerPool` if workers are connected
+        '''
         super(MulticutAgglomeration, self).__init__()
         self.map_weights = map_weights
+        self.solver      = default_solver() if solver is None else solver
+        self.worker_pool = worker_pool
+        if self.solver not in SOLVERS:
+            raise ValueError('Unknown solver `{}\', choose from {}'.format(self.solver, sorted(SOLVERS)))
 
-    def optimize(self, graph, weights, known_labels=None):
+    def optimize(self, graph, weights, known_labels=None, previous_solution=None):
         """
 
         :param graph:
         :param weights:
         :param tuple known_labels: 0: edge is inactive, 1: edge is active (nodes are in same connected component)
+        :param previous_solution: if not `None', keep segment ids of best matching segments in `previous_solution'
         :return:
         """
 
@@ -71,21 +195,45 @@ class MulticutAgglomeration(object):
         if graph is None or weights is None:
             return
 
+        return self.optimize_costs(graph, self.compute_costs(weights, known_labels=known_labels), previous_solution=previous_solution)
+
+    def compute_costs(self, weights, known_labels=None):
+        """
+        :param weights: merge probabilities
+        :param tuple known_labels: 0: edge is inactive, 1: edge is active (nodes are in same connected component)
+        :return: multicut costs, known labels are fixed to large attractive/repulsive costs
+        """
         costs = self.map_weights(weights)
         if known_labels is not None:
             _logger.trace('Known labels are %s', known_labels)
             known_labels_costs = 1e4 * (2 * np.asarray(known_labels[1], dtype=np.float64) - 1)
             costs[known_labels[0]] = known_labels_costs
+        return costs
+
+    def optimize_costs(self, graph, costs, previous_solution=None):
         _logger.trace('Optimizing multi-cut with graph %s and weights %s (%s)', graph, costs.shape, costs)
         # Qutoing @constantinpape
         # the cost can be in ]-inf, inf[ (I usually clip at ~ ]-6, 6[),
         # where negative costs are repulsive (i.e. nodes are more likely to be disconnected)
         # and positive costs are attractive
-        solution = solve_multicut(graph, costs)
+        solution = match_segment_ids(self._solve(graph, costs), previous_solution)
         _logger.debug('Solution shape %s', solution.shape)
         _logger.trace('Solution %s', solution)
         _logger.info('Graph %s: solution size=%d, number of unique labels=%d', graph, solution.size, np.unique(solution).size)
         return solution
 
+    def _solve(self, graph, costs):
+        if self.worker_pool is not None and self.worker_pool.num_workers() > 0:
+            # deferred: only needed with workers
+            from .worker_pool import WorkerPoolError
+            try:
+                return self.worker_pool.solve(graph.numberOfNodes, graph.uvIds(), costs, self.solver)
+            except WorkerPoolError as e:
+                _logger.warning('Unable to solve on workers, solving locally: %s', e)
+        return SOLVERS[self.solver](graph, costs)
+
+    def solve_uv(self, number_of_nodes, uv_ids, costs):
+        return solve_multicut_uv(number_of_nodes, uv_ids, costs, solver=self.solver)
+
 
 
@@ -0,0 +1,11 @@
+# Return codes and message types of the api endpoint (`address_base'). These are shared between the
+# server (solver_server.py) and the client (client.py) and must not pull in any heavy dependencies.
+
+API_RESPONSE_OK               = 0
+API_RESPONSE_UNKNOWN_ERROR    = 1
+API_RESPONSE_ENDPOINT_UNKNOWN = 2
+
+API_RESPONSE_DATA_STRING  = 0
+API_RESPONSE_DATA_BYTES   = 1
+API_RESPONSE_DATA_INT     = 2
+API_RESPONSE_DATA_UNKNOWN = 3
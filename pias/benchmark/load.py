@@ -0,0 +1,395 @@
+from ..pias_logging import logging
+
+import collections
+import threading
+import time
+
+import numpy as np
+import zmq
+
+from ..api import API_RESPONSE_OK
+from ..graph import connected_components
+from ..solver_server import SolverServer, _EDGE_DATASET, _SET_EDGE_REQ_EDGE_LIST, _SET_EDGE_REP_SUCCESS
+from ..workflow import State
+from ..zmq_util import recv_ints, recv_ints_multipart, send_int
+from ..zmq_util.util import _bytes_as_int
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_API_ENDPOINTS = ('/api/metrics', '/api/n5/all')
+
+# name of the notification lag in the summary: time from an update request to the notification about its solution
+NOTIFICATION = 'new-solution'
+
+_LABEL_ENTRY_DTYPE = np.dtype([('u', '>u8'), ('v', '>u8'), ('label', '>i4')])
+
+
+def partition_labels(edges, merge_probability=0.5, rng=None):
+    '''
+    Labels of `edges' from a random partition of the fragments into segments: the connected components of a random
+    subset of the edges (each edge with probability `merge_probability'). An edge is labeled `1' (merge) if both
+    fragments are in the same segment and `0' otherwise, i.e. any subset of these labels is consistent.
+
+    :return: labels (`int32', shape `(n,)')
+    '''
+    rng            = np.random.default_rng() if rng is None else rng
+    fragments, uv  = np.unique(np.asarray(edges).reshape(-1, 2), return_inverse=True)
+    uv             = uv.reshape(-1, 2)
+    segments       = connected_components(fragments.size, uv[rng.random(uv.shape[0]) < merge_probability])
+    return (segments[uv[:, 0]] == segments[uv[:, 1]]).astype(np.int32)
+
+
+class _Latencies(object):
+    '''
+    Latencies (seconds) and errors (time outs and error responses) per endpoint, shared by all simulated clients.
+    '''
+
+    def __init__(self):
+        super(_Latencies, self).__init__()
+        self.latencies = collections.defaultdict(list)
+        self.errors    = collections.defaultdict(int)
+        self.lock      = threading.Lock()
+
+    def add(self, endpoint, latency):
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+
+    def add_error(self, endpoint):
+        with self.lock:
+            self.errors[endpoint] += 1
+
+    def summary(self, duration):
+        '''
+        :return: dict of endpoint to count, errors, throughput (responses per second), and mean, median, 99th and 99.9th
+                 percentile and maximum of latencies in seconds (`None' without responses)
+        '''
+        with self.lock:
+            endpoints = sorted(set(self.latencies) | set(self.errors))
+            return {endpoint: _latency_summary(self.latencies[endpoint], self.errors[endpoint], duration) for endpoint in endpoints}
+
+
+def _latency_summary(latencies, errors, duration):
+    latencies = np.asarray(latencies, dtype=np.float64)
+    summary   = dict(count=int(latencies.size), errors=errors, throughput=latencies.size / duration)
+    if latencies.size == 0:
+        return dict(summary, mean=None, p50=None, p99=None, p999=None, max=None)
+    p50, p99, p999 = np.percentile(latencies, (50, 99, 99.9))
+    return dict(summary, mean=float(latencies.mean()), p50=float(p50), p99=float(p99), p999=float(p999), max=float(latencies.max()))
+
+
+class _Client(object):
+    '''
+    Simulated client with its own sockets. Requests of each kind arrive as a Poisson process with the configured rate,
+    i.e. with exponentially distributed pauses, so that clients do not synchronize. Latencies are measured from the
+    scheduled time of each request, not from when it was sent: a slow response delays the following requests of the
+    client, and that delay counts towards their latencies (no coordinated omission).
+    '''
+
+    def __init__(self, index, context, address_base, edges, labels, rates, label_batch_size, api_endpoints, timeout, latencies, requested, rng):
+        super(_Client, self).__init__()
+        self.logger           = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+        self.index            = index
+        self.context          = context
+        self.edges            = edges
+        self.labels           = labels
+        self.rates            = {kind: rate for kind, rate in rates.items() if rate > 0}
+        self.label_batch_size = label_batch_size
+        self.api_endpoints    = api_endpoints
+        self.timeout          = timeout
+        self.latencies        = latencies
+        self.requested        = requested
+        self.rng              = rng
+        self.addresses        = {
+            'set-edge-labels'  : SolverServer.set_edge_labels_address(address_base),
+            'update-solution'  : SolverServer.solution_update_request_address(address_base),
+            'current-solution' : SolverServer.current_solution_address(address_base),
+            'api'              : SolverServer.api_endpoint_address(address_base)}
+        self.sockets          = {}
+        self.notified         = {}
+        self.subscriber       = context.socket(zmq.SUB)
+        self.subscriber.setsockopt(zmq.RCVTIMEO, 50)
+        self.subscriber.setsockopt(zmq.SUBSCRIBE, b'')
+        self.subscriber.connect(SolverServer.new_solution_address(address_base))
+
+    def _socket(self, kind):
+        socket = self.sockets.get(kind)
+        if socket is None:
+            socket = self.context.socket(zmq.REQ)
+            socket.setsockopt(zmq.SNDTIMEO, int(self.timeout * 1000))
+            socket.setsockopt(zmq.RCVTIMEO, int(self.timeout * 1000))
+            socket.setsockopt(zmq.LINGER, 0)
+            socket.connect(self.addresses[kind])
+            self.sockets[kind] = socket
+        return socket
+
+    def _request(self, kind, endpoint, send, receive, scheduled):
+        socket = self._socket(kind)
+        try:
+            send(socket)
+            response = receive(socket)
+        except zmq.error.Again:
+            # a REQ socket cannot send again before it received a reply: replace it
+            self.logger.debug('Client %d: %s timed out', self.index, endpoint)
+            socket.close()
+            del self.sockets[kind]
+            self.latencies.add_error(endpoint)
+            return
+        if response is False:
+            self.latencies.add_error(endpoint)
+        else:
+            self.latencies.add(endpoint, time.perf_counter() - scheduled)
+
+    def submit_labels(self, scheduled):
+        indices          = self.rng.choice(self.edges.shape[0], size=min(self.label_batch_size, self.edges.shape[0]), replace=False)
+        entries          = np.empty(indices.size, dtype=_LABEL_ENTRY_DTYPE)
+        entries['u']     = self.edges[indices, 0]
+        entries['v']     = self.edges[indices, 1]
+        entries['label'] = self.labels[indices]
+
+        def send(socket):
+            send_int(socket, _SET_EDGE_REQ_EDGE_LIST, flags=zmq.SNDMORE)
+            socket.send(entries.tobytes())
+        # inconsistent labels and exceptions are errors
+        self._request('set-edge-labels', 'set-edge-labels', send, lambda socket: _bytes_as_int(socket.recv_multipart()[0]) == _SET_EDGE_REP_SUCCESS, scheduled)
+
+    def request_update(self, scheduled):
+        def receive(socket):
+            _, solution_id = recv_ints_multipart(socket)
+            with self.requested.lock:
+                self.requested.times.setdefault(solution_id, scheduled)
+        self._request('update-solution', 'update-solution', lambda socket: socket.send_string(''), receive, scheduled)
+
+    def poll_solution(self, scheduled):
+        self._request('current-solution', 'current-solution', lambda socket: socket.send_string(''), lambda socket: socket.recv_multipart(), scheduled)
+
+    def request_api(self, scheduled):
+        endpoint = self.api_endpoints[self.rng.integers(len(self.api_endpoints))]
+        self._request('api', endpoint, lambda socket: socket.send_string(endpoint), lambda socket: _bytes_as_int(socket.recv_multipart()[0]) == API_RESPONSE_OK, scheduled)
+
+    def receive_notifications(self):
+        try:
+            solution_id, exit_code = recv_ints(self.subscriber)
+        except zmq.error.Again:
+            return
+        if exit_code != State.SUCCESS:
+            self.logger.debug('Client %d: update %d failed with exit code %d', self.index, solution_id, exit_code)
+            self.latencies.add_error(NOTIFICATION)
+            return
+        # the notification may arrive before the response to the update request: match with requests at the end
+        self.notified.setdefault(solution_id, time.perf_counter())
+
+    def add_notification_lags(self):
+        with self.requested.lock:
+            requested = dict(self.requested.times)
+        for solution_id, received in self.notified.items():
+            if solution_id in requested:
+                self.latencies.add(NOTIFICATION, received - requested[solution_id])
+
+    def run(self, start, end, stop):
+        actions = dict(labels=self.submit_labels, update=self.request_update, poll=self.poll_solution, api=self.request_api)
+        due     = {kind: start + self.rng.exponential(1. / rate) for kind, rate in self.rates.items()}
+        try:
+            while not stop.is_set():
+                kind = min(due, key=due.get) if due else None
+                now  = time.perf_counter()
+                if kind is None or due[kind] >= end:
+                    if now >= end:
+                        break
+                    time.sleep(min(0.05, end - now))
+                    continue
+                if due[kind] > now:
+                    time.sleep(due[kind] - now)
+                actions[kind](due[kind])
+                due[kind] += self.rng.exponential(1. / self.rates[kind])
+        finally:
+            for socket in self.sockets.values():
+                socket.close()
+
+    def listen(self, stop):
+        try:
+            while not stop.is_set():
+                self.receive_notifications()
+        finally:
+            self.subscriber.close(linger=0)
+
+
+class _Requested(object):
+    '''
+    Time of the first request of each solution id, shared by all clients for the notification lag.
+    '''
+
+    def __init__(self):
+        super(_Requested, self).__init__()
+        self.times = {}
+        self.lock  = threading.Lock()
+
+
+def load_test(
+        address_base,
+        edges,
+        num_clients=4,
+        duration=10.,
+        label_rate=1.,
+        label_batch_size=10,
+        update_rate=0.5,
+        poll_rate=2.,
+        api_rate=1.,
+        api_endpoints=DEFAULT_API_ENDPOINTS,
+        timeout=10.,
+        context=None,
+        seed=None,
+        labels=None):
+    '''
+    Run `num_clients' simulated clients against a live server for `duration' seconds. Each client submits batches of
+    `label_batch_size' labels for random `edges', requests solution updates, polls the current solution, and
+    requests `api_endpoints' at the given rates (requests per second and client, `0' to disable), and listens for
+    notifications about new solutions. Requests that do not receive a response within `timeout' seconds, error
+    responses, inconsistent labels, and notifications about failed updates count as errors.
+
+    :param labels: labels of `edges' that clients submit, labels of a random partition of the fragments (see
+                   :func:`partition_labels`) if `None'. All clients share these labels so that they stay consistent.
+
+    :return: dict with number of clients, duration, and latency summary per endpoint (see :meth:`_Latencies.summary`),
+             including the notification lag `new-solution' from update request to notification of the new solution
+    '''
+    own_context = context is None
+    context     = zmq.Context(1) if own_context else context
+    latencies   = _Latencies()
+    requested   = _Requested()
+    seeds       = np.random.SeedSequence(seed).spawn(num_clients + 1)
+    labels      = partition_labels(edges, rng=np.random.default_rng(seeds[-1])) if labels is None else np.asarray(labels, dtype=np.int32)
+    rates       = dict(labels=label_rate, update=update_rate, poll=poll_rate, api=api_rate)
+    clients     = [_Client(index, context, address_base, edges, labels, rates, label_batch_size, tuple(api_endpoints), timeout, latencies, requested, np.random.default_rng(s))
+                   for index, s in enumerate(seeds[:-1])]
+    stop        = threading.Event()
+    listeners   = [threading.Thread(target=client.listen, args=(stop,), name='load-listener-%d' % client.index, daemon=True) for client in clients]
+    for listener in listeners:
+        listener.start()
+    # give subscriptions time to propagate before the first update request
+    time.sleep(0.1)
+
+    start   = time.perf_counter()
+    end     = start + duration
+    threads = [threading.Thread(target=client.run, args=(start, end, stop), name='load-client-%d' % client.index, daemon=True) for client in clients]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        # wait for notifications about outstanding updates
+        time.sleep(min(timeout, 1.))
+    finally:
+        stop.set()
+        for thread in threads + listeners:
+            thread.join()
+        if own_context:
+            context.destroy()
+    for client in clients:
+        client.add_notification_lags()
+    return dict(num_clients=num_clients, duration=elapsed, endpoints=latencies.summary(elapsed))
+
+
+def parse_latency_limit(limit):
+    '''
+    Parse `[ENDPOINT:]QUANTILE=SECONDS', e.g. `p99=0.5' (any endpoint) or `current-solution:p999=0.1'.
+
+    :return: tuple of endpoint (`None' for any endpoint), quantile key, and maximum latency in seconds
+    '''
+    key, seconds = limit.rsplit('=', 1)
+    endpoint, _, quantile = key.rpartition(':')
+    if quantile not in ('mean', 'p50', 'p99', 'p999', 'max'):
+        raise ValueError('Unknown quantile `{}\' in latency limit `{}\''.format(quantile, limit))
+    return endpoint or None, quantile, float(seconds)
+
+
+def check_latency_limits(summary, limits, max_errors=0):
+    '''
+    :param summary: return value of :func:`load_test`
+    :param limits: tuples of endpoint (`None' for any endpoint), quantile key, and maximum latency in seconds
+    :return: list of violations (human readable), empty if all limits are met
+    '''
+    violations = []
+    for endpoint, result in sorted(summary['endpoints'].items()):
+        if result['errors'] > max_errors:
+            violations.append('{}: {} errors (max {})'.format(endpoint, result['errors'], max_errors))
+        for limit_endpoint, quantile, seconds in limits:
+            if limit_endpoint not in (None, endpoint) or result[quantile] is None:
+                continue
+            if result[quantile] > seconds:
+                violations.append('{}: {} {:.6f}s > {:.6f}s'.format(endpoint, quantile, result[quantile], seconds))
+    for limit_endpoint, _, _ in limits:
+        if limit_endpoint is not None and limit_endpoint not in summary['endpoints']:
+            violations.append('{}: no responses'.format(limit_endpoint))
+    return violations
+
+
+def _request_string(context, address, endpoint, timeout):
+    socket = context.socket(zmq.REQ)
+    socket.setsockopt(zmq.RCVTIMEO, int(timeout * 1000))
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.connect(address)
+    try:
+        socket.send_string(endpoint)
+        frames = socket.recv_multipart()
+        if _bytes_as_int(frames[0]) != API_RESPONSE_OK:
+            raise Exception('Request of {} failed with status {}'.format(endpoint, _bytes_as_int(frames[0])))
+        return frames[-1].decode('utf-8')
+    finally:
+        socket.close()
+
+
+def load_test_main(argv=None):
+    import argparse
+    import json
+    import sys
+    from ..ext import z5py
+    from ..version_info import _version as version
+    parser = argparse.ArgumentParser(description='Run simulated clients against a live solver server and report throughput and latency per endpoint as json. Exits with status 1 if a latency limit or the maximum number of errors is exceeded.')
+    parser.add_argument('--address', required=True, help='Base address of the server, e.g. ipc://${DIRECTORY}/server')
+    parser.add_argument('--num-clients', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10., help='Duration of the load test in seconds.')
+    parser.add_argument('--label-rate', type=float, default=1., help='Label batches per second and client.')
+    parser.add_argument('--label-batch-size', type=int, default=10)
+    parser.add_argument('--update-rate', type=float, default=0.5, help='Update requests per second and client.')
+    parser.add_argument('--poll-rate', type=float, default=2., help='Requests of the current solution per second and client.')
+    parser.add_argument('--api-rate', type=float, default=1., help='Api requests per second and client.')
+    parser.add_argument('--api-endpoint', action='append', default=None, help='Api endpoint to request (repeat for several, default: {}).'.format(' '.join(DEFAULT_API_ENDPOINTS)))
+    parser.add_argument('--timeout', type=float, default=10., help='Count requests without response after this many seconds as errors.')
+    parser.add_argument('--max-latency', action='append', default=[], metavar='[ENDPOINT:]QUANTILE=SECONDS', help='Latency limit, e.g. p99=0.5 or current-solution:p999=0.1 (repeat for several). QUANTILE is one of mean, p50, p99, p999, max.')
+    parser.add_argument('--max-errors', type=int, default=0, help='Maximum number of errors per endpoint.')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--log-level', required=False, choices=('DEBUG', 'INFO', 'WARN', 'ERROR'), default='WARN')
+    parser.add_argument('--version', action='version', version=f'{version}')
+    args = parser.parse_args(args=argv)
+    logging.basicConfig(level=logging.getLevelName(args.log_level))
+
+    limits  = [parse_latency_limit(limit) for limit in args.max_latency]
+    context = zmq.Context(1)
+    try:
+        container = _request_string(context, args.address, '/api/n5/container', args.timeout)
+        dataset   = _request_string(context, args.address, '/api/n5/dataset', args.timeout)
+        edges     = z5py.File(container, use_zarr_format=False)[(dataset + '/' + _EDGE_DATASET).lstrip('/')][...]
+        summary   = load_test(
+            args.address,
+            edges,
+            num_clients      = args.num_clients,
+            duration         = args.duration,
+            label_rate       = args.label_rate,
+            label_batch_size = args.label_batch_size,
+            update_rate      = args.update_rate,
+            poll_rate        = args.poll_rate,
+            api_rate         = args.api_rate,
+            api_endpoints    = DEFAULT_API_ENDPOINTS if args.api_endpoint is None else args.api_endpoint,
+            timeout          = args.timeout,
+            context          = context,
+            seed             = args.seed)
+    finally:
+        context.destroy()
+    print(json.dumps(summary, indent=2))
+
+    violations = check_latency_limits(summary, limits, max_errors=args.max_errors)
+    for violation in violations:
+        _logger.error('%s', violation)
+    if violations:
+        sys.exit(1)
@@ -0,0 +1,194 @@
+from ..pias_logging import logging
+
+import contextlib
+import json
+import os
+import platform
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from ..agglomeration_model import SOLVERS, default_solver, make_graph
+from ..checkpoint import save_state_checkpoint
+from ..edge_labels import EdgeLabelCache
+from ..edges import EdgeFeatureIO, EdgeIndex
+from ..ext import z5py
+from ..label_consistency import LabelConsistency
+from ..shared_solution import SharedSolutionFile
+from ..solver_server import _EDGE_DATASET, _EDGE_FEATURE_DATASET, _PAINTERA_DATA_KEY
+from ..version_info import _version as version
+from ..workflow import State
+from ..zmq_util import _ndarray_as_bytes
+from .synthetic import grid_region_adjacency_graph, synthetic_edge_features
+
+_logger = logging.getLogger(__name__)
+
+
+def write_synthetic_dataset(container, dataset, num_edges, num_features=8, seed=None, chunk_size=2**20):
+    '''
+    Write a synthetic region adjacency graph (:func:`pias.benchmark.synthetic.grid_region_adjacency_graph`) with
+    correlated edge features (:func:`pias.benchmark.synthetic.synthetic_edge_features`) as paintera dataset into an N5
+    container, in the layout expected by the server. Features are generated and written in chunks.
+
+    :return: tuple of number of nodes, uv-ids, and ground truth segment id for each node
+    '''
+    number_of_nodes, uv_ids, probabilities, segments = grid_region_adjacency_graph(num_edges, seed=seed)
+    f = z5py.File(container, use_zarr_format=False)
+    group = f.require_group(dataset) if dataset else f
+    group.attrs[_PAINTERA_DATA_KEY] = {'type': 'label'}
+    edges    = group.create_dataset(_EDGE_DATASET, shape=uv_ids.shape, chunks=(chunk_size, 2), dtype=np.uint64)
+    features = group.create_dataset(_EDGE_FEATURE_DATASET, shape=(uv_ids.shape[0], num_features), chunks=(chunk_size, num_features), dtype=np.float64)
+    edges[...] = uv_ids
+    for start, block in synthetic_edge_features(probabilities, num_features=num_features, seed=seed, block_size=chunk_size):
+        features[start:start + block.shape[0], :] = block
+    _logger.info('Wrote synthetic dataset with %d nodes and %d edges into %s/%s', number_of_nodes, uv_ids.shape[0], container, dataset)
+    return number_of_nodes, uv_ids, segments
+
+
+class _Stages(object):
+    '''
+    Record duration and peak memory of benchmark stages. Peak memory of a stage is the peak of memory traced by
+    `tracemalloc' (numpy allocations are traced) during that stage if `trace_memory', and the peak resident set size
+    of the process so far (does not decrease) in any case.
+    '''
+
+    def __init__(self, trace_memory):
+        super(_Stages, self).__init__()
+        self.trace_memory = trace_memory
+        self.results      = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            traced_start = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        yield
+        result = dict(
+            stage        = name,
+            seconds      = time.perf_counter() - start,
+            peak_rss_mb  = _peak_rss_bytes() / 2**20)
+        if self.trace_memory:
+            result['peak_traced_mb'] = (tracemalloc.get_traced_memory()[1] - traced_start) / 2**20
+        _logger.info('%s', result)
+        self.results.append(result)
+
+
+def _peak_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == 'Darwin' else peak * 1024
+
+
+def benchmark_pipeline(container, dataset, segments, directory, num_labels=1000, n_estimators=100, solver=None, trace_memory=False, seed=None):
+    '''
+    Run all stages of a solution update on a paintera dataset as the server does and record run time and peak memory of
+    each stage. Labels are sampled uniformly from all edges and labeled according to the ground truth `segments'.
+
+    :param directory: directory for serialized solutions and checkpoints
+    :return: list of dicts with stage, seconds, peak resident set size (and peak traced memory if `trace_memory')
+    '''
+    solver = default_solver() if solver is None else solver
+    rng    = np.random.default_rng(seed)
+    stages = _Stages(trace_memory)
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        with stages.stage('read'):
+            prefix          = (dataset + '/').lstrip('/')
+            edges, features = EdgeFeatureIO(container, edge_dataset=prefix + _EDGE_DATASET, edge_feature_dataset=prefix + _EDGE_FEATURE_DATASET).read()
+        with stages.stage('edge-index'):
+            edge_index = EdgeIndex(edges)
+        with stages.stage('graph'):
+            graph = make_graph(edges.max().item() + 1, edges)
+
+        labeled_edges = edges[rng.choice(edges.shape[0], size=min(num_labels, edges.shape[0]), replace=False)]
+        labels        = (segments[labeled_edges[:, 0]] == segments[labeled_edges[:, 1]]).astype(np.int32)
+        with stages.stage('label-ingestion'):
+            label_cache = EdgeLabelCache()
+            label_cache.update_edge_index_mapping(edges, edge_index)
+            valid = label_cache.update_labels(labeled_edges, labels)
+            LabelConsistency().update(labeled_edges[valid], labels[valid])
+        with stages.stage('training-set'):
+            labeled_samples = label_cache.get_sample_and_label_arrays(features)
+
+        state = State(
+            edges                = edges,
+            edge_features        = features,
+            graph                = graph,
+            labeled_samples      = labeled_samples,
+            random_forest_kwargs = dict(n_estimators=n_estimators),
+            solution_id          = 0,
+            solver               = solver)
+        with stages.stage('fit'):
+            state.random_forest.train_model(samples=state.samples, labels=state.labels)
+        with stages.stage('predict'):
+            state.merge_probabilities = state._predict()
+        with stages.stage('costs'):
+            state.costs = state.agglomeration.compute_costs(state.merge_probabilities, known_labels=(state.indices, state.labels))
+        with stages.stage('solve'):
+            state.solution = state.agglomeration.optimize_costs(graph, state.costs)
+
+        with stages.stage('serialize-bytes'):
+            _ndarray_as_bytes(state.solution)
+        with stages.stage('serialize-shared-solution-file'):
+            shared_solution_file = SharedSolutionFile(os.path.join(directory, 'solution.bin'))
+            shared_solution_file.write(0, state.solution)
+            shared_solution_file.close()
+        with stages.stage('serialize-checkpoint'):
+            save_state_checkpoint(os.path.join(directory, 'checkpoint.npz'), state)
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return stages.results
+
+
+def benchmark_pipeline_main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark all stages of a solution update on synthetic region adjacency graphs that are written to N5. Prints one json object per stage and graph size.')
+    parser.add_argument('--num-edges', type=float, nargs='+', default=[1e4, 1e5, 1e6], help='Approximate number of edges of each graph (up to 1e8).')
+    parser.add_argument('--num-features', type=int, default=8)
+    parser.add_argument('--num-labels', type=int, default=1000)
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--solver', choices=sorted(SOLVERS), default=None, help='Multicut solver (default: kernighan-lin if nifty is available, greedy-additive otherwise).')
+    parser.add_argument('--trace-memory', action='store_true', help='Record peak memory of each stage with tracemalloc (slower). Peak resident set size is always recorded.')
+    parser.add_argument('--directory', default=None, help='Directory for N5 containers and serialized solutions (temporary directory that is removed afterwards if not specified).')
+    parser.add_argument('--output', default=None, help='Append results to this file (json lines) instead of printing them.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--log-level', required=False, choices=('DEBUG', 'INFO', 'WARN', 'ERROR'), default='WARN')
+    args = parser.parse_args(args=argv)
+    logging.basicConfig(level=logging.getLevelName(args.log_level))
+
+    directory = tempfile.mkdtemp(prefix='pias-benchmark-') if args.directory is None else args.directory
+    output    = None if args.output is None else open(args.output, 'a')
+    try:
+        for num_edges in (int(n) for n in args.num_edges):
+            size_directory = os.path.join(directory, 'edges-%d' % num_edges)
+            container      = os.path.join(size_directory, 'data.n5')
+            os.makedirs(size_directory, exist_ok=True)
+            number_of_nodes, uv_ids, segments = write_synthetic_dataset(container, 'fragments', num_edges, num_features=args.num_features, seed=args.seed)
+            metadata = dict(
+                version      = version,
+                python       = platform.python_version(),
+                timestamp    = time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                num_nodes    = number_of_nodes,
+                num_edges    = uv_ids.shape[0],
+                num_features = args.num_features,
+                num_labels   = args.num_labels,
+                n_estimators = args.n_estimators,
+                solver       = default_solver() if args.solver is None else args.solver)
+            del uv_ids
+            results = benchmark_pipeline(container, 'fragments', segments, size_directory, num_labels=args.num_labels, n_estimators=args.n_estimators, solver=args.solver, trace_memory=args.trace_memory, seed=args.seed)
+            for result in results:
+                print(json.dumps(dict(metadata, **result)), file=output, flush=True)
+            if args.directory is None:
+                shutil.rmtree(size_directory)
+    finally:
+        if output is not None:
+            output.close()
+        if args.directory is None:
+            shutil.rmtree(directory, ignore_errors=True)
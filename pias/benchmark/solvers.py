@@ -0,0 +1,120 @@
+from ..pias_logging import logging
+
+import time
+
+import numpy as np
+
+from ..agglomeration_model import SOLVERS, _default_map_weights, make_graph
+from ..ext import is_module_available
+from ..instances import load_instance
+from .synthetic import grid_region_adjacency_graph, multicut_energy
+
+_NIFTY_SOLVERS = ('kernighan-lin', 'nifty-greedy-additive')
+
+
+def benchmark_solvers(num_edges, solvers, repetitions=1, seed=0):
+    '''
+    Run multicut `solvers' on synthetic region adjacency graphs.
+
+    :param num_edges: list of (approximate) graph sizes
+    :param solvers: keys in :data:`pias.agglomeration_model.SOLVERS`
+    :return: list of dicts with solver, number of edges, best run time in seconds, energy, number of segments
+    '''
+    logger  = logging.getLogger(__name__)
+    results = []
+    for size in num_edges:
+        number_of_nodes, uv_ids, probabilities, _ = grid_region_adjacency_graph(size, seed=seed)
+        costs = _default_map_weights(probabilities)
+        graph = make_graph(number_of_nodes, uv_ids)
+        for solver in solvers:
+            times = []
+            for _ in range(repetitions):
+                start  = time.perf_counter()
+                labels = np.asarray(SOLVERS[solver](graph, costs))
+                times.append(time.perf_counter() - start)
+            result = dict(
+                solver       = solver,
+                num_edges    = uv_ids.shape[0],
+                seconds      = min(times),
+                energy       = multicut_energy(uv_ids, costs, labels),
+                num_segments = np.unique(labels).size)
+            logger.info('%s', result)
+            results.append(result)
+    return results
+
+
+def benchmark_instances(paths, solvers, repetitions=1):
+    '''
+    Re-solve multicut instances dumped by the server (`--dump-instances', see :class:`pias.instances.InstanceDumper`).
+
+    :param paths: instance files
+    :param solvers: keys in :data:`pias.agglomeration_model.SOLVERS`
+    :return: list of dicts with instance, solver, number of edges, best run time in seconds, energy, number of
+             segments, and solver, run time, and energy of the dumped solution
+    '''
+    logger  = logging.getLogger(__name__)
+    results = []
+    for path in paths:
+        instance = load_instance(path)
+        uv_ids   = instance.uv_ids.astype(np.int64)
+        graph    = make_graph(instance.number_of_nodes, instance.uv_ids)
+        for solver in solvers:
+            times = []
+            for _ in range(repetitions):
+                start  = time.perf_counter()
+                labels = np.asarray(SOLVERS[solver](graph, instance.costs))
+                times.append(time.perf_counter() - start)
+            result = dict(
+                instance         = path,
+                solver           = solver,
+                num_edges        = uv_ids.shape[0],
+                seconds          = min(times),
+                energy           = multicut_energy(uv_ids, instance.costs, labels),
+                num_segments     = np.unique(labels).size,
+                dumped_solver    = instance.solver,
+                dumped_seconds   = instance.seconds,
+                dumped_energy    = instance.energy)
+            logger.info('%s', result)
+            results.append(result)
+    return results
+
+
+def _available_solvers(solvers):
+    if is_module_available('nifty'):
+        return solvers
+    logging.getLogger(__name__).warning('nifty not available, skipping solvers %s', [s for s in solvers if s in _NIFTY_SOLVERS])
+    return [s for s in solvers if s not in _NIFTY_SOLVERS]
+
+
+def benchmark_instances_main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Compare run time and energy of multicut solvers on instances dumped by the server with --dump-instances.')
+    parser.add_argument('instances', nargs='+', help='Instance files (`instances/instance-*.npz\' in the server directory).')
+    parser.add_argument('--solvers', nargs='+', choices=sorted(SOLVERS), default=sorted(SOLVERS))
+    parser.add_argument('--repetitions', type=int, default=1, help='Report best run time of this many runs.')
+    parser.add_argument('--log-level', required=False, choices=('DEBUG', 'INFO', 'WARN', 'ERROR'), default='WARN')
+    args = parser.parse_args(args=argv)
+    logging.basicConfig(level=logging.getLevelName(args.log_level))
+
+    print('instance', 'solver', 'num_edges', 'seconds', 'energy', 'num_segments', 'dumped_solver', 'dumped_seconds', 'dumped_energy', sep='\t')
+    for result in benchmark_instances(args.instances, _available_solvers(args.solvers), repetitions=args.repetitions):
+        print(result['instance'], result['solver'], result['num_edges'], '%.3f' % result['seconds'], '%.3f' % result['energy'], result['num_segments'],
+              result['dumped_solver'], '%.3f' % result['dumped_seconds'], '%.3f' % result['dumped_energy'], sep='\t')
+
+
+def benchmark_solvers_main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Compare run time and energy of multicut solvers on synthetic region adjacency graphs.')
+    parser.add_argument('--num-edges', type=float, nargs='+', default=[1e5, 1e6, 1e7], help='Approximate number of edges of each graph.')
+    parser.add_argument('--solvers', nargs='+', choices=sorted(SOLVERS), default=sorted(SOLVERS))
+    parser.add_argument('--repetitions', type=int, default=1, help='Report best run time of this many runs.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--log-level', required=False, choices=('DEBUG', 'INFO', 'WARN', 'ERROR'), default='WARN')
+    args = parser.parse_args(args=argv)
+    logging.basicConfig(level=logging.getLevelName(args.log_level))
+
+    solvers = _available_solvers(args.solvers)
+
+    print('solver', 'num_edges', 'seconds', 'energy', 'num_segments', sep='\t')
+    for result in benchmark_solvers([int(n) for n in args.num_edges], solvers, repetitions=args.repetitions, seed=args.seed):
+        print(result['solver'], result['num_edges'], '%.3f' % result['seconds'], '%.3f' % result['energy'], result['num_segments'], sep='\t')
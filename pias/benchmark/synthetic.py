@@ -0,0 +1,60 @@
+from ..pias_logging import logging
+
+import numpy as np
+
+from ..instances import multicut_energy
+
+_logger = logging.getLogger(__name__)
+
+
+def grid_region_adjacency_graph(num_edges, segment_size=10, seed=None):
+    '''
+    Synthetic region adjacency graph: fragments on a 3D grid with 6-neighborhood, ground truth segments are boxes of
+    (on average) `segment_size' fragments along each axis. Merge probabilities of edges are drawn from `Beta(5, 2)'
+    within and from `Beta(2, 5)' across ground truth segments.
+
+    :param num_edges: approximate number of edges
+    :param segment_size: average extent of ground truth segments along each axis (in fragments)
+    :param seed: seed for random number generator
+    :return: tuple of number of nodes, uv-ids (`uint64'), merge probabilities, ground truth segment id for each node
+    '''
+    rng     = np.random.default_rng(seed)
+    extent  = max(int(round((num_edges / 3.) ** (1. / 3.))), 2)
+    nodes   = np.arange(extent ** 3, dtype=np.uint64).reshape(extent, extent, extent)
+    uv_ids  = np.concatenate([
+        np.stack((nodes[:-1, :, :].ravel(), nodes[1:, :, :].ravel()), axis=1),
+        np.stack((nodes[:, :-1, :].ravel(), nodes[:, 1:, :].ravel()), axis=1),
+        np.stack((nodes[:, :, :-1].ravel(), nodes[:, :, 1:].ravel()), axis=1)])
+
+    num_boxes = max(extent // segment_size, 1)
+    bins      = [np.searchsorted(np.sort(rng.choice(np.arange(1, extent), size=num_boxes - 1, replace=False)), np.arange(extent), side='right')
+                 for _ in range(3)]
+    segments  = ((bins[0][:, None, None] * num_boxes + bins[1][None, :, None]) * num_boxes + bins[2][None, None, :]).ravel().astype(np.uint64)
+
+    same          = segments[uv_ids[:, 0]] == segments[uv_ids[:, 1]]
+    probabilities = np.where(same, rng.beta(5, 2, size=same.size), rng.beta(2, 5, size=same.size))
+    _logger.debug('Created grid graph with %d nodes, %d edges, and %d segments', nodes.size, uv_ids.shape[0], np.unique(segments).size)
+    return nodes.size, uv_ids, probabilities, segments
+
+
+def synthetic_edge_features(probabilities, num_features=8, noise=1., seed=None, block_size=2**22):
+    '''
+    Synthetic edge features that are correlated with each other and with the merge probabilities: each feature is a
+    random linear function of the logit of the merge probability plus noise that is shared across all features of an
+    edge and noise that is independent for each feature.
+
+    :param probabilities: merge probability for each edge, e.g. from :func:`grid_region_adjacency_graph`
+    :param noise: standard deviation of shared and independent noise
+    :param block_size: generate features in blocks of this many edges
+    :return: generator of tuples of offset and features (`float64', shape `(n, num_features)') for each block
+    '''
+    rng     = np.random.default_rng(seed)
+    weights = rng.uniform(-1., 1., size=num_features)
+    weights = np.where(np.abs(weights) < 0.2, 0.2 * np.sign(weights + 1e-9), weights)
+    offsets = rng.normal(size=num_features)
+    for start in range(0, probabilities.size, block_size):
+        p        = np.clip(probabilities[start:start + block_size], 1e-6, 1 - 1e-6)
+        logit    = np.log(p / (1 - p))
+        shared   = rng.normal(scale=noise, size=(p.size, 1))
+        features = logit[:, None] * weights[None, :] + offsets[None, :] + shared + rng.normal(scale=noise, size=(p.size, num_features))
+        yield start, features
@@ -0,0 +1,113 @@
+from .pias_logging import logging
+
+import os
+import pickle
+import tempfile
+
+import numpy as np
+
+_logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 1
+
+
+class StateCheckpoint(object):
+
+    def __init__(
+            self,
+            solution_id,
+            model,
+            merge_probabilities,
+            solution,
+            indices,
+            labels,
+            uv_pairs):
+        super(StateCheckpoint, self).__init__()
+        self.solution_id         = solution_id
+        self.model               = model
+        self.merge_probabilities = merge_probabilities
+        self.solution            = solution
+        self.indices             = indices
+        self.labels              = labels
+        self.uv_pairs            = uv_pairs
+
+
+def checkpoint_from_state(state):
+    '''
+    :param state: successfully computed :class:`pias.workflow.State`
+    :return: :class:`StateCheckpoint` that shares arrays with `state'
+    '''
+    return StateCheckpoint(
+        solution_id         = state.solution_id,
+        model               = state.random_forest.get_model(),
+        merge_probabilities = state.merge_probabilities,
+        solution            = state.solution,
+        indices             = state.indices,
+        labels              = state.labels,
+        uv_pairs            = state.uv_pairs)
+
+
+def save_state_checkpoint(path, state):
+    '''
+    Atomically write trained model, merge probabilities and solution of `state' into `path' (`.npz').
+    The checkpoint is written into a temporary file in the same directory first and then moved into place.
+
+    :param path: target file
+    :param state: successfully computed :class:`pias.workflow.State`
+    :return: `path'
+    '''
+    return save_checkpoint(path, checkpoint_from_state(state))
+
+
+def save_checkpoint(path, checkpoint):
+    '''
+    Atomically write :class:`StateCheckpoint` into `path' (`.npz'), see :func:`save_state_checkpoint`.
+
+    :return: `path'
+    '''
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.checkpoint-', suffix='.npz', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(
+                f,
+                format_version      = np.array(_FORMAT_VERSION),
+                solution_id         = np.array(checkpoint.solution_id, dtype=np.int64),
+                model               = np.frombuffer(pickle.dumps(checkpoint.model, protocol=pickle.HIGHEST_PROTOCOL), dtype=np.uint8),
+                merge_probabilities = np.asarray(checkpoint.merge_probabilities, dtype=np.float32),
+                solution            = np.asarray(checkpoint.solution),
+                indices             = np.asarray(checkpoint.indices, dtype=np.uint64),
+                labels              = np.asarray(checkpoint.labels, dtype=np.uint64),
+                uv_pairs            = np.asarray(checkpoint.uv_pairs, dtype=np.uint64).reshape(-1, 2))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _logger.debug('Wrote checkpoint for solution %d to %s', checkpoint.solution_id, path)
+    return path
+
+
+def load_state_checkpoint(path):
+    '''
+    :param path: checkpoint written by :func:`save_state_checkpoint`
+    :return: :class:`StateCheckpoint` or `None' if `path' does not exist
+    '''
+    if not os.path.isfile(path):
+        return None
+
+    with np.load(path, allow_pickle=False) as f:
+        format_version = f['format_version'].item()
+        if format_version != _FORMAT_VERSION:
+            raise Exception('Unsupported checkpoint format version %d in %s (expected %d)' % (format_version, path, _FORMAT_VERSION))
+        return StateCheckpoint(
+            solution_id         = f['solution_id'].item(),
+            # the checkpoint is written by the server itself into its own directory
+            model               = pickle.loads(f['model'].tobytes()),
+            merge_probabilities = f['merge_probabilities'],
+            solution            = f['solution'],
+            indices             = f['indices'],
+            labels              = f['labels'],
+            uv_pairs            = f['uv_pairs'])
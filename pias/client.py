@@ -0,0 +1,49 @@
+# Client entry point for the api endpoint of a running solver server.
+# Only zmq (and the standard library) are imported here so that `pias-cli' starts up quickly.
+import zmq
+
+from .api import API_RESPONSE_OK, API_RESPONSE_DATA_STRING, API_RESPONSE_DATA_BYTES, API_RESPONSE_DATA_INT, \
+    API_RESPONSE_DATA_UNKNOWN
+from .pias_logging import levels as log_levels
+from .pias_logging import logging
+from .zmq_util import recv_int
+
+
+def client_cli_main(argv=None):
+    import argparse
+    import sys
+    from .version_info import _version as version
+
+    _logger = logging.getLogger(__name__)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('endpoint')
+    parser.add_argument('--address', required=True, help='base address of server for which help is requested')
+    parser.add_argument('--version', action='version', version=f'{version}')
+    parser.add_argument('--log-level', required=False, choices=log_levels, default='INFO')
+
+    args = parser.parse_args(args=argv)
+
+    logging.basicConfig(level=logging.getLevelName(args.log_level))
+
+    context = zmq.Context(1)
+    socket = context.socket(zmq.REQ)
+    socket.connect(args.address)
+    socket.send_string(args.endpoint)
+    response_code = recv_int(socket)
+
+    if response_code != API_RESPONSE_OK:
+        _logger.error('Received non-zero return code %d', response_code)
+        sys.exit(response_code)
+
+    for i in range(0, recv_int(socket)):
+        message_type = recv_int(socket)
+        if message_type == API_RESPONSE_DATA_STRING:
+            data = socket.recv_string()
+        elif message_type == API_RESPONSE_DATA_INT:
+            data = recv_int(socket)
+        elif message_type in (API_RESPONSE_DATA_BYTES, API_RESPONSE_DATA_UNKNOWN):
+            data = socket.recv()
+        else:
+            raise Exception('Do not understand message type %d' % message_type)
+        print(data)
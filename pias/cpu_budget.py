@@ -0,0 +1,135 @@
+from .pias_logging import logging
+
+import contextlib
+import os
+import threading
+import time
+
+from .ext import is_module_available
+
+# stages of solution updates that get threads from the budget
+FIT     = 'fit'
+PREDICT = 'predict'
+SOLVE   = 'solve'
+STAGES  = (FIT, PREDICT, SOLVE)
+
+# upper bound of threads per stage: the multicut solvers (nifty and built-in) are single-threaded
+MAX_STAGE_THREADS = {SOLVE: 1}
+
+
+def available_cores():
+    '''
+    :return: number of cores this process may run on
+    '''
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class _StageStats(object):
+
+    def __init__(self):
+        super(_StageStats, self).__init__()
+        self.count        = 0
+        self.active       = 0
+        self.threads      = 0
+        self.seconds      = 0.
+        self.core_seconds = 0.
+
+
+class CpuBudget(object):
+    '''
+    Splits `cores' between serving and the stages of solution updates (training, prediction, solving) so that
+    concurrent stages do not oversubscribe the cores. `reserved' cores are kept for socket handlers (e.g. the zmq I/O
+    threads), the remaining cores are shared by the stages of up to `concurrency' concurrent updates (e.g. the threads
+    of a :class:`pias.scheduler.UpdateScheduler`): each stage gets the cores that are not in use by other stages, at
+    most its fair share (`(cores - reserved) / concurrency') and its limit in :data:`MAX_STAGE_THREADS`, at least one.
+
+    Use :meth:`stage` around each stage and pass the number of threads to the library that runs it (e.g. `n_jobs' of
+    sklearn). Wall time and core time (wall time times threads) of each stage are recorded for :meth:`utilization`.
+    '''
+
+    def __init__(self, cores=None, reserved=1, concurrency=1):
+        super(CpuBudget, self).__init__()
+        self.logger      = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+        self.cores       = available_cores() if cores is None else cores
+        self.reserved    = min(max(reserved, 0), self.cores - 1) if self.cores > 1 else 0
+        self.compute     = max(self.cores - self.reserved, 1)
+        self.concurrency = max(concurrency, 1)
+        self.in_use      = 0
+        self.stats       = {stage: _StageStats() for stage in STAGES}
+        self.started     = time.monotonic()
+        self.lock        = threading.Lock()
+        self.logger.debug('Budget of %d cores: %d reserved for serving, %d for %d concurrent updates', self.cores, self.reserved, self.compute, self.concurrency)
+
+    def fair_share(self, stage):
+        '''
+        :return: maximum number of threads of `stage'
+        '''
+        return max(min(self.compute // self.concurrency, MAX_STAGE_THREADS.get(stage, self.compute)), 1)
+
+    @contextlib.contextmanager
+    def stage(self, stage):
+        '''
+        Acquire threads for `stage' for the duration of the `with' block.
+
+        :return: number of threads that `stage' may use
+        '''
+        with self.lock:
+            threads        = max(min(self.compute - self.in_use, self.fair_share(stage)), 1)
+            self.in_use   += threads
+            stats          = self.stats.setdefault(stage, _StageStats())
+            stats.active  += 1
+            stats.threads  = threads
+        start = time.perf_counter()
+        try:
+            yield threads
+        finally:
+            seconds = time.perf_counter() - start
+            with self.lock:
+                self.in_use        -= threads
+                stats.active       -= 1
+                stats.count        += 1
+                stats.seconds      += seconds
+                stats.core_seconds += seconds * threads
+
+    def utilization(self):
+        '''
+        :return: dict of cores, reserved cores, cores in use, and overall utilization of the cores for updates (core
+                 time of all stages over elapsed time of all cores for updates), and for each stage: number of runs,
+                 running instances, threads of the last run, wall time, core time, and utilization
+        '''
+        with self.lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            stages  = {
+                stage: dict(
+                    count        = stats.count,
+                    active       = stats.active,
+                    threads      = stats.threads,
+                    seconds      = stats.seconds,
+                    core_seconds = stats.core_seconds,
+                    utilization  = stats.core_seconds / (self.compute * elapsed))
+                for stage, stats in sorted(self.stats.items())}
+            return dict(
+                cores       = self.cores,
+                reserved    = self.reserved,
+                compute     = self.compute,
+                concurrency = self.concurrency,
+                in_use      = self.in_use,
+                utilization = sum(s['core_seconds'] for s in stages.values()) / (self.compute * elapsed),
+                stages      = stages)
+
+    def limit_native_threads(self):
+        '''
+        Limit thread pools of native libraries (BLAS, OpenMP) of this process to the fair share of an update, if
+        `threadpoolctl' is available. Call once at start-up: the limits apply to all threads of the process.
+
+        :return: `True' if limits were set
+        '''
+        if not is_module_available('threadpoolctl'):
+            self.logger.info('threadpoolctl not available, not limiting BLAS and OpenMP threads')
+            return False
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=max(self.compute // self.concurrency, 1))
+        return True
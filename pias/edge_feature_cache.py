@@ -1,38 +1,151 @@
 from .pias_logging import logging
 
-import nifty
+import os
+import tempfile
 import threading
+import time
 
-from .edges import EdgeFeatureIO
+import numpy as np
+
+from .agglomeration_model import make_graph
+from .edges import EdgeFeatureIO, EdgeIndex
+from .graph import Adjacency
 
 class EdgeFeatureCache(object):
-    
-    def __init__(self, container, edge_dataset, edge_feature_dataset):
+
+    def __init__(self, container, edge_dataset, edge_feature_dataset, cache_directory=None):
+        '''
+        :param cache_directory: if not `None', keep a copy of edges and features in `.npy' files in this directory
+                                from which they are reloaded after :meth:`evict`, instead of reading the N5 dataset
+        '''
         super(EdgeFeatureCache, self).__init__()
         self.logger = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
         self.logger.debug('Instantiating workflow with arguments %s', (container, edge_dataset, edge_feature_dataset))
         self.feature_io         = EdgeFeatureIO(container=container, edge_dataset=edge_dataset, edge_feature_dataset=edge_feature_dataset)
+        self.cache_directory    = cache_directory
         self.edges              = None
         self.edge_features      = None
         self.edge_index_mapping = None
         self.graph              = None
+        self.adjacency          = None
+        self.evicted            = False
+        self.last_access        = time.monotonic()
         self.lock               = threading.RLock()
+        # called with edges and edge index whenever they are (re-)loaded, with `None' when they are evicted
+        self.listeners          = []
 
         self.update_edge_features()
 
+    def add_listener(self, listener):
+        '''
+        :param listener: callable `(edges, edge_index_mapping)', called (under the lock of this cache) whenever edges
+                         are read or reloaded, and with `(None, None)' when they are evicted, e.g. to keep references
+                         only while edges are loaded
+        '''
+        with self.lock:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self.lock:
+            if listener in self.listeners:
+                self.listeners.remove(listener)
+
     def get_edges_and_features(self):
         with self.lock:
+            self._ensure_loaded()
             return self.edges, self.edge_features, self.edge_index_mapping, self.graph
 
+    def get_adjacency(self):
+        '''
+        :return: :class:`pias.graph.Adjacency` of current edges, built on first call after each update
+        '''
+        with self.lock:
+            self._ensure_loaded()
+            if self.adjacency is None and self.edges is not None:
+                self.adjacency = Adjacency(self.graph.numberOfNodes, self.edges)
+            return self.adjacency
+
     def update_edge_features(self):
         edges, features    = self.feature_io.read()
-        edge_index_mapping = {(e[0], e[1]): index for index, e in enumerate(edges)}
+        edge_index_mapping = EdgeIndex(edges)
         max_id = edges.max().item()
-        graph = nifty.graph.UndirectedGraph(max_id + 1)
-        graph.insertEdges(edges)
+        graph = make_graph(max_id + 1, edges)
+        if self.cache_directory is not None:
+            self._write_cache(edges, features)
         with self.lock:
             self.edges              = edges
             self.edge_features      = features
             self.edge_index_mapping = edge_index_mapping
             self.graph              = graph
-            return self.get_edges_and_features()
\ No newline at end of file
+            self.adjacency          = None
+            self.evicted            = False
+            self._notify()
+            return self.get_edges_and_features()
+
+    def evict(self):
+        '''
+        Release edges, features, edge index, graph, and adjacency. They are reloaded on next access, from the `.npy'
+        cache if available.
+        '''
+        with self.lock:
+            if self.evicted:
+                return
+            self.edges              = None
+            self.edge_features      = None
+            self.edge_index_mapping = None
+            self.graph              = None
+            self.adjacency          = None
+            self.evicted            = True
+            self._notify()
+        self.logger.info('Evicted edges and features of %s', self.feature_io.container)
+
+    def arrays(self):
+        '''
+        :return: list of arrays held by edges, features, edge index, and adjacency (empty if evicted). The graph is not
+                 included, it is approximately twice the size of the edges.
+        '''
+        with self.lock:
+            if self.evicted:
+                return []
+            arrays = [self.edges, self.edge_features, self.edge_index_mapping.order, self.edge_index_mapping.sorted_keys]
+            if self.adjacency is not None:
+                arrays.extend((self.adjacency.indptr, self.adjacency.neighbors, self.adjacency.edge_ids))
+            return arrays
+
+    def _ensure_loaded(self):
+        self.last_access = time.monotonic()
+        if not self.evicted:
+            return
+        start = time.perf_counter()
+        if self.cache_directory is not None and os.path.isfile(self._cache_path('edges')):
+            edges    = np.load(self._cache_path('edges'))
+            features = np.load(self._cache_path('edge-features'))
+        else:
+            edges, features = self.feature_io.read()
+        self.edges              = edges
+        self.edge_features      = features
+        self.edge_index_mapping = EdgeIndex(edges)
+        self.graph              = make_graph(edges.max().item() + 1, edges)
+        self.evicted            = False
+        self._notify()
+        self.logger.info('Reloaded %d edges of %s in %.3fs', edges.shape[0], self.feature_io.container, time.perf_counter() - start)
+
+    def _notify(self):
+        for listener in list(self.listeners):
+            listener(self.edges, self.edge_index_mapping)
+
+    def _cache_path(self, name):
+        return os.path.join(self.cache_directory, name + '.npy')
+
+    def _write_cache(self, edges, features):
+        os.makedirs(self.cache_directory, exist_ok=True)
+        for name, array in (('edges', edges), ('edge-features', features)):
+            fd, tmp_path = tempfile.mkstemp(prefix='.' + name + '-', suffix='.npy', dir=self.cache_directory)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, array)
+                os.replace(tmp_path, self._cache_path(name))
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
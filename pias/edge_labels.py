@@ -3,6 +3,26 @@ from .pias_logging import logging
 import numpy as np
 import threading
 
+# label that removes an existing label of an edge
+UNLABELED = -1
+
+# labels that may be set for an edge
+VALID_LABELS = (0, 1, UNLABELED)
+
+
+def check_labels(labels):
+    '''
+    :param labels: array-like of labels
+    :return: `labels' as `int8' array of shape `(n,)'
+    :raise ValueError: if `labels' contains anything but :data:`VALID_LABELS`
+    '''
+    labels = np.asarray(labels).reshape(-1)
+    valid  = np.isin(labels, VALID_LABELS)
+    if not np.all(valid):
+        raise ValueError('Invalid labels %s, expected one of %s' % (np.unique(labels[~valid]).tolist(), list(VALID_LABELS)))
+    return labels.astype(np.int8)
+
+
 
 class EdgeLabelCache(object):
     
@@ -15,17 +35,32 @@ class EdgeLabelCache(object):
         self.lock               = threading.RLock()
 
     def update_labels(self, edges, labels):
+        '''
+        :param edges: uv-pairs, array-like of shape `(n, 2)'
+        :param labels: array-like of length `n', :data:`UNLABELED` removes the label of an edge
+        :return: boolean mask of edges that are in the edge-index-mapping, i.e. labels that were accepted
+        '''
         with self.lock:
 
             if self.edge_index_mapping is None:
-                return
+                return np.zeros((len(labels),), dtype=bool)
 
-            for e, l in zip(edges, labels):
-                if e not in self.edge_index_mapping:
-                    self.logger.debug('Edge %s not in edge-index-mapping %s', e, self.edge_index_mapping)
-                    continue
-                index = self.edge_index_mapping[e]
-                self.edge_label_map[index] = l
+            indices = self.edge_index_mapping.lookup(edges)
+            labels  = np.asarray(labels)
+            valid   = indices >= 0
+            if not np.all(valid):
+                self.logger.debug('Edges %s not in edge-index-mapping', np.asarray(edges)[~valid])
+            if np.any(labels[valid] == UNLABELED):
+                # in order, i.e. the last label for an edge wins
+                for index, label in zip(indices[valid].tolist(), labels[valid].tolist()):
+                    if label == UNLABELED:
+                        self.edge_label_map.pop(index, None)
+                    else:
+                        self.edge_label_map[index] = label
+            else:
+                # dict.update preserves order, i.e. the last label for an edge wins
+                self.edge_label_map.update(zip(indices[valid].tolist(), labels[valid].tolist()))
+            return valid
 
     def get_sample_and_label_arrays(self, samples):
         with self.lock:
@@ -34,10 +69,28 @@ class EdgeLabelCache(object):
             uv_pairs     = self.edges[edge_indices]
         return samples[edge_indices, ...], labels, edge_indices, uv_pairs
 
+    def get_labeled_uv_pairs(self):
+        with self.lock:
+            edge_indices = np.fromiter(self.edge_label_map.keys(), dtype=np.uint64, count=len(self.edge_label_map))
+            labels       = np.fromiter(self.edge_label_map.values(), dtype=np.uint64, count=len(self.edge_label_map))
+            uv_pairs     = self.edges[edge_indices] if self.edges is not None else np.empty((0, 2), dtype=np.uint64)
+        return uv_pairs, labels
+
     def update_edge_index_mapping(self, edges, edge_index_mapping):
+        '''
+        :param edges: edges, `None' (with `edge_index_mapping') to release references while edges are evicted. Labels
+                      are kept by edge index and refer to the same edges after edges are reloaded.
+        '''
         with self.lock:
             self.logger.debug('Updating edge-index-mapping: %s', edge_index_mapping)
             self.edges              = edges
             self.edge_index_mapping = edge_index_mapping
 
-
+    def arrays(self):
+        '''
+        :return: list of arrays held by edges and edge-index-mapping (empty if released)
+        '''
+        with self.lock:
+            if self.edge_index_mapping is None:
+                return []
+            return [self.edges, self.edge_index_mapping.order, self.edge_index_mapping.sorted_keys]
@@ -0,0 +1,67 @@
+import numpy as np
+
+# per-edge quantities of a solution
+MERGE_PROBABILITIES = 0
+COSTS               = 1
+QUANTITIES          = (MERGE_PROBABILITIES, COSTS)
+
+# encodings, all big endian
+FLOAT32 = 0
+FLOAT16 = 1
+UINT8   = 2
+
+_DTYPES = {FLOAT32: np.dtype('>f4'), FLOAT16: np.dtype('>f2'), UINT8: np.dtype('u1')}
+
+
+class EncodedEdgeValues(object):
+    '''
+    Per-edge values (e.g. merge probabilities or costs of a solution) encoded once as big-endian `float32', `float16',
+    or `uint8', so that queries for all edges or a range of edges are views into the encoded array that can be sent
+    without copying. `uint8' values are quantized linearly over `value_range' (defaults to minimum and maximum of
+    `values'): `value = offset + scale * encoded'. For floating point encodings, `offset' is 0 and `scale' is 1.
+    '''
+
+    def __init__(self, values, encoding, value_range=None):
+        super(EncodedEdgeValues, self).__init__()
+        if encoding not in _DTYPES:
+            raise ValueError('Unknown encoding %s (expected one of %s)' % (encoding, sorted(_DTYPES)))
+        values        = np.asarray(values, dtype=np.float32)
+        self.encoding = encoding
+        if encoding == UINT8:
+            if value_range is None:
+                value_range = (values.min().item(), values.max().item()) if values.size > 0 else (0., 1.)
+            low, high   = value_range
+            self.offset = float(low)
+            self.scale  = float(high - low) / 255. if high > low else 1.
+            self.data   = np.clip(np.rint((values.astype(np.float64) - self.offset) / self.scale), 0, 255).astype(np.uint8)
+        else:
+            self.offset = 0.
+            self.scale  = 1.
+            self.data   = values.astype(_DTYPES[encoding])
+
+    def all(self):
+        return self.data
+
+    def range(self, start, stop):
+        '''
+        :return: values of edges `start' (inclusive) to `stop' (exclusive), clipped to the number of edges (view)
+        '''
+        return self.data[max(start, 0):max(stop, 0)]
+
+    def select(self, edge_ids):
+        '''
+        :return: values of `edge_ids' (copy)
+        '''
+        edge_ids = np.asarray(edge_ids, dtype=np.uint64)
+        if edge_ids.size > 0 and edge_ids.max() >= self.data.size:
+            raise IndexError('Edge id %d out of range for %d edges' % (edge_ids.max(), self.data.size))
+        return self.data[edge_ids.astype(np.int64)]
+
+    def decode(self, data):
+        '''
+        :return: `float32' values of encoded `data'
+        '''
+        return (self.offset + self.scale * np.asarray(data).astype(np.float32)).astype(np.float32)
+
+    def nbytes(self):
+        return self.data.nbytes
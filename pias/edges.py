@@ -1,5 +1,7 @@
 from .ext import z5py
 
+import numpy as np
+
 class EdgeFeatureIO(object):
     
     def __init__(self, container, edge_dataset='edges', edge_feature_dataset='edge_features'):
@@ -12,3 +14,46 @@ class EdgeFeatureIO(object):
         reader = z5py.File(self.container, use_zarr_format=False)
         return reader[self.edge_dataset][...], reader[self.edge_feature_dataset][...]
 
+
+def _uv_pairs_as_keys(uv_pairs):
+    # Big-endian uint64 pairs compare lexicographically as raw 16 byte strings,
+    # which allows for sorting and binary search of edges without Python objects per edge.
+    uv_pairs = np.ascontiguousarray(np.asarray(uv_pairs, dtype=np.uint64).reshape(-1, 2), dtype='>u8')
+    return uv_pairs.view(np.dtype((np.void, 16))).ravel()
+
+
+class EdgeIndex(object):
+    '''
+    Map uv-pairs to edge indices through binary search over lexicographically sorted edges.
+    Unlike a dict of uv-tuples, construction and look-ups are vectorized.
+    '''
+
+    def __init__(self, edges):
+        super(EdgeIndex, self).__init__()
+        keys             = _uv_pairs_as_keys(edges)
+        self.order       = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[self.order]
+
+    def __len__(self):
+        return self.sorted_keys.size
+
+    def lookup(self, uv_pairs):
+        '''
+        :param uv_pairs: array-like of shape `(n, 2)'
+        :return: `int64' array of edge indices, `-1' for uv-pairs that are not in the index
+        '''
+        keys      = _uv_pairs_as_keys(uv_pairs)
+        if self.sorted_keys.size == 0:
+            return np.full(keys.shape, -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.sorted_keys, keys), self.sorted_keys.size - 1)
+        found     = self.sorted_keys[positions] == keys
+        return np.where(found, self.order[positions], -1).astype(np.int64)
+
+    def __contains__(self, uv_pair):
+        return self.lookup((uv_pair,))[0] >= 0
+
+    def __getitem__(self, uv_pair):
+        index = self.lookup((uv_pair,))[0]
+        if index < 0:
+            raise KeyError(uv_pair)
+        return index.item()
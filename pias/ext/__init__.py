@@ -2,6 +2,7 @@ from __future__ import print_function
 
 from ..pias_logging import logging
 
+import importlib.util
 import traceback
 
 import sys
@@ -19,6 +20,12 @@ class NoSuchModule(object):
     def __getattr__(self, item):
         raise self.__exception
 
+def is_module_available(name):
+    '''
+    :return: `True' if module `name' can be imported, without importing it
+    '''
+    return importlib.util.find_spec(name) is not None
+
 try:
     import z5py
 except ImportError:
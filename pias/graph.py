@@ -0,0 +1,124 @@
+import numpy as np
+
+from .edges import EdgeIndex
+
+
+def concatenated_ranges(starts, counts):
+    '''
+    :return: concatenation of `arange(start, start + count)' for all `starts' and `counts', without a Python loop
+    '''
+    counts  = np.asarray(counts, dtype=np.int64)
+    offsets = np.repeat(np.asarray(starts, dtype=np.int64) - np.cumsum(counts) + counts, counts)
+    return np.arange(offsets.size, dtype=np.int64) + offsets
+
+
+def merge_parallel_edges(uv_ids, costs):
+    '''
+    Remove self-loops and sum up costs of parallel edges.
+
+    :return: tuple of unique uv-ids (`u < v') and their costs
+    '''
+    uv_ids  = np.sort(np.asarray(uv_ids, dtype=np.uint64).reshape(-1, 2), axis=1)
+    costs   = np.asarray(costs, dtype=np.float64)
+    no_loop = uv_ids[:, 0] != uv_ids[:, 1]
+    uv_ids  = uv_ids[no_loop]
+    costs   = costs[no_loop]
+    if uv_ids.size == 0:
+        return uv_ids, costs
+    base = uv_ids[:, 1].max().item() + 1
+    if base < 2**32:
+        # pack into single integer: sorting 1d keys is much faster than np.unique(..., axis=0)
+        keys, inverse = np.unique(uv_ids[:, 0] * np.uint64(base) + uv_ids[:, 1], return_inverse=True)
+        unique        = np.stack((keys // np.uint64(base), keys % np.uint64(base)), axis=1)
+    else:
+        unique, inverse = np.unique(uv_ids, axis=0, return_inverse=True)
+    return unique, np.bincount(inverse.reshape(-1), weights=costs, minlength=unique.shape[0])
+
+
+class ArrayGraph(object):
+    '''
+    Minimal undirected graph over uv-id arrays with the subset of the interface of `nifty.graph.UndirectedGraph' that is
+    used in pias. Used in place of the nifty graph when nifty is not available.
+    '''
+
+    def __init__(self, number_of_nodes, edges):
+        super(ArrayGraph, self).__init__()
+        self.numberOfNodes = number_of_nodes
+        self.edges         = np.asarray(edges, dtype=np.uint64).reshape(-1, 2)
+        self.numberOfEdges = self.edges.shape[0]
+        self.edge_index    = EdgeIndex(np.sort(self.edges, axis=1))
+
+    def uvIds(self):
+        return self.edges
+
+    def findEdges(self, uv_ids):
+        '''
+        :return: edge id for each uv-pair (in any order), `-1' if not an edge
+        '''
+        return self.edge_index.lookup(np.sort(np.asarray(uv_ids, dtype=np.uint64).reshape(-1, 2), axis=1))
+
+    def __str__(self):
+        return 'ArrayGraph(numberOfNodes={}, numberOfEdges={})'.format(self.numberOfNodes, self.numberOfEdges)
+
+
+class Adjacency(object):
+    '''
+    Adjacency of an undirected graph in compressed sparse row layout: the neighbors of node `n' are
+    `neighbors[indptr[n]:indptr[n+1]]', connected through edges `edge_ids[indptr[n]:indptr[n+1]]'.
+    '''
+
+    def __init__(self, number_of_nodes, edges):
+        super(Adjacency, self).__init__()
+        edges                = np.asarray(edges, dtype=np.uint64).reshape(-1, 2)
+        ends                 = np.concatenate((edges[:, 0], edges[:, 1])).astype(np.int64)
+        others               = np.concatenate((edges[:, 1], edges[:, 0]))
+        edge_ids             = np.tile(np.arange(edges.shape[0], dtype=np.int64), 2)
+        order                = np.argsort(ends, kind='stable')
+        self.number_of_nodes = number_of_nodes
+        self.indptr          = np.zeros(number_of_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ends, minlength=number_of_nodes), out=self.indptr[1:])
+        self.neighbors       = others[order]
+        self.edge_ids        = edge_ids[order]
+
+    def _positions(self, nodes):
+        nodes = np.asarray(nodes, dtype=np.uint64)
+        nodes = nodes[nodes < self.number_of_nodes].astype(np.int64)
+        return concatenated_ranges(self.indptr[nodes], self.indptr[nodes + 1] - self.indptr[nodes])
+
+    def neighbors_of(self, nodes):
+        '''
+        :return: sorted unique neighbors of all `nodes'
+        '''
+        return np.unique(self.neighbors[self._positions(nodes)])
+
+    def incident_edges(self, nodes):
+        '''
+        :return: sorted unique ids of all edges with at least one end point in `nodes'
+        '''
+        return np.unique(self.edge_ids[self._positions(nodes)])
+
+    def expand(self, nodes, depth):
+        '''
+        :return: sorted unique nodes within `depth' hops of `nodes' (including `nodes')
+        '''
+        region   = np.unique(np.asarray(nodes, dtype=np.uint64))
+        frontier = region
+        for _ in range(depth):
+            frontier = np.setdiff1d(self.neighbors_of(frontier), region, assume_unique=True)
+            if frontier.size == 0:
+                break
+            region = np.union1d(region, frontier)
+        return region
+
+
+def connected_components(number_of_nodes, uv_ids):
+    '''
+    :return: component id for each node (`int64')
+    '''
+    # scipy is a dependency of scikit-learn
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components as scipy_connected_components
+    uv_ids    = np.asarray(uv_ids, dtype=np.int64).reshape(-1, 2)
+    adjacency = coo_matrix((np.ones(uv_ids.shape[0], dtype=np.int8), (uv_ids[:, 0], uv_ids[:, 1])), shape=(number_of_nodes, number_of_nodes))
+    _, labels = scipy_connected_components(adjacency, directed=False)
+    return labels.astype(np.int64)
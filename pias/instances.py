@@ -0,0 +1,152 @@
+from .pias_logging import logging
+
+import collections
+import os
+import queue
+import tempfile
+import threading
+
+import numpy as np
+
+_logger = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 1
+
+MulticutInstance = collections.namedtuple('MulticutInstance', ('solution_id', 'number_of_nodes', 'uv_ids', 'costs', 'indices', 'labels', 'solution', 'solver', 'energy', 'seconds'))
+
+
+def multicut_energy(uv_ids, costs, labels):
+    '''
+    :return: sum of costs of all cut edges (lower is better, positive costs are attractive)
+    '''
+    cut = labels[uv_ids[:, 0]] != labels[uv_ids[:, 1]]
+    return float(costs[cut].sum())
+
+
+def save_instance(path, instance):
+    '''
+    Atomically write a :class:`MulticutInstance` into `path' (compressed `.npz').
+
+    :return: `path'
+    '''
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.instance-', suffix='.npz', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(
+                f,
+                format_version  = np.array(_FORMAT_VERSION),
+                solution_id     = np.array(instance.solution_id, dtype=np.int64),
+                number_of_nodes = np.array(instance.number_of_nodes, dtype=np.int64),
+                uv_ids          = np.asarray(instance.uv_ids, dtype=np.uint64).reshape(-1, 2),
+                costs           = np.asarray(instance.costs, dtype=np.float64),
+                indices         = np.asarray(instance.indices, dtype=np.uint64),
+                labels          = np.asarray(instance.labels, dtype=np.uint64),
+                solution        = np.asarray(instance.solution, dtype=np.uint64),
+                solver          = np.array(instance.solver),
+                energy          = np.array(instance.energy, dtype=np.float64),
+                seconds         = np.array(instance.seconds, dtype=np.float64))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def load_instance(path):
+    '''
+    :param path: instance written by :func:`save_instance`
+    :return: :class:`MulticutInstance`
+    '''
+    with np.load(path, allow_pickle=False) as f:
+        format_version = f['format_version'].item()
+        if format_version != _FORMAT_VERSION:
+            raise Exception('Unsupported instance format version %d in %s (expected %d)' % (format_version, path, _FORMAT_VERSION))
+        return MulticutInstance(
+            solution_id     = f['solution_id'].item(),
+            number_of_nodes = f['number_of_nodes'].item(),
+            uv_ids          = f['uv_ids'],
+            costs           = f['costs'],
+            indices         = f['indices'],
+            labels          = f['labels'],
+            solution        = f['solution'],
+            solver          = f['solver'].item(),
+            energy          = f['energy'].item(),
+            seconds         = f['seconds'].item())
+
+
+class InstanceDumper(object):
+    '''
+    Dump solved multicut instances of :class:`pias.workflow.State` into `directory' as `instance-SOLUTION_ID.npz' for
+    offline solver benchmarks (`pias-benchmark-instances'). Instances are written in a background thread, one at a
+    time, in order of submission. Up to `max_pending' instances wait while another one is written, further instances
+    are dropped with a warning.
+
+    :param min_seconds: only dump instances that took at least this long to solve
+    :param max_pending: maximum number of instances that wait to be written
+    '''
+
+    def __init__(self, directory, min_seconds=0., max_pending=4):
+        super(InstanceDumper, self).__init__()
+        self.logger      = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+        self.directory   = directory
+        self.min_seconds = min_seconds
+        self.pending     = queue.Queue(maxsize=max_pending)
+        self.lock        = threading.Lock()
+        self.thread      = None
+
+    def path(self, solution_id):
+        return os.path.join(self.directory, 'instance-%d.npz' % solution_id)
+
+    def submit(self, state):
+        '''
+        :param state: successfully computed :class:`pias.workflow.State`
+        :return: `True' if the instance is dumped
+        '''
+        if state.solve_seconds is None or state.solve_seconds < self.min_seconds:
+            return False
+        try:
+            # graph and edges may be released while the instance waits (see :meth:`pias.workflow.State.release`)
+            self.pending.put_nowait((state, state.graph.numberOfNodes, state.edges))
+        except queue.Full:
+            self.logger.warning('%d instances are waiting to be written, not dumping instance of solution %d', self.pending.maxsize, state.solution_id)
+            return False
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='dump-instances', daemon=True)
+                self.thread.start()
+        return True
+
+    def wait(self):
+        '''
+        Wait until all submitted instances are written.
+        '''
+        self.pending.join()
+
+    def _run(self):
+        while True:
+            state, number_of_nodes, edges = self.pending.get()
+            try:
+                self._dump(state, number_of_nodes, edges)
+            finally:
+                self.pending.task_done()
+
+    def _dump(self, state, number_of_nodes, edges):
+        try:
+            instance = MulticutInstance(
+                solution_id     = state.solution_id,
+                number_of_nodes = number_of_nodes,
+                uv_ids          = edges,
+                costs           = state.costs,
+                indices         = state.indices,
+                labels          = state.labels,
+                solution        = state.solution,
+                solver          = state.agglomeration.solver,
+                energy          = multicut_energy(np.asarray(edges, dtype=np.int64), state.costs, state.solution),
+                seconds         = state.solve_seconds)
+            os.makedirs(self.directory, exist_ok=True)
+            path = save_instance(self.path(state.solution_id), instance)
+            self.logger.info('Dumped multicut instance of solution %d (%.3fs with %s) into %s', state.solution_id, state.solve_seconds, instance.solver, path)
+        except Exception as e:
+            self.logger.error('Unable to dump multicut instance of solution %d: %s', state.solution_id, e)
@@ -0,0 +1,168 @@
+from .pias_logging import logging
+
+import collections
+import threading
+
+import numpy as np
+
+from .edge_labels import UNLABELED
+
+_logger = logging.getLogger(__name__)
+
+
+def flatten_paths(paths):
+    '''
+    :param paths: list of paths (lists of node ids)
+    :return: `uint64' array with length of each path followed by the nodes of the path, for all paths
+    '''
+    flat = [value for path in paths for value in [len(path)] + list(path)]
+    return np.array(flat, dtype=np.uint64)
+
+
+class LabelConsistency(object):
+    '''
+    Incrementally check edge labels for consistency: a negative label (`0', fragments are in different segments) is
+    inconsistent if its fragments are connected through a path of positive labels (`1', fragments are in the same
+    segment). Positive labels are kept in a union-find structure (union by size, path halving) and each set keeps
+    the negative labels incident to it. When two sets are merged, only the negative labels of the smaller set are
+    checked, i.e. each label is checked O(log n) times. Replacing or removing a positive label cannot be done
+    incrementally and triggers a rebuild.
+    '''
+
+    def __init__(self):
+        super(LabelConsistency, self).__init__()
+        self.logger = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+        self.lock   = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.labels             = {}
+        self.parent             = {}
+        self.size               = {}
+        self.negative_by_root   = {}
+        self.positive_neighbors = collections.defaultdict(set)
+        self.conflicts          = set()
+
+    def update(self, uv_pairs, labels):
+        '''
+        :param uv_pairs: uv-pairs, array-like of shape `(n, 2)'
+        :param labels: array-like of length `n', the last label for an edge wins, :data:`pias.edge_labels.UNLABELED`
+                       removes a label
+        :return: number of conflicting negative labels after update
+        '''
+        uv_pairs = np.asarray(uv_pairs, dtype=np.uint64).reshape(-1, 2)
+        labels   = np.asarray(labels).reshape(-1)
+        with self.lock:
+            rebuild = False
+            for (u, v), label in zip(uv_pairs.tolist(), labels.tolist()):
+                if u == v:
+                    continue
+                key      = (u, v) if u < v else (v, u)
+                previous = self.labels.get(key)
+                if previous == label or (previous is None and label == UNLABELED):
+                    continue
+                if label == UNLABELED:
+                    del self.labels[key]
+                else:
+                    self.labels[key] = label
+                rebuild = rebuild or previous == 1
+                if rebuild:
+                    # everything is re-added from self.labels after this batch
+                    continue
+                if previous == 0:
+                    # incident lists are cleaned up lazily
+                    self.conflicts.discard(key)
+                if label == 1:
+                    self._add_positive(key)
+                elif label == 0:
+                    self._add_negative(key)
+
+            if rebuild:
+                self._rebuild()
+
+            if len(self.conflicts) > 0:
+                self.logger.info('Labels are inconsistent: %d negative labels between fragments connected by positive labels', len(self.conflicts))
+            return len(self.conflicts)
+
+    def num_conflicts(self):
+        with self.lock:
+            return len(self.conflicts)
+
+    def conflict_paths(self, max_paths=None):
+        '''
+        :param max_paths: return at most this many paths (all if `None')
+        :return: for (up to `max_paths') conflicting negative labels `(u, v)', a path of positive labels from `u' to
+                 `v' as list of nodes `[u, ..., v]'
+        '''
+        with self.lock:
+            conflicts = sorted(self.conflicts)
+            if max_paths is not None:
+                conflicts = conflicts[:max_paths]
+            return [self._positive_path(u, v) for u, v in conflicts]
+
+    def _find(self, node):
+        parent = self.parent
+        while parent.get(node, node) != node:
+            grand_parent = parent.get(parent[node], parent[node])
+            parent[node] = grand_parent
+            node         = grand_parent
+        return node
+
+    def _add_positive(self, key):
+        u, v = key
+        self.positive_neighbors[u].add(v)
+        self.positive_neighbors[v].add(u)
+        root_u, root_v = self._find(u), self._find(v)
+        if root_u == root_v:
+            return
+        small, large = (root_u, root_v) if self.size.get(root_u, 1) < self.size.get(root_v, 1) else (root_v, root_u)
+        self.parent[small] = large
+        self.parent.setdefault(large, large)
+        self.size[large]   = self.size.get(large, 1) + self.size.pop(small, 1)
+
+        # a negative label between both sets is incident to both: checking the smaller set is sufficient
+        remaining = self.negative_by_root.setdefault(large, [])
+        for negative in self.negative_by_root.pop(small, []):
+            if self.labels.get(negative) != 0 or negative in self.conflicts:
+                continue
+            if self._find(negative[0]) == self._find(negative[1]):
+                self.conflicts.add(negative)
+            else:
+                remaining.append(negative)
+
+    def _add_negative(self, key):
+        root_u, root_v = self._find(key[0]), self._find(key[1])
+        if root_u == root_v:
+            self.conflicts.add(key)
+        else:
+            self.negative_by_root.setdefault(root_u, []).append(key)
+            self.negative_by_root.setdefault(root_v, []).append(key)
+
+    def _rebuild(self):
+        labels = self.labels
+        self._reset()
+        self.labels = labels
+        for key, label in labels.items():
+            if label == 1:
+                self._add_positive(key)
+        for key, label in labels.items():
+            if label == 0:
+                self._add_negative(key)
+        self.logger.debug('Rebuilt label consistency for %d labels', len(labels))
+
+    def _positive_path(self, source, target):
+        # breadth-first search: shortest chain of positive labels
+        predecessors = {source: None}
+        queue        = collections.deque([source])
+        while queue:
+            node = queue.popleft()
+            if node == target:
+                break
+            for neighbor in self.positive_neighbors.get(node, ()):
+                if neighbor not in predecessors:
+                    predecessors[neighbor] = node
+                    queue.append(neighbor)
+        path = [target]
+        while predecessors[path[-1]] is not None:
+            path.append(predecessors[path[-1]])
+        return path[::-1]
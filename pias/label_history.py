@@ -0,0 +1,128 @@
+from .pias_logging import logging
+
+import threading
+
+import numpy as np
+
+from .edge_labels import UNLABELED
+
+
+class LabelHistory(object):
+    '''
+    Versioned edge labels. Each batch of labels gets the next version number, starting from version `0' without
+    labels (or the labels at the last :meth:`rebase`, which keep their version). A version only stores the labels that
+    changed in its batch (previous and new label of each edge), all versions share the labels that did not change.
+    Diffs between two versions (and reverts, see :meth:`diff`) therefore cost time proportional to the number of
+    changes between them, not to the number of labels.
+    '''
+
+    def __init__(self):
+        super(LabelHistory, self).__init__()
+        self.logger = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+        # uv-pair -> current label, uv-pairs are kept as submitted (edge look-ups depend on the order of u and v)
+        self.labels  = {}
+        # changes[version]: uv-pair -> (previous label, new label) of all edges that changed in batch `version'
+        self.changes = [{}]
+        # version of the labels in changes[0], i.e. of the last rebase
+        self.base    = 0
+        self.lock    = threading.RLock()
+
+    @property
+    def version(self):
+        with self.lock:
+            return self.base + len(self.changes) - 1
+
+    def rebase(self, version=0):
+        '''
+        Drop all versions, current labels become version `version', e.g. after labels of a persisted version are
+        loaded. Later batches continue from `version'.
+        '''
+        with self.lock:
+            self.changes = [{}]
+            self.base    = version
+
+    def load(self, uv_pairs, labels, version=0):
+        '''
+        Replace all labels and versions with the labels of persisted version `version' (e.g. a snapshot of the labels
+        at that version), later batches continue from `version'.
+        '''
+        uv_pairs = np.asarray(uv_pairs, dtype=np.uint64).reshape(-1, 2)
+        labels   = np.asarray(labels).reshape(-1)
+        with self.lock:
+            self.labels = {key: label for key, label in zip(map(tuple, uv_pairs.tolist()), labels.tolist()) if label != UNLABELED}
+            self.rebase(version)
+
+    def truncate(self, version):
+        '''
+        Drop all versions before `version', e.g. to bound the memory of long sessions.
+        '''
+        with self.lock:
+            if version < self.base or version > self.version:
+                raise ValueError('Version %d does not exist (versions %d to %d are available)' % (version, self.base, self.version))
+            self.changes = [{}] + self.changes[version - self.base + 1:]
+            self.base    = version
+
+    def snapshot(self, version):
+        '''
+        :return: tuple of uv-pairs (`uint64', shape `(n, 2)') and labels (`int32', shape `(n,)') of all labeled edges
+                 of version `version'
+        '''
+        with self.lock:
+            uv_pairs, labels = self.diff(self.version, version)
+            snapshot         = dict(self.labels)
+        for key, label in zip(map(tuple, uv_pairs.tolist()), labels.tolist()):
+            if label == UNLABELED:
+                snapshot.pop(key, None)
+            else:
+                snapshot[key] = label
+        return np.array(list(snapshot.keys()), dtype=np.uint64).reshape(-1, 2), np.array(list(snapshot.values()), dtype=np.int32)
+
+    def record(self, uv_pairs, labels):
+        '''
+        :param uv_pairs: uv-pairs, array-like of shape `(n, 2)'
+        :param labels: array-like of length `n', the last label for an edge wins, :data:`pias.edge_labels.UNLABELED`
+                       removes a label
+        :return: version of the labels after this batch
+        '''
+        uv_pairs = np.asarray(uv_pairs, dtype=np.uint64).reshape(-1, 2)
+        labels   = np.asarray(labels).reshape(-1)
+        with self.lock:
+            changes = {}
+            for key, label in zip(map(tuple, uv_pairs.tolist()), labels.tolist()):
+                previous = self.labels.get(key, UNLABELED)
+                if label == UNLABELED:
+                    self.labels.pop(key, None)
+                else:
+                    self.labels[key] = label
+                changes[key] = (changes[key][0] if key in changes else previous, label)
+            self.changes.append({key: change for key, change in changes.items() if change[0] != change[1]})
+            return self.base + len(self.changes) - 1
+
+    def diff(self, source, target):
+        '''
+        Labels that turn the labels of version `source' into the labels of version `target' (e.g. to revert to
+        `target' from the current version `source'), as set-edge-labels batch.
+
+        :return: tuple of uv-pairs (`uint64', shape `(n, 2)') and labels (`int32', shape `(n,)') of version `target'
+                 for all edges whose label differs between both versions, :data:`pias.edge_labels.UNLABELED` for edges
+                 that are not labeled in version `target'
+        '''
+        with self.lock:
+            for version in (source, target):
+                if version < self.base or version > self.version:
+                    raise ValueError('Version %d does not exist (versions %d to %d are available)' % (version, self.base, self.version))
+            # compose changes between both versions, oldest first when moving forward
+            source  -= self.base
+            target  -= self.base
+            forward  = source <= target
+            versions = range(source + 1, target + 1) if forward else range(source, target, -1)
+            composed = {}
+            for version in versions:
+                for key, (previous, label) in self.changes[version].items():
+                    before, after = (previous, label) if forward else (label, previous)
+                    composed[key] = (composed[key][0] if key in composed else before, after)
+
+        changed  = [(key, after) for key, (before, after) in composed.items() if before != after]
+        uv_pairs = np.array([key for key, _ in changed], dtype=np.uint64).reshape(-1, 2)
+        labels   = np.array([label for _, label in changed], dtype=np.int32)
+        return uv_pairs, labels
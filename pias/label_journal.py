@@ -0,0 +1,178 @@
+from .pias_logging import logging
+
+import os
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+from .edge_labels import check_labels
+
+_logger = logging.getLogger(__name__)
+
+# Each record is a batch of edge labels as submitted by a client:
+#   header:  magic (4 bytes), crc32 of payload (uint32), number of labels n (uint64)
+#   payload: n uv-pairs (2 x uint64), n labels (int8)
+_RECORD_MAGIC         = b'PLJ1'
+_RECORD_HEADER        = struct.Struct('>4sIQ')
+_UV_DTYPE             = np.dtype('>u8')
+_LABEL_DTYPE          = np.dtype('i1')
+_BYTES_PER_LABEL      = 2 * _UV_DTYPE.itemsize + _LABEL_DTYPE.itemsize
+
+
+def _encode_record(uv_pairs, labels):
+    uv_pairs = np.asarray(uv_pairs, dtype=np.uint64).reshape(-1, 2)
+    labels   = check_labels(labels)
+    assert uv_pairs.shape[0] == labels.size, 'Number of uv-pairs (%d) and labels (%d) inconsistent' % (uv_pairs.shape[0], labels.size)
+    payload = uv_pairs.astype(_UV_DTYPE).tobytes() + labels.astype(_LABEL_DTYPE).tobytes()
+    return _RECORD_HEADER.pack(_RECORD_MAGIC, zlib.crc32(payload), labels.size) + payload
+
+
+def _decode_records(buffer, path):
+    uv_pairs = []
+    labels   = []
+    offset   = 0
+    while offset + _RECORD_HEADER.size <= len(buffer):
+        magic, crc, n = _RECORD_HEADER.unpack_from(buffer, offset)
+        start = offset + _RECORD_HEADER.size
+        stop  = start + n * _BYTES_PER_LABEL
+        if magic != _RECORD_MAGIC or stop > len(buffer) or zlib.crc32(buffer[start:stop]) != crc:
+            break
+        uv_pairs.append(np.frombuffer(buffer, dtype=_UV_DTYPE, count=2 * n, offset=start))
+        labels.append(np.frombuffer(buffer, dtype=_LABEL_DTYPE, count=n, offset=start + 2 * n * _UV_DTYPE.itemsize))
+        offset = stop
+    if offset < len(buffer):
+        _logger.warning('Ignoring truncated or corrupt label journal record at byte %d in %s', offset, path)
+    return uv_pairs, labels, offset
+
+
+def read_label_journal(path):
+    '''
+    Read all complete records of a label journal. A truncated or corrupt record (e.g. from a crash while
+    appending) ends the journal: it and everything after it is ignored.
+
+    :param path: journal file
+    :return: tuple of uv-pairs (`uint64', shape `(n, 2)') and labels (`int8', shape `(n,)') in order of submission
+    '''
+    if not os.path.isfile(path):
+        return np.empty((0, 2), dtype=np.uint64), np.empty((0,), dtype=_LABEL_DTYPE)
+
+    with open(path, 'rb') as f:
+        uv_pairs, labels, _ = _decode_records(f.read(), path)
+
+    if len(labels) == 0:
+        return np.empty((0, 2), dtype=np.uint64), np.empty((0,), dtype=_LABEL_DTYPE)
+
+    return np.concatenate(uv_pairs).astype(np.uint64).reshape(-1, 2), np.concatenate(labels)
+
+
+def read_label_journal_batches(path):
+    '''
+    Read all complete records of a label journal as separate batches, e.g. to restore label versions (see
+    :class:`pias.label_history.LabelHistory`). Truncated or corrupt records are handled like in
+    :func:`read_label_journal`.
+
+    :param path: journal file
+    :return: list of tuples of uv-pairs (`uint64', shape `(n, 2)') and labels (`int8', shape `(n,)'), one per record,
+             in order of submission
+    '''
+    if not os.path.isfile(path):
+        return []
+
+    with open(path, 'rb') as f:
+        uv_pairs, labels, _ = _decode_records(f.read(), path)
+
+    return [(uv.astype(np.uint64).reshape(-1, 2), label) for uv, label in zip(uv_pairs, labels)]
+
+
+def write_label_journal(path, batches):
+    '''
+    Atomically write a label journal with one record per batch.
+
+    :param batches: list of tuples of uv-pairs and labels
+    '''
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        for uv_pairs, labels in batches:
+            f.write(_encode_record(uv_pairs, labels))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class LabelJournal(object):
+    '''
+    Write-ahead journal of edge label batches. Records are appended to `path' and handed to the operating system
+    immediately; `fsync' is batched and happens at most every `sync_interval' seconds in a background thread (or
+    explicitly through :meth:`sync`).
+    '''
+
+    def __init__(self, path, sync_interval=0.2):
+        super(LabelJournal, self).__init__()
+        self.logger            = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+        self.path              = path
+        self.sync_interval     = sync_interval
+        self.lock              = threading.RLock()
+        self.num_records       = self._truncate_incomplete_records()
+        self.file              = open(self.path, 'ab')
+        self._needs_sync       = False
+        self._stopped          = threading.Event()
+        self._sync_requested   = threading.Event()
+
+        self.sync_thread = threading.Thread(target=self._sync_periodically, name='sync-%s' % self.path, daemon=True)
+        self.sync_thread.start()
+
+    def append(self, uv_pairs, labels):
+        record = _encode_record(uv_pairs, labels)
+        with self.lock:
+            self.file.write(record)
+            self.file.flush()
+            self.num_records += 1
+            self._needs_sync = True
+        self._sync_requested.set()
+
+    def sync(self):
+        with self.lock:
+            if self._needs_sync and not self.file.closed:
+                os.fsync(self.file.fileno())
+                self._needs_sync = False
+
+    def rotate(self, rotated_path):
+        '''
+        Move all records written so far to `rotated_path' and continue with an empty journal.
+        '''
+        with self.lock:
+            self.sync()
+            self.file.close()
+            os.replace(self.path, rotated_path)
+            self.file        = open(self.path, 'ab')
+            self.num_records = 0
+
+    def close(self):
+        self._stopped.set()
+        self._sync_requested.set()
+        self.sync_thread.join()
+        with self.lock:
+            self.sync()
+            self.file.close()
+
+    def _truncate_incomplete_records(self):
+        # drop a partially written record (e.g. from a crash) so that new records are not appended behind it
+        if not os.path.isfile(self.path):
+            return 0
+        with open(self.path, 'r+b') as f:
+            _, labels, valid_length = _decode_records(f.read(), self.path)
+            f.truncate(valid_length)
+        return len(labels)
+
+    def _sync_periodically(self):
+        while not self._stopped.is_set():
+            self._sync_requested.wait()
+            # batch all appends within `sync_interval' into a single fsync
+            self._stopped.wait(timeout=self.sync_interval)
+            self._sync_requested.clear()
+            try:
+                self.sync()
+            except Exception as e:
+                self.logger.error('Unable to sync label journal %s: %s', self.path, e)
@@ -0,0 +1,162 @@
+from .pias_logging import logging
+
+import threading
+
+from .agglomeration_model import default_solver
+
+# faster solver to fall back to if solving alone exceeds its share of the latency target
+FALLBACK_SOLVERS = {
+    'kernighan-lin'         : 'nifty-greedy-additive',
+    'nifty-greedy-additive' : None,
+    'greedy-additive'       : None}
+
+# max_depth of random forests, from unlimited (sklearn default) to shallowest
+DEPTHS = (None, 16, 8, 4)
+
+
+class LatencyController(object):
+    '''
+    Adapts the size of the random forest (number of trees and maximum depth), the size of prediction chunks, and the
+    multicut solver such that solution updates take at most `target' seconds. After each computed solution,
+    :meth:`observe` receives the time spent training, predicting, solving, and on everything else (training set,
+    costs, publishing), and adjusts the settings for the next update:
+
+     - solver: fall back to a faster solver (see :data:`FALLBACK_SOLVERS`) if solving takes more than `solve_share' of
+       the budget, try the preferred solver again after `probe_interval' updates (e.g. labels may have split the
+       graph into easier components).
+     - forest: training and prediction time is proportional to the number of trees, which is chosen to fill the budget
+       that is left after solving (changed by at most a factor of two per update). Trees get shallower if even
+       `min_estimators' trees do not fit, and deeper again before more trees are added if the current number of trees
+       fits the budget at the time per tree that was last observed at the deeper depth (deeper depths that were not
+       observed within `probe_interval' updates are tried again).
+     - prediction chunks: features are predicted in chunks that take at most `chunk_share' of the budget each, which
+       bounds memory of local prediction and balances prediction tasks across workers.
+
+    The budget is `headroom' times `target'.
+    '''
+
+    def __init__(
+            self,
+            target,
+            n_estimators=100,
+            max_depth=None,
+            solver=None,
+            min_estimators=4,
+            max_estimators=500,
+            headroom=0.8,
+            solve_share=0.5,
+            chunk_share=0.1,
+            min_chunk_size=1024,
+            probe_interval=20):
+        super(LatencyController, self).__init__()
+        if target <= 0:
+            raise ValueError('Latency target must be positive but got %s' % target)
+        self.logger                = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+        self.target                = target
+        self.min_estimators        = min_estimators
+        self.max_estimators        = max_estimators
+        self.headroom              = headroom
+        self.solve_share           = solve_share
+        self.chunk_share           = chunk_share
+        self.min_chunk_size        = min_chunk_size
+        self.probe_interval        = probe_interval
+        self.n_estimators          = min(max(n_estimators, min_estimators), max_estimators)
+        self.max_depth             = max_depth
+        self.prediction_chunk_size = None
+        # preferred solver first, followed by its fallbacks
+        self.solvers               = [default_solver() if solver is None else solver]
+        while FALLBACK_SOLVERS.get(self.solvers[-1]) is not None:
+            self.solvers.append(FALLBACK_SOLVERS[self.solvers[-1]])
+        self.solver_index          = 0
+        self.fallback_update       = 0
+        # last solve time of each solver
+        self.solve_seconds         = {}
+        # max_depth -> (training and prediction time per tree, update) of last observation at max_depth
+        self.tree_seconds          = {}
+        self.observed              = None
+        self.num_observations      = 0
+        self.lock                  = threading.Lock()
+
+    @property
+    def solver(self):
+        return self.solvers[self.solver_index]
+
+    def settings(self):
+        '''
+        :return: dict of latency target, number of trees, maximum depth, prediction chunk size, solver, number of
+                 observed updates, and the times (seconds) of the last observed update
+        '''
+        with self.lock:
+            return dict(
+                latency_target        = self.target,
+                n_estimators          = self.n_estimators,
+                max_depth             = self.max_depth,
+                prediction_chunk_size = self.prediction_chunk_size,
+                solver                = self.solver,
+                updates               = self.num_observations,
+                observed              = self.observed)
+
+    def random_forest_kwargs(self, random_forest_kwargs=None):
+        '''
+        :return: copy of `random_forest_kwargs' with current number of trees and maximum depth
+        '''
+        with self.lock:
+            return dict(random_forest_kwargs or {}, n_estimators=self.n_estimators, max_depth=self.max_depth)
+
+    def observe(self, fit, predict, solve, total, num_edges):
+        '''
+        Adjust settings for the next update after an update with the current settings.
+
+        :param fit: seconds spent training the random forest
+        :param predict: seconds spent predicting merge probabilities
+        :param solve: seconds spent solving the multicut
+        :param total: seconds of the whole update (at least `fit + predict + solve')
+        :param num_edges: number of predicted edges
+        '''
+        with self.lock:
+            budget                = self.headroom * self.target
+            other                 = max(total - fit - predict - solve, 0.)
+            self.observed         = dict(fit=fit, predict=predict, solve=solve, other=other, total=total)
+            self.num_observations += 1
+            self.solve_seconds[self.solver] = solve
+            self._adapt_solver(solve, budget)
+            self._adapt_forest(fit + predict, budget - self.solve_seconds.get(self.solver, solve) - other)
+            self._adapt_chunks(predict, num_edges, budget)
+            self.logger.debug(
+                'Update took %.3fs, next update with %d trees, max depth %s, prediction chunk size %s, and solver %s',
+                total, self.n_estimators, self.max_depth, self.prediction_chunk_size, self.solver)
+
+    def _adapt_solver(self, solve, budget):
+        if solve > self.solve_share * budget and self.solver_index + 1 < len(self.solvers):
+            self.solver_index   += 1
+            self.fallback_update = self.num_observations
+            self.logger.info('Solving took %.3fs, falling back to solver %s', solve, self.solver)
+        elif self.solver_index > 0 and self.num_observations - self.fallback_update >= self.probe_interval:
+            self.solver_index    = 0
+            self.fallback_update = self.num_observations
+            self.logger.info('Trying solver %s again', self.solver)
+
+    def _adapt_forest(self, forest, remaining):
+        per_tree = forest / self.n_estimators
+        desired  = remaining / per_tree if per_tree > 0 else float(self.max_estimators)
+        depth    = DEPTHS.index(self.max_depth) if self.max_depth in DEPTHS else None
+        self.tree_seconds[self.max_depth] = (per_tree, self.num_observations)
+        if desired < self.min_estimators and self.n_estimators <= self.min_estimators and depth is not None and depth + 1 < len(DEPTHS):
+            self.max_depth = DEPTHS[depth + 1]
+        elif desired >= 2 * self.n_estimators and depth is not None and depth > 0 and self._fits(DEPTHS[depth - 1], remaining):
+            # deeper trees before more trees
+            self.max_depth = DEPTHS[depth - 1]
+        else:
+            desired           = min(max(int(desired), self.n_estimators // 2, 1), 2 * self.n_estimators)
+            self.n_estimators = min(max(desired, self.min_estimators), self.max_estimators)
+
+    def _fits(self, max_depth, remaining):
+        # depths that were not observed recently are tried
+        per_tree, update = self.tree_seconds.get(max_depth, (None, None))
+        return per_tree is None or self.num_observations - update >= self.probe_interval or self.n_estimators * per_tree <= remaining
+
+    def _adapt_chunks(self, predict, num_edges, budget):
+        if predict <= 0 or num_edges <= 0:
+            return
+        chunk_size                 = max(int(num_edges * self.chunk_share * budget / predict), self.min_chunk_size)
+        self.prediction_chunk_size = None if chunk_size >= num_edges else chunk_size
@@ -0,0 +1,92 @@
+from .pias_logging import logging
+
+import threading
+
+
+class LatestWriter(object):
+    '''
+    Write values in the background on a single thread, keeping only the newest pending value: values that are
+    superseded by a later :meth:`submit` before their write starts are dropped. Use for state where only the latest
+    version matters (e.g. checkpoints), so that producers never wait for slow writes and writes never queue up.
+    '''
+
+    def __init__(self, write, name='latest-writer', drop=None):
+        '''
+        :param write: callable that writes a submitted value, exceptions are logged
+        :param name: name of the writer thread
+        :param drop: optional callable that is called with each superseded value, e.g. to cancel futures
+        '''
+        super(LatestWriter, self).__init__()
+        self.logger      = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+        self.write       = write
+        self.drop        = drop
+        self.name        = name
+        self.condition   = threading.Condition()
+        self.pending     = None
+        self.has_pending = False
+        self.writing     = False
+        self.stopped     = False
+        self.num_written = 0
+        self.num_dropped = 0
+        self.thread      = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, value):
+        '''
+        Write `value' after the current write, replacing the pending value if there is one.
+
+        :return: `True' if a pending value was dropped
+        '''
+        with self.condition:
+            if self.stopped:
+                raise RuntimeError('Writer {} is shut down'.format(self.name))
+            dropped          = self.has_pending
+            superseded       = self.pending
+            self.pending     = value
+            self.has_pending = True
+            if dropped:
+                self.num_dropped += 1
+            self.condition.notify_all()
+        if dropped and self.drop is not None:
+            self.drop(superseded)
+        return dropped
+
+    def wait(self, timeout=None):
+        '''
+        Wait until the pending value is written.
+
+        :return: `True' if no write is pending or running
+        '''
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.has_pending and not self.writing, timeout=timeout)
+
+    def shutdown(self, wait=True):
+        '''
+        Stop the writer thread after writing the pending value.
+        '''
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if wait:
+            self.thread.join()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.stopped and not self.has_pending:
+                    self.condition.wait()
+                if not self.has_pending:
+                    return
+                value            = self.pending
+                self.pending     = None
+                self.has_pending = False
+                self.writing     = True
+            try:
+                self.write(value)
+            except Exception as e:
+                self.logger.error('%s: unable to write: %s', self.name, e, exc_info=1)
+            finally:
+                with self.condition:
+                    self.writing      = False
+                    self.num_written += 1
+                    self.condition.notify_all()
@@ -0,0 +1,156 @@
+import bisect
+import contextlib
+import functools
+import json
+import threading
+import time
+
+# Upper bounds of histogram buckets, in seconds for timers: powers of two from ~1us to ~2 minutes. The last bucket
+# holds everything larger than the largest bound.
+DEFAULT_BUCKETS = tuple(2.0 ** e for e in range(-20, 8))
+# Upper bounds of histogram buckets for gauges, e.g. queue depths: powers of two up to 32768.
+COUNT_BUCKETS   = tuple(2.0 ** e for e in range(0, 16))
+
+
+class Histogram(object):
+    '''
+    Histogram with fixed bucket bounds. :meth:`observe` only bisects the bounds and increments a few numbers under a
+    lock, which is cheap enough to call for every request.
+    '''
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__()
+        self.buckets = tuple(buckets)
+        self.counts  = [0] * (len(self.buckets) + 1)
+        self.count   = 0
+        self.sum     = 0.
+        self.min     = None
+        self.max     = None
+        self.lock    = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count         += 1
+            self.sum           += value
+            self.min            = value if self.min is None or value < self.min else self.min
+            self.max            = value if self.max is None or value > self.max else self.max
+
+    def quantile(self, q):
+        '''
+        :return: upper bound of the bucket that holds quantile `q' (`max' for the overflow bucket), `None' if empty
+        '''
+        with self.lock:
+            counts, count, maximum = list(self.counts), self.count, self.max
+        if count == 0:
+            return None
+        threshold  = q * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= threshold:
+                return min(bound, maximum)
+        return maximum
+
+    def snapshot(self):
+        '''
+        :return: dict with count, sum, min, max, mean, approximate quantiles, and non-empty buckets (upper bound and
+                 count, upper bound `None' for overflow bucket)
+        '''
+        with self.lock:
+            counts, count, total, minimum, maximum = list(self.counts), self.count, self.sum, self.min, self.max
+        bounds = self.buckets + (None,)
+        return dict(
+            count   = count,
+            sum     = total,
+            min     = minimum,
+            max     = maximum,
+            mean    = total / count if count > 0 else None,
+            p50     = self.quantile(0.5),
+            p90     = self.quantile(0.9),
+            p99     = self.quantile(0.99),
+            buckets = [[bound, c] for bound, c in zip(bounds, counts) if c > 0])
+
+
+class Gauge(object):
+    '''
+    Current value of a quantity, e.g. a queue depth. Each :meth:`set` is also recorded in a histogram.
+    '''
+
+    def __init__(self, buckets=COUNT_BUCKETS):
+        super(Gauge, self).__init__()
+        self.value     = 0
+        self.histogram = Histogram(buckets=buckets)
+
+    def set(self, value):
+        self.value = value
+        self.histogram.observe(value)
+
+    def snapshot(self):
+        return dict(value=self.value, histogram=self.histogram.snapshot())
+
+
+class Metrics(object):
+    '''
+    Registry of named timers (histograms of durations in seconds) and gauges. Metrics are created on first use.
+    '''
+
+    def __init__(self):
+        super(Metrics, self).__init__()
+        self.timers = {}
+        self.gauges = {}
+        self.lock   = threading.Lock()
+
+    def timer(self, name):
+        '''
+        :return: :class:`Histogram` of durations of `name'
+        '''
+        try:
+            return self.timers[name]
+        except KeyError:
+            with self.lock:
+                return self.timers.setdefault(name, Histogram())
+
+    def gauge(self, name):
+        '''
+        :return: :class:`Gauge` `name'
+        '''
+        try:
+            return self.gauges[name]
+        except KeyError:
+            with self.lock:
+                return self.gauges.setdefault(name, Gauge())
+
+    @contextlib.contextmanager
+    def time(self, name):
+        '''
+        Record duration of the `with' block in timer `name', including blocks that raise.
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timer(name).observe(time.perf_counter() - start)
+
+    def timed(self, name):
+        '''
+        :return: decorator that records the duration of each call in timer `name'
+        '''
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.time(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        with self.lock:
+            timers, gauges = dict(self.timers), dict(self.gauges)
+        return dict(
+            timers = {name: timer.snapshot() for name, timer in sorted(timers.items())},
+            gauges = {name: gauge.snapshot() for name, gauge in sorted(gauges.items())})
+
+    def to_json(self):
+        return json.dumps(self.snapshot())
@@ -0,0 +1,230 @@
+from .pias_logging import logging
+
+import json
+import os
+import threading
+
+import zmq
+
+from .api import API_RESPONSE_OK, API_RESPONSE_ENDPOINT_UNKNOWN, API_RESPONSE_UNKNOWN_ERROR, API_RESPONSE_DATA_STRING
+from .cpu_budget import CpuBudget
+from .scheduler import UpdateScheduler
+from .server import ReplySocket, Server
+from .solver_server import SolverServer
+
+_HELP_STRING_TEMPLATE = '''
+Multi-dataset server at {address_base}. Each dataset is served by a solver server at its own base address
+ipc://{directory}/NAME/server (send /help there for its endpoints).
+
+/help
+/api/datasets
+    Names, base addresses, approximate memory (bytes), and eviction state of all datasets (json string).
+/api/resources
+    Core budget and utilization of the cores shared by the updates of all datasets (json string, see /help of a
+    dataset).
+'''
+
+
+class MultiDatasetServer(object):
+    '''
+    Serve several paintera datasets from one process. Each dataset is served by a :class:`pias.solver_server.SolverServer`
+    in sub-directory `NAME' of `directory', i.e. at base address `ipc://DIRECTORY/NAME/server'. All datasets share the
+    zmq context and a :class:`pias.scheduler.UpdateScheduler` with `num_update_threads' threads for solution updates.
+    Edges and features of each dataset are cached in `.npy' files in its directory. While the approximate memory of all
+    datasets exceeds `memory_budget' (bytes), the least recently used datasets without pending updates are evicted
+    (see :meth:`pias.workflow.Workflow.evict`): edges, features, graphs, and classifiers are released and reloaded from
+    the `.npy' cache on next access. The budget is enforced after each dataset is loaded at start-up.
+    The api endpoint at `ipc://DIRECTORY/server' lists all datasets.
+
+    :param datasets: list of tuples of name, N5 container, and paintera dataset
+    :param memory_budget: maximum approximate memory in bytes, never evict if `None'
+    :param eviction_interval: check memory every this many seconds
+    :param cores: number of cores shared by the updates of all datasets (:class:`pias.cpu_budget.CpuBudget`), all
+                  available cores if `None'
+    :param reserved_cores: cores reserved for serving requests
+    :param server_kwargs: passed to each :class:`pias.solver_server.SolverServer`
+    '''
+
+    def __init__(self, context, directory, datasets, memory_budget=None, num_update_threads=1, eviction_interval=5., cores=None, reserved_cores=1, **server_kwargs):
+        super(MultiDatasetServer, self).__init__()
+        self.logger            = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+        self.context           = context
+        self.directory         = directory
+        self.memory_budget     = memory_budget
+        self.eviction_interval = eviction_interval
+        self.address_base      = 'ipc://' + os.path.join(directory, 'server')
+        self.scheduler         = UpdateScheduler(num_threads=num_update_threads)
+        self.cpu_budget        = CpuBudget(cores=cores, reserved=reserved_cores, concurrency=num_update_threads)
+        self.servers           = {}
+        self.lock              = threading.Lock()
+
+        names = [name for name, _, _ in datasets]
+        if len(set(names)) != len(names):
+            raise ValueError('Dataset names are not unique: {}'.format(names))
+
+        os.makedirs(directory, exist_ok=True)
+        try:
+            for name, container, dataset in datasets:
+                self.logger.info('Starting server for dataset %s: %s/%s', name, container, dataset)
+                self.servers[name] = SolverServer(
+                    context          = context,
+                    directory        = os.path.join(directory, name),
+                    n5_container     = container,
+                    paintera_dataset = dataset,
+                    update_scheduler = self.scheduler,
+                    cpu_budget       = self.cpu_budget,
+                    edge_cache       = True,
+                    **server_kwargs)
+                # enforce the memory budget while datasets load, not only after the first eviction interval
+                self.evict_to_budget()
+        except BaseException:
+            self._shutdown_servers()
+            raise
+
+        self.api_socket = ReplySocket(self.address_base, timeout=10, respond=self._respond)
+        self.server     = Server(self.api_socket)
+        self.server.start(context=context)
+
+        self._stopped         = threading.Event()
+        self.eviction_thread  = threading.Thread(target=self._evict_in_background, name='evict-datasets', daemon=True)
+        self.eviction_thread.start()
+        logging.info('Started multi-dataset server with %d datasets at %s', len(self.servers), self.address_base)
+
+    def get_api_endpoint_address(self):
+        return self.address_base
+
+    def get_server(self, name):
+        return self.servers[name]
+
+    def datasets(self):
+        '''
+        :return: dict of dataset name to base address, approximate memory in bytes, whether edges and features are
+                 evicted, and whether updates are pending
+        '''
+        return {name: dict(
+                    address_base = server.address_base,
+                    memory_bytes = server.workflow.memory_bytes(),
+                    evicted      = server.workflow.edge_feature_cache.evicted,
+                    idle         = server.workflow.is_idle())
+                for name, server in self.servers.items()}
+
+    def evict_to_budget(self):
+        '''
+        Evict idle datasets in order of last access until the approximate memory of all datasets is within the
+        memory budget.
+
+        :return: names of evicted datasets
+        '''
+        if self.memory_budget is None:
+            return []
+        with self.lock:
+            memory = {name: server.workflow.memory_bytes() for name, server in self.servers.items()}
+            total  = sum(memory.values())
+            if total <= self.memory_budget:
+                return []
+            evicted    = []
+            candidates = sorted(
+                (name for name, server in self.servers.items() if server.workflow.is_idle() and not server.workflow.edge_feature_cache.evicted),
+                key=lambda name: self.servers[name].workflow.last_access())
+            for name in candidates:
+                if total <= self.memory_budget:
+                    break
+                workflow = self.servers[name].workflow
+                workflow.evict()
+                released = memory[name] - workflow.memory_bytes()
+                total   -= released
+                evicted.append(name)
+                self.logger.info('Evicted dataset %s (released %.1f MB)', name, released / 2**20)
+            if total > self.memory_budget:
+                self.logger.warning('Memory of %.1f MB exceeds budget of %.1f MB after evicting all idle datasets', total / 2**20, self.memory_budget / 2**20)
+            return evicted
+
+    def shutdown(self):
+        self.logger.debug('Shutting down multi-dataset server at %s', self.address_base)
+        self._stopped.set()
+        self.eviction_thread.join()
+        self.server.stop()
+        self.scheduler.stop()
+        self._shutdown_servers()
+
+    def _shutdown_servers(self):
+        for name, server in self.servers.items():
+            try:
+                server.shutdown()
+            except Exception as e:
+                self.logger.error('Unable to shut down server for dataset %s: %s', name, e)
+
+    def _evict_in_background(self):
+        while not self._stopped.wait(self.eviction_interval):
+            try:
+                self.evict_to_budget()
+            except Exception as e:
+                self.logger.error('Unable to evict datasets: %s', e, exc_info=1)
+
+    def _respond(self, endpoint, socket):
+        try:
+            return_code = API_RESPONSE_OK
+            message     = '/' + endpoint.lstrip('/')
+            if message == '/help':
+                messages = ((API_RESPONSE_DATA_STRING, _HELP_STRING_TEMPLATE.format(address_base=self.address_base, directory=self.directory)),)
+            elif message == '/api/datasets':
+                messages = ((API_RESPONSE_DATA_STRING, json.dumps(self.datasets())),)
+            elif message == '/api/resources':
+                messages = ((API_RESPONSE_DATA_STRING, json.dumps(self.cpu_budget.utilization())),)
+            else:
+                return_code = API_RESPONSE_ENDPOINT_UNKNOWN
+                messages    = ((API_RESPONSE_DATA_STRING, 'Endpoint unknown'), (API_RESPONSE_DATA_STRING, endpoint))
+        except Exception as e:
+            return_code = API_RESPONSE_UNKNOWN_ERROR
+            messages    = tuple((API_RESPONSE_DATA_STRING, m) for m in (str(type(e)), str(e)))
+        SolverServer.api_endpoint_respond(socket, return_code, *messages)
+
+
+def multi_server_main(argv=None):
+    import argparse
+    import signal
+    from . import version
+    from .agglomeration_model import SOLVERS
+    from .pias_logging import levels as log_levels
+    parser = argparse.ArgumentParser(description='Serve several paintera datasets from a single process.')
+    parser.add_argument('--dataset', nargs=3, action='append', required=True, metavar=('NAME', 'CONTAINER', 'PAINTERA_DATASET'), help='Serve PAINTERA_DATASET in N5 CONTAINER at ipc://${DIRECTORY}/NAME/server (repeat for several datasets).')
+    parser.add_argument('--directory', required=False, default='pias', help='Directory for ipc sockets and serialization of server state, one sub-directory per dataset.')
+    parser.add_argument('--num-io-threads', required=False, type=int, default=1, help='Number of zmq I/O threads, also the number of cores reserved for serving requests (see --cores).')
+    parser.add_argument('--cores', type=int, default=None, help='Number of cores shared by all datasets (default: all available). Cores that are not reserved for serving are split between concurrent updates.')
+    parser.add_argument('--num-update-threads', type=int, default=1, help='Number of solution updates that run concurrently across all datasets.')
+    parser.add_argument('--memory-budget-mb', type=float, default=None, help='Evict edges, features, graphs, and classifiers of least recently used idle datasets while their memory exceeds this budget.')
+    parser.add_argument('--eviction-interval', type=float, default=5., help='Check memory budget every this many seconds.')
+    parser.add_argument('--solver', required=False, choices=sorted(SOLVERS), default=None)
+    parser.add_argument('--latency-target', type=float, default=None, help='Adapt random forest, prediction chunks, and solver of each dataset such that solution updates take at most this many seconds.')
+    parser.add_argument('--log-level', required=False, choices=log_levels, default='INFO')
+    parser.add_argument('--version', action='version', version=f'{version}')
+    args = parser.parse_args(args=argv)
+    logging.basicConfig(level=logging.getLevelName(args.log_level))
+    logger = logging.getLogger(__name__)
+
+    context = zmq.Context(args.num_io_threads)
+    try:
+        server = MultiDatasetServer(
+            context            = context,
+            directory          = args.directory,
+            datasets           = [tuple(dataset) for dataset in args.dataset],
+            memory_budget      = None if args.memory_budget_mb is None else int(args.memory_budget_mb * 2**20),
+            num_update_threads = args.num_update_threads,
+            eviction_interval  = args.eviction_interval,
+            solver             = args.solver,
+            latency_target     = args.latency_target,
+            cores              = args.cores,
+            reserved_cores     = args.num_io_threads)
+        server.cpu_budget.limit_native_threads()
+
+        def sigint_handler(signum, frame):
+            logger.info('Shutting down multi-dataset server at %s', server.address_base)
+            server.shutdown()
+            context.destroy()
+
+        signal.signal(signal.SIGINT, handler=sigint_handler)
+
+    except Exception as e:
+        logger.error('Unable to start server: %s', e)
+        logger.debug('Exception info: %s', e, exc_info=True)
+        context.destroy()
@@ -1,5 +1,4 @@
 import logging
-print(logging)
 
 trace = logging.DEBUG- 5
 logging.TRACE = trace
@@ -0,0 +1,129 @@
+from .pias_logging import logging
+
+import collections
+import contextlib
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+TARGETS = ('update', 'endpoints')
+
+_DISABLED = contextlib.nullcontext()
+
+
+class Profiler(object):
+    '''
+    Profile the next `n' runs of a target (:data:`TARGETS`) with `cProfile' and optionally `tracemalloc' on request.
+    Statistics are written into `directory': `pstats' dumps (`.prof', inspect with e.g. `snakeviz' or :mod:`pstats`) and
+    text summaries. Only one run is profiled at a time, concurrent runs are not profiled. If no profile is requested,
+    :meth:`profile` returns a shared no-op context manager after a single dict lookup.
+    '''
+
+    def __init__(self, directory, top=20, max_results=50):
+        '''
+        :param top: number of functions (sorted by cumulative time) and allocation sites in summaries
+        :param max_results: keep this many most recent results
+        '''
+        super(Profiler, self).__init__()
+        self.logger    = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+        self.directory = directory
+        self.top       = top
+        self.remaining = {target: 0 for target in TARGETS}
+        self.memory    = {target: False for target in TARGETS}
+        self.results   = collections.deque(maxlen=max_results)
+        self.lock      = threading.Lock()
+        self.active    = threading.Lock()
+        # distinguishes runs within the same second (the pid distinguishes processes that share `directory')
+        self.sequence  = itertools.count()
+
+    def request(self, target, num_runs, memory=False):
+        '''
+        Profile the next `num_runs' runs of `target', replacing any previous request for `target'.
+
+        :param memory: also trace memory allocations with `tracemalloc' (slows down execution considerably)
+        '''
+        if target not in self.remaining:
+            raise ValueError('Unknown profiling target `{}\', choose from {}'.format(target, TARGETS))
+        with self.lock:
+            self.memory[target]    = memory
+            self.remaining[target] = num_runs
+        self.logger.info('Profiling next %d runs of %s (memory: %s)', num_runs, target, memory)
+
+    def get_results(self):
+        '''
+        :return: list of dicts with target, name, duration (seconds), path of `pstats' dump, summary, and path of
+                 memory summary and memory summary (`None' if memory was not traced), most recent last
+        '''
+        with self.lock:
+            return list(self.results)
+
+    def profile(self, target, name):
+        '''
+        :return: context manager that profiles the enclosed block if a profile of `target' was requested
+        '''
+        if self.remaining[target] <= 0:
+            return _DISABLED
+        return self._profile(target, name)
+
+    @contextlib.contextmanager
+    def _profile(self, target, name):
+        with self.lock:
+            if self.remaining[target] <= 0 or not self.active.acquire(blocking=False):
+                run = False
+            else:
+                self.remaining[target] -= 1
+                memory                  = self.memory[target]
+                run                     = True
+        if not run:
+            yield
+            return
+
+        try:
+            if memory:
+                tracemalloc.start()
+            profile = cProfile.Profile()
+            start   = time.perf_counter()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                duration = time.perf_counter() - start
+                snapshot = tracemalloc.take_snapshot() if memory else None
+                if memory:
+                    tracemalloc.stop()
+                try:
+                    self._save(target, name, duration, profile, snapshot)
+                except Exception as e:
+                    self.logger.error('Unable to save profile of %s %s: %s', target, name, e)
+        finally:
+            self.active.release()
+
+    def _save(self, target, name, duration, profile, snapshot):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp  = '{}-{}-{}'.format(time.strftime('%Y%m%d-%H%M%S'), os.getpid(), next(self.sequence))
+        prefix = os.path.join(self.directory, '{}-{}-{}'.format(target, name, stamp)).replace(' ', '_')
+        path   = prefix + '.prof'
+        profile.dump_stats(path)
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(self.top)
+        summary = stream.getvalue()
+        with open(prefix + '.txt', 'w') as f:
+            f.write(summary)
+
+        memory_path, memory_summary = None, None
+        if snapshot is not None:
+            memory_path    = prefix + '-memory.txt'
+            memory_summary = '\n'.join(str(s) for s in snapshot.statistics('lineno')[:self.top])
+            with open(memory_path, 'w') as f:
+                f.write(memory_summary)
+
+        result = dict(target=target, name=name, duration=duration, path=path, summary=summary, memory_path=memory_path, memory_summary=memory_summary)
+        with self.lock:
+            self.results.append(result)
+        self.logger.info('Profiled %s %s (%.3fs) into %s', target, name, duration, path)
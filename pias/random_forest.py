@@ -1,9 +1,8 @@
+import contextlib
 import threading
 
 import numpy as np
 
-from sklearn.ensemble import RandomForestClassifier
-
 class ModelNotTrained(Exception):
     
     def __init__(self):
@@ -16,6 +15,17 @@ class LabelsInconsistency(Exception):
         self.required_labels = required_labels
         self.actual_labels   = actual_labels
 
+def _threads(n_jobs):
+    '''
+    Limit the threads of scikit-learn models without `n_jobs' (i.e. `n_jobs=None') to `n_jobs' in the calling thread,
+    no limit if `n_jobs' is `None'.
+    '''
+    if n_jobs is None:
+        return contextlib.nullcontext()
+    # joblib is a dependency of scikit-learn, the configuration is local to the calling thread
+    from joblib import parallel_config
+    return parallel_config(n_jobs=n_jobs)
+
 class RandomForestModelCache(object):
 
     def __init__(self, labels=(0,1), random_forest_kwargs=None):
@@ -26,26 +36,44 @@ class RandomForestModelCache(object):
         self.random_forest_kwargs = {} if random_forest_kwargs is None else random_forest_kwargs
 
 
-    def train_model(self, samples, labels):
+    def train_model(self, samples, labels, n_jobs=None):
+        '''
+        :param n_jobs: number of threads for training, overrides `n_jobs' of `random_forest_kwargs' if not `None'. The
+                       trained model keeps `n_jobs' of `random_forest_kwargs' (`None' by default), see :meth:`predict`.
+        '''
 
         if not np.all(np.unique(self.labels) == np.unique(labels)):
             raise LabelsInconsistency(self.labels, np.unique(labels))
 
-        rf = RandomForestClassifier(**self.random_forest_kwargs)
+        # sklearn is expensive to import, defer until first training
+        from sklearn.ensemble import RandomForestClassifier
+        rf = RandomForestClassifier(**(self.random_forest_kwargs if n_jobs is None else dict(self.random_forest_kwargs, n_jobs=n_jobs)))
         rf.fit(samples, labels)
+        # not shared yet: predictions choose their own number of threads
+        rf.set_params(n_jobs=self.random_forest_kwargs.get('n_jobs'))
         with self.lock:
             self.model = rf
 
         return rf
 
-    def predict(self, samples):
+    def predict(self, samples, n_jobs=None):
+        '''
+        :param n_jobs: number of threads for prediction, `n_jobs' of the trained model if `None'. The model is shared
+                       with concurrent predictions and is not modified: models with `n_jobs' (e.g. from
+                       `random_forest_kwargs') always use their own `n_jobs'.
+        '''
         with self.lock:
             rf = self.model
 
         if rf is None:
             raise ModelNotTrained()
 
-        return rf.predict_proba(samples)
+        with _threads(n_jobs):
+            return rf.predict_proba(samples)
+
+    def set_model(self, model):
+        with self.lock:
+            self.model = model
 
     def get_model(self):
         with self.lock:
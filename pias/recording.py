@@ -0,0 +1,161 @@
+from .pias_logging import logging
+
+import collections
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from .edge_labels import check_labels
+
+_logger = logging.getLogger(__name__)
+
+# Log of requests to the solver server, for replay with `pias-replay'. All numbers are big endian.
+#
+#   file header:  magic `PIASREC1' (8 bytes), wall clock time at start of recording (float64, seconds since epoch)
+#   each record:  magic (4 bytes), kind (uint8), 3 bytes padding, time since start of recording (float64, seconds),
+#                 solution id (int64), exit code (int32), payload length (uint64), crc32 of payload (uint32)
+#   payload:
+#     LABELS:         n uv-pairs (2 x uint64), n labels (int8)
+#     UPDATE_REQUEST: empty, solution id is the id returned to the client
+#     FETCH:          empty, solution id of the served solution (-1 if no solution was available)
+#     SOLUTION:       zlib-compressed solution (uint64, one segment id per fragment) if solutions are recorded,
+#                     exit code of the update
+_FILE_MAGIC     = b'PIASREC1'
+_FILE_HEADER    = struct.Struct('>8sd')
+_RECORD_MAGIC   = b'PRQ1'
+_RECORD_HEADER  = struct.Struct('>4sB3xdqiQI')
+_UV_DTYPE       = np.dtype('>u8')
+_LABEL_DTYPE    = np.dtype('i1')
+_SOLUTION_DTYPE = np.dtype('>u8')
+
+LABELS         = 0
+UPDATE_REQUEST = 1
+FETCH          = 2
+SOLUTION       = 3
+
+RecordedRequest = collections.namedtuple('RecordedRequest', ('kind', 'time', 'solution_id', 'exit_code', 'uv_pairs', 'labels', 'solution'))
+
+
+class RequestRecorder(object):
+    '''
+    Append requests to the solver server (labels, update requests, solution fetches) and the resulting solutions with
+    time stamps to a log file. Records are time stamped when they are recorded and written in order by a background
+    thread, which also compresses the solutions: recording never waits for compression or the file (solutions are
+    recorded by solution update listeners that run under the lock of the workflow). Records are written through a
+    buffered file that is flushed on :meth:`close`, i.e. recording does not add a system call per request.
+
+    :param record_solutions: store each solution (compressed) for comparison with replays, otherwise only solution ids
+                             and exit codes are recorded
+    '''
+
+    def __init__(self, path, record_solutions=True):
+        super(RequestRecorder, self).__init__()
+        self.logger           = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+        self.path             = path
+        self.record_solutions = record_solutions
+        self.lock             = threading.Lock()
+        self.closed           = False
+        # records to write, `None' stops the writer thread
+        self.records          = queue.Queue()
+        self.start            = time.perf_counter()
+        self.file             = open(path, 'wb')
+        self.file.write(_FILE_HEADER.pack(_FILE_MAGIC, time.time()))
+        self.thread           = threading.Thread(target=self._run, name='request-recorder', daemon=True)
+        self.thread.start()
+        self.logger.info('Recording requests into %s', path)
+
+    def record_labels(self, uv_pairs, labels):
+        uv_pairs = np.asarray(uv_pairs, dtype=np.uint64).reshape(-1, 2)
+        payload  = uv_pairs.astype(_UV_DTYPE).tobytes() + check_labels(labels).astype(_LABEL_DTYPE).tobytes()
+        self._append(LABELS, payload=payload)
+
+    def record_update_request(self, solution_id):
+        self._append(UPDATE_REQUEST, solution_id=solution_id)
+
+    def record_fetch(self, solution_id):
+        self._append(FETCH, solution_id=solution_id)
+
+    def record_solution(self, solution_id, exit_code, solution):
+        # compressed by the writer thread, solutions are not modified after they are published
+        self._append(SOLUTION, solution_id=solution_id, exit_code=exit_code, solution=solution if self.record_solutions else None)
+
+    def close(self):
+        '''
+        Write all pending records and close the log, later records are dropped.
+        '''
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.records.put(None)
+        self.thread.join()
+        self.file.close()
+
+    def _append(self, kind, solution_id=-1, exit_code=0, payload=b'', solution=None):
+        record = (kind, time.perf_counter() - self.start, solution_id, exit_code, payload, solution)
+        with self.lock:
+            if not self.closed:
+                self.records.put(record)
+
+    def _run(self):
+        while True:
+            record = self.records.get()
+            if record is None:
+                return
+            kind, seconds, solution_id, exit_code, payload, solution = record
+            try:
+                if solution is not None:
+                    payload = zlib.compress(np.asarray(solution, dtype=_SOLUTION_DTYPE).tobytes(), 1)
+                self.file.write(_RECORD_HEADER.pack(_RECORD_MAGIC, kind, seconds, solution_id, exit_code, len(payload), zlib.crc32(payload)))
+                self.file.write(payload)
+            except Exception as e:
+                self.logger.error('Unable to record request into %s: %s', self.path, e, exc_info=1)
+
+
+def read_recording(path):
+    '''
+    Read all complete records of a request log. A truncated or corrupt record ends the log.
+
+    :return: tuple of wall clock start time and list of :class:`RecordedRequest` in order of recording
+    '''
+    with open(path, 'rb') as f:
+        buffer = f.read()
+    magic, start = _FILE_HEADER.unpack_from(buffer, 0)
+    if magic != _FILE_MAGIC:
+        raise Exception('%s is not a request log' % path)
+
+    requests = []
+    offset   = _FILE_HEADER.size
+    while offset + _RECORD_HEADER.size <= len(buffer):
+        magic, kind, t, solution_id, exit_code, length, crc = _RECORD_HEADER.unpack_from(buffer, offset)
+        payload_start = offset + _RECORD_HEADER.size
+        payload       = buffer[payload_start:payload_start + length]
+        if magic != _RECORD_MAGIC or len(payload) != length or zlib.crc32(payload) != crc:
+            break
+        uv_pairs, labels, solution = None, None, None
+        if kind == LABELS:
+            n        = length // (2 * _UV_DTYPE.itemsize + _LABEL_DTYPE.itemsize)
+            uv_pairs = np.frombuffer(payload, dtype=_UV_DTYPE, count=2 * n).astype(np.uint64).reshape(-1, 2)
+            labels   = np.frombuffer(payload, dtype=_LABEL_DTYPE, count=n, offset=2 * n * _UV_DTYPE.itemsize)
+        elif kind == SOLUTION and length > 0:
+            solution = np.frombuffer(zlib.decompress(payload), dtype=_SOLUTION_DTYPE).astype(np.uint64)
+        requests.append(RecordedRequest(kind, t, solution_id, exit_code, uv_pairs, labels, solution))
+        offset = payload_start + length
+    if offset < len(buffer):
+        _logger.warning('Ignoring truncated or corrupt record at byte %d in %s', offset, path)
+    return start, requests
+
+
+def edge_agreement(edges, solution1, solution2):
+    '''
+    :return: fraction of edges that are cut in both or merged in both solutions (`1.0' for identical partitions)
+    '''
+    if edges.shape[0] == 0:
+        return 1.
+    cut1 = solution1[edges[:, 0]] != solution1[edges[:, 1]]
+    cut2 = solution2[edges[:, 0]] != solution2[edges[:, 1]]
+    return float(np.mean(cut1 == cut2))
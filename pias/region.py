@@ -0,0 +1,109 @@
+from .pias_logging import logging
+
+import numpy as np
+
+from .graph import connected_components, merge_parallel_edges
+
+_logger = logging.getLogger(__name__)
+
+# Cost of edges between terminals, i.e. between different segments of the global solution outside of a region.
+# Same magnitude as the costs for known labels in MulticutAgglomeration.
+_TERMINAL_REPULSION = -1e4
+
+
+def solve_region(adjacency, edges, costs, solution, fragments, halo, solve, cost_updates=None):
+    '''
+    Solve the multicut problem for the region of all nodes within `halo' hops of `fragments' with all other nodes
+    fixed to their segment in `solution': each segment adjacent to the region is contracted into a terminal node
+    (summing up the costs of all its boundary edges) and terminals repel each other if they are adjacent to the same
+    connected component of the region (see :func:`_terminal_pairs`).
+
+    :param adjacency: :class:`pias.graph.Adjacency` of `edges'
+    :param edges: uv-pairs of global graph
+    :param costs: costs of global graph, positive costs are attractive
+    :param solution: global solution: segment id for each node
+    :param fragments: fragments of region of interest, fragments that are not in the graph are ignored
+    :param halo: extend region of interest by all nodes within this number of hops
+    :param solve: callable `(number_of_nodes, uv_ids, costs) -> node labels'
+    :param cost_updates: tuple of edge ids and costs that replace `costs' of these edges, e.g. for labels that were
+                         submitted after `costs' were computed
+    :return: tuple of region nodes (sorted) and their segment ids. Nodes that end up in a segment with a terminal get
+             the segment id of that terminal, all other segments get fresh ids larger than any id in `solution'.
+    '''
+    fragments = np.asarray(fragments, dtype=np.uint64).reshape(-1)
+    nodes     = adjacency.expand(fragments[fragments < adjacency.number_of_nodes], halo)
+    edge_ids  = adjacency.incident_edges(nodes)
+    uv        = edges[edge_ids]
+    costs     = costs[edge_ids]
+    if cost_updates is not None:
+        update_ids, update_costs = (np.asarray(a).reshape(-1) for a in cost_updates)
+        positions                = np.minimum(np.searchsorted(edge_ids, update_ids), max(edge_ids.size - 1, 0))
+        in_region                = edge_ids[positions] == update_ids if edge_ids.size > 0 else np.zeros(update_ids.size, dtype=bool)
+        costs[positions[in_region]] = update_costs[in_region]
+    u_in     = np.isin(uv[:, 0], nodes, assume_unique=False)
+    v_in     = np.isin(uv[:, 1], nodes, assume_unique=False)
+    internal = u_in & v_in
+    boundary = u_in ^ v_in
+
+    inside                             = np.where(u_in, uv[:, 0], uv[:, 1])[boundary]
+    outside                            = np.where(u_in, uv[:, 1], uv[:, 0])[boundary]
+    terminal_segments, terminal_index  = np.unique(solution[outside], return_inverse=True)
+    num_terminals                      = terminal_segments.size
+    terminal_index                     = terminal_index.reshape(-1)
+
+    internal_uv    = np.stack((np.searchsorted(nodes, uv[internal, 0]), np.searchsorted(nodes, uv[internal, 1])), axis=1)
+    inside         = np.searchsorted(nodes, inside)
+    components     = connected_components(nodes.size, internal_uv)
+    terminal_pairs = _terminal_pairs(components[inside], terminal_index) + np.uint64(nodes.size)
+    local_uv = np.concatenate((
+        internal_uv.astype(np.uint64),
+        np.stack((inside, terminal_index + nodes.size), axis=1).astype(np.uint64),
+        terminal_pairs))
+    local_costs = np.concatenate((
+        costs[internal],
+        costs[boundary],
+        np.full(terminal_pairs.shape[0], _TERMINAL_REPULSION)))
+    local_uv, local_costs = merge_parallel_edges(local_uv, local_costs)
+    number_of_nodes       = nodes.size + num_terminals
+    _logger.debug('Solving region with %d nodes, %d terminals, and %d edges', nodes.size, num_terminals, local_costs.size)
+
+    if local_costs.size == 0:
+        labels = np.arange(number_of_nodes, dtype=np.uint64)
+    else:
+        labels = np.asarray(solve(number_of_nodes, local_uv, local_costs), dtype=np.uint64)
+
+    # relabel: components with a terminal take the segment id of that terminal (first terminal if more than one)
+    unique_labels, inverse = np.unique(labels, return_inverse=True)
+    inverse                = inverse.reshape(-1)
+    segment_ids            = np.zeros(unique_labels.size, dtype=np.uint64)
+    has_terminal           = np.zeros(unique_labels.size, dtype=bool)
+    terminal_components    = inverse[nodes.size:][::-1]
+    segment_ids[terminal_components]  = terminal_segments[::-1]
+    has_terminal[terminal_components] = True
+    num_fresh                         = np.count_nonzero(~has_terminal)
+    segment_ids[~has_terminal]        = np.uint64(solution.max()) + np.arange(1, num_fresh + 1, dtype=np.uint64)
+
+    return nodes, segment_ids[inverse[:nodes.size]]
+
+
+def _terminal_pairs(components, terminals):
+    '''
+    Pairs of terminals that are adjacent to the same connected component of the region. Two terminals can only end up
+    in the same segment if they are joined by a path through the region, and each such path passes through a sequence
+    of terminals in which consecutive terminals share a region component: repelling these pairs suffices to keep
+    all terminals apart, without the dense clique of all pairs of terminals.
+
+    :param components: region component of the inside node of each boundary edge
+    :param terminals: terminal of each boundary edge
+    :return: unique pairs of terminal indices (`uint64', shape `(n, 2)', smaller index first)
+    '''
+    incidences       = np.unique(np.stack((components, terminals), axis=1).reshape(-1, 2), axis=0)
+    component_starts = np.flatnonzero(np.diff(incidences[:, 0], prepend=-1))
+    component_counts = np.diff(np.append(component_starts, incidences.shape[0]))
+    pairs            = [np.empty((0, 2), dtype=np.uint64)]
+    for start, count in zip(component_starts[component_counts > 1], component_counts[component_counts > 1]):
+        # terminals of each component are sorted, upper triangle is smaller index first
+        component_terminals = incidences[start:start + count, 1]
+        first, second       = np.triu_indices(count, k=1)
+        pairs.append(np.stack((component_terminals[first], component_terminals[second]), axis=1).astype(np.uint64))
+    return np.unique(np.concatenate(pairs), axis=0)
@@ -0,0 +1,176 @@
+from .pias_logging import logging
+
+import threading
+import time
+
+import numpy as np
+import zmq
+
+from .recording import LABELS, UPDATE_REQUEST, FETCH, SOLUTION, edge_agreement, read_recording
+from .zmq_util import recv_ints_multipart, send_int
+
+_logger = logging.getLogger(__name__)
+
+_LABEL_ENTRY_DTYPE = np.dtype([('u', '>u8'), ('v', '>u8'), ('label', '>i4')])
+
+
+def _distribution(values):
+    '''
+    :return: dict with count, mean, median, 90th and 99th percentile, and maximum of `values' (`None' if empty)
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return dict(count=0, mean=None, p50=None, p90=None, p99=None, max=None)
+    p50, p90, p99 = np.percentile(values, (50, 90, 99))
+    return dict(count=int(values.size), mean=float(values.mean()), p50=float(p50), p90=float(p90), p99=float(p99), max=float(values.max()))
+
+
+def _labels_as_bytes(uv_pairs, labels):
+    entries          = np.empty(labels.size, dtype=_LABEL_ENTRY_DTYPE)
+    entries['u']     = uv_pairs[:, 0]
+    entries['v']     = uv_pairs[:, 1]
+    entries['label'] = labels
+    return entries.tobytes()
+
+
+def replay(requests, server, speed=1., timeout=600.):
+    '''
+    Re-run recorded requests (see :func:`pias.recording.read_recording`) against a fresh `server' through its sockets.
+
+    :param server: :class:`pias.solver_server.SolverServer` without any labels, running in this process
+    :param speed: replay `speed' times faster than recorded, as fast as possible if `0'
+    :param timeout: wait at most this many seconds for the solutions of all update requests after the last request
+    :return: dict with latency distributions (seconds) of labels, solution fetches, and updates (time from update
+             request to new solution) of replay and recording, and agreement of replayed and recorded solutions
+             (fraction of edges with same cut/merge decision, see :func:`pias.recording.edge_agreement`)
+    '''
+    # deferred: solver_server imports the full server stack
+    from .solver_server import _SET_EDGE_REQ_EDGE_LIST
+    completed = {}
+    condition = threading.Condition()
+
+    def on_solution(solution_id, exit_code, state):
+        with condition:
+            completed[solution_id] = (time.perf_counter(), exit_code, state.solution)
+            condition.notify_all()
+
+    server.workflow.add_solution_update_listener(on_solution)
+
+    addresses = dict(
+        labels = server.get_edge_labels_address(),
+        update = server.get_solution_update_request_address(),
+        fetch  = server.get_current_solution_address())
+    sockets   = {name: _connect(server.context, address) for name, address in addresses.items()}
+
+    label_latencies = []
+    fetch_latencies = []
+    # tuples of recorded solution id, replayed solution id, and time of replayed update request
+    updates         = []
+    start           = time.perf_counter()
+    try:
+        for request in requests:
+            if request.kind == SOLUTION:
+                continue
+            if speed > 0:
+                delay = start + request.time / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sent = time.perf_counter()
+            if request.kind == LABELS:
+                send_int(sockets['labels'], _SET_EDGE_REQ_EDGE_LIST, flags=zmq.SNDMORE)
+                sockets['labels'].send(_labels_as_bytes(request.uv_pairs, request.labels))
+                sockets['labels'].recv_multipart()
+                label_latencies.append(time.perf_counter() - sent)
+            elif request.kind == UPDATE_REQUEST:
+                sockets['update'].send_string('')
+                _, solution_id = recv_ints_multipart(sockets['update'])
+                updates.append((request.solution_id, solution_id, sent))
+            elif request.kind == FETCH:
+                sockets['fetch'].send_string('')
+                sockets['fetch'].recv_multipart()
+                fetch_latencies.append(time.perf_counter() - sent)
+
+        deadline = time.perf_counter() + timeout
+        with condition:
+            while not all(solution_id in completed for _, solution_id, _ in updates):
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    _logger.warning('Timed out waiting for %d solutions', sum(solution_id not in completed for _, solution_id, _ in updates))
+                    break
+                condition.wait(remaining)
+    finally:
+        for socket in sockets.values():
+            socket.close(linger=0)
+
+    recorded_requests  = {r.solution_id: r.time for r in requests if r.kind == UPDATE_REQUEST}
+    recorded_solutions = {r.solution_id: r for r in requests if r.kind == SOLUTION}
+    edges              = server.workflow.edge_feature_cache.get_edges_and_features()[0].astype(np.int64)
+    replayed_latencies = []
+    recorded_latencies = []
+    agreements         = []
+    for recorded_id, replayed_id, sent in updates:
+        if replayed_id in completed:
+            replayed_latencies.append(completed[replayed_id][0] - sent)
+        recorded = recorded_solutions.get(recorded_id)
+        if recorded is None:
+            continue
+        recorded_latencies.append(recorded.time - recorded_requests[recorded_id])
+        replayed_solution = completed[replayed_id][2] if replayed_id in completed else None
+        if recorded.solution is not None and replayed_solution is not None and recorded.solution.shape == replayed_solution.shape:
+            agreements.append(edge_agreement(edges, recorded.solution, replayed_solution))
+
+    return dict(
+        num_requests      = sum(r.kind != SOLUTION for r in requests),
+        num_updates       = len(updates),
+        num_completed     = sum(solution_id in completed for _, solution_id, _ in updates),
+        replay_seconds    = time.perf_counter() - start,
+        speed             = speed,
+        labels            = _distribution(label_latencies),
+        fetch             = _distribution(fetch_latencies),
+        update            = _distribution(replayed_latencies),
+        recorded_update   = _distribution(recorded_latencies),
+        agreement         = _distribution(agreements),
+        num_identical     = sum(a == 1. for a in agreements))
+
+
+def _connect(context, address):
+    socket = context.socket(zmq.REQ)
+    socket.connect(address)
+    return socket
+
+
+def replay_main(argv=None):
+    import argparse
+    import json
+    import shutil
+    import tempfile
+    from . import version
+    from .agglomeration_model import SOLVERS
+    from .solver_server import SolverServer
+    parser = argparse.ArgumentParser(description='Replay a request log (recorded with pias --record-requests) against a fresh server and report latency distributions and agreement of solutions with the recorded run as json.')
+    parser.add_argument('log', help='Request log, `requests-*.log\' in the directory of the recorded server.')
+    parser.add_argument('--container', required=True, help='N5 container of the recorded run')
+    parser.add_argument('--paintera-dataset', required=True, help='Paintera dataset of the recorded run')
+    parser.add_argument('--directory', required=False, default=None, help='Empty directory for the fresh server (temporary directory that is removed afterwards if not specified).')
+    parser.add_argument('--speed', type=float, default=1., help='Replay this many times faster than recorded, as fast as possible if 0.')
+    parser.add_argument('--timeout', type=float, default=600., help='Wait at most this many seconds for outstanding solutions after the last request.')
+    parser.add_argument('--solver', required=False, choices=sorted(SOLVERS), default=None)
+    parser.add_argument('--log-level', required=False, choices=('DEBUG', 'INFO', 'WARN', 'ERROR'), default='WARN')
+    parser.add_argument('--version', action='version', version=f'{version}')
+    args = parser.parse_args(args=argv)
+    logging.basicConfig(level=logging.getLevelName(args.log_level))
+
+    _, requests = read_recording(args.log)
+    directory   = tempfile.mkdtemp(prefix='pias-replay-') if args.directory is None else args.directory
+    context     = zmq.Context(1)
+    server      = None
+    try:
+        server  = SolverServer(context=context, directory=directory, n5_container=args.container, paintera_dataset=args.paintera_dataset, solver=args.solver)
+        summary = replay(requests, server, speed=args.speed, timeout=args.timeout)
+        print(json.dumps(summary, indent=2))
+    finally:
+        if server is not None:
+            server.shutdown()
+        context.destroy()
+        if args.directory is None:
+            shutil.rmtree(directory, ignore_errors=True)
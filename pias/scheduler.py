@@ -0,0 +1,85 @@
+from .pias_logging import logging
+
+import collections
+import threading
+
+
+class UpdateScheduler(object):
+    '''
+    Shared pool of threads for the solution updates of several :class:`pias.workflow.Workflow` instances, e.g. one per
+    dataset of a :class:`pias.multi_server.MultiDatasetServer`, that bounds the number of concurrent updates across
+    all workflows. Updates of the same workflow run one at a time in order of submission, workflows with pending
+    updates are served round robin.
+    '''
+
+    def __init__(self, num_threads=1):
+        super(UpdateScheduler, self).__init__()
+        self.logger    = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+        self.condition = threading.Condition()
+        # owner -> deque of pending tasks
+        self.pending   = {}
+        # owners with pending tasks that are not running a task, in order of service
+        self.ready     = collections.deque()
+        self.running   = set()
+        self.stopped   = False
+        self.threads   = [threading.Thread(target=self._run, name='update-scheduler-%d' % i, daemon=True) for i in range(num_threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, owner, task):
+        '''
+        Run `task' (callable without arguments) after all previously submitted tasks of `owner'.
+        '''
+        with self.condition:
+            tasks = self.pending.setdefault(owner, collections.deque())
+            tasks.append(task)
+            if len(tasks) == 1 and owner not in self.running:
+                self.ready.append(owner)
+                self.condition.notify()
+
+    def num_pending(self, owner):
+        '''
+        :return: number of queued and running tasks of `owner'
+        '''
+        with self.condition:
+            return len(self.pending.get(owner, ())) + (1 if owner in self.running else 0)
+
+    def num_queued(self, owner):
+        '''
+        :return: number of queued tasks of `owner' that have not started
+        '''
+        with self.condition:
+            return len(self.pending.get(owner, ()))
+
+    def stop(self):
+        '''
+        Stop all threads after their current task, pending tasks are dropped.
+        '''
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.stopped and len(self.ready) == 0:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                owner = self.ready.popleft()
+                task  = self.pending[owner].popleft()
+                self.running.add(owner)
+            try:
+                task()
+            except Exception as e:
+                self.logger.error('Update of %s failed: %s', owner, e, exc_info=1)
+            finally:
+                with self.condition:
+                    self.running.discard(owner)
+                    if len(self.pending[owner]) > 0:
+                        self.ready.append(owner)
+                        self.condition.notify()
+                    else:
+                        del self.pending[owner]
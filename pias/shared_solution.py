@@ -0,0 +1,140 @@
+from .pias_logging import logging
+
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+import numpy as np
+
+_logger = logging.getLogger(__name__)
+
+# Memory-mapped, double-buffered solution file for clients on the same host. All numbers are big endian.
+#
+#   file header (64 bytes at offset 0):
+#     magic `PIASSOL1' (8 bytes), active slot (uint32), reserved (uint32), slot capacity in bytes (uint64)
+#   slot headers (64 bytes each at offset 64 + 64 * slot):
+#     generation (uint64), solution id (int64), numpy dtype string (16 bytes, ascii, zero-padded), length (uint64)
+#   slot data (at offset 4096 + slot * slot capacity)
+#
+# A new solution is always written into the inactive slot before the active slot is flipped. A view of the active
+# slot therefore stays valid until the next-but-one solution is written. The generation of a slot increases with each
+# write into that slot and can be used to detect if a view was overwritten. If a solution does not fit into the
+# slots, a larger file is created and moved into place: existing mappings of the previous file remain valid.
+_MAGIC            = b'PIASSOL1'
+_FILE_HEADER      = struct.Struct('>8sIIQ')
+_FILE_HEADER_SIZE = 64
+_SLOT_HEADER      = struct.Struct('>Qq16sQ')
+_SLOT_HEADER_SIZE = 64
+_DATA_OFFSET      = 4096
+_NUM_SLOTS        = 2
+
+
+def _slot_header_offset(slot):
+    return _FILE_HEADER_SIZE + slot * _SLOT_HEADER_SIZE
+
+
+def _slot_data_offset(slot, capacity):
+    return _DATA_OFFSET + slot * capacity
+
+
+class SharedSolutionFile(object):
+    '''
+    Writer side of the shared solution file. Solutions are stored big endian, consistent with the socket protocol.
+    '''
+
+    def __init__(self, path):
+        super(SharedSolutionFile, self).__init__()
+        self.logger   = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+        self.path     = path
+        self.lock     = threading.RLock()
+        self.mmap     = None
+        self.capacity = 0
+        self.active   = _NUM_SLOTS - 1
+
+    def write(self, solution_id, solution):
+        solution = np.asarray(solution)
+        data     = solution.astype(solution.dtype.newbyteorder('>'), copy=False).reshape(-1)
+        with self.lock:
+            if self.mmap is None or data.nbytes > self.capacity:
+                self._allocate(data.nbytes)
+            slot = (self.active + 1) % _NUM_SLOTS
+            offset = _slot_data_offset(slot, self.capacity)
+            np.frombuffer(self.mmap, dtype=data.dtype, count=data.size, offset=offset)[...] = data
+            generation = _SLOT_HEADER.unpack_from(self.mmap, _slot_header_offset(slot))[0] + 1
+            _SLOT_HEADER.pack_into(self.mmap, _slot_header_offset(slot), generation, solution_id, data.dtype.str.encode('ascii'), data.size)
+            # the mapping is shared: no need to flush to disk for readers on the same host to see the update
+            _FILE_HEADER.pack_into(self.mmap, 0, _MAGIC, slot, 0, self.capacity)
+            self.active = slot
+            self.logger.debug('Wrote solution %d with %d entries into slot %d of %s', solution_id, data.size, slot, self.path)
+
+    def close(self):
+        with self.lock:
+            if self.mmap is not None:
+                self.mmap.close()
+            self.mmap = None
+
+    def _allocate(self, capacity):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.solution-', suffix='.bin', dir=directory)
+        try:
+            os.ftruncate(fd, _slot_data_offset(_NUM_SLOTS, capacity))
+            new_mmap = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+        _FILE_HEADER.pack_into(new_mmap, 0, _MAGIC, _NUM_SLOTS - 1, 0, capacity)
+        os.replace(tmp_path, self.path)
+        if self.mmap is not None:
+            self.mmap.close()
+        self.mmap     = new_mmap
+        self.capacity = capacity
+        self.active   = _NUM_SLOTS - 1
+        self.logger.debug('Allocated shared solution file %s with slot capacity %d', self.path, capacity)
+
+
+class SharedSolutionReader(object):
+    '''
+    Reader side of the shared solution file. Solutions are returned as read-only views of the mapped file, i.e. they are
+    not copied. A view is valid until the next-but-one solution is written; compare :meth:`generation` of its slot
+    before and after using the view or copy it if it needs to persist.
+    '''
+
+    def __init__(self, path):
+        super(SharedSolutionReader, self).__init__()
+        self.path  = path
+        self.inode = None
+        self.mmap  = None
+
+    def current(self):
+        '''
+        :return: tuple of solution id, slot, and solution (read-only view) or `None' if no solution was written yet
+        '''
+        self._remap_if_replaced()
+        magic, slot, _, capacity = _FILE_HEADER.unpack_from(self.mmap, 0)
+        if magic != _MAGIC:
+            raise Exception('%s is not a shared solution file' % self.path)
+        generation, solution_id, dtype, length = _SLOT_HEADER.unpack_from(self.mmap, _slot_header_offset(slot))
+        if generation == 0:
+            return None
+        dtype = np.dtype(dtype.rstrip(b'\0').decode('ascii'))
+        return solution_id, slot, np.frombuffer(self.mmap, dtype=dtype, count=length, offset=_slot_data_offset(slot, capacity))
+
+    def generation(self, slot):
+        return _SLOT_HEADER.unpack_from(self.mmap, _slot_header_offset(slot))[0]
+
+    def close(self):
+        if self.mmap is not None:
+            self.mmap.close()
+        self.mmap  = None
+        self.inode = None
+
+    def _remap_if_replaced(self):
+        inode = os.stat(self.path).st_ino
+        if inode == self.inode and self.mmap is not None:
+            return
+        with open(self.path, 'rb') as f:
+            new_mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # do not close previous mapping: views handed out earlier might still be in use
+        self.mmap  = new_mmap
+        self.inode = inode
@@ -0,0 +1,239 @@
+from .pias_logging import logging
+
+import collections
+import glob
+import hashlib
+import os
+import queue
+import threading
+
+import numpy as np
+
+from .checkpoint import load_state_checkpoint, save_checkpoint
+
+
+def label_fingerprint(indices, labels, num_edges, random_forest_kwargs=None, solver=None):
+    '''
+    :param indices: edge indices of labeled edges
+    :param labels: labels of `indices' (same order)
+    :param num_edges: number of edges
+    :param random_forest_kwargs: classifier configuration
+    :param solver: multicut solver
+    :return: hex digest that identifies the set of labeled edges and the classifier configuration, independent of the
+             order of `indices'
+    '''
+    indices = np.asarray(indices, dtype=np.uint64).reshape(-1)
+    labels  = np.asarray(labels, dtype=np.uint64).reshape(-1)
+    order   = np.argsort(indices, kind='stable')
+    digest  = hashlib.sha1()
+    digest.update(repr((num_edges, sorted((random_forest_kwargs or {}).items()), solver)).encode('utf-8'))
+    digest.update(indices[order].astype('<u8').tobytes())
+    digest.update(labels[order].astype('<u8').tobytes())
+    return digest.hexdigest()
+
+
+# arrays of the trees of sklearn forests, see :func:`checkpoint_bytes`
+_TREE_ARRAYS = ('children_left', 'children_right', 'feature', 'threshold', 'impurity', 'n_node_samples', 'weighted_n_node_samples', 'value')
+
+
+def _arrays(checkpoint):
+    return (checkpoint.merge_probabilities, checkpoint.solution, checkpoint.indices, checkpoint.labels, checkpoint.uv_pairs)
+
+
+def checkpoint_bytes(checkpoint):
+    '''
+    :param checkpoint: :class:`pias.checkpoint.StateCheckpoint`
+    :return: approximate memory held by the arrays and the model of `checkpoint' (trees of sklearn forests, other
+             models are not counted)
+    '''
+    trees = [getattr(estimator, 'tree_', None) for estimator in getattr(checkpoint.model, 'estimators_', ())]
+    model = sum(getattr(tree, name).nbytes for tree in trees if tree is not None for name in _TREE_ARRAYS)
+    return model + sum(np.asarray(a).nbytes for a in _arrays(checkpoint) if a is not None)
+
+
+class SolutionCache(object):
+    '''
+    Bounded LRU cache of trained classifiers, merge probabilities, and solutions
+    (:class:`pias.checkpoint.StateCheckpoint`) keyed by :func:`label_fingerprint`, so that a label set that was solved
+    before (e.g. after undo and redo of a label) is served without training and solving again. Entries of at most
+    `max_bytes' (see :func:`checkpoint_bytes`) are held in memory, least recently used entries are spilled into
+    `directory' in the checkpoint format (at most `disk_capacity' files) or dropped if `directory' is `None'. Spilled
+    entries of previous runs are removed, edges and features may have changed since.
+
+    Spilled entries are written on a background thread so that :meth:`put` never waits for the disk, and are served
+    from memory until they are written. Entries are dropped instead of spilled if more than `max_bytes' would wait to
+    be written.
+    '''
+
+    def __init__(self, max_bytes=256 * 2**20, directory=None, disk_capacity=64):
+        super(SolutionCache, self).__init__()
+        self.logger         = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+        self.max_bytes      = max_bytes
+        self.directory      = directory
+        self.disk_capacity  = disk_capacity if directory is not None else 0
+        # fingerprint -> (StateCheckpoint, bytes) / path, least recently used first
+        self.memory         = collections.OrderedDict()
+        self.disk           = collections.OrderedDict()
+        self.memory_bytes   = 0
+        # fingerprint -> (StateCheckpoint, bytes) of entries that wait to be written by the spill thread
+        self.spilling       = {}
+        self.spilling_bytes = 0
+        self.spill_queue    = queue.Queue()
+        self.spill_thread   = None
+        self.hits           = 0
+        self.misses         = 0
+        self.lock           = threading.RLock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._remove_files(glob.glob(os.path.join(directory, '*.npz')))
+
+    def get(self, fingerprint):
+        '''
+        :return: :class:`pias.checkpoint.StateCheckpoint` for `fingerprint' or `None'
+        '''
+        with self.lock:
+            checkpoint = None
+            if fingerprint in self.memory:
+                checkpoint = self.memory[fingerprint][0]
+                self.memory.move_to_end(fingerprint)
+            elif fingerprint in self.spilling:
+                # not written yet, the spill thread skips entries that are not spilling anymore
+                checkpoint, nbytes   = self.spilling.pop(fingerprint)
+                self.spilling_bytes -= nbytes
+                self._put(fingerprint, checkpoint)
+            elif fingerprint in self.disk:
+                path = self.disk.pop(fingerprint)
+                try:
+                    checkpoint = load_state_checkpoint(path)
+                except Exception as e:
+                    self.logger.warning('Ignoring unreadable cached solution %s: %s', path, e)
+                self._remove_files((path,))
+                if checkpoint is not None:
+                    self._put(fingerprint, checkpoint)
+            if checkpoint is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return checkpoint
+
+    def put(self, fingerprint, checkpoint):
+        '''
+        Add :class:`pias.checkpoint.StateCheckpoint` for `fingerprint', spill or drop least recently used entries
+        beyond `max_bytes'.
+        '''
+        with self.lock:
+            self._put(fingerprint, checkpoint)
+
+    def spill(self):
+        '''
+        Spill all entries held in memory into the cache directory (drop them if there is none), e.g. when the dataset
+        is evicted. Use :meth:`wait` to wait until they are written.
+        '''
+        with self.lock:
+            while len(self.memory) > 0:
+                self._spill_oldest()
+
+    def wait(self):
+        '''
+        Wait until all spilled entries are written.
+        '''
+        self.spill_queue.join()
+
+    def clear(self):
+        '''
+        Remove all entries, e.g. when edges or features change.
+        '''
+        with self.lock:
+            self.memory.clear()
+            self.memory_bytes = 0
+            self.spilling.clear()
+            self.spilling_bytes = 0
+            self._remove_files(self.disk.values())
+            self.disk.clear()
+
+    def arrays(self):
+        '''
+        :return: list of arrays held in memory, including entries that wait to be written
+        '''
+        with self.lock:
+            return [a for c, _ in list(self.memory.values()) + list(self.spilling.values()) for a in _arrays(c)]
+
+    def stats(self):
+        '''
+        :return: dict of hits, misses, number of entries in memory and on disk, and bytes in memory
+        '''
+        with self.lock:
+            return dict(hits=self.hits, misses=self.misses, memory=len(self.memory), disk=len(self.disk), memory_bytes=self.memory_bytes)
+
+    def _put(self, fingerprint, checkpoint):
+        if fingerprint in self.disk:
+            self._remove_files((self.disk.pop(fingerprint),))
+        if fingerprint in self.spilling:
+            self.spilling_bytes -= self.spilling.pop(fingerprint)[1]
+        if fingerprint in self.memory:
+            self.memory_bytes -= self.memory.pop(fingerprint)[1]
+        nbytes                   = checkpoint_bytes(checkpoint)
+        self.memory[fingerprint] = (checkpoint, nbytes)
+        self.memory_bytes       += nbytes
+        # the newest entry is kept even if it exceeds max_bytes on its own
+        while self.memory_bytes > self.max_bytes and len(self.memory) > 1:
+            self._spill_oldest()
+
+    def _spill_oldest(self):
+        fingerprint, (checkpoint, nbytes) = self.memory.popitem(last=False)
+        self.memory_bytes -= nbytes
+        if self.disk_capacity <= 0:
+            return
+        if len(self.spilling) > 0 and self.spilling_bytes + nbytes > self.max_bytes:
+            self.logger.warning('Dropping cached solution %d: %d bytes wait to be spilled', checkpoint.solution_id, self.spilling_bytes)
+            return
+        self.spilling[fingerprint] = (checkpoint, nbytes)
+        self.spilling_bytes       += nbytes
+        if self.spill_thread is None:
+            self.spill_thread = threading.Thread(target=self._run, name='solution-cache-spill', daemon=True)
+            self.spill_thread.start()
+        self.spill_queue.put(fingerprint)
+
+    def _run(self):
+        while True:
+            fingerprint = self.spill_queue.get()
+            try:
+                self._write(fingerprint)
+            except Exception as e:
+                self.logger.error('Unable to spill cached solution: %s', e, exc_info=1)
+            finally:
+                self.spill_queue.task_done()
+
+    def _write(self, fingerprint):
+        with self.lock:
+            checkpoint, _ = self.spilling.get(fingerprint, (None, None))
+        # moved back into memory or cleared
+        if checkpoint is None:
+            return
+        path = os.path.join(self.directory, fingerprint + '.npz')
+        try:
+            save_checkpoint(path, checkpoint)
+        except Exception as e:
+            self.logger.warning('Unable to spill cached solution %d to %s: %s', checkpoint.solution_id, path, e)
+            written = False
+        else:
+            written = True
+        with self.lock:
+            if self.spilling.get(fingerprint, (None, None))[0] is not checkpoint:
+                # moved back into memory or cleared while writing
+                if written:
+                    self._remove_files((path,))
+                return
+            self.spilling_bytes -= self.spilling.pop(fingerprint)[1]
+            if not written:
+                return
+            self.disk[fingerprint] = path
+            while len(self.disk) > self.disk_capacity:
+                self._remove_files((self.disk.popitem(last=False)[1],))
+
+    def _remove_files(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError as e:
+                self.logger.debug('Unable to remove cached solution %s: %s', path, e)
@@ -0,0 +1,48 @@
+import numpy as np
+
+# Returned as segment id for fragment ids that are not part of the solution.
+INVALID_ID = np.iinfo(np.uint64).max
+
+
+class SolutionIndex(object):
+    '''
+    Inverted index of a solution (`solution[fragment] = segment') in compressed sparse row layout: the fragments of
+    `segments[i]' are `fragments[offsets[i]:offsets[i+1]]'. Look-ups in both directions are vectorized.
+    '''
+
+    def __init__(self, solution):
+        super(SolutionIndex, self).__init__()
+        self.solution             = np.asarray(solution, dtype=np.uint64)
+        order                     = np.argsort(self.solution, kind='stable')
+        self.fragments            = order.astype(np.uint64)
+        self.segments, counts     = np.unique(self.solution[order], return_counts=True)
+        self.offsets              = np.zeros(self.segments.size + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+
+    def segments_of(self, fragments):
+        '''
+        :param fragments: fragment ids
+        :return: segment id for each fragment, :data:`INVALID_ID` for fragments that are not in the solution
+        '''
+        fragments = np.asarray(fragments, dtype=np.uint64)
+        if self.solution.size == 0:
+            return np.full(fragments.shape, INVALID_ID, dtype=np.uint64)
+        valid     = fragments < self.solution.size
+        return np.where(valid, self.solution[np.where(valid, fragments, 0)], INVALID_ID)
+
+    def fragments_of(self, segments):
+        '''
+        :param segments: segment ids
+        :return: tuple of number of fragments per segment (`0' for unknown segments) and fragments of all segments (concatenated, in order of `segments')
+        '''
+        segments  = np.asarray(segments, dtype=np.uint64)
+        if self.segments.size == 0:
+            return np.zeros(segments.shape, dtype=np.uint64), np.empty((0,), dtype=np.uint64)
+        positions = np.minimum(np.searchsorted(self.segments, segments), self.segments.size - 1)
+        found     = self.segments[positions] == segments
+        starts    = np.where(found, self.offsets[positions], 0)
+        counts    = np.where(found, self.offsets[positions + 1] - self.offsets[positions], 0)
+        # gather all ranges [start, start + count) without a Python loop
+        range_offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        indices       = np.arange(range_offsets.size, dtype=np.int64) + range_offsets
+        return counts.astype(np.uint64), self.fragments[indices]
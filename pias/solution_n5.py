@@ -0,0 +1,173 @@
+from .pias_logging import logging
+
+import concurrent.futures
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from .ext import z5py
+from .latest_writer import LatestWriter
+
+_SOLUTION_ID_KEY = 'solutionId'
+_CURRENT_KEY     = 'current'
+
+
+def changed_blocks(previous, current, block_size):
+    '''
+    :param previous: previous solution or `None'
+    :param current: current solution
+    :param block_size: number of entries per block
+    :return: indices of all blocks of `current' that differ from `previous' (all blocks if shapes differ)
+    '''
+    num_blocks = (current.size + block_size - 1) // block_size
+    if previous is None or previous.shape != current.shape:
+        return np.arange(num_blocks)
+    num_full_blocks = current.size // block_size
+    full            = num_full_blocks * block_size
+    changed         = np.any(previous[:full].reshape(num_full_blocks, block_size) != current[:full].reshape(num_full_blocks, block_size), axis=1)
+    blocks          = np.flatnonzero(changed)
+    if full < current.size and np.any(previous[full:] != current[full:]):
+        blocks = np.append(blocks, num_full_blocks)
+    return blocks
+
+
+def read_solution(container, dataset='fragment-segment-lookup'):
+    '''
+    Read the latest fully written solution of a :class:`SolutionN5Writer`.
+
+    :return: tuple of solution id and solution, or `None' if no solution was written yet
+    '''
+    f = z5py.File(container, use_zarr_format=False)
+    if dataset not in f:
+        return None
+    attrs = f[dataset].attrs
+    if _CURRENT_KEY not in attrs:
+        return None
+    # the pointer attributes are replaced atomically, solution id and version are consistent
+    solution_id, version = attrs[_SOLUTION_ID_KEY], attrs[_CURRENT_KEY]
+    return solution_id, f[dataset][version][...]
+
+
+def _write_attributes(path, **attributes):
+    # replace attributes.json atomically so that readers see either the old or the new attributes
+    attributes_path = os.path.join(path, 'attributes.json')
+    try:
+        with open(attributes_path, 'r') as f:
+            current = json.load(f)
+    except (IOError, ValueError):
+        current = {}
+    current.update(attributes)
+    tmp = attributes_path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(current, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, attributes_path)
+
+
+def _link_or_copy(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+class SolutionN5Writer(object):
+    '''
+    Write solutions into versions of a chunked, one-dimensional fragment-segment lookup dataset: `group/VERSION[fragment]
+    = segment'. Each solution is written into a new version and the attributes `current' (name of the version) and
+    `solutionId' of the group are switched atomically after all chunks are written, so that readers never see chunks
+    of different solutions (see :func:`read_solution`). If `only_changed_chunks' is set, only chunks that differ from
+    the previously written solution are written, unchanged chunks are hard-linked from the previous version. The
+    `num_versions' newest versions are kept for readers that resolved `current' before it was switched.
+
+    Solutions are written in the background and chunks are written in parallel. Only the newest pending solution is
+    kept: solutions that are superseded before their write starts are dropped (their futures are cancelled).
+    '''
+
+    def __init__(self, container, dataset='fragment-segment-lookup', chunk_size=2**18, num_threads=4, only_changed_chunks=True, num_versions=2):
+        super(SolutionN5Writer, self).__init__()
+        self.logger              = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+        self.container           = container
+        self.dataset             = dataset
+        self.chunk_size          = chunk_size
+        self.only_changed_chunks = only_changed_chunks
+        self.num_versions        = max(num_versions, 1)
+        # version name and solution of the current version
+        self.previous            = None
+        self.lock                = threading.RLock()
+        # single thread for the newest solution, pool for chunks of a single solution
+        self.coordinator         = LatestWriter(self._write_pending, name='solution-n5', drop=lambda pending: pending[2].cancel())
+        self.executor            = concurrent.futures.ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix='solution-n5-chunks')
+
+    def submit(self, solution_id, solution):
+        '''
+        :return: :class:`concurrent.futures.Future` that holds the number of written chunks when done, cancelled if a
+                 newer solution is submitted before writing starts
+        '''
+        future = concurrent.futures.Future()
+        self.coordinator.submit((solution_id, np.asarray(solution, dtype=np.uint64), future))
+        return future
+
+    def shutdown(self, wait=True):
+        self.coordinator.shutdown(wait=wait)
+        self.executor.shutdown(wait=wait)
+
+    def _write_pending(self, pending):
+        solution_id, solution, future = pending
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(self._write(solution_id, solution))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _write(self, solution_id, solution):
+        try:
+            with self.lock:
+                f = z5py.File(self.container, use_zarr_format=False)
+                if self.dataset in f and _CURRENT_KEY not in f[self.dataset].attrs:
+                    self.logger.info('%s/%s is not a versioned lookup, re-creating it', self.container, self.dataset)
+                    shutil.rmtree(os.path.join(self.container, self.dataset))
+                    self.previous = None
+                group      = f.require_group(self.dataset)
+                group_path = os.path.join(self.container, self.dataset)
+                versions   = sorted((int(name) for name in os.listdir(group_path) if name.isdigit()))
+
+                if self.previous is None and _CURRENT_KEY in group.attrs:
+                    # persisted from previous run
+                    current       = group.attrs[_CURRENT_KEY]
+                    self.previous = (current, group[current][...])
+
+                version    = str(versions[-1] + 1 if len(versions) > 0 else 0)
+                dataset    = group.create_dataset(version, shape=solution.shape, chunks=(self.chunk_size,), dtype=np.uint64, compression='gzip')
+                num_blocks = (solution.size + self.chunk_size - 1) // self.chunk_size
+                blocks     = changed_blocks(self.previous[1] if self.only_changed_chunks and self.previous is not None else None, solution, self.chunk_size)
+                if len(blocks) < num_blocks:
+                    # copy-on-write: unchanged chunks are shared with the previous version
+                    for block in np.setdiff1d(np.arange(num_blocks), blocks):
+                        source = os.path.join(group_path, self.previous[0], str(block))
+                        if os.path.isfile(source):
+                            _link_or_copy(source, os.path.join(group_path, version, str(block)))
+
+                futures = [self.executor.submit(self._write_chunk, dataset, solution, block) for block in blocks]
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+                _write_attributes(group_path, **{_CURRENT_KEY: version, _SOLUTION_ID_KEY: solution_id})
+                self.previous = (version, solution)
+
+                for stale in versions[:max(len(versions) + 1 - self.num_versions, 0)]:
+                    shutil.rmtree(os.path.join(group_path, str(stale)), ignore_errors=True)
+                self.logger.debug('Wrote %d/%d chunks of solution %d into %s/%s/%s', len(blocks), num_blocks, solution_id, self.container, self.dataset, version)
+                return len(blocks)
+        except Exception as e:
+            self.logger.error('Unable to write solution %d into %s/%s: %s', solution_id, self.container, self.dataset, e)
+            raise
+
+    def _write_chunk(self, dataset, solution, block):
+        start = block * self.chunk_size
+        stop  = min(start + self.chunk_size, solution.size)
+        dataset[start:stop] = solution[start:stop]
@@ -1,22 +1,47 @@
+import json
 import os
+import re
+import shutil
 import signal
 import tempfile
 import threading
-from datetime import datetime
+import time
 
+import numpy as np
 import zmq
 
+from .api import API_RESPONSE_OK, API_RESPONSE_UNKNOWN_ERROR, API_RESPONSE_ENDPOINT_UNKNOWN, \
+    API_RESPONSE_DATA_STRING, API_RESPONSE_DATA_BYTES, API_RESPONSE_DATA_INT, API_RESPONSE_DATA_UNKNOWN
+from .checkpoint import load_state_checkpoint, save_state_checkpoint
+from .client import client_cli_main
+from .cpu_budget import CpuBudget
 from .ext import z5py
+from .instances import InstanceDumper
+from .edge_labels import UNLABELED, check_labels
+from .label_history import LabelHistory
+from .label_journal import LabelJournal, read_label_journal_batches
+from .latest_writer import LatestWriter
 from .pias_logging import levels as log_levels
 from .pias_logging import logging
+from .profiling import Profiler, TARGETS as PROFILING_TARGETS
+from .recording import RequestRecorder
+from .scheduler import UpdateScheduler
+from .solution_cache import SolutionCache
 from .server import PublishSocket, ReplySocket, Server
-from .workflow import Workflow
-from .zmq_util import send_int, recv_int, send_ints_multipart, send_more_int, _ndarray_as_bytes, _bytes_as_edges, \
-    send_ints
+from .shared_solution import SharedSolutionFile
+from .solution_n5 import SolutionN5Writer
+from .suggestions import UNCERTAINTY_MEASURES
+from .agglomeration_model import SOLVERS
+from .label_consistency import flatten_paths
+from .worker_pool import WorkerPool
+from .workflow import State, Workflow
+from .zmq_util import send_int, recv_int, send_ints_multipart, send_more_int, _ndarray_as_bytes, _bytes_as_edge_arrays, _edge_arrays_as_bytes, \
+    _bytes_as_ndarray, send_ints
 
 _EDGE_DATASET         = 'edges'
 _EDGE_FEATURE_DATASET = 'edge-features'
 _PAINTERA_DATA_KEY    = 'painteraData'
+_LABEL_VERSION_KEY    = 'labelVersion'
 
 _SUCCESS               = 0
 _NO_SOLUTION_AVAILABLE = 1
@@ -24,20 +49,22 @@ _NO_SOLUTION_AVAILABLE = 1
 _SET_EDGE_REP_SUCCESS           = 0
 _SET_EDGE_REP_DO_NOT_UNDERSTAND = 1
 _SET_EDGE_REP_EXCEPTION         = 2
+_SET_EDGE_REP_INCONSISTENT      = 3
+
+# maximum number of conflicting label paths sent in response to inconsistent labels
+_MAX_CONFLICT_PATHS             = 100
 
 _SET_EDGE_REQ_EDGE_LIST         = 0
 
 _SOLUTION_UPDATE_REQUEST_RECEIVED = 0
 
+_EDGE_VALUES_REP_EXCEPTION      = 2
 
-API_RESPONSE_OK               = 0
-API_RESPONSE_UNKNOWN_ERROR    = 1
-API_RESPONSE_ENDPOINT_UNKNOWN = 2
+_EDGE_VALUES_REQ_ALL            = 0
+_EDGE_VALUES_REQ_RANGE          = 1
+_EDGE_VALUES_REQ_IDS            = 2
 
-API_RESPONSE_DATA_STRING  = 0
-API_RESPONSE_DATA_BYTES   = 1
-API_RESPONSE_DATA_INT     = 2
-API_RESPONSE_DATA_UNKNOWN = 3
+_SESSION_NAME = re.compile('[A-Za-z0-9_.-]+')
 
 API_HELP_STRING_TEMPLATE = '''
 Paintera Interactive Solver Server
@@ -67,7 +94,61 @@ The /help endpoint sends  a single zmq string response. All endpoints under /api
 /api/n5/all
     REQ/REP Send both container and dataset as multiple messages.
 /api/save-ground-truth-labels
-    REQ/REP Serialize current ground truth labels (uv-pairs and labels) into server directory
+    REQ/REP Compact label journal and current ground truth labels (uv-pairs and labels) into server directory
+/api/shared-solution-file
+    REQ/REP Path to memory-mapped solution file in server directory (empty string if not enabled)
+/api/solution-n5
+    REQ/REP Container and dataset of chunked fragment-segment lookup with latest solution (empty strings if not enabled).
+            The dataset is a group of versions: attribute `current' names the version that holds the latest fully
+            written solution, attribute `solutionId' its id (see pias.solution_n5.read_solution).
+/api/save-checkpoint
+    REQ/REP Serialize latest solution, merge probabilities, and classifier into server directory for warm restarts
+            (0: success, 1: no solution available, 2: classifier released while the dataset is evicted)
+/api/metrics
+    REQ/REP Latency histograms (seconds) of update stages, serialization, publishing, and endpoints, and update queue
+            depth as json string. The count of each endpoint timer is the number of requests.
+/api/labels/version
+    REQ/REP Version of current labels. Each list of edge labels submitted since the server was started increments
+            the version (version 0 holds the labels loaded at start-up).
+/api/labels/diff/SOURCE/TARGET
+    REQ/REP Edge labels (bytes, same format as submitted edge labels) that turn labels of version SOURCE into labels of
+            version TARGET, label {unlabeled} for edges that are not labeled in version TARGET.
+/api/labels/revert/VERSION
+    REQ/REP Restore labels of VERSION by submitting the changes since then as new list of edge labels. Responds with
+            the new label version. Does not request a solution update.
+/api/suggest-edges/K
+/api/suggest-edges/K/MEASURE
+/api/suggest-edges/K/MEASURE/FRAGMENTS
+    REQ/REP Up to K unlabeled edges that are most informative to label next, i.e. most uncertain in the latest
+            solution by MEASURE (one of {uncertainty_measures}, default {default_uncertainty_measure}), optionally only
+            edges incident to any of the comma-separated fragment ids FRAGMENTS. Responds with the solution id (-1 if no
+            solution is available), uv-pairs (uint64), and merge probabilities (float32) of the edges, most uncertain
+            first. Served from an index that is built after each solution.
+/api/settings
+    REQ/REP Json object with random forest kwargs, solver, and prediction chunk size of the next update, and the latency
+            target, chosen settings, and stage times (seconds) of the last update of the latency controller (null
+            unless the server was started with --latency-target)
+/api/resources
+    REQ/REP Json object with core budget (cores, cores reserved for serving, cores for updates, concurrent updates,
+            cores in use) and utilization of the cores for updates, overall and per stage (fit, predict, solve): number
+            of runs, running instances, threads of the last run, wall and core time (seconds), and utilization
+/api/solution-cache
+    REQ/REP Json object with hits, misses, and number of entries in memory and on disk of the cache of solved label sets
+/api/sessions
+    REQ/REP Json object of open labeling sessions and their base addresses (only if server was started with --sessions)
+/api/session/open/NAME
+    REQ/REP Open (or create) labeling session NAME with its own labels, classifier, and solutions, sharing edges and
+            features with this server. Responds with the base address of the session, which serves all endpoints
+            described here. Sessions are re-opened on restart.
+/api/session/close/NAME
+    REQ/REP Close labeling session NAME (labels are kept). Responds with 0 if closed, 1 if no such session is open.
+/api/profile/TARGET/N
+/api/profile/TARGET/N/memory
+    REQ/REP Profile the next N runs of TARGET (one of {profiling_targets}) with cProfile (and tracemalloc if
+            `/memory' is appended). Statistics are written into `profiles' in the server directory. Responds with N.
+/api/profile/results
+    REQ/REP Json list of recent profiles: target, name, duration, path of cProfile stats, summary of top functions
+            by cumulative time, path and summary of top memory allocations (null unless memory was traced)
 
 Use the following addresses for specific queries:
 
@@ -76,9 +157,38 @@ Use the following addresses for specific queries:
 {current_solution_address}
     REQ/REP: Responds with current solution (if any)
 {set_edge_labels_address}
-    REQ/REP: Submit list of edge labels
+    REQ/REP: Submit list of edge labels. Responds with status and number of submitted labels. If the labels are
+             inconsistent, i.e. a negative label connects fragments that are joined by a chain of positive labels, the
+             status is {inconsistent} followed by the number of inconsistent negative labels, and (as bytes) up to
+             {max_conflict_paths} paths of positive labels between the fragments of an inconsistent negative label:
+             length of the path followed by the fragments of the path (uint64) for each path. No solutions are
+             computed while labels are inconsistent. Label {unlabeled} removes the label of an edge.
+             Each list of edge labels increments the label version (see /api/labels/version).
+{fragment_segment_lookup_address}
+    REQ/REP: Submit fragment ids (uint64), responds with segment id of each fragment in current solution
+{segment_fragment_lookup_address}
+    REQ/REP: Submit segment ids (uint64), responds with number of fragments per segment and all fragments of these segments
+{solve_region_address}
+    REQ/REP: Submit halo (integer) and fragment ids (uint64) of a region of interest, e.g. the fragments on screen.
+             Solves the multicut for the region extended by all fragments within halo hops, with all other fragments
+             fixed to the current solution. Responds with the id of the current solution, fragments of the extended
+             region, and their segment ids. The global solution is not modified.
+{edge_values_address}
+    REQ/REP: Submit quantity (integer, 0: merge probabilities, 1: costs), encoding (integer, 0: float32, 1: float16,
+             2: uint8), selection (integer, 0: all edges, 1: range of edges, 2: list of edges), and (as bytes)
+             nothing, first and last (exclusive) edge index (2 x uint64), or edge indices (uint64), respectively.
+             Responds with status, solution id, offset and scale (2 x float32, as bytes), and the encoded values of
+             the edges in the current solution (in order of the edges of the paintera dataset). Decode with
+             `offset + scale * value' (quantized over [0, 1] for merge probabilities, over the costs of unlabeled
+             edges for costs). Status {edge_values_exception} is followed by -1, empty bytes, and the error message.
 {solution_update_request_address}
-    PUB/SUB: Subscribe to `' (empty string) to be notified whenever a new solution is available
+    REQ/REP: Request update of current solution, responds with id of the requested solution
+{new_solution_address}
+    PUB/SUB: Subscribe to `' (empty string) to be notified whenever a new solution is available.
+             If the shared solution file is enabled, the path to that file is sent as a second (string) message
+{workers_address}
+    ROUTER: Connect workers (`pias-worker --address {workers_address}') to offload prediction and multicut
+            to other processes (only if server was started with --workers)
 {api_endpoint_address}
     REQ/REP for api endpoints
 '''
@@ -116,6 +226,22 @@ class SolverServer(object):
     def set_edge_labels_address(address_base):
         return '%s-set-edge-labels' % address_base
 
+    @staticmethod
+    def fragment_segment_lookup_address(address_base):
+        return '%s-fragment-segment-lookup' % address_base
+
+    @staticmethod
+    def segment_fragment_lookup_address(address_base):
+        return '%s-segment-fragment-lookup' % address_base
+
+    @staticmethod
+    def solve_region_address(address_base):
+        return '%s-solve-region' % address_base
+
+    @staticmethod
+    def edge_values_address(address_base):
+        return '%s-edge-values' % address_base
+
     @staticmethod
     def solution_update_request_address(address_base):
         return '%s-update-solution' % address_base
@@ -124,6 +250,34 @@ class SolverServer(object):
     def new_solution_address(address_base):
         return '%s-new-solution' % address_base
 
+    @staticmethod
+    def parse_profile_request(endpoint):
+        '''
+        :param endpoint: `/api/profile/TARGET/N' or `/api/profile/TARGET/N/memory'
+        :return: tuple of target, number of runs, and whether to trace memory
+        '''
+        parts = endpoint.strip('/').split('/')
+        if len(parts) not in (4, 5) or parts[3] == '' or not parts[3].isdigit() or parts[2] not in PROFILING_TARGETS or parts[4:] not in ([], ['memory']):
+            raise ValueError('Expected /api/profile/{{{}}}/N[/memory] but got `{}\''.format(','.join(PROFILING_TARGETS), endpoint))
+        return parts[2], int(parts[3]), len(parts) == 5
+
+    @staticmethod
+    def parse_suggest_edges_request(endpoint):
+        '''
+        :param endpoint: `/api/suggest-edges/K[/MEASURE[/FRAGMENTS]]' with comma-separated fragment ids
+        :return: tuple of k, uncertainty measure, and fragment ids (`None' for all fragments)
+        '''
+        parts = endpoint.strip('/').split('/')
+        if len(parts) not in (3, 4, 5) or not parts[2].isdigit() or parts[3:4] not in ([], *([m] for m in UNCERTAINTY_MEASURES)):
+            raise ValueError('Expected /api/suggest-edges/K[/{{{}}}[/FRAGMENTS]] but got `{}\''.format(','.join(UNCERTAINTY_MEASURES), endpoint))
+        measure   = parts[3] if len(parts) > 3 else UNCERTAINTY_MEASURES[0]
+        fragments = np.array([int(f) for f in parts[4].split(',') if f != ''], dtype=np.uint64) if len(parts) > 4 else None
+        return int(parts[2]), measure, fragments
+
+    @staticmethod
+    def workers_address(address_base):
+        return '%s-workers' % address_base
+
     @staticmethod
     def api_endpoint_address(address_base):
         return address_base
@@ -151,9 +305,21 @@ class SolverServer(object):
             ping_address=SolverServer.ping_address(address_base),
             current_solution_address=SolverServer.current_solution_address(address_base),
             set_edge_labels_address=SolverServer.set_edge_labels_address(address_base),
+            fragment_segment_lookup_address=SolverServer.fragment_segment_lookup_address(address_base),
+            segment_fragment_lookup_address=SolverServer.segment_fragment_lookup_address(address_base),
+            solve_region_address=SolverServer.solve_region_address(address_base),
+            edge_values_address=SolverServer.edge_values_address(address_base),
             solution_update_request_address=SolverServer.solution_update_request_address(address_base),
             new_solution_address=SolverServer.new_solution_address(address_base),
-            api_endpoint_address=SolverServer.api_endpoint_address(address_base))
+            workers_address=SolverServer.workers_address(address_base),
+            api_endpoint_address=SolverServer.api_endpoint_address(address_base),
+            inconsistent=_SET_EDGE_REP_INCONSISTENT,
+            edge_values_exception=_EDGE_VALUES_REP_EXCEPTION,
+            unlabeled=UNLABELED,
+            uncertainty_measures=', '.join(UNCERTAINTY_MEASURES),
+            default_uncertainty_measure=UNCERTAINTY_MEASURES[0],
+            profiling_targets=', '.join(PROFILING_TARGETS),
+            max_conflict_paths=_MAX_CONFLICT_PATHS)
 
     def __init__(
             self,
@@ -161,7 +327,28 @@ class SolverServer(object):
             directory,
             n5_container,
             paintera_dataset,
-            next_solution_id = 0):
+            next_solution_id = 0,
+            label_compaction_threshold = 1000,
+            label_compaction_interval = 30.,
+            label_history_versions = 10000,
+            shared_solution_file = False,
+            solution_n5 = False,
+            solution_n5_only_changed_chunks = True,
+            solver = None,
+            workers = False,
+            record_requests = False,
+            dump_instances = False,
+            dump_instances_min_seconds = 0.,
+            update_scheduler = None,
+            edge_cache = False,
+            edge_feature_cache = None,
+            sessions = False,
+            solution_cache_megabytes = 256.,
+            solution_cache_disk_size = 64,
+            latency_target = None,
+            cores = None,
+            reserved_cores = 1,
+            cpu_budget = None):
         super(SolverServer, self).__init__()
 
         if not SolverServer.is_paintera_data(n5_container, paintera_dataset):
@@ -178,35 +365,200 @@ class SolverServer(object):
         self.pid = os.getpid()
         self.directory = directory
         self.ground_truth_directory = os.path.join(self.directory, 'ground-truth.n5')
+        self.checkpoint_file = os.path.join(self.directory, 'checkpoint.npz')
         self.lock_file = self.lock_directory()
         self.address_base = 'ipc://' + os.path.join(directory, 'server')
         self.logger = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
-        self.logger.debug('Initializing workflow')
         self.save_lock = threading.RLock()
+
+        try:
+            checkpoint = load_state_checkpoint(self.checkpoint_file)
+        except Exception as e:
+            self.logger.warning('Ignoring unreadable checkpoint %s: %s', self.checkpoint_file, e)
+            checkpoint = None
+        if checkpoint is not None:
+            # never re-use solution ids of persisted solutions
+            next_solution_id = max(next_solution_id, checkpoint.solution_id + 1)
+
+        self.workers_address = SolverServer.workers_address(self.address_base)
+        self.worker_pool     = WorkerPool(self.workers_address) if workers else None
+
+        # labeling sessions share edges, features, and graph with this server and interleave their updates with
+        # updates of this server on a shared scheduler
+        self.n5_container       = n5_container
+        self.paintera_dataset   = paintera_dataset
+        self.solver             = solver
+        self.latency_target     = latency_target
+        self.sessions_enabled   = sessions
+        self.sessions_directory = os.path.join(self.directory, 'sessions')
+        self.sessions           = {}
+        self.session_lock       = threading.Lock()
+        self.owned_scheduler    = UpdateScheduler() if sessions and update_scheduler is None else None
+        self.update_scheduler   = update_scheduler if self.owned_scheduler is None else self.owned_scheduler
+        # cores for training, prediction, and solving, shared with sessions (and other datasets if given)
+        self.cpu_budget         = CpuBudget(cores=cores, reserved=reserved_cores) if cpu_budget is None else cpu_budget
+
+        # repeated label sets (e.g. after undo and redo) are served from cache without training and solving
+        self.solution_cache = SolutionCache(
+            max_bytes     = int(solution_cache_megabytes * 2**20),
+            directory     = os.path.join(self.directory, 'solution-cache') if solution_cache_disk_size > 0 else None,
+            disk_capacity = solution_cache_disk_size) if solution_cache_megabytes > 0 or solution_cache_disk_size > 0 else None
+
+        self.logger.debug('Initializing workflow')
         self.workflow = Workflow(
             next_solution_id=next_solution_id, # TODO read from project file
             edge_n5_container=n5_container,
             edge_dataset=edge_dataset,
-            edge_feature_dataset=edge_feature_dataset)
+            edge_feature_dataset=edge_feature_dataset,
+            solver=solver,
+            worker_pool=self.worker_pool,
+            profiler=Profiler(os.path.join(self.directory, 'profiles')),
+            scheduler=self.update_scheduler,
+            cache_directory=os.path.join(self.directory, 'cache') if edge_cache else None,
+            edge_feature_cache=edge_feature_cache,
+            solution_cache=self.solution_cache,
+            latency_target=latency_target,
+            cpu_budget=self.cpu_budget)
         self.logger.debug('Initialized workflow')
 
-        if os.path.isdir(self.ground_truth_directory):
-            with z5py.File(self.ground_truth_directory, 'r') as f:
-                edges  = tuple(tuple(it) for it in f['edges'][...])
-                labels = f['labels'][...]
-            self.logger.info('Loading persisted ground truth with edges %s and labels %s', edges, labels)
-            self.workflow._set_edge_labels(edges, labels)
+        restored_state = None
+        if checkpoint is not None:
+            try:
+                restored_state = self.workflow.restore_state(checkpoint)
+            except Exception as e:
+                self.logger.warning('Unable to restore state from checkpoint %s: %s', self.checkpoint_file, e)
+
+        self.shared_solution_file = SharedSolutionFile(os.path.join(self.directory, 'solution.bin')) if shared_solution_file else None
+        if self.shared_solution_file is not None and restored_state is not None:
+            self.shared_solution_file.write(restored_state.solution_id, restored_state.solution)
+
+        self.solution_n5_container = os.path.join(self.directory, 'solution.n5')
+        self.solution_n5_writer    = SolutionN5Writer(self.solution_n5_container, only_changed_chunks=solution_n5_only_changed_chunks) if solution_n5 else None
+        if self.solution_n5_writer is not None and restored_state is not None:
+            self.solution_n5_writer.submit(restored_state.solution_id, restored_state.solution)
+
+        self.label_lock                       = threading.RLock()
+        self.label_journal_file               = os.path.join(self.directory, 'labels.journal')
+        # compacted journal segments (and labels before the oldest segment) restore label versions after a restart
+        self.label_history_directory          = os.path.join(self.directory, 'label-history')
+        self.label_history_base_directory     = os.path.join(self.label_history_directory, 'base.n5')
+        self.label_history_versions           = label_history_versions
+        self.label_compaction_threshold       = label_compaction_threshold
+        self.label_compaction_interval        = label_compaction_interval
+        num_persisted_labels                  = self._restore_labels()
+        self.label_journal                    = LabelJournal(self.label_journal_file)
+        self._label_compaction_requested      = threading.Event()
+        self._label_compaction_stopped        = threading.Event()
+        self.label_compaction_thread          = threading.Thread(target=self._compact_labels_in_background, name='compact-%s' % self.label_journal_file, daemon=True)
+        self.label_compaction_thread.start()
+
+        self.instance_directory = os.path.join(self.directory, 'instances')
+        self.instance_dumper    = InstanceDumper(self.instance_directory, min_seconds=dump_instances_min_seconds) if dump_instances else None
+
+        # optional log of all requests for pias-replay, starts with labels that are already known
+        self.request_log_file = os.path.join(self.directory, time.strftime('requests-%Y%m%d-%H%M%S.log'))
+        self.request_recorder = RequestRecorder(self.request_log_file) if record_requests else None
+        if self.request_recorder is not None and num_persisted_labels > 0:
+            self.request_recorder.record_labels(*self.workflow.get_labeled_uv_pairs())
+
+        if num_persisted_labels > 0 or restored_state is not None:
+            # compute solution for persisted labels or verify restored solution in the background
             self.workflow.request_update_state()
 
 
+        metrics  = self.workflow.metrics
+        profiler = self.workflow.profiler
+
         def current_solution(_, socket):
             solution = self.workflow.get_latest_state()
+            if self.request_recorder is not None:
+                self.request_recorder.record_fetch(-1 if solution is None or solution.solution is None else solution.solution_id)
             if solution is None or solution.solution is None:
                 send_more_int(socket, _NO_SOLUTION_AVAILABLE)
                 socket.send(b'')
             else:
                 send_more_int(socket, _SUCCESS)
-                socket.send(_ndarray_as_bytes(solution.solution))
+                with metrics.time('serialize/current-solution'):
+                    data = _ndarray_as_bytes(solution.solution)
+                socket.send(data)
+
+        def fragment_segment_lookup(fragments, socket):
+            state = self.workflow.get_latest_state()
+            if state is None or state.solution is None:
+                send_ints_multipart(socket, _NO_SOLUTION_AVAILABLE, -1, flags=zmq.SNDMORE)
+                socket.send(b'')
+            else:
+                segments = state.get_solution_index().segments_of(_bytes_as_ndarray(fragments, dtype=np.uint64))
+                send_ints_multipart(socket, _SUCCESS, state.solution_id, flags=zmq.SNDMORE)
+                socket.send(_ndarray_as_bytes(segments))
+
+        def segment_fragment_lookup(segments, socket):
+            state = self.workflow.get_latest_state()
+            if state is None or state.solution is None:
+                send_ints_multipart(socket, _NO_SOLUTION_AVAILABLE, -1, flags=zmq.SNDMORE)
+                socket.send(b'', flags=zmq.SNDMORE)
+                socket.send(b'')
+            else:
+                counts, fragments = state.get_solution_index().fragments_of(_bytes_as_ndarray(segments, dtype=np.uint64))
+                send_ints_multipart(socket, _SUCCESS, state.solution_id, flags=zmq.SNDMORE)
+                socket.send(_ndarray_as_bytes(counts), flags=zmq.SNDMORE)
+                socket.send(_ndarray_as_bytes(fragments))
+
+        def solve_region_receive(socket):
+            halo      = recv_int(socket)
+            fragments = socket.recv()
+            return halo, fragments
+
+        def solve_region(message, socket):
+            halo, fragments = message
+            try:
+                region = self.workflow.solve_region(_bytes_as_ndarray(fragments, dtype=np.uint64), halo=halo)
+            except Exception as e:
+                self.logger.error('Unable to solve region: %s', e, exc_info=1)
+                region = None
+            if region is None:
+                send_ints_multipart(socket, _NO_SOLUTION_AVAILABLE, -1, flags=zmq.SNDMORE)
+                socket.send(b'', flags=zmq.SNDMORE)
+                socket.send(b'')
+            else:
+                solution_id, nodes, segments = region
+                send_ints_multipart(socket, _SUCCESS, solution_id, flags=zmq.SNDMORE)
+                socket.send(_ndarray_as_bytes(nodes), flags=zmq.SNDMORE)
+                socket.send(_ndarray_as_bytes(segments))
+
+        def edge_values_receive(socket):
+            quantity, encoding, selection = (recv_int(socket) for _ in range(3))
+            return quantity, encoding, selection, socket.recv()
+
+        def edge_values(message, socket):
+            quantity, encoding, selection, payload = message
+            state = self.workflow.get_latest_state()
+            try:
+                values = None if state is None else state.get_edge_values(quantity, encoding)
+                if values is None:
+                    send_ints_multipart(socket, _NO_SOLUTION_AVAILABLE, -1, flags=zmq.SNDMORE)
+                    socket.send(b'', flags=zmq.SNDMORE)
+                    socket.send(b'')
+                    return
+                if selection == _EDGE_VALUES_REQ_ALL:
+                    data = values.all()
+                elif selection == _EDGE_VALUES_REQ_RANGE:
+                    start, stop = _bytes_as_ndarray(payload, dtype=np.uint64).tolist()
+                    data = values.range(start, stop)
+                elif selection == _EDGE_VALUES_REQ_IDS:
+                    data = values.select(_bytes_as_ndarray(payload, dtype=np.uint64))
+                else:
+                    raise ValueError('Unknown selection %d' % selection)
+            except Exception as e:
+                self.logger.debug('Sending exception `%s\' (%s)', e, type(e))
+                send_ints_multipart(socket, _EDGE_VALUES_REP_EXCEPTION, -1, flags=zmq.SNDMORE)
+                socket.send(b'', flags=zmq.SNDMORE)
+                socket.send_string(str(e))
+                return
+            send_ints_multipart(socket, _SUCCESS, state.solution_id, flags=zmq.SNDMORE)
+            socket.send(np.array([values.offset, values.scale], dtype='>f4').tobytes(), flags=zmq.SNDMORE)
+            # encoded values are immutable and already big endian: send without copying
+            socket.send(data, copy=False)
 
         def set_edge_labels_receive(socket):
             method = recv_int(socket)
@@ -219,10 +571,15 @@ class SolverServer(object):
             self.logger.debug('Method is %s', method)
             try:
                 if method == _SET_EDGE_REQ_EDGE_LIST:
-                    labels = _bytes_as_edges(message[1])
-                    self.logger.debug('Labels are %s', labels)
-                    self.workflow.request_set_edge_labels(tuple((e[0], e[1]) for e in labels), tuple(e[2] for e in labels))
-                    send_ints_multipart(socket, _SET_EDGE_REP_SUCCESS, len(labels))
+                    uv_pairs, labels = _bytes_as_edge_arrays(message[1])
+                    self.logger.debug('Labels are %s %s', uv_pairs, labels)
+                    num_conflicts = self.set_edge_labels(uv_pairs, labels)
+                    if num_conflicts > 0:
+                        paths = self.workflow.get_label_conflict_paths(max_paths=_MAX_CONFLICT_PATHS)
+                        send_ints_multipart(socket, _SET_EDGE_REP_INCONSISTENT, labels.size, num_conflicts, flags=zmq.SNDMORE)
+                        socket.send(_ndarray_as_bytes(flatten_paths(paths)))
+                    else:
+                        send_ints_multipart(socket, _SET_EDGE_REP_SUCCESS, labels.size)
                 else:
                     send_ints_multipart(socket, _SET_EDGE_REP_DO_NOT_UNDERSTAND, method)
             except Exception as e:
@@ -232,16 +589,25 @@ class SolverServer(object):
 
         def update_request_received_confirmation(_, socket):
             next_solution_id = self.workflow.request_update_state()
+            if self.request_recorder is not None:
+                self.request_recorder.record_update_request(next_solution_id)
             send_ints_multipart(socket, _SOLUTION_UPDATE_REQUEST_RECEIVED, next_solution_id)
 
+        @metrics.timed('publish')
         def publish_new_solution(socket, message):
             self.logger.debug('Publishing new solution %s', message)
-            send_ints(socket, *message)
+            if self.shared_solution_file is None:
+                send_ints(socket, *message)
+            else:
+                send_ints(socket, *message, flags=zmq.SNDMORE)
+                socket.send_string(self.shared_solution_file.path)
 
         def api_socket_send(endpoint, socket):
             if len(endpoint) == 0 or endpoint == '' or endpoint == '/':
                 socket.send(b'')
                 return
+            start = time.perf_counter()
+            timer = 'endpoint/api-unknown'
             try:
                 return_code = API_RESPONSE_OK
                 message = '/' + endpoint.lstrip('/')
@@ -261,56 +627,256 @@ class SolverServer(object):
                     exit_code = self.save_ground_truth()
                     self.logger.info('Saved ground truth: %d (0: success, 1: no data available)', exit_code)
                     messages = ((API_RESPONSE_DATA_INT, exit_code),)
+                elif message == '/api/shared-solution-file':
+                    path = '' if self.shared_solution_file is None else self.shared_solution_file.path
+                    messages = ((API_RESPONSE_DATA_STRING, path),)
+                elif message == '/api/solution-n5':
+                    if self.solution_n5_writer is None:
+                        messages = ((API_RESPONSE_DATA_STRING, ''), (API_RESPONSE_DATA_STRING, ''))
+                    else:
+                        messages = ((API_RESPONSE_DATA_STRING, self.solution_n5_writer.container), (API_RESPONSE_DATA_STRING, self.solution_n5_writer.dataset))
+                elif message == '/api/save-checkpoint':
+                    exit_code = self.save_checkpoint()
+                    self.logger.info('Saved checkpoint: %d (0: success, 1: no data available, 2: classifier released)', exit_code)
+                    messages = ((API_RESPONSE_DATA_INT, exit_code),)
+                elif message == '/api/metrics':
+                    messages = ((API_RESPONSE_DATA_STRING, metrics.to_json()),)
+                elif message == '/api/profile/results':
+                    messages = ((API_RESPONSE_DATA_STRING, json.dumps(profiler.get_results())),)
+                elif message == '/api/labels/version':
+                    messages = ((API_RESPONSE_DATA_INT, self.workflow.get_label_version()),)
+                elif message.startswith('/api/labels/diff/'):
+                    source, target = (int(v) for v in message[len('/api/labels/diff/'):].split('/'))
+                    messages = ((API_RESPONSE_DATA_BYTES, _edge_arrays_as_bytes(*self.workflow.diff_labels(source, target))),)
+                    message  = '/api/labels/diff'
+                elif message.startswith('/api/labels/revert/'):
+                    messages = ((API_RESPONSE_DATA_INT, self.revert_labels(int(message[len('/api/labels/revert/'):]))),)
+                    message  = '/api/labels/revert'
+                elif message.startswith('/api/suggest-edges/'):
+                    k, measure, fragments = SolverServer.parse_suggest_edges_request(message)
+                    suggestions = self.workflow.suggest_edges(k, measure=measure, fragments=fragments)
+                    if suggestions is None:
+                        suggestions = (-1, np.empty((0, 2), dtype=np.uint64), np.empty((0,), dtype=np.float32), None)
+                    solution_id, uv_pairs, probabilities, _ = suggestions
+                    messages = (
+                        (API_RESPONSE_DATA_INT, solution_id),
+                        (API_RESPONSE_DATA_BYTES, _ndarray_as_bytes(np.asarray(uv_pairs, dtype=np.uint64))),
+                        (API_RESPONSE_DATA_BYTES, _ndarray_as_bytes(np.asarray(probabilities, dtype=np.float32))))
+                    message  = '/api/suggest-edges'
+                elif message == '/api/settings':
+                    messages = ((API_RESPONSE_DATA_STRING, json.dumps(self.workflow.get_settings())),)
+                elif message == '/api/resources':
+                    messages = ((API_RESPONSE_DATA_STRING, json.dumps(self.cpu_budget.utilization())),)
+                elif message == '/api/solution-cache':
+                    stats    = dict(enabled=False) if self.solution_cache is None else dict(enabled=True, **self.solution_cache.stats())
+                    messages = ((API_RESPONSE_DATA_STRING, json.dumps(stats)),)
+                elif message == '/api/sessions':
+                    messages = ((API_RESPONSE_DATA_STRING, json.dumps(self.list_sessions())),)
+                elif message.startswith('/api/session/open/'):
+                    messages = ((API_RESPONSE_DATA_STRING, self.open_session(message[len('/api/session/open/'):])),)
+                    message  = '/api/session/open'
+                elif message.startswith('/api/session/close/'):
+                    messages = ((API_RESPONSE_DATA_INT, self.close_session(message[len('/api/session/close/'):])),)
+                    message  = '/api/session/close'
+                elif message.startswith('/api/profile/'):
+                    target, num_runs, memory = SolverServer.parse_profile_request(message)
+                    profiler.request(target, num_runs, memory=memory)
+                    messages = ((API_RESPONSE_DATA_INT, num_runs),)
+                    message  = '/api/profile'
                 else:
                     return_code = API_RESPONSE_ENDPOINT_UNKNOWN
                     messages = ((API_RESPONSE_DATA_STRING, "Endpoint unknown"), (API_RESPONSE_DATA_STRING, endpoint))
+                if return_code == API_RESPONSE_OK:
+                    timer = 'endpoint' + message
 
             except Exception as e:
                 return_code = API_RESPONSE_UNKNOWN_ERROR
                 messages = tuple((API_RESPONSE_DATA_STRING, m) for m in (str(type(e)), str(e)))
 
             SolverServer.api_endpoint_respond(socket, return_code, *messages)
+            metrics.timer(timer).observe(time.perf_counter() - start)
 
 
 
         self.ping_address                    = SolverServer.ping_address(self.address_base)
         self.current_solution_address        = SolverServer.current_solution_address(self.address_base)
         self.set_edge_labels_address         = SolverServer.set_edge_labels_address(self.address_base)
+        self.fragment_segment_lookup_address = SolverServer.fragment_segment_lookup_address(self.address_base)
+        self.segment_fragment_lookup_address = SolverServer.segment_fragment_lookup_address(self.address_base)
+        self.solve_region_address            = SolverServer.solve_region_address(self.address_base)
+        self.edge_values_address             = SolverServer.edge_values_address(self.address_base)
         self.solution_update_request_address = SolverServer.solution_update_request_address(self.address_base)
         self.new_solution_address            = SolverServer.new_solution_address(self.address_base)
         self.api_endpoint_address            = SolverServer.api_endpoint_address(self.address_base)
 
+        def instrumented(name, respond):
+            # request counts and latencies of each endpoint (count of the timer is the number of requests), profiles on request
+            timed = metrics.timed('endpoint/' + name)(respond)
+            def wrapper(request, socket):
+                with profiler.profile('endpoints', name):
+                    return timed(request, socket)
+            return wrapper
+
+        ping                           = lambda request, socket: socket.send_string('')
         api_socket                     = ReplySocket(self.api_endpoint_address, timeout=10, respond=api_socket_send)
-        ping_socket                    = ReplySocket(self.ping_address, timeout=10)
+        ping_socket                    = ReplySocket(self.ping_address, timeout=10, respond=instrumented('ping', ping))
         solution_notifier_socket       = PublishSocket(self.new_solution_address, timeout=10 / 1000, send=publish_new_solution) # queue timeout is specified in seconds
-        solution_request_socket        = ReplySocket(self.current_solution_address, timeout=10, respond=current_solution)
-        solution_update_request_socket = ReplySocket(self.solution_update_request_address, timeout=10, respond=update_request_received_confirmation)
-        set_edge_labels_request_socket = ReplySocket(self.set_edge_labels_address, timeout=10, respond=set_edge_labels_send, receive=set_edge_labels_receive)
-
+        solution_request_socket        = ReplySocket(self.current_solution_address, timeout=10, respond=instrumented('current-solution', current_solution))
+        solution_update_request_socket = ReplySocket(self.solution_update_request_address, timeout=10, respond=instrumented('update-solution', update_request_received_confirmation))
+        set_edge_labels_request_socket = ReplySocket(self.set_edge_labels_address, timeout=10, respond=instrumented('set-edge-labels', set_edge_labels_send), receive=set_edge_labels_receive)
+        fragment_segment_lookup_socket = ReplySocket(self.fragment_segment_lookup_address, timeout=10, respond=instrumented('fragment-segment-lookup', fragment_segment_lookup), receive=lambda socket: socket.recv())
+        segment_fragment_lookup_socket = ReplySocket(self.segment_fragment_lookup_address, timeout=10, respond=instrumented('segment-fragment-lookup', segment_fragment_lookup), receive=lambda socket: socket.recv())
+        solve_region_socket            = ReplySocket(self.solve_region_address, timeout=10, respond=instrumented('solve-region', solve_region), receive=solve_region_receive)
+        edge_values_socket             = ReplySocket(self.edge_values_address, timeout=10, respond=instrumented('edge-values', edge_values), receive=edge_values_receive)
+
+        def write_shared_solution(solution_id, exit_code, state):
+            if self.shared_solution_file is not None and exit_code == State.SUCCESS:
+                with metrics.time('serialize/shared-solution-file'):
+                    self.shared_solution_file.write(solution_id, state.solution)
+
+        def record_solution(solution_id, exit_code, state):
+            if self.request_recorder is not None:
+                self.request_recorder.record_solution(solution_id, exit_code, state.solution)
+
+        def dump_instance(solution_id, exit_code, state):
+            if self.instance_dumper is not None and exit_code == State.SUCCESS:
+                self.instance_dumper.submit(state)
+
+        def build_indices(state):
+            state.get_solution_index()
+            for measure in UNCERTAINTY_MEASURES:
+                state.get_edge_suggestions(measure)
+
+        # indices are built in the background, only for the newest solution: lookups of superseded solutions build
+        # their index on demand
+        self.solution_index_writer = LatestWriter(build_indices, name='solution-index')
+
+        def build_solution_index(solution_id, exit_code, state):
+            if exit_code == State.SUCCESS:
+                self.solution_index_writer.submit(state)
+
+        def write_solution_n5(solution_id, exit_code, state):
+            if self.solution_n5_writer is not None and exit_code == State.SUCCESS:
+                self.solution_n5_writer.submit(solution_id, state.solution)
+
+        # the shared solution file must be up to date before clients are notified
+        self.workflow.add_solution_update_listener(write_shared_solution)
+        self.workflow.add_solution_update_listener(write_solution_n5)
+        self.workflow.add_solution_update_listener(build_solution_index)
+        self.workflow.add_solution_update_listener(record_solution)
+        self.workflow.add_solution_update_listener(dump_instance)
         self.workflow.add_solution_update_listener(lambda solution_id, exit_code, solution: solution_notifier_socket.queue.put((solution_id, exit_code)))
 
+        def write_checkpoint(state):
+            try:
+                self.save_checkpoint(state)
+            except Exception as e:
+                self.logger.error('Unable to write checkpoint for solution %d to %s: %s', state.solution_id, self.checkpoint_file, e)
 
-        self.context = context
-        self.server  = Server(
+        # listeners run under the workflow lock: checkpoints are written in the background, only the newest is kept
+        self.checkpoint_writer = LatestWriter(write_checkpoint, name='checkpoint')
+
+        def checkpoint_successful_state(solution_id, exit_code, state):
+            if exit_code == State.SUCCESS:
+                self.checkpoint_writer.submit(state)
+
+        self.workflow.add_solution_update_listener(checkpoint_successful_state)
+
+
+        sockets = (
             api_socket,
             ping_socket,
             solution_notifier_socket,
             solution_request_socket,
             set_edge_labels_request_socket,
+            fragment_segment_lookup_socket,
+            segment_fragment_lookup_socket,
+            solve_region_socket,
+            edge_values_socket,
             solution_update_request_socket)
 
+        self.context = context
+        self.server  = Server(*(sockets if self.worker_pool is None else sockets + (self.worker_pool,)))
+
         logging.info('Starting solver server at base address          %s', self.address_base)
         logging.info('Endpoint (send /help for more information)      %s', self.api_endpoint_address)
         logging.info('Ping server at                                  %s', self.ping_address)
         logging.info('Request current solution at                     %s', self.current_solution_address)
         logging.info('Submit edge labels at                           %s', self.set_edge_labels_address)
+        logging.info('Look up segments of fragments at                %s', self.fragment_segment_lookup_address)
+        logging.info('Look up fragments of segments at                %s', self.segment_fragment_lookup_address)
+        logging.info('Solve region of interest at                     %s', self.solve_region_address)
+        logging.info('Request edge probabilities and costs at         %s', self.edge_values_address)
         logging.info('Request update of current solution at           %s', self.solution_update_request_address)
         logging.info('Subscribe to be notified about new solutions at %s', self.new_solution_address)
+        if self.worker_pool is not None:
+            logging.info('Connect workers at                              %s', self.workers_address)
 
         self.server.start(context=self.context)
 
         logging.info('Ping server at address %s', self.ping_address)
 
+        if self.sessions_enabled and os.path.isdir(self.sessions_directory):
+            for name in sorted(os.listdir(self.sessions_directory)):
+                if _SESSION_NAME.fullmatch(name) and os.path.isdir(os.path.join(self.sessions_directory, name)):
+                    self.open_session(name)
+
+    def open_session(self, name):
+        '''
+        Open labeling session `name' (created on first open, re-opened on restart) with its own labels, classifier, and
+        solutions in `sessions/NAME' in the server directory, served at base address `ipc://DIRECTORY/sessions/NAME/server'
+        with all endpoints of this server. Sessions share edges, features, and graph with this server (read-only),
+        updates of all sessions and this server are interleaved round robin.
+
+        :return: base address of the session
+        '''
+        if not self.sessions_enabled:
+            raise Exception('Sessions are not enabled, start server with --sessions')
+        if not _SESSION_NAME.fullmatch(name):
+            raise ValueError('Invalid session name `{}\' (letters, digits, `.\', `_\', and `-\' only)'.format(name))
+        with self.session_lock:
+            session = self.sessions.get(name)
+            if session is None:
+                session = SolverServer(
+                    context            = self.context,
+                    directory          = os.path.join(self.sessions_directory, name),
+                    n5_container       = self.n5_container,
+                    paintera_dataset   = self.paintera_dataset,
+                    solver             = self.solver,
+                    latency_target     = self.latency_target,
+                    cpu_budget         = self.cpu_budget,
+                    update_scheduler   = self.update_scheduler,
+                    edge_feature_cache = self.workflow.edge_feature_cache)
+                self.sessions[name] = session
+                self.logger.info('Opened session %s at %s', name, session.address_base)
+            return session.address_base
+
+    def close_session(self, name):
+        '''
+        Shut down session `name'. Labels and checkpoints remain in the session directory and the session is re-opened
+        with :meth:`open_session`.
+
+        :return: 0 if the session was closed, 1 if no such session is open
+        '''
+        with self.session_lock:
+            session = self.sessions.pop(name, None)
+        if session is None:
+            return 1
+        session.shutdown()
+        self.logger.info('Closed session %s', name)
+        return 0
+
+    def get_session(self, name):
+        with self.session_lock:
+            return self.sessions[name]
+
+    def list_sessions(self):
+        '''
+        :return: dict of open session names to base addresses
+        '''
+        with self.session_lock:
+            return {name: session.address_base for name, session in self.sessions.items()}
+
     def get_ping_address(self):
         return self.ping_address
 
@@ -320,21 +886,55 @@ class SolverServer(object):
     def get_edge_labels_address(self):
         return self.set_edge_labels_address
 
+    def get_fragment_segment_lookup_address(self):
+        return self.fragment_segment_lookup_address
+
+    def get_segment_fragment_lookup_address(self):
+        return self.segment_fragment_lookup_address
+
+    def get_solve_region_address(self):
+        return self.solve_region_address
+
+    def get_edge_values_address(self):
+        return self.edge_values_address
+
     def get_solution_update_request_address(self):
         return self.solution_update_request_address
 
     def get_new_solution_address(self):
         return self.new_solution_address
 
+    def get_workers_address(self):
+        return self.workers_address
+
     def get_api_endpoint_address(self):
         return self.api_endpoint_address
 
     def shutdown(self):
         # TODO handle things like saving etc in here
         self.logger.debug('Shutting down server at base address %s', self.address_base)
+        for name in list(self.list_sessions()):
+            self.close_session(name)
         self.server.stop()
+        self._label_compaction_stopped.set()
+        self._label_compaction_requested.set()
+        self.label_compaction_thread.join()
+        # before the workflow stops: labels of evicted edges are looked up after reloading the edges
+        self.compact_labels()
+        self.label_journal.close()
+        if self.owned_scheduler is not None:
+            self.owned_scheduler.stop()
         self.workflow.stop()
-        self.save_ground_truth()
+        self.checkpoint_writer.shutdown()
+        self.solution_index_writer.shutdown()
+        if self.shared_solution_file is not None:
+            self.shared_solution_file.close()
+        if self.solution_n5_writer is not None:
+            self.solution_n5_writer.shutdown()
+        if self.request_recorder is not None:
+            self.request_recorder.close()
+        if self.instance_dumper is not None:
+            self.instance_dumper.wait()
         self.unlock_directory()
 
     def lock_directory(self):
@@ -359,35 +959,248 @@ class SolverServer(object):
         os.remove(self.lock_file)
         self.lock_file = None
 
+    def set_edge_labels(self, uv_pairs, labels):
+        '''
+        Journal and apply edge labels (:data:`pias.edge_labels.UNLABELED` removes a label).
+
+        :return: number of inconsistent negative labels
+        :raise ValueError: if `labels' contains anything but :data:`pias.edge_labels.VALID_LABELS`, nothing is
+                           journaled or applied
+        '''
+        labels = check_labels(labels)
+        with self.label_lock:
+            # write-ahead: labels are journaled before they are applied
+            self.label_journal.append(uv_pairs, labels)
+            if self.request_recorder is not None:
+                self.request_recorder.record_labels(uv_pairs, labels)
+            num_conflicts = self.workflow.request_set_edge_labels(uv_pairs, labels)
+        if self.label_journal.num_records >= self.label_compaction_threshold:
+            self._label_compaction_requested.set()
+        return num_conflicts
+
+    def revert_labels(self, version):
+        '''
+        Restore labels of `version' by submitting all changes since then as a new list of edge labels (journaled like
+        any other list of labels). Costs time proportional to the number of changes since `version'.
+
+        :return: new label version
+        '''
+        with self.label_lock:
+            uv_pairs, labels = self.workflow.diff_labels(self.workflow.get_label_version(), version)
+            self.set_edge_labels(uv_pairs, labels)
+            self.logger.info('Reverted labels to version %d (%d changes)', version, labels.size)
+            return self.workflow.get_label_version()
+
+    def save_checkpoint(self, state=None):
+        '''
+        Atomically persist classifier, merge probabilities and solution of `state' (defaults to latest successful state)
+        so that they can be served immediately after a restart.
+
+        :return: 0 on success, 1 if no data is available, 2 if the classifier was released (nothing is written)
+        '''
+        state = self.workflow.get_latest_state() if state is None else state
+
+        if state is None or state.solution is None:
+            return 1
+
+        if state.random_forest.get_model() is None:
+            # classifier was released on eviction after the state was checkpointed
+            return 2
+
+        with self.save_lock, self.workflow.metrics.time('serialize/checkpoint'):
+            save_state_checkpoint(self.checkpoint_file, state)
+
+        return 0
+
     def save_ground_truth(self):
-        state = self.workflow.get_latest_state()
+        return self.compact_labels()
 
-        if state is None:
-            return 1
+    def compact_labels(self):
+        '''
+        Write all current labels into `ground-truth.n5' and move the label journal records that it supersedes into
+        the label history. Label versions that are older than the last `label_history_versions' versions are dropped
+        from the label history.
+
+        :return: 0 on success, 1 if no labels are available
+        '''
+        with self.save_lock:
+            with self.label_lock:
+                # snapshot and rotation must be atomic with respect to incoming labels
+                uv_pairs, labels = self.workflow.get_labeled_uv_pairs()
+                version          = self.workflow.get_label_version()
+                if labels.size == 0:
+                    return 1
+                segments = self._label_journal_segments()
+                if self.label_journal.num_records == 0 and len(segments) == 0 and os.path.isdir(self.ground_truth_directory):
+                    # nothing new since last compaction
+                    return 0
+                if self.label_journal.num_records > 0:
+                    # each record is a label version, segments are named by the version of their first record
+                    segment = '%s.%09d' % (self.label_journal_file, version - self.label_journal.num_records + 1)
+                    self.label_journal.rotate(segment)
+                    segments.append(segment)
+
+            self.logger.debug('Compacting %d labels from %s into %s', labels.size, segments, self.ground_truth_directory)
+            self._write_ground_truth(uv_pairs, labels, version)
+            os.makedirs(self.label_history_directory, exist_ok=True)
+            for segment in segments:
+                os.replace(segment, os.path.join(self.label_history_directory, os.path.basename(segment)))
+            self._prune_label_history(version)
+
+        return 0
 
+    def _prune_label_history(self, version):
+        '''
+        Move the base of the label history to the newest segment boundary that is at least `label_history_versions'
+        versions before `version': write the labels of that version into `base.n5' in the label history and remove
+        all segments before it.
+        '''
+        history  = self.workflow.label_history
+        segments = self._label_journal_segments(self.label_history_directory)
+        firsts   = [int(segment.rsplit('.', 1)[-1]) for segment in segments]
+        # the base must be a version that the label history can still reproduce
+        candidates = [b for b in [first - 1 for first in firsts] + [version] if b >= history.base]
+        if self.label_history_versions is None:
+            base_version = min(candidates)
+        else:
+            outdated     = [b for b in candidates if b <= version - self.label_history_versions]
+            base_version = max(outdated) if len(outdated) > 0 else min(candidates)
+
+        base = self._read_label_snapshot(self.label_history_base_directory)
+        # version 0 has no labels and does not need a base
+        if base_version > 0 and (base is None or base[2] != base_version):
+            self.logger.debug('Moving base of label history %s to version %d', self.label_history_directory, base_version)
+            self._write_label_snapshot(self.label_history_base_directory, *history.snapshot(base_version), version=base_version)
+        for segment, first in zip(segments, firsts):
+            if first <= base_version:
+                os.remove(segment)
+        if base_version > history.base:
+            history.truncate(base_version)
+
+    def _label_journal_segments(self, directory=None):
+        '''
+        :return: label journal segments in `directory' (server directory if `None') in order of their first version
+        '''
+        directory = self.directory if directory is None else directory
+        if not os.path.isdir(directory):
+            return []
+        prefix = os.path.basename(self.label_journal_file) + '.'
+        suffixes = sorted((f[len(prefix):] for f in os.listdir(directory) if f.startswith(prefix) and f[len(prefix):].isdigit()), key=int)
+        return [os.path.join(directory, prefix + suffix) for suffix in suffixes]
+
+    def _compact_labels_in_background(self):
+        while not self._label_compaction_stopped.is_set():
+            self._label_compaction_requested.wait(timeout=self.label_compaction_interval)
+            self._label_compaction_requested.clear()
+            if self._label_compaction_stopped.is_set():
+                break
+            try:
+                self.compact_labels()
+            except Exception as e:
+                self.logger.error('Unable to compact labels into %s: %s', self.ground_truth_directory, e)
+
+    def _restore_labels(self):
+        '''
+        Restore labels and label versions: load the labels of `ground-truth.n5' in a single update as the version at
+        which they were compacted, and replay only journal records after that version, each as the next label
+        version. Earlier versions are restored from the label history (labels in `base.n5' and all compacted segments
+        after it) without replaying them. Ground truth that was written before label versions existed becomes version
+        `1'. Without (consistent) label history, earlier versions are not available.
+
+        :return: number of restored labels
+        '''
+        history = self._read_label_history()
+        ground_truth = self._read_ground_truth()
+        if ground_truth is None:
+            uv_pairs, labels, version = np.empty((0, 2), dtype=np.uint64), np.empty((0,), dtype=np.int32), 0
+        else:
+            uv_pairs, labels, version = ground_truth
+            # ground truth without label version predates label versions
+            version = (1 if labels.size > 0 else 0) if version is None else version
+        if history.version != version:
+            if os.path.isdir(self.label_history_directory):
+                self.logger.warning('Label history %s ends at version %d but ground truth %s is version %d, dropping label history', self.label_history_directory, history.version, self.ground_truth_directory, version)
+                shutil.rmtree(self.label_history_directory)
+            history.load(uv_pairs, labels, version)
+
+        if labels.size > 0:
+            self.logger.info('Loading %d persisted labels of version %d from %s', labels.size, version, self.ground_truth_directory)
+        self.workflow.restore_labels(uv_pairs, labels, history)
+        num_labels = labels.size
+
+        for journal in self._label_journal_segments() + [self.label_journal_file]:
+            batches = read_label_journal_batches(journal)
+            # segments that were not moved into the label history yet may already be part of the ground truth
+            first   = int(journal.rsplit('.', 1)[-1]) if journal != self.label_journal_file else history.version + 1
+            batches = batches[max(history.version + 1 - first, 0):]
+            if len(batches) > 0:
+                self.logger.info('Loading %d persisted labels in %d batches from %s', sum(labels.size for _, labels in batches), len(batches), journal)
+            for uv_pairs, labels in batches:
+                # every batch is a version, even if it is empty
+                self.workflow._set_edge_labels(uv_pairs, labels)
+                num_labels += labels.size
+        return num_labels
+
+    def _read_label_history(self):
+        '''
+        :return: :class:`LabelHistory` with the labels of `base.n5' in the label history and all compacted segments
+                 after it, up to the first missing version
+        '''
+        history = LabelHistory()
+        base    = self._read_label_snapshot(self.label_history_base_directory)
+        if base is not None:
+            history.load(*base)
+        for segment in self._label_journal_segments(self.label_history_directory):
+            first   = int(segment.rsplit('.', 1)[-1])
+            batches = read_label_journal_batches(segment)
+            if first > history.version + 1:
+                break
+            for uv_pairs, labels in batches[history.version + 1 - first:]:
+                history.record(uv_pairs, labels)
+        return history
+
+    def _read_ground_truth(self):
+        '''
+        :return: tuple of uv-pairs, labels, and label version (`None' if not stored) of the persisted ground truth, or
+                 `None'
+        '''
+        return self._read_label_snapshot(self.ground_truth_directory)
+
+    def _write_ground_truth(self, uv_pairs, labels, version=0):
+        self._write_label_snapshot(self.ground_truth_directory, uv_pairs, labels, version=version)
+
+    def _read_label_snapshot(self, path):
+        '''
+        :return: tuple of uv-pairs, labels, and label version (`None' if not stored) of the labels in N5 container
+                 `path', or `None'
+        '''
+        for snapshot in (path, path + '.old'):
+            # `.old' only remains if a previous write was interrupted
+            if os.path.isdir(snapshot):
+                with z5py.File(snapshot, 'r') as f:
+                    version = f.attrs[_LABEL_VERSION_KEY] if _LABEL_VERSION_KEY in f.attrs else None
+                    return f['edges'][...], f['labels'][...], version
+        return None
+
+    def _write_label_snapshot(self, path, uv_pairs, labels, version=0):
         save_tmp_dir = os.path.join(self.directory, 'tmp')
         os.makedirs(save_tmp_dir, exist_ok=True)
-        tmp_dir = tempfile.mkdtemp(prefix='ground-truth-', suffix='.n5', dir=save_tmp_dir)
-        labels = state.labels
-        uv_pairs = state.uv_pairs
+        tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(path)[:-len('.n5')] + '-', suffix='.n5', dir=save_tmp_dir)
         with z5py.File(tmp_dir, 'w') as f:
             f.create_dataset('labels', data=labels)
             f.create_dataset('edges', data=uv_pairs)
+            # label version of the snapshot, later journal records continue from it
+            f.attrs[_LABEL_VERSION_KEY] = version
 
-        ground_truth = self.ground_truth_directory
+        previous = path + '.old'
         with self.save_lock:
-            while os.path.exists(ground_truth):
-                try:
-                    os.rename(ground_truth, ground_truth + '.' + datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-                except OSError as e:
-                    # 39: Directory not empty
-                    # 17: File exists
-                    if e.errno not in (17, 39):
-                        raise e
-
-            os.rename(tmp_dir, ground_truth)
-
-        return 0
+            if os.path.exists(previous):
+                shutil.rmtree(previous)
+            if os.path.exists(path):
+                os.rename(path, previous)
+            os.rename(tmp_dir, path)
+            if os.path.exists(previous):
+                shutil.rmtree(previous)
 
 
 
@@ -398,7 +1211,21 @@ def server_main(argv=None):
     parser.add_argument('--container', required=True, help='N5 FS Container with group that contains edges as pairs of fragment labels and features')
     parser.add_argument('--paintera-dataset', required=True, help=f'Paintera dataset inside CONTAINER that also contains datasets `{_EDGE_DATASET}\' and `{_EDGE_FEATURE_DATASET}\'')
     parser.add_argument('--directory', required=False, help='Directory for ipc sockets and serialization of server state.', default='pias')
-    parser.add_argument('--num-io-threads', required=False, type=int, default=1)
+    parser.add_argument('--num-io-threads', required=False, type=int, default=1, help='Number of zmq I/O threads, also the number of cores reserved for serving requests (see --cores).')
+    parser.add_argument('--cores', type=int, default=None, help='Number of cores of the server (default: all available). Cores that are not reserved for serving (--num-io-threads) are split between training, prediction, and solving (see /api/resources).')
+    parser.add_argument('--solution-n5', action='store_true', help='Write each new solution into chunked fragment-segment lookup dataset in `solution.n5\' in DIRECTORY.')
+    parser.add_argument('--solution-n5-write-all-chunks', action='store_true', help='Write all chunks of each solution instead of only those that changed (requires --solution-n5).')
+    parser.add_argument('--shared-solution-file', action='store_true', help='Write each new solution into memory-mapped file `solution.bin\' in DIRECTORY for zero-copy access by clients on the same host.')
+    parser.add_argument('--solver', required=False, choices=sorted(SOLVERS), default=None, help='Multicut solver (default: kernighan-lin if nifty is available, greedy-additive otherwise). greedy-additive does not require nifty.')
+    parser.add_argument('--workers', action='store_true', help='Accept workers (see pias-worker) at ${DIRECTORY}/server-workers for prediction and multicut. Without connected workers, everything is computed in the server process.')
+    parser.add_argument('--record-requests', action='store_true', help='Record all labels, update requests, solution fetches, and solutions into `requests-TIMESTAMP.log\' in DIRECTORY for replay with pias-replay.')
+    parser.add_argument('--dump-instances', action='store_true', help='Dump each solved multicut instance (edges, costs, known labels, solution, energy, solve time) into `instances\' in DIRECTORY for pias-benchmark-instances.')
+    parser.add_argument('--dump-instances-min-seconds', type=float, default=0., help='Only dump instances that took at least this many seconds to solve (requires --dump-instances).')
+    parser.add_argument('--solution-cache-megabytes', type=float, default=256., help='Keep classifiers and solutions of recently solved label sets in up to this much memory (MB) to serve repeated label sets (e.g. after undo) without training and solving.')
+    parser.add_argument('--solution-cache-disk-size', type=int, default=64, help='Spill up to this many cached solutions into `solution-cache\' in DIRECTORY (0 to drop them instead).')
+    parser.add_argument('--label-history-versions', type=int, default=10000, help='Keep this many label versions in `label-history\' in DIRECTORY to diff and revert labels after a restart (older versions are dropped when labels are compacted into `ground-truth.n5\').')
+    parser.add_argument('--latency-target', type=float, default=None, help='Adapt number of trees and depth of the random forest, prediction chunks, and multicut solver to each update such that solution updates take at most this many seconds (see /api/settings).')
+    parser.add_argument('--sessions', action='store_true', help='Allow independent labeling sessions that share edges and features (see /api/session/open/NAME).')
     parser.add_argument('--log-level', required=False, choices=log_levels, default='INFO')
     parser.add_argument('--version', action='version', version=f'{version}')
 
@@ -413,7 +1240,23 @@ def server_main(argv=None):
             n5_container=args.container,
             paintera_dataset=args.paintera_dataset,
             next_solution_id=0,
-            directory=args.directory)
+            directory=args.directory,
+            shared_solution_file=args.shared_solution_file,
+            solution_n5=args.solution_n5,
+            solution_n5_only_changed_chunks=not args.solution_n5_write_all_chunks,
+            solver=args.solver,
+            workers=args.workers,
+            record_requests=args.record_requests,
+            dump_instances=args.dump_instances,
+            dump_instances_min_seconds=args.dump_instances_min_seconds,
+            sessions=args.sessions,
+            solution_cache_megabytes=args.solution_cache_megabytes,
+            solution_cache_disk_size=args.solution_cache_disk_size,
+            label_history_versions=args.label_history_versions,
+            latency_target=args.latency_target,
+            cores=args.cores,
+            reserved_cores=args.num_io_threads)
+        server.cpu_budget.limit_native_threads()
 
         def sigint_handler(signum, frame):
             logger.debug('Signal handler called with signal %s', signum)
@@ -429,44 +1272,3 @@ def server_main(argv=None):
         context.destroy()
 
     # TODO add handler to shutdown server on ctrl-c
-
-def client_cli_main(argv=None):
-    import argparse
-    import sys
-    from . import version
-
-    _logger = logging.getLogger(__name__)
-
-    parser = argparse.ArgumentParser()
-    parser.add_argument('endpoint')
-    parser.add_argument('--address', required=True, help='base address of server for which help is requested')
-    parser.add_argument('--version', action='version', version=f'{version}')
-    parser.add_argument('--log-level', required=False, choices=log_levels, default='INFO')
-
-    args = parser.parse_args(args=argv)
-
-    logging.basicConfig(level=logging.getLevelName(args.log_level))
-
-    context = zmq.Context(1)
-    socket = context.socket(zmq.REQ)
-    socket.connect(args.address)
-    socket.send_string(args.endpoint)
-    response_code = recv_int(socket)
-
-    if response_code != API_RESPONSE_OK:
-        _logger.error('Received non-zero return code %d', response_code)
-        sys.exit(response_code)
-
-    for i in range(0, recv_int(socket)):
-        message_type = recv_int(socket)
-        if message_type == API_RESPONSE_DATA_STRING:
-            data = socket.recv_string()
-        elif message_type == API_RESPONSE_DATA_INT:
-            data = recv_int(socket)
-        elif message_type == API_RESPONSE_DATA_BYTES or API_RESPONSE_DATA_UNKNOWN:
-            data = socket.recv()
-        else:
-            raise Exception('Do not understand message type %d', message_type)
-        print(data)
-
-
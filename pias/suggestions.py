@@ -0,0 +1,85 @@
+import heapq
+
+import numpy as np
+
+# measures of classifier uncertainty for each edge, see :func:`uncertainty`
+UNCERTAINTY_MEASURES = ('probability', 'cost')
+
+
+def uncertainty(measure, merge_probabilities=None, costs=None):
+    '''
+    :param measure: `probability': merge probability close to 0.5 (`1 - 2 |p - 0.5|'); for fully grown random forests
+                    this is the disagreement of the votes of the trees. `cost': multicut cost close to zero
+                    (`-|cost|'), i.e. edges that barely influence the solution.
+    :return: uncertainty of each edge (higher is more uncertain)
+    '''
+    if measure == 'probability':
+        return 1. - 2. * np.abs(np.asarray(merge_probabilities, dtype=np.float64) - 0.5)
+    if measure == 'cost':
+        return -np.abs(np.asarray(costs, dtype=np.float64))
+    raise ValueError('Unknown uncertainty measure `{}\' (expected one of {})'.format(measure, ', '.join(UNCERTAINTY_MEASURES)))
+
+
+class EdgeSuggestions(object):
+    '''
+    Edges in order of decreasing uncertainty, for active learning: the most uncertain edges are the most informative
+    ones to label next. Built once per solution; :meth:`top` then costs `O(k)' for all edges and `O(f + k log f)' for
+    edges incident to `f' fragments (plus edges that are skipped because they were labeled in the meantime). The
+    incident edges of each fragment are kept in compressed sparse row layout, ordered by uncertainty.
+
+    :param labeled: edge ids that are never suggested, e.g. the labels that the classifier was trained on
+    '''
+
+    def __init__(self, edges, uncertainty, labeled=()):
+        super(EdgeSuggestions, self).__init__()
+        edges       = np.asarray(edges, dtype=np.uint64).reshape(-1, 2)
+        uncertainty = np.asarray(uncertainty, dtype=np.float64)
+        candidates  = np.ones(edges.shape[0], dtype=bool)
+        candidates[np.asarray(labeled, dtype=np.int64)] = False
+        candidates  = np.flatnonzero(candidates)
+        # most uncertain first, ties in order of edge ids
+        self.order       = candidates[np.argsort(-uncertainty[candidates], kind='stable')]
+        self.uncertainty = uncertainty[self.order]
+
+        # incident edges of each fragment in order of uncertainty (rank in self.order)
+        ends                = np.concatenate((edges[self.order, 0], edges[self.order, 1])).astype(np.int64)
+        ranks               = np.tile(np.arange(self.order.size, dtype=np.int64), 2)
+        number_of_nodes     = ends.max().item() + 1 if ends.size > 0 else 0
+        self.indptr         = np.zeros(number_of_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ends, minlength=number_of_nodes), out=self.indptr[1:])
+        self.incident_ranks = ranks[np.lexsort((ranks, ends))]
+
+    def arrays(self):
+        return [self.order, self.uncertainty, self.indptr, self.incident_ranks]
+
+    def top(self, k, fragments=None, skip=()):
+        '''
+        :param k: maximum number of edges
+        :param fragments: only suggest edges incident to any of these fragments (all edges if `None')
+        :param skip: container of edge ids (e.g. dict of labeled edges) that are not suggested
+        :return: tuple of up to `k' edge ids and their uncertainty, most uncertain first
+        '''
+        ranks = []
+        if fragments is None:
+            for rank in range(self.order.size):
+                if len(ranks) >= k:
+                    break
+                if self.order[rank].item() not in skip:
+                    ranks.append(rank)
+        else:
+            # k-way merge of the (ordered) incident edges of all fragments
+            fragments = np.unique(np.asarray(fragments, dtype=np.uint64))
+            fragments = fragments[fragments < self.indptr.size - 1].astype(np.int64).tolist()
+            heads     = [(self.incident_ranks[self.indptr[f]].item(), self.indptr[f].item(), self.indptr[f + 1].item()) for f in fragments if self.indptr[f] < self.indptr[f + 1]]
+            heapq.heapify(heads)
+            while len(heads) > 0 and len(ranks) < k:
+                rank, position, stop = heads[0]
+                if position + 1 < stop:
+                    heapq.heapreplace(heads, (self.incident_ranks[position + 1].item(), position + 1, stop))
+                else:
+                    heapq.heappop(heads)
+                # edges between two of the fragments are seen twice in a row
+                if (len(ranks) == 0 or ranks[-1] != rank) and self.order[rank].item() not in skip:
+                    ranks.append(rank)
+        ranks = np.array(ranks, dtype=np.int64)
+        return self.order[ranks], self.uncertainty[ranks]
@@ -0,0 +1,169 @@
+from .pias_logging import logging
+
+import concurrent.futures
+import pickle
+import struct
+import time
+
+import numpy as np
+import zmq
+
+from .zmq_util.util import _bytes_as_int, _int_as_bytes
+
+# Protocol between worker pool (ROUTER) and workers (DEALER). Each message is a multipart message that starts with a
+# command, integers are big endian 32 bit integers, arrays are sent as big endian data (see _array_frames).
+#
+# pool -> worker:
+#   DATA     data version, edges (3 frames), edge features (3 frames)
+#   MODEL    model version, pickled classifier
+#   PREDICT  task id, data version, model version, start, stop
+#   SOLVE    task id, solver, number of nodes, uv-ids (3 frames), costs (3 frames)
+#   SHUTDOWN
+# worker -> pool:
+#   HEARTBEAT                     (sent every heartbeat interval, also while a task is running)
+#   RESULT   task id, result (3 frames)
+#   ERROR    task id, message
+DATA      = b'DATA'
+MODEL     = b'MODEL'
+PREDICT   = b'PREDICT'
+SOLVE     = b'SOLVE'
+SHUTDOWN  = b'SHUTDOWN'
+HEARTBEAT = b'HEARTBEAT'
+RESULT    = b'RESULT'
+ERROR     = b'ERROR'
+
+
+def _array_frames(array):
+    '''
+    :return: three frames: dtype (big endian numpy dtype string), shape (big endian uint64), data (big endian)
+    '''
+    array = np.ascontiguousarray(array)
+    data  = array.astype(array.dtype.newbyteorder('>'), copy=False)
+    return [data.dtype.str.encode('ascii'), struct.pack('>%dQ' % array.ndim, *array.shape), data]
+
+
+def _frames_array(frames):
+    dtype = np.dtype(bytes(frames[0]).decode('ascii'))
+    shape = struct.unpack('>%dQ' % (len(frames[1]) // 8), bytes(frames[1]))
+    return np.frombuffer(frames[2], dtype=dtype).reshape(shape).astype(dtype.newbyteorder('='))
+
+
+class Worker(object):
+    '''
+    Connect to a worker pool (see :class:`pias.worker_pool.WorkerPool`) and run prediction chunks and multicut
+    problems that are submitted by the pool. Edges and edge features are received once per data version, classifiers
+    once per model version. Tasks run in a background thread so that heartbeats are sent while they run: the pool
+    only re-submits tasks of workers that went silent.
+    '''
+
+    def __init__(self, context, address, heartbeat_interval=1., poll_interval=0.01):
+        super(Worker, self).__init__()
+        self.logger             = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+        self.context            = context
+        self.address            = address
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval      = poll_interval
+        self.data_version       = None
+        self.edges              = None
+        self.edge_features      = None
+        self.model_version      = None
+        self.model              = None
+        self.running            = False
+        # task id and future of the running task, the socket is only used by the thread that calls run()
+        self.task               = None
+        self.executor           = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='worker-task')
+
+    def run(self):
+        socket = self.context.socket(zmq.DEALER)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(self.address)
+        self.logger.info('Connected worker to %s', self.address)
+        self.running = True
+        try:
+            socket.send(HEARTBEAT)
+            last_heartbeat = time.monotonic()
+            while self.running:
+                # poll frequently while a task is running to send its result without delay
+                timeout = self.heartbeat_interval if self.task is None else min(self.poll_interval, self.heartbeat_interval)
+                if socket.poll(timeout=int(timeout * 1000)) != 0:
+                    self._handle(socket, socket.recv_multipart(copy=False))
+                if self.task is not None and self.task[1].done():
+                    self._send_result(socket)
+                if time.monotonic() - last_heartbeat >= self.heartbeat_interval:
+                    socket.send(HEARTBEAT)
+                    last_heartbeat = time.monotonic()
+        finally:
+            self.executor.shutdown(wait=False)
+            socket.close()
+            self.logger.info('Disconnected worker from %s', self.address)
+
+    def stop(self):
+        self.running = False
+
+    def _handle(self, socket, frames):
+        command = frames[0].bytes
+        if command == DATA:
+            self.data_version  = _bytes_as_int(frames[1].bytes)
+            self.edges         = _frames_array(frames[2:5])
+            self.edge_features = _frames_array(frames[5:8])
+            self.logger.debug('Received data version %d with %d edges', self.data_version, self.edges.shape[0])
+        elif command == MODEL:
+            self.model_version = _bytes_as_int(frames[1].bytes)
+            self.model         = pickle.loads(frames[2].bytes)
+            self.logger.debug('Received model version %d', self.model_version)
+        elif command in (PREDICT, SOLVE):
+            task_id = _bytes_as_int(frames[1].bytes)
+            if self.task is not None:
+                socket.send_multipart([ERROR, _int_as_bytes(task_id), ('Busy with task %d' % self.task[0]).encode('utf-8')])
+                return
+            self.task = (task_id, self.executor.submit(self._predict if command == PREDICT else self._solve, frames))
+        elif command == SHUTDOWN:
+            self.running = False
+        else:
+            self.logger.warning('Ignoring unknown command %s', command)
+
+    def _send_result(self, socket):
+        task_id, future = self.task
+        self.task       = None
+        try:
+            socket.send_multipart([RESULT, _int_as_bytes(task_id)] + _array_frames(future.result()), copy=False)
+        except Exception as e:
+            self.logger.error('Unable to run task %d: %s', task_id, e, exc_info=True)
+            socket.send_multipart([ERROR, _int_as_bytes(task_id), str(e).encode('utf-8')])
+
+    def _predict(self, frames):
+        data_version, model_version, start, stop = (_bytes_as_int(f.bytes) for f in frames[2:6])
+        if data_version != self.data_version or model_version != self.model_version:
+            raise Exception('Expected data version %d and model version %d but have %s and %s' % (data_version, model_version, self.data_version, self.model_version))
+        return self.model.predict_proba(self.edge_features[start:stop])[..., 1].astype(np.float32)
+
+    def _solve(self, frames):
+        # deferred: imports nifty if available
+        from .agglomeration_model import solve_multicut_uv
+        solver          = frames[2].bytes.decode('utf-8')
+        number_of_nodes = _bytes_as_int(frames[3].bytes)
+        uv_ids          = _frames_array(frames[4:7])
+        costs           = _frames_array(frames[7:10])
+        return np.asarray(solve_multicut_uv(number_of_nodes, uv_ids, costs, solver=solver), dtype=np.uint64)
+
+
+def worker_main(argv=None):
+    import argparse
+    import signal
+    from . import version
+    parser = argparse.ArgumentParser(description='Run prediction and multicut tasks for a pias server started with --workers.')
+    parser.add_argument('--address', required=True, help='Worker address of the server: ${address_base}-workers (see /help of server).')
+    parser.add_argument('--heartbeat-interval', type=float, default=1., help='Send heartbeat every this many seconds, also while running tasks.')
+    parser.add_argument('--log-level', required=False, choices=('DEBUG', 'INFO', 'WARN', 'ERROR'), default='INFO')
+    parser.add_argument('--version', action='version', version=f'{version}')
+    args = parser.parse_args(args=argv)
+    logging.basicConfig(level=logging.getLevelName(args.log_level))
+
+    context = zmq.Context(1)
+    worker  = Worker(context, args.address, heartbeat_interval=args.heartbeat_interval)
+    signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    try:
+        worker.run()
+    finally:
+        context.term()
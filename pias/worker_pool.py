@@ -0,0 +1,334 @@
+from .pias_logging import logging
+
+import collections
+import concurrent.futures
+import itertools
+import pickle
+import queue
+import threading
+import time
+
+import numpy as np
+import zmq
+
+from .graph import connected_components
+from .server import StartStop
+from .worker import DATA, MODEL, PREDICT, SOLVE, SHUTDOWN, HEARTBEAT, RESULT, ERROR, _array_frames, _frames_array
+from .zmq_util.util import _bytes_as_int, _int_as_bytes
+
+
+class WorkerPoolError(Exception):
+    pass
+
+
+class NoWorkersAvailable(WorkerPoolError):
+
+    def __init__(self):
+        super(NoWorkersAvailable, self).__init__('No workers connected')
+
+
+class WorkerTaskFailed(WorkerPoolError):
+
+    def __init__(self, task_id, attempts, reason):
+        super(WorkerTaskFailed, self).__init__('Task %d failed after %d attempts: %s' % (task_id, attempts, reason))
+        self.task_id  = task_id
+        self.attempts = attempts
+        self.reason   = reason
+
+
+class _Task(object):
+
+    def __init__(self, task_id, command, frames, data_version=None, model=None):
+        super(_Task, self).__init__()
+        self.task_id      = task_id
+        self.command      = command
+        self.frames       = frames
+        self.data_version = data_version
+        # tuple of model version and pickled model, or `None'
+        self.model        = model
+        self.future       = concurrent.futures.Future()
+        self.attempts     = 0
+
+
+class _WorkerState(object):
+
+    def __init__(self, identity, now):
+        super(_WorkerState, self).__init__()
+        self.identity      = identity
+        self.last_seen     = now
+        self.data_version  = None
+        self.model_version = None
+        self.task          = None
+        self.started       = None
+
+
+class WorkerPool(StartStop):
+    '''
+    Broker for :class:`pias.worker.Worker` processes that connect to a zmq ROUTER socket at `address'. Edges and edge
+    features are sent to each worker once per :meth:`set_data`, classifiers once per version. Tasks are queued and
+    dispatched to idle workers. Workers send heartbeats, also while they run a task: workers that have not been heard
+    of for `heartbeat_timeout' seconds are dropped and their tasks are re-submitted, as are tasks of workers that
+    report an error or, if `task_timeout' is not `None', do not respond within `task_timeout' seconds (up to
+    `max_retries' times). Long tasks of workers that keep sending heartbeats are not interrupted.
+
+    :meth:`predict` and :meth:`solve` block until all of their tasks are done and raise :class:`WorkerPoolError` if
+    any task fails. All socket operations happen in the broker thread.
+    '''
+
+    def __init__(self, address, task_timeout=None, max_retries=3, heartbeat_timeout=10., poll_timeout=0.01):
+        super(WorkerPool, self).__init__()
+        self.logger            = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+        self.address           = address
+        self.task_timeout      = task_timeout
+        self.max_retries       = max_retries
+        self.heartbeat_timeout = heartbeat_timeout
+        self.poll_timeout      = poll_timeout
+        self.submissions       = queue.Queue()
+        self.pending           = collections.deque()
+        self.workers           = {}
+        self.worker_count      = 0
+        self.task_ids          = itertools.count()
+        self.model_versions    = itertools.count()
+        self.lock              = threading.RLock()
+        self.data_version      = -1
+        # edges and edge features are serialized when they are sent, references only
+        self.data              = None
+        self.num_samples       = 0
+        self.socket            = None
+        self.thread            = None
+        self.running           = False
+
+    def start(self, context):
+        if self.running:
+            raise Exception('Worker pool already bound!')
+        self.socket = context.socket(zmq.ROUTER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.bind(self.address)
+        self.running = True
+        self.thread  = threading.Thread(target=self._broker, name='worker-pool-on-%s' % self.address, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        self.thread = None
+
+    def num_workers(self):
+        return self.worker_count
+
+    def set_data(self, edges, edge_features):
+        '''
+        Share `edges' and `edge_features' with all workers. Workers receive the data before their next prediction task.
+        Only references are kept, pass `None' to release them (e.g. when edges and features are evicted).
+        '''
+        with self.lock:
+            self.data_version += 1
+            self.data          = None if edges is None or edge_features is None else (edges, edge_features)
+            self.num_samples   = 0 if self.data is None else np.shape(edge_features)[0]
+            self.logger.debug('Updated worker data to version %d with %d samples', self.data_version, self.num_samples)
+
+    def predict(self, model, num_chunks=None):
+        '''
+        :param model: classifier with `predict_proba', e.g. `sklearn.ensemble.RandomForestClassifier'
+        :param num_chunks: split edge features into this many prediction tasks, twice the number of workers if `None'
+        :return: probabilities of second class for all edge features (`float32')
+        '''
+        if self.num_workers() == 0:
+            raise NoWorkersAvailable()
+        with self.lock:
+            data_version = self.data_version
+            num_samples  = self.num_samples
+            has_data     = self.data is not None
+        if not has_data:
+            raise WorkerPoolError('No data set')
+        num_chunks = 2 * self.num_workers() if num_chunks is None else num_chunks
+        bounds     = np.linspace(0, num_samples, max(min(num_chunks, num_samples), 1) + 1).astype(np.int64)
+        model      = (next(self.model_versions), pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+        tasks      = [
+            self._submit(PREDICT, [_int_as_bytes(data_version), _int_as_bytes(model[0]), _int_as_bytes(start), _int_as_bytes(stop)], data_version=data_version, model=model)
+            for start, stop in zip(bounds[:-1], bounds[1:])]
+        return np.concatenate([self._result(task) for task in tasks]).astype(np.float32, copy=False)
+
+    def solve(self, number_of_nodes, uv_ids, costs, solver, num_tasks=None):
+        '''
+        Split the multicut problem into the connected components of the subgraph of attractive edges, which can be
+        solved independently: edges between these components are always cut. Components are packed into `num_tasks'
+        tasks of similar numbers of edges (twice the number of workers if `None').
+
+        :param solver: key in :data:`pias.agglomeration_model.SOLVERS`
+        :return: segment id for each node (`uint64')
+        '''
+        if self.num_workers() == 0:
+            raise NoWorkersAvailable()
+        uv_ids     = np.asarray(uv_ids, dtype=np.int64).reshape(-1, 2)
+        costs      = np.asarray(costs, dtype=np.float64)
+        components = connected_components(number_of_nodes, uv_ids[costs > 0])
+        internal   = components[uv_ids[:, 0]] == components[uv_ids[:, 1]]
+        uv_ids     = uv_ids[internal]
+        costs      = costs[internal]
+        edge_components = components[uv_ids[:, 0]]
+
+        # pack components with internal edges into bins of similar numbers of edges: cut the components, largest first,
+        # into consecutive runs at equal fractions of the cumulative edge count
+        edge_counts = np.bincount(edge_components, minlength=components.max() + 1 if components.size > 0 else 0)
+        non_trivial = np.flatnonzero(edge_counts)
+        num_tasks   = min(2 * self.num_workers() if num_tasks is None else num_tasks, non_trivial.size)
+        by_size     = non_trivial[np.argsort(-edge_counts[non_trivial], kind='stable')]
+        sizes       = edge_counts[by_size]
+        boundaries  = sizes.sum() * np.arange(1, max(num_tasks, 1)) // max(num_tasks, 1)
+        bins        = np.full(edge_counts.size, -1, dtype=np.int64)
+        bins[by_size] = np.searchsorted(boundaries, np.cumsum(sizes) - sizes, side='right')
+
+        # group nodes and edges by bin (singletons in bin -1 first), nodes keep their order within each bin
+        node_bins   = bins[components]
+        edge_bins   = bins[edge_components]
+        node_order  = np.argsort(node_bins, kind='stable')
+        edge_order  = np.argsort(edge_bins, kind='stable')
+        node_bounds = np.searchsorted(node_bins[node_order], np.arange(-1, num_tasks + 1))
+        edge_bounds = np.searchsorted(edge_bins[edge_order], np.arange(num_tasks + 1))
+        local_ids   = np.empty(number_of_nodes, dtype=np.int64)
+        local_ids[node_order] = np.arange(number_of_nodes) - node_bounds[node_bins[node_order] + 1]
+        local_uv    = local_ids[uv_ids].astype(np.uint64)
+        solution    = np.empty(number_of_nodes, dtype=np.uint64)
+        tasks       = []
+        for index in range(num_tasks):
+            edges = edge_order[edge_bounds[index]:edge_bounds[index + 1]]
+            if edges.size == 0:
+                continue
+            nodes  = node_order[node_bounds[index + 1]:node_bounds[index + 2]]
+            frames = [solver.encode('utf-8'), _int_as_bytes(nodes.size)] + _array_frames(local_uv[edges]) + _array_frames(costs[edges])
+            tasks.append((nodes, self._submit(SOLVE, frames)))
+
+        offset = 0
+        for nodes, task in tasks:
+            _, segments     = np.unique(self._result(task), return_inverse=True)
+            segments        = segments.reshape(-1)
+            solution[nodes] = offset + segments.astype(np.uint64)
+            offset         += int(segments.max()) + 1 if segments.size > 0 else 0
+        # nodes without attractive edges are segments on their own
+        singletons           = node_order[node_bounds[0]:node_bounds[1]]
+        solution[singletons] = offset + np.arange(singletons.size, dtype=np.uint64)
+        self.logger.debug('Solved %d components in %d tasks', non_trivial.size, len(tasks))
+        return solution
+
+    def _submit(self, command, frames, data_version=None, model=None):
+        task = _Task(next(self.task_ids), command, frames, data_version=data_version, model=model)
+        self.submissions.put(task)
+        return task
+
+    def _result(self, task):
+        try:
+            return task.future.result()
+        except WorkerPoolError:
+            raise
+        except Exception as e:
+            raise WorkerTaskFailed(task.task_id, task.attempts, e)
+
+    def _broker(self):
+        socket  = self.socket
+        running = {}
+        try:
+            while self.running:
+                if socket.poll(timeout=int(self.poll_timeout * 1000)):
+                    while True:
+                        try:
+                            frames = socket.recv_multipart(flags=zmq.NOBLOCK, copy=False)
+                        except zmq.Again:
+                            break
+                        self._receive(frames, running)
+                while True:
+                    try:
+                        self.pending.append(self.submissions.get_nowait())
+                    except queue.Empty:
+                        break
+                self._expire(running)
+                self._dispatch(running)
+        finally:
+            for worker in self.workers.values():
+                socket.send_multipart([worker.identity, SHUTDOWN])
+            for task in itertools.chain(self.pending, running.values()):
+                task.future.set_exception(WorkerPoolError('Worker pool stopped'))
+            self.pending.clear()
+            socket.close()
+            self.socket = None
+
+    def _receive(self, frames, running):
+        identity = frames[0].bytes
+        command  = frames[1].bytes
+        now      = time.monotonic()
+        worker   = self.workers.get(identity)
+        if worker is None:
+            worker = self.workers[identity] = _WorkerState(identity, now)
+            self.worker_count = len(self.workers)
+            self.logger.info('Worker %s connected (%d workers)', identity.hex(), len(self.workers))
+        worker.last_seen = now
+        if command == HEARTBEAT:
+            return
+        if command not in (RESULT, ERROR):
+            self.logger.warning('Ignoring unknown command %s from worker %s', command, identity.hex())
+            return
+        task_id = _bytes_as_int(frames[2].bytes)
+        if worker.task is not None and worker.task.task_id == task_id:
+            worker.task = None
+        task = running.pop(task_id, None)
+        if task is None:
+            # already re-submitted after time out
+            return
+        if command == RESULT:
+            task.future.set_result(_frames_array(frames[3:6]))
+        else:
+            self._retry(task, frames[3].bytes.decode('utf-8'))
+
+    def _retry(self, task, reason):
+        if task.attempts > self.max_retries:
+            self.logger.error('Task %d failed after %d attempts: %s', task.task_id, task.attempts, reason)
+            task.future.set_exception(WorkerTaskFailed(task.task_id, task.attempts, reason))
+        else:
+            self.logger.warning('Re-submitting task %d after attempt %d: %s', task.task_id, task.attempts, reason)
+            self.pending.appendleft(task)
+
+    def _expire(self, running):
+        now = time.monotonic()
+        for identity, worker in list(self.workers.items()):
+            silent    = now - worker.last_seen > self.heartbeat_timeout
+            timed_out = worker.task is not None and self.task_timeout is not None and now - worker.started > self.task_timeout
+            if not silent and not timed_out:
+                continue
+            reason = 'no heartbeat for %s seconds' % self.heartbeat_timeout if silent else 'no response within %s seconds' % self.task_timeout
+            self.logger.info('Dropping worker %s: %s', identity.hex(), reason)
+            del self.workers[identity]
+            if worker.task is not None:
+                task, worker.task = worker.task, None
+                running.pop(task.task_id, None)
+                self._retry(task, 'worker %s: %s' % (identity.hex(), reason))
+        self.worker_count = len(self.workers)
+        if not self.workers:
+            while self.pending:
+                self.pending.popleft().future.set_exception(NoWorkersAvailable())
+
+    def _dispatch(self, running):
+        idle = [worker for worker in self.workers.values() if worker.task is None]
+        # serialized on first use: workers that need the data in this round share the frames, they are not kept
+        data_frames = None
+        while idle and self.pending:
+            task = self.pending.popleft()
+            with self.lock:
+                data_version, data = self.data_version, self.data
+            if task.data_version is not None and (task.data_version != data_version or data is None):
+                task.future.set_exception(WorkerPoolError('Data changed since submission of task %d' % task.task_id))
+                continue
+            worker = idle.pop()
+            if task.data_version is not None and worker.data_version != task.data_version:
+                if data_frames is None or data_frames[0] != data_version:
+                    data_frames = (data_version, _array_frames(np.asarray(data[0])) + _array_frames(np.asarray(data[1])))
+                self.socket.send_multipart([worker.identity, DATA, _int_as_bytes(task.data_version)] + data_frames[1], copy=False)
+                worker.data_version = task.data_version
+            if task.model is not None and worker.model_version != task.model[0]:
+                self.socket.send_multipart([worker.identity, MODEL, _int_as_bytes(task.model[0]), task.model[1]])
+                worker.model_version = task.model[0]
+            self.socket.send_multipart([worker.identity, task.command, _int_as_bytes(task.task_id)] + task.frames, copy=False)
+            task.attempts        += 1
+            worker.task           = task
+            worker.started        = time.monotonic()
+            running[task.task_id] = task
@@ -2,14 +2,33 @@ from __future__ import absolute_import
 
 from .pias_logging import logging
 
+import contextlib
+import os
 import queue
+import tempfile
 import threading
+import time
 
-from .agglomeration_model import MulticutAgglomeration
+import numpy as np
+
+from .agglomeration_model import MulticutAgglomeration, default_solver
+from .checkpoint import checkpoint_from_state
+from .cpu_budget import FIT, PREDICT, SOLVE
 from .edge_feature_cache import EdgeFeatureCache
 from .edge_labels import  EdgeLabelCache
+from .edge_values import COSTS, MERGE_PROBABILITIES, EncodedEdgeValues
+from .label_consistency import LabelConsistency
+from .label_history import LabelHistory
+from .latency_controller import LatencyController
+from .metrics import Metrics
+from .profiling import Profiler
 from .random_forest import LabelsInconsistency, ModelNotTrained, RandomForestModelCache
+from .region import solve_region
+from .solution_cache import label_fingerprint
+from .solution_index import SolutionIndex
+from .suggestions import EdgeSuggestions, uncertainty
 from .threading import AtomicInteger
+from .worker_pool import WorkerPoolError
 
 class State(object):
 
@@ -18,6 +37,7 @@ class State(object):
     RANDOM_FOREST_TRAINING_FAILED = 2
     MC_OPTIMIZATION_FAILED        = 3
     UNKNOWN_ERRROR                = 4
+    LABELS_INCONSISTENT           = 5
 
 
 
@@ -28,7 +48,14 @@ class State(object):
             graph,
             labeled_samples,
             random_forest_kwargs,
-            solution_id
+            solution_id,
+            previous_solution=None,
+            solver=None,
+            worker_pool=None,
+            metrics=None,
+            prediction_chunk_size=None,
+            cpu_budget=None,
+            edge_source=None
     ):
         self.logger = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
         self.edges              = edges
@@ -39,10 +66,28 @@ class State(object):
         self.indices            = labeled_samples[2]
         self.uv_pairs           = labeled_samples[3]
         self.random_forest      = RandomForestModelCache(labels=(0, 1), random_forest_kwargs=random_forest_kwargs)
-        self.agglomeration      = MulticutAgglomeration()
+        self.agglomeration      = MulticutAgglomeration(solver=solver, worker_pool=worker_pool)
+        self.worker_pool        = worker_pool
+        self.metrics            = Metrics() if metrics is None else metrics
         self.solution_id        = solution_id
-        self.solution_state     = None
-        self.solution           = None
+        self.previous_solution  = previous_solution
+        # predict edge features in chunks of this many edges (all at once if `None')
+        self.prediction_chunk_size = prediction_chunk_size
+        # optional pias.cpu_budget.CpuBudget that assigns threads to training, prediction, and solving
+        self.cpu_budget            = cpu_budget
+        # optional callable that returns (reloaded) edges after release()
+        self.edge_source           = edge_source
+        self.solution_state      = None
+        self.solution            = None
+        self.merge_probabilities = None
+        self.costs               = None
+        self.fit_seconds         = None
+        self.predict_seconds     = None
+        self.solve_seconds       = None
+        self.solution_index      = None
+        self.solution_index_lock = threading.Lock()
+        self.edge_suggestions    = {}
+        self.edge_values         = {}
 
     def compute(self):
 
@@ -50,17 +95,26 @@ class State(object):
 
             try:
                 self.logger.debug('Training random forest with samples %s and labels %s', self.samples, self.labels)
-                self.random_forest.train_model(samples=self.samples, labels=self.labels)
+                start = time.perf_counter()
+                with self.metrics.time('fit'), self._stage(FIT) as n_jobs:
+                    self.random_forest.train_model(samples=self.samples, labels=self.labels, n_jobs=n_jobs)
+                self.fit_seconds = time.perf_counter() - start
                 self.logger.debug('Trained random forest model')
             except LabelsInconsistency as e:
                 self.logger.error('Error training random forest %s: %s', type(e), e)
                 return State.RANDOM_FOREST_TRAINING_FAILED
 
             try:
-                probabilities = self.random_forest.predict(self.edge_features)
-                # do we need first or second class probabilities?
-                merge_probabilities = probabilities[..., 1]
-                self.solution = self.agglomeration.optimize(self.graph, merge_probabilities, known_labels=(self.indices, self.labels))
+                start = time.perf_counter()
+                with self.metrics.time('predict'), self._stage(PREDICT) as n_jobs:
+                    self.merge_probabilities = self._predict(n_jobs=n_jobs)
+                self.predict_seconds = time.perf_counter() - start
+                with self.metrics.time('costs'):
+                    self.costs = self.agglomeration.compute_costs(self.merge_probabilities, known_labels=(self.indices, self.labels))
+                start = time.perf_counter()
+                with self.metrics.time('solve'), self._stage(SOLVE):
+                    self.solution = self.agglomeration.optimize_costs(self.graph, self.costs, previous_solution=self.previous_solution)
+                self.solve_seconds = time.perf_counter() - start
                 return State.SUCCESS
             except Exception as e:
                 self.logger.error('Error when optimizing multi-cut model %s: %s', type(e), e)
@@ -71,6 +125,116 @@ class State(object):
 
 
 
+    def restore(self, checkpoint):
+        '''
+        Set classifier, merge probabilities, costs, and solution from `checkpoint' instead of computing them.
+
+        :param checkpoint: :class:`pias.checkpoint.StateCheckpoint` for the labels of this state
+        :return: :attr:`State.SUCCESS`
+        '''
+        self.random_forest.set_model(checkpoint.model)
+        self.merge_probabilities = checkpoint.merge_probabilities
+        self.costs               = self.agglomeration.compute_costs(checkpoint.merge_probabilities, known_labels=(self.indices, self.labels))
+        self.solution            = checkpoint.solution
+        return State.SUCCESS
+
+    def _stage(self, stage):
+        # number of threads for `stage', `None' (library defaults) without budget
+        return contextlib.nullcontext() if self.cpu_budget is None else self.cpu_budget.stage(stage)
+
+    def _predict(self, n_jobs=None):
+        num_edges  = self.edge_features.shape[0]
+        chunk_size = num_edges if self.prediction_chunk_size is None else max(self.prediction_chunk_size, 1)
+        if self.worker_pool is not None and self.worker_pool.num_workers() > 0:
+            try:
+                num_chunks = None if self.prediction_chunk_size is None else max(-(-num_edges // chunk_size), 2 * self.worker_pool.num_workers())
+                return self.worker_pool.predict(self.random_forest.get_model(), num_chunks=num_chunks)
+            except WorkerPoolError as e:
+                self.logger.warning('Unable to predict on workers, predicting locally: %s', e)
+        # do we need first or second class probabilities?
+        if chunk_size >= num_edges:
+            return self.random_forest.predict(self.edge_features, n_jobs=n_jobs)[..., 1].astype(np.float32)
+        probabilities = np.empty((num_edges,), dtype=np.float32)
+        for start in range(0, num_edges, chunk_size):
+            probabilities[start:start + chunk_size] = self.random_forest.predict(self.edge_features[start:start + chunk_size], n_jobs=n_jobs)[..., 1]
+        return probabilities
+
+    def release(self):
+        '''
+        Drop references to edges, edge features, graph, training samples, and classifier, e.g. when the dataset is
+        evicted (see :meth:`Workflow.evict`). Solution, costs, and solution index are kept to serve requests, edges are
+        requested from `edge_source' when needed (see :meth:`get_edges`).
+        '''
+        self.edges         = None
+        self.edge_features = None
+        self.graph         = None
+        self.samples       = None
+        self.random_forest.set_model(None)
+
+    def get_edges(self):
+        '''
+        :return: edges of this state, from `edge_source' after :meth:`release`
+        '''
+        edges = self.edges
+        return self.edge_source() if edges is None and self.edge_source is not None else edges
+
+    def arrays(self):
+        '''
+        :return: list of arrays held by this state
+        '''
+        indices = [a for s in list(self.edge_suggestions.values()) for a in s.arrays()] + [v.data for v in list(self.edge_values.values())]
+        return [a for a in (self.edges, self.edge_features, self.samples, self.merge_probabilities, self.costs, self.solution) if isinstance(a, np.ndarray)] + indices
+
+    def get_solution_index(self):
+        '''
+        :return: :class:`pias.solution_index.SolutionIndex` of solution, built on first call (`None' if no solution)
+        '''
+        with self.solution_index_lock:
+            if self.solution_index is None and self.solution is not None:
+                self.solution_index = SolutionIndex(self.solution)
+            return self.solution_index
+
+    def get_edge_values(self, quantity, encoding):
+        '''
+        :param quantity: :data:`pias.edge_values.MERGE_PROBABILITIES` or :data:`pias.edge_values.COSTS`
+        :param encoding: one of the encodings in :mod:`pias.edge_values`
+        :return: :class:`pias.edge_values.EncodedEdgeValues` of `quantity' for all edges, encoded on first call
+                 (`None' if no solution). Merge probabilities are quantized over `[0, 1]'.
+        '''
+        if quantity not in (MERGE_PROBABILITIES, COSTS):
+            raise ValueError('Unknown edge quantity %s (expected one of %s)' % (quantity, (MERGE_PROBABILITIES, COSTS)))
+        with self.solution_index_lock:
+            key = (quantity, encoding)
+            if key not in self.edge_values and self.solution is not None:
+                self.edge_values[key] = EncodedEdgeValues(
+                    self.merge_probabilities if quantity == MERGE_PROBABILITIES else self.costs,
+                    encoding,
+                    value_range=(0., 1.) if quantity == MERGE_PROBABILITIES else self._cost_range())
+            return self.edge_values.get(key)
+
+    def _cost_range(self):
+        # labeled edges have fixed costs of large magnitude that would dominate the quantization
+        unlabeled = np.ones(self.costs.shape, dtype=bool)
+        unlabeled[np.asarray(self.indices, dtype=np.int64)] = False
+        costs     = self.costs[unlabeled] if np.any(unlabeled) else self.costs
+        return (costs.min().item(), costs.max().item()) if costs.size > 0 else None
+
+    def get_edge_suggestions(self, measure='probability'):
+        '''
+        :param measure: one of :data:`pias.suggestions.UNCERTAINTY_MEASURES`
+        :return: :class:`pias.suggestions.EdgeSuggestions` of unlabeled edges by `measure', built on first call
+                 (`None' if no solution)
+        '''
+        with self.solution_index_lock:
+            if measure not in self.edge_suggestions and self.solution is not None:
+                self.edge_suggestions[measure] = EdgeSuggestions(
+                    self.get_edges(),
+                    uncertainty(measure, merge_probabilities=self.merge_probabilities, costs=self.costs),
+                    labeled=self.indices)
+            return self.edge_suggestions.get(measure)
+
+
+
 class Workflow(object):
     
     def __init__(
@@ -80,16 +244,64 @@ class Workflow(object):
             edge_feature_dataset,
             next_solution_id,
             n_estimators=100,
-            random_forest_kwargs=None):
+            random_forest_kwargs=None,
+            solver=None,
+            worker_pool=None,
+            profiler=None,
+            scheduler=None,
+            cache_directory=None,
+            edge_feature_cache=None,
+            solution_cache=None,
+            latency_target=None,
+            cpu_budget=None):
+        '''
+        :param scheduler: run updates on shared :class:`pias.scheduler.UpdateScheduler` instead of an own thread
+        :param cache_directory: keep edges and features in `.npy' files in this directory for fast reloads after
+                                :meth:`evict`
+        :param edge_feature_cache: share (read-only) edges, features, and graph of :class:`EdgeFeatureCache` with
+                                   other workflows, e.g. labeling sessions, instead of reading them
+        :param solution_cache: serve repeated label sets from :class:`pias.solution_cache.SolutionCache`
+        :param latency_target: adapt random forest, prediction chunks, and solver such that updates take at most this
+                               many seconds (see :class:`pias.latency_controller.LatencyController`)
+        :param cpu_budget: assign threads to training, prediction, and solving from (shared)
+                           :class:`pias.cpu_budget.CpuBudget` instead of library defaults
+        '''
         super(Workflow, self).__init__()
         self.logger = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
         self.logger.debug('Instantiating workflow with arguments %s', (edge_n5_container, edge_dataset, edge_feature_dataset, n_estimators, random_forest_kwargs))
-        self.edge_feature_cache        = EdgeFeatureCache(edge_n5_container, edge_dataset=edge_dataset, edge_feature_dataset=edge_feature_dataset)
+        self.edge_feature_cache        = EdgeFeatureCache(edge_n5_container, edge_dataset=edge_dataset, edge_feature_dataset=edge_feature_dataset, cache_directory=cache_directory) \
+            if edge_feature_cache is None else edge_feature_cache
         self.edge_label_cache          = EdgeLabelCache()
+        # the label cache only references edges and edge index while they are loaded
+        self.edge_feature_cache.add_listener(self.edge_label_cache.update_edge_index_mapping)
+        self.label_consistency         = LabelConsistency()
+        self.label_history             = LabelHistory()
         self.random_forest_kwargs      = dict(n_estimators=n_estimators)
         if (random_forest_kwargs is not None):
             self.random_forest_kwargs.update(random_forest_kwargs)
         self.logger.debug('Random forest kwargs: %s', self.random_forest_kwargs)
+        # multicut solver backend, see pias.agglomeration_model.SOLVERS
+        self.solver                    = solver
+        # optional pias.worker_pool.WorkerPool for prediction and multicut, references edges only while they are loaded
+        self.worker_pool               = worker_pool
+        if self.worker_pool is not None:
+            self.edge_feature_cache.add_listener(self._share_edges_with_workers)
+        # timers of update stages, see pias.metrics.Metrics
+        self.metrics                   = Metrics()
+        # on-demand profiles of updates, see pias.profiling.Profiler
+        self.profiler                  = Profiler(os.path.join(tempfile.gettempdir(), 'pias-profiles')) if profiler is None else profiler
+        # optional pias.scheduler.UpdateScheduler shared with other workflows
+        self.scheduler                 = scheduler
+        # optional pias.solution_cache.SolutionCache of previously solved label sets
+        self.solution_cache            = solution_cache
+        # optional pias.latency_controller.LatencyController that chooses random forest kwargs and solver of updates
+        self.latency_controller        = None if latency_target is None else LatencyController(
+            latency_target,
+            n_estimators = self.random_forest_kwargs['n_estimators'],
+            max_depth    = self.random_forest_kwargs.get('max_depth'),
+            solver       = solver)
+        # optional pias.cpu_budget.CpuBudget shared with other workflows
+        self.cpu_budget                = cpu_budget
         # TODO do we need to lock in any place?
         self.lock                      = threading.RLock()
 
@@ -97,7 +309,8 @@ class Workflow(object):
         self.edge_feature_update_notify = []
         self.edge_label_update_notify   = []
 
-        self._update_edges()
+        # edges were just read by (or are shared through) the edge feature cache
+        self._update_edges(read=False)
         self.latest_state            = None
         self.latest_successful_state = None
 
@@ -106,9 +319,11 @@ class Workflow(object):
         self._queue_get_timeout      = 0.01
         self.update_queue            = queue.Queue()  # multiprocessing.SimpleQueue()
         self.next_solution_id        = AtomicInteger(next_solution_id)
+        self.pending_updates         = AtomicInteger(0)
 
-        self.update_worker = threading.Thread(target=self._execute_updates)
-        self.update_worker.start()
+        self.update_worker = None if scheduler is not None else threading.Thread(target=self._execute_updates)
+        if self.update_worker is not None:
+            self.update_worker.start()
 
     def _execute_updates(self):
         self.logger.debug('Executing updates')
@@ -128,48 +343,298 @@ class Workflow(object):
 
     def request_update_state(self):
         solution_id = self.next_solution_id.get_and_increment()
-        self.update_queue.put(lambda: self._update_state(solution_id))
+        requested   = time.perf_counter()
+        task        = lambda: self._update_state(solution_id, requested=requested)
+        self.pending_updates.increment_and_get()
+        if self.scheduler is None:
+            self.update_queue.put(task)
+        else:
+            self.scheduler.submit(self, task)
+        self._set_update_queue_depth()
         return solution_id
 
-    def _update_state(self, solution_id):
+    def _set_update_queue_depth(self):
+        # queued updates that have not started
+        depth = self.update_queue.qsize() if self.scheduler is None else self.scheduler.num_queued(self)
+        self.metrics.gauge('update-queue-depth').set(depth)
+
+    def _update_state(self, solution_id, requested=None):
+        self._set_update_queue_depth()
+        try:
+            if requested is not None:
+                self.metrics.timer('update-queue-wait').observe(time.perf_counter() - requested)
+            with self.metrics.time('update'), self.profiler.profile('update', 'solution-%d' % solution_id):
+                self._compute_state(solution_id)
+        finally:
+            self.pending_updates.deccrement_and_get()
+            self._set_update_queue_depth()
+
+    def is_idle(self):
+        '''
+        :return: `True' if no update is queued or running
+        '''
+        return self.pending_updates.value == 0
+
+    def last_access(self):
+        '''
+        :return: :func:`time.monotonic` of last access of edges and features
+        '''
+        return self.edge_feature_cache.last_access
+
+    def evict(self):
+        '''
+        Release edges, features, graph, and classifiers of this workflow. Labels, solutions, and costs are kept; edges
+        and features are reloaded on demand.
+        '''
+        with self.lock:
+            self.edge_feature_cache.evict()
+            if self.solution_cache is not None:
+                self.solution_cache.spill()
+            for state in (self.latest_state, self.latest_successful_state):
+                if state is not None:
+                    state.release()
+        if self.solution_cache is not None:
+            # spilled solutions are held in memory until written
+            self.solution_cache.wait()
+
+    def memory_bytes(self):
+        '''
+        :return: approximate memory held by edges, features, graph, and latest states
+        '''
+        with self.lock:
+            arrays = self.edge_feature_cache.arrays()
+            graph  = 2 * arrays[0].nbytes if len(arrays) > 0 else 0
+            for state in (self.latest_state, self.latest_successful_state):
+                if state is not None:
+                    arrays.extend(state.arrays())
+            if self.solution_cache is not None:
+                arrays.extend(self.solution_cache.arrays())
+            arrays.extend(self.edge_label_cache.arrays())
+            # states share arrays with each other and with the edge feature cache
+            return graph + sum(a.nbytes for a in {id(a): a for a in arrays}.values())
+
+    def get_settings(self):
+        '''
+        :return: dict of random forest kwargs, solver, and prediction chunk size of the next update, and the state of
+                 the latency controller (`None' if there is no latency target)
+        '''
+        random_forest_kwargs, solver, prediction_chunk_size = self._update_settings()
+        return dict(
+            random_forest_kwargs  = random_forest_kwargs,
+            solver                = default_solver() if solver is None else solver,
+            prediction_chunk_size = prediction_chunk_size,
+            latency_controller    = None if self.latency_controller is None else self.latency_controller.settings())
+
+    def _update_settings(self):
+        controller = self.latency_controller
+        if controller is None:
+            return self.random_forest_kwargs, self.solver, None
+        settings = controller.settings()
+        return controller.random_forest_kwargs(self.random_forest_kwargs), settings['solver'], settings['prediction_chunk_size']
+
+    def _compute_state(self, solution_id):
+        start = time.perf_counter()
+        random_forest_kwargs, solver, prediction_chunk_size = self._update_settings()
         with self.lock:
             edges, edge_features, edge_index_mapping, graph = self.edge_feature_cache.get_edges_and_features()
-            labeled_samples = self.edge_label_cache.get_sample_and_label_arrays(edge_features)
+            with self.metrics.time('training-set'):
+                labeled_samples = self.edge_label_cache.get_sample_and_label_arrays(edge_features)
+            num_conflicts   = self.label_consistency.num_conflicts()
+            previous_state  = self.latest_successful_state
             state = State(
-                edges                = edges,
-                edge_features        = edge_features,
-                graph                = graph,
-                labeled_samples      = labeled_samples,
-                solution_id          = solution_id,
-                random_forest_kwargs = self.random_forest_kwargs)
-        exit_code = state.compute()
+                edges                 = edges,
+                edge_features         = edge_features,
+                graph                 = graph,
+                labeled_samples       = labeled_samples,
+                solution_id           = solution_id,
+                random_forest_kwargs  = random_forest_kwargs,
+                previous_solution     = None if previous_state is None else previous_state.solution,
+                solver                = solver,
+                worker_pool           = self.worker_pool,
+                metrics               = self.metrics,
+                prediction_chunk_size = prediction_chunk_size,
+                cpu_budget            = self.cpu_budget,
+                edge_source           = self._get_edges)
+            fingerprint = None if self.solution_cache is None else \
+                label_fingerprint(state.indices, state.labels, edges.shape[0], random_forest_kwargs=random_forest_kwargs, solver=solver)
+        cached = None if fingerprint is None or num_conflicts > 0 or len(state.indices) == 0 else self.solution_cache.get(fingerprint)
+        if num_conflicts > 0:
+            # do not train and solve: the solution would violate some of the labels
+            self.logger.warning('Not computing solution %d: %d labels are inconsistent', solution_id, num_conflicts)
+            exit_code = State.LABELS_INCONSISTENT
+        elif cached is not None:
+            self.logger.info('Serving solution %d for labels of solution %d from cache', solution_id, cached.solution_id)
+            with self.metrics.time('solution-cache-hit'):
+                exit_code = state.restore(cached)
+        else:
+            exit_code = state.compute()
+        state.solution_state = exit_code
         with self.lock:
             self.latest_state = state
             if exit_code == State.SUCCESS:
                 self.latest_successful_state = state
-            for listener in self.state_update_notify:
-                listener(state.solution_id, exit_code, state)
-
+            with self.metrics.time('notify'):
+                for listener in self.state_update_notify:
+                    listener(state.solution_id, exit_code, state)
+        if exit_code == State.SUCCESS and cached is None and self.latency_controller is not None:
+            self.latency_controller.observe(state.fit_seconds, state.predict_seconds, state.solve_seconds, time.perf_counter() - start, edges.shape[0])
+        if exit_code == State.SUCCESS and cached is None and fingerprint is not None:
+            self.solution_cache.put(fingerprint, checkpoint_from_state(state))
+
+
+    def restore_state(self, checkpoint):
+        '''
+        Restore latest successful state from a checkpoint without recomputing it. Request an update to verify it.
+
+        :param checkpoint: :class:`pias.checkpoint.StateCheckpoint`
+        :return: restored :class:`State`
+        '''
+        random_forest_kwargs, solver, _ = self._update_settings()
+        with self.lock:
+            edges, edge_features, edge_index_mapping, graph = self.edge_feature_cache.get_edges_and_features()
+            if checkpoint.merge_probabilities.shape != (edges.shape[0],):
+                raise Exception('Checkpoint with %d edge probabilities inconsistent with %d edges' % (checkpoint.merge_probabilities.size, edges.shape[0]))
+            indices = checkpoint.indices.astype(np.uint64)
+            state = State(
+                edges                = edges,
+                edge_features        = edge_features,
+                graph                = graph,
+                labeled_samples      = (edge_features[indices, ...], checkpoint.labels, indices, checkpoint.uv_pairs),
+                solution_id          = checkpoint.solution_id,
+                random_forest_kwargs = random_forest_kwargs,
+                solver               = solver,
+                worker_pool          = self.worker_pool,
+                edge_source          = self._get_edges)
+            state.solution_state         = state.restore(checkpoint)
+            self.latest_state            = state
+            self.latest_successful_state = state
+            # not added to the solution cache: the next update verifies the checkpoint (e.g. features may have changed)
+            self.logger.info('Restored state for solution %d', state.solution_id)
+            return state
 
     def request_update_edges(self):
         # self.update_queue.put(self._update_edges)
         return self._update_edges()
 
-    def _update_edges(self):
+    def _update_edges(self, read=True):
         with self.lock:
-            edges, _, edge_index_mapping, _ = self.edge_feature_cache.update_edge_features()
+            cache = self.edge_feature_cache
+            edges, edge_features, edge_index_mapping, _ = cache.update_edge_features() if read else cache.get_edges_and_features()
+            if read and self.solution_cache is not None:
+                # cached solutions were computed for previous edges and features
+                self.solution_cache.clear()
             self.edge_label_cache.update_edge_index_mapping(edges, edge_index_mapping)
+            if self.worker_pool is not None:
+                self.worker_pool.set_data(edges, edge_features)
 
     def request_set_edge_labels(self, edges, labels):
         # self.update_queue.put(lambda: self._set_edge_labels(edges, labels))
         return self._set_edge_labels(edges, labels)
 
 
+    def _share_edges_with_workers(self, edges, edge_index_mapping):
+        self.worker_pool.set_data(edges, None if edges is None else self.edge_feature_cache.edge_features)
+
+    def _get_edges(self):
+        # reloads edges if evicted
+        return self.edge_feature_cache.get_edges_and_features()[0]
+
     def _set_edge_labels(self, edges, labels):
-        with self.lock:
+        with self.lock, self.metrics.time('label-ingestion'):
             self.logger.debug('Setting edges %s and labels %s', edges, labels)
-            self.edge_label_cache.update_labels(edges, labels)
-
+            # labels are looked up in the edge index, which is released while evicted
+            self._get_edges()
+            valid    = self.edge_label_cache.update_labels(edges, labels)
+            uv_pairs = np.asarray(edges).reshape(-1, 2)[valid]
+            labels   = np.asarray(labels)[valid]
+            self.label_history.record(uv_pairs, labels)
+            return self.label_consistency.update(uv_pairs, labels)
+
+    def restore_labels(self, uv_pairs, labels, label_history):
+        '''
+        Set persisted labels in a single update, without recording a new label version, e.g. at start-up.
+
+        :param label_history: :class:`pias.label_history.LabelHistory` whose current labels are `labels', replaces
+                              the label history of this workflow
+        '''
+        with self.lock, self.metrics.time('label-ingestion'):
+            self._get_edges()
+            valid              = self.edge_label_cache.update_labels(uv_pairs, labels)
+            self.label_history = label_history
+            return self.label_consistency.update(np.asarray(uv_pairs).reshape(-1, 2)[valid], np.asarray(labels)[valid])
+
+    def get_label_version(self):
+        '''
+        :return: version of current labels, see :class:`pias.label_history.LabelHistory`
+        '''
+        return self.label_history.version
+
+    def diff_labels(self, source, target):
+        '''
+        :return: uv-pairs and labels that turn labels of version `source' into labels of version `target', see
+                 :meth:`pias.label_history.LabelHistory.diff`
+        '''
+        return self.label_history.diff(source, target)
+
+    def get_label_conflict_paths(self, max_paths=None):
+        '''
+        :return: paths of positive labels between the fragments of each inconsistent negative label, see
+                 :meth:`pias.label_consistency.LabelConsistency.conflict_paths`
+        '''
+        return self.label_consistency.conflict_paths(max_paths=max_paths)
+
+
+    def solve_region(self, fragments, halo=1, solve=None):
+        '''
+        Solve the multicut problem only for `fragments' and their neighborhood, with all other fragments fixed to the
+        latest successful solution. This is fast enough for interactive use while the global solution is updated in
+        the background. Costs of labeled edges reflect the current labels, including labels that were submitted after
+        the latest solution.
+
+        :param fragments: fragments of region of interest, e.g. fragments currently visible in a viewer
+        :param halo: extend region of interest by all fragments within this number of hops
+        :param solve: callable `(number_of_nodes, uv_ids, costs) -> node labels', solver of the latest state if `None'
+        :return: tuple of solution id of the global solution, region fragments, and their segment ids, or `None' if
+                 no solution is available
+        '''
+        state = self.get_latest_state()
+        if state is None or state.solution is None or state.costs is None:
+            return None
+        with self.metrics.time('solve-region'):
+            adjacency = self.edge_feature_cache.get_adjacency()
+            solve     = state.agglomeration.solve_uv if solve is None else solve
+            with self.edge_label_cache.lock:
+                label_map = self.edge_label_cache.edge_label_map
+                indices   = np.fromiter(label_map.keys(), dtype=np.int64, count=len(label_map))
+                labels    = np.fromiter(label_map.values(), dtype=np.int64, count=len(label_map))
+            # edges that were labeled for the latest solution but are not labeled anymore get their predicted costs
+            unlabeled = np.setdiff1d(np.asarray(state.indices, dtype=np.int64), indices)
+            edge_ids  = np.concatenate((unlabeled, indices))
+            costs     = state.agglomeration.compute_costs(state.merge_probabilities[edge_ids], known_labels=(np.arange(unlabeled.size, edge_ids.size), labels))
+            nodes, segments = solve_region(adjacency, state.get_edges(), state.costs, state.solution, fragments, halo, solve, cost_updates=(edge_ids, costs))
+        return state.solution_id, nodes, segments
+
+    def suggest_edges(self, k, measure='probability', fragments=None):
+        '''
+        Most uncertain unlabeled edges of the latest solution, i.e. the most informative edges to label next.
+
+        :param fragments: only suggest edges incident to any of these fragments
+        :return: tuple of solution id, uv-pairs, merge probabilities, and uncertainty of up to `k' edges (most
+                 uncertain first), or `None' if no solution is available
+        '''
+        state = self.get_latest_state()
+        if state is None:
+            return None
+        suggestions = state.get_edge_suggestions(measure)
+        with self.edge_label_cache.lock:
+            # skip edges that were labeled after the solution was computed
+            edge_ids, edge_uncertainty = suggestions.top(k, fragments=fragments, skip=self.edge_label_cache.edge_label_map)
+        return state.solution_id, state.get_edges()[edge_ids], state.merge_probabilities[edge_ids], edge_uncertainty
+
+    def get_labeled_uv_pairs(self):
+        with self.lock:
+            self._get_edges()
+            return self.edge_label_cache.get_labeled_uv_pairs()
 
     '''
     Implement listener like this:
@@ -185,8 +650,11 @@ class Workflow(object):
             return self.latest_successful_state
 
     def stop(self):
+        self.edge_feature_cache.remove_listener(self.edge_label_cache.update_edge_index_mapping)
+        self.edge_feature_cache.remove_listener(self._share_edges_with_workers)
         self._is_running = False
         self.logger.debug('Joining update worker -- self._is_running=%s', self._is_running)
-        self.update_worker.join()
+        if self.update_worker is not None:
+            self.update_worker.join()
         self.logger.debug('Finished stopping workflow')
 
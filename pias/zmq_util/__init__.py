@@ -1,3 +1,3 @@
 from .util import send_int, send_ints, send_ints_multipart, send_more_int
 from .util import recv_int, recv_ints, recv_ints_multipart
-from .util import _bytes_as_ndarray, _ndarray_as_bytes, _bytes_as_edges, _edges_as_bytes
\ No newline at end of file
+from .util import _bytes_as_ndarray, _ndarray_as_bytes, _bytes_as_edges, _bytes_as_edge_arrays, _edge_arrays_as_bytes, _edges_as_bytes
\ No newline at end of file
@@ -1,4 +1,3 @@
-import numpy as np
 import struct
 import zmq
 
@@ -44,6 +43,34 @@ def _bytes_as_edges(b):
     e = struct.unpack(pattern, b)
     return tuple((e[i+0], e[i+1], e[i+2]) for i in range(0, len(e), 3))
 
+def _bytes_as_edge_arrays(b):
+    '''
+    Vectorized version of :func:`_bytes_as_edges`.
+
+    :return: tuple of uv-pairs (`uint64', shape `(n, 2)') and labels (`int32', shape `(n,)')
+    '''
+    # numpy is imported lazily to keep the client entry point light-weight
+    import numpy as np
+    entry_size = 20
+    assert len(b) % entry_size == 0, 'Message length is not integer multiple of entry size: 20 (8 + 8 + 4)'
+    entries = np.frombuffer(b, dtype=np.dtype([('u', f'{_ENDIANNESS}u8'), ('v', f'{_ENDIANNESS}u8'), ('label', f'{_ENDIANNESS}i4')]))
+    uv_pairs = np.empty((entries.size, 2), dtype=np.uint64)
+    uv_pairs[:, 0] = entries['u']
+    uv_pairs[:, 1] = entries['v']
+    return uv_pairs, entries['label'].astype(np.int32)
+
+def _edge_arrays_as_bytes(uv_pairs, labels):
+    '''
+    Inverse of :func:`_bytes_as_edge_arrays`.
+    '''
+    import numpy as np
+    uv_pairs         = np.asarray(uv_pairs, dtype=np.uint64).reshape(-1, 2)
+    entries          = np.empty(uv_pairs.shape[0], dtype=np.dtype([('u', f'{_ENDIANNESS}u8'), ('v', f'{_ENDIANNESS}u8'), ('label', f'{_ENDIANNESS}i4')]))
+    entries['u']     = uv_pairs[:, 0]
+    entries['v']     = uv_pairs[:, 1]
+    entries['label'] = np.asarray(labels).reshape(-1)
+    return entries.tobytes()
+
 def _ndarray_as_bytes(ndarray):
     # java always big endian
     # https://stackoverflow.com/questions/981549/javas-virtual-machines-endianness
@@ -52,6 +79,8 @@ def _ndarray_as_bytes(ndarray):
 def _bytes_as_ndarray(buffer, dtype, count=-1, offset=0):
     # java always big endian
     # https://stackoverflow.com/questions/981549/javas-virtual-machines-endianness
+    # numpy is imported lazily to keep the client entry point light-weight
+    import numpy as np
     ndarray = np.frombuffer(buffer, dtype=dtype, count=-1, offset=0)
     return ndarray.byteswap() if _USE_BIG_ENDIAN else ndarray
 
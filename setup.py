@@ -23,14 +23,22 @@ install_requires = [
 ]
 
 console_scripts = [
-    'pias=pias:solver_server_main',
-    'pias-cli=pias:client_cli_main'
+    'pias=pias.solver_server:server_main',
+    'pias-cli=pias.client:client_cli_main',
+    'pias-benchmark=pias.benchmark.pipeline:benchmark_pipeline_main',
+    'pias-benchmark-instances=pias.benchmark.solvers:benchmark_instances_main',
+    'pias-benchmark-solvers=pias.benchmark.solvers:benchmark_solvers_main',
+    'pias-load-test=pias.benchmark.load:load_test_main',
+    'pias-multi=pias.multi_server:multi_server_main',
+    'pias-replay=pias.replay:replay_main',
+    'pias-worker=pias.worker:worker_main'
 ]
 
 entry_points = dict(console_scripts=console_scripts)
 
 packages = [
     f'{name}',
+    f'{name}.benchmark',
     f'{name}.ext',
     f'{name}.threading',
     f'{name}.zmq_util'
@@ -38,7 +46,7 @@ packages = [
 
 setuptools.setup(
     name='pias',
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     packages=packages,
     version=f'{version}',
     author='Philipp Hanslovsky',
@@ -2,4 +2,30 @@ from __future__ import absolute_import
 
 from .test_server_basic import TestReqSocket
 from .test_edge_feature_io import TestEdgeIO
-from .test_solver_server import TestRequestUpdateSolution, TestSolverCurrentSolution, TestSolverServerPing, TestSolverSetEdgeLabels
\ No newline at end of file
+from .test_edge_values import TestEncodedEdgeValues
+from .test_agglomeration_model import TestMatchSegmentIds
+from .test_checkpoint import TestCheckpoint
+from .test_cpu_budget import TestCpuBudget
+from .test_instances import TestInstances
+from .test_import_time import TestImportTime
+from .test_metrics import TestHistogram, TestMetrics
+from .test_profiling import TestProfiler
+from .test_random_forest import TestRandomForestModelCache
+from .test_scheduler import TestUpdateScheduler
+from .test_recording import TestEdgeAgreement, TestRequestRecorder
+from .test_label_journal import TestEdgeIndex, TestLabelJournal
+from .test_label_consistency import TestLabelConsistency
+from .test_label_history import TestLabelHistory
+from .test_latency_controller import TestLatencyController
+from .test_latest_writer import TestLatestWriter
+from .test_region import TestAdjacency, TestSolveRegion
+from .test_greedy_additive import TestGreedyAdditiveEdgeContraction
+from .test_benchmark_pipeline import TestSyntheticEdgeFeatures, TestBenchmarkPipeline
+from .test_benchmark_load import TestClient, TestLatencyLimits
+from .test_solution_cache import TestLabelFingerprint, TestSolutionCache
+from .test_solution_index import TestSolutionIndex
+from .test_suggestions import TestEdgeSuggestions, TestUncertainty
+from .test_worker_pool import TestWorkerPool
+from .test_shared_solution import TestSharedSolutionFile
+from .test_solution_n5 import TestChangedBlocks, TestSolutionN5Writer
+from .test_solver_server import TestCheckpointRestart, TestEdgeValues, TestLabelVersions, TestLoadTest, TestMultiDatasetServer, TestRecordAndReplay, TestRequestUpdateSolution, TestSessions, TestSolutionCacheUndo, TestSolutionLookupWithoutSolution, TestSolverCurrentSolution, TestSolverServerPing, TestSolveRegionEndpoint, TestSolverSetEdgeLabels, TestSuggestEdges
\ No newline at end of file
@@ -0,0 +1,48 @@
+from __future__ import print_function
+
+import unittest
+
+import numpy as np
+
+from pias.agglomeration_model import match_segment_ids
+
+
+class TestMatchSegmentIds(unittest.TestCase):
+
+    def testKeepIdsOfOverlappingSegments(self):
+        previous = np.array([10, 10, 10, 20, 20, 30], dtype=np.uint64)
+        solution = np.array([1, 1, 1, 0, 0, 0], dtype=np.uint64)
+        np.testing.assert_array_equal([10, 10, 10, 20, 20, 20], match_segment_ids(solution, previous))
+
+    def testSplitSegmentsGetFreshIds(self):
+        previous = np.array([10, 10, 10, 20, 20, 30], dtype=np.uint64)
+        solution = np.array([0, 1, 2, 3, 4, 5], dtype=np.uint64)
+        relabeled = match_segment_ids(solution, previous)
+        np.testing.assert_array_equal([10, 20, 30], relabeled[[0, 3, 5]])
+        self.assertTrue(np.all(relabeled[[1, 2, 4]] > 30))
+        self.assertEqual(6, np.unique(relabeled).size)
+
+    def testUnchangedSolutionIsStable(self):
+        previous = np.random.randint(0, 50, size=1000).astype(np.uint64)
+        permutation = np.random.permutation(100).astype(np.uint64)
+        np.testing.assert_array_equal(previous, match_segment_ids(permutation[previous], previous))
+
+    def testMatchingRounds(self):
+        # all new segments prefer old segment 0, then 1, ..., each old segment prefers the new segment with the largest
+        # id: each round matches only one new segment
+        pairs    = [(new, old) for new in range(6) for old in range(6) for _ in range(10 * (6 - old) + new)]
+        solution = np.array([new for new, _ in pairs], dtype=np.uint64)
+        previous = np.array([old for _, old in pairs], dtype=np.uint64)
+        relabeled = match_segment_ids(solution, previous, max_rounds=6)
+        np.testing.assert_array_equal([5, 4, 3, 2, 1, 0], [relabeled[solution == new][0] for new in range(6)])
+
+        relabeled = match_segment_ids(solution, previous)
+        ids       = [relabeled[solution == new][0] for new in range(6)]
+        np.testing.assert_array_equal([2, 1, 0], ids[3:])
+        self.assertTrue(all(i > 5 for i in ids[:3]))
+        self.assertEqual(6, np.unique(relabeled).size)
+
+    def testNoPreviousSolution(self):
+        solution = np.array([1, 1, 0], dtype=np.uint64)
+        self.assertIs(solution, match_segment_ids(solution, None))
+        self.assertIs(solution, match_segment_ids(solution, np.zeros(4, dtype=np.uint64)))
@@ -0,0 +1,71 @@
+from __future__ import print_function
+
+import threading
+import time
+import unittest
+
+import numpy as np
+import zmq
+
+from pias.benchmark.load import _Client, _Latencies, _Requested, check_latency_limits, parse_latency_limit
+
+
+def _result(count=10, errors=0, p99=0.1):
+    return dict(count=count, errors=errors, throughput=1., mean=p99, p50=p99, p99=p99, p999=p99, max=p99)
+
+
+class _SlowSocket(object):
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def send_string(self, string):
+        pass
+
+    def recv_multipart(self):
+        time.sleep(self.seconds)
+        return [b'']
+
+    def close(self):
+        pass
+
+
+class TestClient(unittest.TestCase):
+
+    def testScheduledLatency(self):
+        # 50 requests per second for 0.2s, but each takes 0.05s: later requests queue up behind earlier ones
+        context   = zmq.Context(1)
+        latencies = _Latencies()
+        try:
+            client = _Client(0, context, 'inproc://load-test', np.zeros((1, 2), dtype=np.uint64), np.zeros(1, dtype=np.int32), dict(poll=50.), 1, [], 1., latencies, _Requested(), np.random.default_rng(1))
+            client.sockets['current-solution'] = _SlowSocket(0.05)
+            start = time.perf_counter()
+            client.run(start, start + 0.2, threading.Event())
+            client.subscriber.close(linger=0)
+        finally:
+            context.term()
+        polls = latencies.latencies['current-solution']
+        self.assertGreater(len(polls), 3)
+        # measured from the scheduled time, not from the time the request was sent
+        self.assertGreater(max(polls), 3 * 0.05)
+
+
+class TestLatencyLimits(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual((None, 'p99', 0.5), parse_latency_limit('p99=0.5'))
+        self.assertEqual(('current-solution', 'p999', 0.1), parse_latency_limit('current-solution:p999=0.1'))
+        self.assertEqual(('/api/n5/all', 'max', 2.), parse_latency_limit('/api/n5/all:max=2'))
+        with self.assertRaises(ValueError):
+            parse_latency_limit('p98=0.5')
+
+    def test_check(self):
+        summary = dict(endpoints={
+            'current-solution' : _result(p99=0.01),
+            'set-edge-labels'  : _result(p99=0.2, errors=1),
+            'new-solution'     : _result(count=0, p99=None)})
+        self.assertEqual([], check_latency_limits(summary, [(None, 'p99', 1.)], max_errors=1))
+        self.assertEqual(['set-edge-labels: 1 errors (max 0)'], check_latency_limits(summary, []))
+        self.assertEqual(
+            ['set-edge-labels: p99 0.200000s > 0.100000s', 'update-solution: no responses'],
+            check_latency_limits(summary, [(None, 'p99', 0.1), ('update-solution', 'p99', 0.1)], max_errors=1))
@@ -0,0 +1,56 @@
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from pias.benchmark.pipeline import benchmark_pipeline_main
+from pias.benchmark.synthetic import grid_region_adjacency_graph, synthetic_edge_features
+
+
+class TestSyntheticEdgeFeatures(unittest.TestCase):
+
+    def test(self):
+        _, _, probabilities, _ = grid_region_adjacency_graph(10000, seed=1)
+        blocks   = list(synthetic_edge_features(probabilities, num_features=4, seed=1, block_size=1000))
+        features = np.concatenate([block for _, block in blocks])
+        self.assertEqual([0, 1000, 2000], [start for start, _ in blocks][:3])
+        self.assertEqual((probabilities.size, 4), features.shape)
+        logit = np.log(probabilities / (1 - probabilities))
+        for feature in features.T:
+            self.assertGreater(abs(np.corrcoef(feature, logit)[0, 1]), 0.1)
+        # shared noise correlates features beyond their common dependence on the merge probability
+        residuals = features - np.stack([np.polyval(np.polyfit(logit, feature, 1), logit) for feature in features.T], axis=1)
+        self.assertGreater(np.corrcoef(residuals[:, 0], residuals[:, 1])[0, 1], 0.2)
+
+
+class TestBenchmarkPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test(self):
+        output = os.path.join(self.tmp_dir, 'results.json')
+        benchmark_pipeline_main(['--num-edges', '1000', '--n-estimators', '5', '--num-labels', '100', '--solver', 'greedy-additive', '--output', output, '--trace-memory'])
+        with open(output) as f:
+            results = [json.loads(line) for line in f]
+        self.assertEqual(
+            ['read', 'edge-index', 'graph', 'label-ingestion', 'training-set', 'fit', 'predict', 'costs', 'solve',
+             'serialize-bytes', 'serialize-shared-solution-file', 'serialize-checkpoint'],
+            [r['stage'] for r in results])
+        for result in results:
+            self.assertGreaterEqual(result['seconds'], 0)
+            self.assertGreater(result['peak_rss_mb'], 0)
+            self.assertIn('peak_traced_mb', result)
+            self.assertEqual('greedy-additive', result['solver'])
+
+
+if __name__ == '__main__':
+    unittest.main()
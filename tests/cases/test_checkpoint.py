@@ -0,0 +1,52 @@
+from __future__ import print_function
+
+import os
+import unittest
+
+import numpy as np
+
+from pias import RandomForestModelCache
+from pias.checkpoint import load_state_checkpoint, save_state_checkpoint
+
+from .util import tempdir
+
+
+class _DummyState(object):
+
+    def __init__(self):
+        features = np.array(
+            [[0.7, 1.0, 0.5],
+             [0.7, 0.9, 0.5],
+             [0.6, 0.9, 0.4],
+             [0.5, 0.05, 0.6],
+             [0.4, 0.1, 0.3]])
+        self.solution_id         = 3
+        self.indices             = np.array([0, 4], dtype=np.uint64)
+        self.labels              = np.array([1, 0], dtype=np.uint64)
+        self.uv_pairs            = np.array([[0, 1], [2, 3]], dtype=np.uint64)
+        self.random_forest       = RandomForestModelCache(random_forest_kwargs=dict(n_estimators=5))
+        self.random_forest.train_model(features[self.indices], self.labels)
+        self.merge_probabilities = self.random_forest.predict(features)[..., 1].astype(np.float32)
+        self.solution            = np.array([0, 0, 0, 1], dtype=np.uint64)
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def testRoundTrip(self):
+        state = _DummyState()
+        with tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'checkpoint.npz')
+            self.assertIsNone(load_state_checkpoint(path))
+            save_state_checkpoint(path, state)
+            self.assertEqual(['checkpoint.npz'], os.listdir(tmpdir))
+            checkpoint = load_state_checkpoint(path)
+
+        self.assertEqual(state.solution_id, checkpoint.solution_id)
+        self.assertEqual(np.float32, checkpoint.merge_probabilities.dtype)
+        np.testing.assert_array_equal(state.merge_probabilities, checkpoint.merge_probabilities)
+        np.testing.assert_array_equal(state.solution, checkpoint.solution)
+        np.testing.assert_array_equal(state.indices, checkpoint.indices)
+        np.testing.assert_array_equal(state.labels, checkpoint.labels)
+        np.testing.assert_array_equal(state.uv_pairs, checkpoint.uv_pairs)
+        features = np.random.random((7, 3))
+        np.testing.assert_array_equal(state.random_forest.predict(features), checkpoint.model.predict_proba(features))
@@ -0,0 +1,46 @@
+from __future__ import print_function
+
+import unittest
+
+from pias.cpu_budget import CpuBudget, FIT, PREDICT, SOLVE
+
+
+class TestCpuBudget(unittest.TestCase):
+
+    def testShares(self):
+        budget = CpuBudget(cores=8, reserved=2, concurrency=2)
+        self.assertEqual(6, budget.compute)
+        with budget.stage(FIT) as fit_threads:
+            self.assertEqual(3, fit_threads)
+            with budget.stage(SOLVE) as solve_threads:
+                self.assertEqual(1, solve_threads)
+                with budget.stage(PREDICT) as predict_threads:
+                    self.assertEqual(2, predict_threads)
+                    # never less than one thread
+                    with budget.stage(PREDICT) as threads:
+                        self.assertEqual(1, threads)
+                        self.assertEqual(7, budget.utilization()['in_use'])
+        self.assertEqual(0, budget.utilization()['in_use'])
+
+    def testReserved(self):
+        self.assertEqual((0, 1), (CpuBudget(cores=1, reserved=1).reserved, CpuBudget(cores=1, reserved=1).compute))
+        self.assertEqual((3, 1), (CpuBudget(cores=4, reserved=8).reserved, CpuBudget(cores=4, reserved=8).compute))
+        self.assertGreaterEqual(CpuBudget().cores, 1)
+
+    def testUtilization(self):
+        budget = CpuBudget(cores=4, reserved=0)
+        for _ in range(2):
+            with budget.stage(FIT):
+                pass
+        try:
+            with budget.stage(PREDICT):
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+        utilization = budget.utilization()
+        self.assertEqual(['fit', 'predict', 'solve'], sorted(utilization['stages']))
+        self.assertEqual((2, 0, 4), tuple(utilization['stages'][FIT][k] for k in ('count', 'active', 'threads')))
+        self.assertEqual(1, utilization['stages'][PREDICT]['count'])
+        self.assertEqual(0, utilization['stages'][SOLVE]['count'])
+        self.assertAlmostEqual(4 * utilization['stages'][FIT]['seconds'], utilization['stages'][FIT]['core_seconds'])
+        self.assertLessEqual(utilization['utilization'], 1.)
@@ -0,0 +1,43 @@
+from __future__ import print_function
+
+import unittest
+
+import numpy as np
+
+from pias.edge_values import FLOAT16, FLOAT32, UINT8, EncodedEdgeValues
+
+
+class TestEncodedEdgeValues(unittest.TestCase):
+
+    def testFloat(self):
+        values = np.array([0.1, 0.5, 0.25, 1.], dtype=np.float32)
+        for encoding, dtype in ((FLOAT32, '>f4'), (FLOAT16, '>f2')):
+            encoded = EncodedEdgeValues(values, encoding)
+            self.assertEqual(np.dtype(dtype), encoded.all().dtype)
+            np.testing.assert_allclose(values, np.frombuffer(encoded.all().tobytes(), dtype=dtype), rtol=1e-3)
+            np.testing.assert_allclose(values, encoded.decode(encoded.all()), rtol=1e-3)
+        self.assertRaises(ValueError, EncodedEdgeValues, values, 7)
+
+    def testUint8(self):
+        values  = np.array([0., 0.5, 0.25, 1.], dtype=np.float32)
+        encoded = EncodedEdgeValues(values, UINT8, value_range=(0., 1.))
+        np.testing.assert_array_equal([0, 128, 64, 255], encoded.all())
+        np.testing.assert_allclose(values, encoded.decode(encoded.all()), atol=0.51 / 255)
+
+        # values outside of the range are clipped
+        encoded = EncodedEdgeValues(np.array([-1e4, -2., 0., 2., 1e4]), UINT8, value_range=(-2., 2.))
+        np.testing.assert_array_equal([0, 0, 128, 255, 255], encoded.all())
+        np.testing.assert_allclose([-2., -2., 0., 2., 2.], encoded.decode(encoded.all()), atol=2.01 / 255)
+
+        encoded = EncodedEdgeValues(np.full((3,), 0.7), UINT8)
+        np.testing.assert_allclose([0.7] * 3, encoded.decode(encoded.all()))
+
+    def testSelection(self):
+        encoded = EncodedEdgeValues(np.arange(10, dtype=np.float32), FLOAT32)
+        selected = encoded.range(2, 5)
+        self.assertIs(encoded.all(), selected.base)
+        np.testing.assert_array_equal([2, 3, 4], selected)
+        np.testing.assert_array_equal([8, 9], encoded.range(8, 20))
+        self.assertEqual(0, encoded.range(12, 20).size)
+        np.testing.assert_array_equal([7, 1, 7], encoded.select([7, 1, 7]))
+        self.assertRaises(IndexError, encoded.select, [10])
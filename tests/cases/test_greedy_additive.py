@@ -0,0 +1,58 @@
+from __future__ import print_function
+
+import unittest
+
+import numpy as np
+
+from pias.agglomeration_model import MulticutAgglomeration
+from pias.benchmark.synthetic import grid_region_adjacency_graph, multicut_energy
+from pias.graph import ArrayGraph
+from pias.greedy_additive import greedy_additive_edge_contraction
+
+
+def _same_partition(labels1, labels2):
+    _, inverse1 = np.unique(labels1, return_inverse=True)
+    _, inverse2 = np.unique(labels2, return_inverse=True)
+    pairs       = np.unique(np.stack((inverse1.reshape(-1), inverse2.reshape(-1)), axis=1), axis=0)
+    return pairs.shape[0] == np.unique(inverse1).size == np.unique(inverse2).size
+
+
+class TestGreedyAdditiveEdgeContraction(unittest.TestCase):
+
+    def test(self):
+        # two triangles, connected through repulsive edge
+        uv    = np.array([[0, 1], [1, 2], [0, 2], [2, 3], [3, 4], [4, 5], [3, 5]], dtype=np.uint64)
+        costs = np.array([1., 2., -0.5, -3., 1., 1., 1.])
+        self.assertTrue(_same_partition([0, 0, 0, 1, 1, 1], greedy_additive_edge_contraction(6, uv, costs)))
+
+        # contracting 1-2 makes 0-{1,2} repulsive
+        costs = np.array([1., 2., -1.5, -3., 1., 1., 1.])
+        self.assertTrue(_same_partition([0, 1, 1, 2, 2, 2], greedy_additive_edge_contraction(6, uv, costs)))
+
+    def testNoEdges(self):
+        np.testing.assert_array_equal([0, 1, 2], greedy_additive_edge_contraction(3, np.empty((0, 2), dtype=np.uint64), np.empty((0,))))
+
+    def testStar(self):
+        # hub with many leaves is contracted in few rounds, leaves repel each other
+        num_leaves = 1000
+        uv         = np.stack((np.zeros(num_leaves), np.arange(1, num_leaves + 1)), axis=1).astype(np.uint64)
+        uv         = np.concatenate((uv, [[1, 2]]))
+        costs      = np.concatenate((np.linspace(1., 2., num_leaves), [-10.]))
+        labels     = greedy_additive_edge_contraction(num_leaves + 1, uv, costs)
+        self.assertEqual(2, np.unique(labels).size)
+        self.assertNotEqual(labels[1], labels[2])
+
+    def testSyntheticGraph(self):
+        number_of_nodes, uv, probabilities, segments = grid_region_adjacency_graph(20000, seed=1)
+        costs  = np.log(probabilities / (1 - probabilities))
+        labels = greedy_additive_edge_contraction(number_of_nodes, uv, costs)
+        self.assertLess(multicut_energy(uv, costs, labels), multicut_energy(uv, costs, segments))
+
+    def testAgglomeration(self):
+        graph         = ArrayGraph(4, np.array([[0, 1], [1, 2], [3, 2]], dtype=np.uint64))
+        agglomeration = MulticutAgglomeration(solver='greedy-additive')
+        solution      = agglomeration.optimize(graph, np.array([0.9, 0.1, 0.5]), known_labels=(np.array([2]), np.array([1])))
+        self.assertTrue(_same_partition([0, 0, 1, 1], solution))
+        np.testing.assert_array_equal([0, 1, 2], graph.findEdges([[1, 0], [2, 1], [2, 3]]))
+        np.testing.assert_array_equal([-1], graph.findEdges([[0, 3]]))
+        self.assertRaises(ValueError, MulticutAgglomeration, solver='no-such-solver')
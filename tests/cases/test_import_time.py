@@ -0,0 +1,64 @@
+from __future__ import print_function
+
+import logging
+import subprocess
+import sys
+import unittest
+
+# Modules that must not be imported when only the client is needed.
+_HEAVY_MODULES = ('numpy', 'sklearn', 'scipy', 'nifty', 'z5py')
+
+# Generous upper bound for cumulative import time of the client in microseconds.
+# zmq alone takes a few tens of milliseconds; the scientific stack takes seconds.
+_MAX_CLIENT_IMPORT_TIME_US = 500000
+
+
+def _import_times(statement):
+    """Run `statement' in a fresh interpreter with `-X importtime' and return dict: module -> cumulative time in us."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            cumulative = int(fields[1])
+        except ValueError:
+            # header line
+            continue
+        times[fields[2].strip()] = cumulative
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestImportTime, self).__init__(*args, **kwargs)
+        self.logger = logging.getLogger('{}.{}'.format(self.__module__, type(self).__name__))
+
+    def _assert_no_heavy_imports(self, times):
+        heavy = sorted(m for m in times if m.split('.')[0] in _HEAVY_MODULES)
+        self.assertEqual([], heavy, 'Heavy modules imported: %s' % heavy)
+
+    def testPackageImport(self):
+        self._assert_no_heavy_imports(_import_times('import pias'))
+
+    def testClientImport(self):
+        times = _import_times('import pias.client')
+        self._assert_no_heavy_imports(times)
+        self.logger.debug('Cumulative import time of pias.client: %dus', times['pias.client'])
+        self.assertLess(times['pias.client'], _MAX_CLIENT_IMPORT_TIME_US)
+
+    def testClientHelpDoesNotImportHeavyModules(self):
+        times = _import_times('import sys\n'
+                              'from pias import client_cli_main\n'
+                              'try:\n'
+                              '    client_cli_main(["--help"])\n'
+                              'except SystemExit:\n'
+                              '    pass')
+        self._assert_no_heavy_imports(times)
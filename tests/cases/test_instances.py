@@ -0,0 +1,75 @@
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import threading
+import types
+import unittest
+
+import numpy as np
+
+from pias.agglomeration_model import MulticutAgglomeration, make_graph
+from pias.benchmark.solvers import benchmark_instances
+from pias.instances import InstanceDumper, MulticutInstance, load_instance, multicut_energy, save_instance
+
+
+def _mk_state(solution_id, solve_seconds):
+    edges = np.array([[0, 1], [1, 2], [0, 2], [1, 3], [2, 3]], dtype=np.uint64)
+    costs = np.array([2., 1., 1., -3., -2.])
+    return types.SimpleNamespace(
+        solution_id   = solution_id,
+        graph         = make_graph(4, edges),
+        edges         = edges,
+        costs         = costs,
+        indices       = np.array([3], dtype=np.uint64),
+        labels        = np.array([0], dtype=np.uint64),
+        solution      = np.array([1, 1, 1, 2], dtype=np.uint64),
+        agglomeration = MulticutAgglomeration(solver='greedy-additive'),
+        solve_seconds = solve_seconds)
+
+
+class TestInstances(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_save_and_load(self):
+        state    = _mk_state(3, 0.5)
+        instance = MulticutInstance(3, 4, state.edges, state.costs, state.indices, state.labels, state.solution, 'greedy-additive', -5., 0.5)
+        loaded   = load_instance(save_instance(os.path.join(self.tmp_dir, 'instance.npz'), instance))
+        self.assertEqual(3, loaded.solution_id)
+        self.assertEqual(4, loaded.number_of_nodes)
+        self.assertEqual('greedy-additive', loaded.solver)
+        self.assertEqual(-5., loaded.energy)
+        self.assertEqual(0.5, loaded.seconds)
+        for name in ('uv_ids', 'costs', 'indices', 'labels', 'solution'):
+            np.testing.assert_array_equal(getattr(instance, name), getattr(loaded, name))
+        self.assertEqual(['instance.npz'], os.listdir(self.tmp_dir))
+
+    def test_dumper(self):
+        dumper = InstanceDumper(os.path.join(self.tmp_dir, 'instances'), min_seconds=0.1)
+        self.assertFalse(dumper.submit(_mk_state(0, 0.05)))
+        self.assertTrue(dumper.submit(_mk_state(1, 0.2)))
+        dumper.wait()
+        self.assertEqual(['instance-1.npz'], os.listdir(dumper.directory))
+        instance = load_instance(dumper.path(1))
+        self.assertEqual(-5., instance.energy)
+        self.assertEqual(multicut_energy(instance.uv_ids.astype(np.int64), instance.costs, instance.solution), instance.energy)
+
+        # instances wait while another one is written, up to max_pending
+        queued        = InstanceDumper(os.path.join(self.tmp_dir, 'queued'), max_pending=2)
+        queued.thread = threading.Thread(target=queued._run, daemon=True)
+        self.assertEqual([True, True, False], [queued.submit(_mk_state(solution_id, 0.2)) for solution_id in range(3)])
+        queued.thread.start()
+        queued.wait()
+        self.assertEqual(['instance-0.npz', 'instance-1.npz'], sorted(os.listdir(queued.directory)))
+
+        results = benchmark_instances([dumper.path(1)], ['greedy-additive'])
+        self.assertEqual(1, len(results))
+        self.assertEqual(5, results[0]['num_edges'])
+        self.assertEqual(-5., results[0]['energy'])
+        self.assertEqual(-5., results[0]['dumped_energy'])
@@ -0,0 +1,57 @@
+from __future__ import print_function
+
+import unittest
+
+import numpy as np
+
+from pias.label_consistency import LabelConsistency, flatten_paths
+
+
+class TestLabelConsistency(unittest.TestCase):
+
+    def testConflictAfterNegativeLabel(self):
+        consistency = LabelConsistency()
+        self.assertEqual(0, consistency.update([[1, 2], [3, 2], [3, 4]], [1, 1, 1]))
+        self.assertEqual(0, consistency.update([[1, 5]], [0]))
+        self.assertEqual(1, consistency.update([[4, 1]], [0]))
+        self.assertEqual([[1, 2, 3, 4]], consistency.conflict_paths())
+
+    def testConflictAfterPositiveLabel(self):
+        # conflict is introduced by merging two sets
+        consistency = LabelConsistency()
+        self.assertEqual(0, consistency.update([[1, 2], [3, 4], [1, 4], [2, 5]], [1, 1, 0, 0]))
+        self.assertEqual(1, consistency.update([[2, 3]], [1]))
+        self.assertEqual([[1, 2, 3, 4]], consistency.conflict_paths())
+
+    def testRelabel(self):
+        consistency = LabelConsistency()
+        # last label for an edge wins
+        self.assertEqual(1, consistency.update([[1, 2], [2, 3], [1, 3], [3, 1]], [1, 1, 1, 0]))
+        self.assertEqual(1, consistency.num_conflicts())
+        # positive label replaced with negative label: rebuild
+        self.assertEqual(0, consistency.update([[2, 1]], [0]))
+        # negative label replaced with positive label
+        self.assertEqual(1, consistency.update([[2, 1], [1, 3]], [1, 0]))
+        self.assertEqual(0, consistency.update([[1, 3]], [1]))
+        self.assertEqual([], consistency.conflict_paths())
+
+    def testUnset(self):
+        consistency = LabelConsistency()
+        self.assertEqual(1, consistency.update([[1, 2], [2, 3], [1, 3]], [1, 1, 0]))
+        # removing a positive label: rebuild
+        self.assertEqual(0, consistency.update([[2, 3]], [-1]))
+        self.assertEqual(1, consistency.update([[3, 2]], [1]))
+        # removing a negative label
+        self.assertEqual(0, consistency.update([[1, 3]], [-1]))
+        self.assertEqual(0, consistency.update([[4, 5]], [-1]))
+        self.assertEqual({(1, 2): 1, (2, 3): 1}, consistency.labels)
+
+    def testMaxPaths(self):
+        consistency = LabelConsistency()
+        consistency.update([[1, 2], [2, 3], [1, 3], [4, 5], [5, 6], [4, 6]], [1, 1, 0, 1, 1, 0])
+        self.assertEqual(2, consistency.num_conflicts())
+        self.assertEqual([[1, 2, 3]], consistency.conflict_paths(max_paths=1))
+
+    def testFlattenPaths(self):
+        np.testing.assert_array_equal([2, 1, 2, 3, 4, 5, 6], flatten_paths([[1, 2], [4, 5, 6]]))
+        self.assertEqual(np.uint64, flatten_paths([]).dtype)
@@ -0,0 +1,75 @@
+from __future__ import print_function
+
+import unittest
+
+import numpy as np
+
+from pias.edge_labels import UNLABELED
+from pias.label_history import LabelHistory
+
+
+class TestLabelHistory(unittest.TestCase):
+
+    def _assertDiff(self, history, source, target, expected):
+        uv_pairs, labels = history.diff(source, target)
+        self.assertEqual(np.int32, labels.dtype)
+        self.assertEqual(expected, {tuple(uv): label for uv, label in zip(uv_pairs.tolist(), labels.tolist())})
+
+    def testDiff(self):
+        history = LabelHistory()
+        self.assertEqual(0, history.version)
+        self.assertEqual(1, history.record([[1, 2], [2, 3]], [1, 0]))
+        self.assertEqual(2, history.record([[2, 3], [3, 4]], [1, 1]))
+        self.assertEqual(3, history.record([[1, 2], [3, 4]], [UNLABELED, 1]))
+        self.assertEqual({(2, 3): 1, (3, 4): 1}, history.labels)
+
+        self._assertDiff(history, 1, 1, {})
+        self._assertDiff(history, 0, 3, {(2, 3): 1, (3, 4): 1})
+        self._assertDiff(history, 1, 3, {(1, 2): UNLABELED, (2, 3): 1, (3, 4): 1})
+        # revert
+        self._assertDiff(history, 3, 1, {(1, 2): 1, (2, 3): 0, (3, 4): UNLABELED})
+        self._assertDiff(history, 3, 0, {(2, 3): UNLABELED, (3, 4): UNLABELED})
+        self.assertRaises(ValueError, history.diff, 3, 4)
+
+    def testNoChange(self):
+        history = LabelHistory()
+        history.record([[1, 2]], [1])
+        # every batch gets a version, even if nothing changes
+        self.assertEqual(2, history.record([[1, 2], [2, 3], [2, 3]], [1, 0, UNLABELED]))
+        self.assertEqual({}, history.changes[2])
+        self._assertDiff(history, 1, 2, {})
+
+    def testRebase(self):
+        history = LabelHistory()
+        history.record([[1, 2]], [1])
+        history.rebase()
+        self.assertEqual(0, history.version)
+        self.assertEqual(1, history.record([[1, 2]], [UNLABELED]))
+        self._assertDiff(history, 1, 0, {(1, 2): 1})
+        # labels of a persisted version keep their version
+        history.rebase(7)
+        self.assertEqual(7, history.version)
+        self.assertEqual(8, history.record([[1, 2]], [0]))
+        self._assertDiff(history, 8, 7, {(1, 2): UNLABELED})
+        self.assertRaises(ValueError, history.diff, 8, 6)
+
+    def testLoadTruncateAndSnapshot(self):
+        history = LabelHistory()
+        history.load([[1, 2], [2, 3]], [1, UNLABELED], 3)
+        self.assertEqual(3, history.version)
+        self.assertEqual(4, history.record([[1, 2], [2, 3]], [0, 1]))
+        self.assertEqual(5, history.record([[3, 4]], [1]))
+        self.assertEqual({(1, 2): 1}, self._snapshot(history, 3))
+        self.assertEqual({(1, 2): 0, (2, 3): 1}, self._snapshot(history, 4))
+        self.assertEqual({(1, 2): 0, (2, 3): 1, (3, 4): 1}, self._snapshot(history, 5))
+
+        history.truncate(4)
+        self.assertEqual(5, history.version)
+        self.assertRaises(ValueError, history.diff, 5, 3)
+        self._assertDiff(history, 5, 4, {(3, 4): UNLABELED})
+        self.assertEqual({(1, 2): 0, (2, 3): 1}, self._snapshot(history, 4))
+        self.assertRaises(ValueError, history.truncate, 3)
+
+    def _snapshot(self, history, version):
+        uv_pairs, labels = history.snapshot(version)
+        return {tuple(uv): label for uv, label in zip(uv_pairs.tolist(), labels.tolist())}
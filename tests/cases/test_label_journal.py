@@ -0,0 +1,111 @@
+from __future__ import print_function
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from pias.edges import EdgeIndex
+from pias.label_journal import LabelJournal, read_label_journal, read_label_journal_batches, write_label_journal
+
+from .util import tempdir
+
+
+class TestLabelJournal(unittest.TestCase):
+
+    def testAppendAndRead(self):
+        with tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'labels.journal')
+            journal = LabelJournal(path, sync_interval=0.01)
+            journal.append(np.array([[0, 1], [1, 2]], dtype=np.uint64), np.array([1, 1]))
+            journal.append(((2, 3),), (0,))
+            self.assertEqual(2, journal.num_records)
+            journal.close()
+
+            uv_pairs, labels = read_label_journal(path)
+            np.testing.assert_array_equal([[0, 1], [1, 2], [2, 3]], uv_pairs)
+            np.testing.assert_array_equal([1, 1, 0], labels)
+            self.assertEqual(np.uint64, uv_pairs.dtype)
+
+    def testInvalidLabels(self):
+        with tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'labels.journal')
+            journal = LabelJournal(path)
+            # would wrap around to valid labels if cast to int8
+            self.assertRaises(ValueError, journal.append, ((0, 1), (1, 2)), (1, 257))
+            self.assertRaises(ValueError, journal.append, ((0, 1),), (0.5,))
+            journal.append(((0, 1),), (-1,))
+            self.assertEqual(1, journal.num_records)
+            journal.close()
+            np.testing.assert_array_equal([-1], read_label_journal(path)[1])
+
+    def testTruncatedRecordIsIgnored(self):
+        with tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'labels.journal')
+            journal = LabelJournal(path)
+            journal.append(((0, 1),), (1,))
+            journal.append(((1, 2),), (0,))
+            journal.close()
+
+            # simulate crash during write of the last record
+            with open(path, 'r+b') as f:
+                f.truncate(os.path.getsize(path) - 3)
+            uv_pairs, labels = read_label_journal(path)
+            np.testing.assert_array_equal([[0, 1]], uv_pairs)
+            np.testing.assert_array_equal([1], labels)
+
+            # re-opening drops the incomplete record before appending
+            journal = LabelJournal(path)
+            self.assertEqual(1, journal.num_records)
+            journal.append(((2, 3),), (0,))
+            journal.close()
+            uv_pairs, labels = read_label_journal(path)
+            np.testing.assert_array_equal([[0, 1], [2, 3]], uv_pairs)
+            np.testing.assert_array_equal([1, 0], labels)
+
+    def testRotate(self):
+        with tempdir() as tmpdir:
+            path    = os.path.join(tmpdir, 'labels.journal')
+            rotated = path + '.000000'
+            journal = LabelJournal(path)
+            journal.append(((0, 1),), (1,))
+            journal.rotate(rotated)
+            self.assertEqual(0, journal.num_records)
+            journal.append(((1, 2),), (0,))
+            journal.close()
+            np.testing.assert_array_equal([[0, 1]], read_label_journal(rotated)[0])
+            np.testing.assert_array_equal([[1, 2]], read_label_journal(path)[0])
+
+    def testBatches(self):
+        with tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'labels.journal')
+            write_label_journal(path, [(((0, 1), (1, 2)), (1, 0)), (np.empty((0, 2)), ()), (((2, 3),), (-1,))])
+            self.assertEqual(['labels.journal'], os.listdir(tmpdir))
+            batches = read_label_journal_batches(path)
+            self.assertEqual([2, 0, 1], [labels.size for _, labels in batches])
+            np.testing.assert_array_equal([[0, 1], [1, 2]], batches[0][0])
+            self.assertEqual(np.uint64, batches[0][0].dtype)
+            np.testing.assert_array_equal([-1], batches[2][1])
+            journal = LabelJournal(path)
+            self.assertEqual(3, journal.num_records)
+            journal.close()
+            self.assertEqual([], read_label_journal_batches(os.path.join(tmpdir, 'does-not-exist.journal')))
+
+    def testReadMissingJournal(self):
+        uv_pairs, labels = read_label_journal(os.path.join(tempfile.gettempdir(), 'does-not-exist.journal'))
+        self.assertEqual((0, 2), uv_pairs.shape)
+        self.assertEqual((0,), labels.shape)
+
+
+class TestEdgeIndex(unittest.TestCase):
+
+    def test(self):
+        edges = np.array([[3, 1], [0, 2], [0, 1], [2 ** 40, 5]], dtype=np.uint64)
+        index = EdgeIndex(edges)
+        self.assertEqual(4, len(index))
+        np.testing.assert_array_equal([1, 0, -1, 3, -1], index.lookup([[0, 2], [3, 1], [1, 1], [2 ** 40, 5], [1, 0]]))
+        self.assertIn((0, 1), index)
+        self.assertNotIn((1, 0), index)
+        self.assertEqual(2, index[(0, 1)])
+        self.assertRaises(KeyError, lambda: index[(1, 0)])
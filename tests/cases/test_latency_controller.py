@@ -0,0 +1,73 @@
+from __future__ import print_function
+
+import unittest
+
+from pias.latency_controller import LatencyController
+
+
+class TestLatencyController(unittest.TestCase):
+
+    def testTrees(self):
+        controller = LatencyController(1., n_estimators=100, solver='greedy-additive')
+        # 0.4s left for 100 trees after solving and everything else: 0.008s per tree, 50 trees fit
+        controller.observe(fit=0.5, predict=0.3, solve=0.3, total=1.2, num_edges=100)
+        self.assertEqual(50, controller.settings()['n_estimators'])
+        self.assertEqual(dict(fit=0.5, predict=0.3, solve=0.3, other=0.1, total=1.2), {k: round(v, 6) for k, v in controller.settings()['observed'].items()})
+        # at most doubled per update
+        controller.observe(fit=0.01, predict=0.01, solve=0.1, total=0.12, num_edges=100)
+        self.assertEqual(100, controller.settings()['n_estimators'])
+        self.assertEqual(dict(n_estimators=100, max_depth=None, criterion='gini'), controller.random_forest_kwargs(dict(criterion='gini', n_estimators=10)))
+
+    def testDepth(self):
+        controller = LatencyController(1., n_estimators=4, solver='greedy-additive')
+        controller.observe(fit=1., predict=1., solve=0.1, total=2.1, num_edges=100)
+        self.assertEqual((4, 16), (controller.n_estimators, controller.max_depth))
+        controller.observe(fit=1., predict=1., solve=0.1, total=2.1, num_edges=100)
+        self.assertEqual((4, 8), (controller.n_estimators, controller.max_depth))
+        # 4 trees took 2s at depth 16: more trees instead of deeper trees
+        controller.observe(fit=0.01, predict=0.01, solve=0.1, total=0.12, num_edges=100)
+        self.assertEqual((8, 8), (controller.n_estimators, controller.max_depth))
+
+        # depth before trees if not observed yet
+        controller = LatencyController(1., n_estimators=4, max_depth=8, solver='greedy-additive')
+        controller.observe(fit=0.01, predict=0.01, solve=0.1, total=0.12, num_edges=100)
+        self.assertEqual((4, 16), (controller.n_estimators, controller.max_depth))
+        controller.observe(fit=0.01, predict=0.01, solve=0.1, total=0.12, num_edges=100)
+        controller.observe(fit=0.01, predict=0.01, solve=0.1, total=0.12, num_edges=100)
+        self.assertEqual((8, None), (controller.n_estimators, controller.max_depth))
+
+    def testDepthSettles(self):
+        # 1s per tree without depth limit, 0.25s per tree at depth 16: 4 trees only fit at depth 16
+        tree_seconds = {None: 1., 16: 0.25, 8: 0.1, 4: 0.05}
+        controller   = LatencyController(2.5, n_estimators=4, solver='greedy-additive')
+        totals       = []
+        for _ in range(100):
+            total = controller.n_estimators * tree_seconds[controller.max_depth]
+            totals.append(total)
+            controller.observe(fit=total, predict=0., solve=0., total=total, num_edges=100)
+        self.assertEqual((8, 16), (controller.n_estimators, controller.max_depth))
+        self.assertTrue(all(total <= 2.5 for total in totals[1:]), totals)
+
+    def testSolver(self):
+        controller = LatencyController(1., solver='kernighan-lin', probe_interval=2)
+        controller.observe(fit=0.1, predict=0.1, solve=0.5, total=0.7, num_edges=100)
+        self.assertEqual('nifty-greedy-additive', controller.settings()['solver'])
+        controller.observe(fit=0.1, predict=0.1, solve=0.01, total=0.21, num_edges=100)
+        self.assertEqual('nifty-greedy-additive', controller.settings()['solver'])
+        controller.observe(fit=0.1, predict=0.1, solve=0.01, total=0.21, num_edges=100)
+        self.assertEqual('kernighan-lin', controller.settings()['solver'])
+        # no faster solver to fall back to
+        controller = LatencyController(1., solver='greedy-additive')
+        controller.observe(fit=0.1, predict=0.1, solve=5., total=5.2, num_edges=100)
+        self.assertEqual('greedy-additive', controller.settings()['solver'])
+
+    def testChunks(self):
+        controller = LatencyController(1., solver='greedy-additive', min_chunk_size=10)
+        # 0.08s per chunk of 0.8s budget
+        controller.observe(fit=0.1, predict=0.8, solve=0.1, total=1., num_edges=1000)
+        self.assertEqual(100, controller.settings()['prediction_chunk_size'])
+        controller.observe(fit=0.1, predict=0.01, solve=0.1, total=0.21, num_edges=1000)
+        self.assertIsNone(controller.settings()['prediction_chunk_size'])
+
+    def testInvalidTarget(self):
+        self.assertRaises(ValueError, LatencyController, 0.)
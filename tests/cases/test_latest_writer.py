@@ -0,0 +1,56 @@
+from __future__ import print_function
+
+import threading
+import unittest
+
+from pias.latest_writer import LatestWriter
+
+
+class TestLatestWriter(unittest.TestCase):
+
+    def test(self):
+        started = threading.Event()
+        blocked = threading.Event()
+        written = []
+
+        def write(value):
+            started.set()
+            blocked.wait()
+            written.append(value)
+
+        writer = LatestWriter(write)
+        try:
+            self.assertFalse(writer.submit(1))
+            self.assertTrue(started.wait(5))
+            # 1 is being written: 2 is superseded by 3 before its write starts
+            self.assertFalse(writer.submit(2))
+            self.assertTrue(writer.submit(3))
+            self.assertFalse(writer.wait(timeout=0.01))
+            blocked.set()
+            self.assertTrue(writer.wait(timeout=5))
+            self.assertEqual([1, 3], written)
+            self.assertEqual((2, 1), (writer.num_written, writer.num_dropped))
+        finally:
+            blocked.set()
+            writer.shutdown()
+
+    def testShutdown(self):
+        written = []
+        writer  = LatestWriter(written.append)
+        writer.submit(1)
+        writer.shutdown()
+        # pending value is written before the thread stops
+        self.assertEqual([1], written)
+        self.assertRaises(RuntimeError, writer.submit, 2)
+
+    def testError(self):
+        def write(value):
+            if value == 1:
+                raise ValueError(value)
+        writer = LatestWriter(write)
+        writer.submit(1)
+        writer.wait(timeout=5)
+        writer.submit(2)
+        self.assertTrue(writer.wait(timeout=5))
+        self.assertEqual(2, writer.num_written)
+        writer.shutdown()
@@ -0,0 +1,57 @@
+from __future__ import print_function
+
+import json
+import threading
+import unittest
+
+from pias.metrics import Histogram, Metrics
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test(self):
+        histogram = Histogram(buckets=(1., 2., 4.))
+        self.assertIsNone(histogram.quantile(0.5))
+        for value in (0.5, 1.5, 1.5, 3., 10.):
+            histogram.observe(value)
+        snapshot = histogram.snapshot()
+        self.assertEqual(5, snapshot['count'])
+        self.assertAlmostEqual(16.5, snapshot['sum'])
+        self.assertEqual(0.5, snapshot['min'])
+        self.assertEqual(10., snapshot['max'])
+        self.assertEqual([[1., 1], [2., 2], [4., 1], [None, 1]], snapshot['buckets'])
+        self.assertEqual(2., histogram.quantile(0.5))
+        self.assertEqual(10., histogram.quantile(1.))
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test(self):
+        metrics = Metrics()
+
+        @metrics.timed('decorated')
+        def decorated(value):
+            return value
+
+        self.assertEqual(3, decorated(3))
+        with self.assertRaises(ValueError):
+            with metrics.time('raises'):
+                raise ValueError()
+
+        threads = [threading.Thread(target=lambda: [metrics.timer('concurrent').observe(0.1) for _ in range(1000)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        metrics.gauge('depth').set(3)
+
+        snapshot = json.loads(metrics.to_json())
+        self.assertEqual(1, snapshot['timers']['decorated']['count'])
+        self.assertEqual(1, snapshot['timers']['raises']['count'])
+        self.assertEqual(4000, snapshot['timers']['concurrent']['count'])
+        self.assertEqual(3, snapshot['gauges']['depth']['value'])
+        self.assertEqual(1, snapshot['gauges']['depth']['histogram']['count'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from pias.profiling import Profiler
+from pias.solver_server import SolverServer
+
+
+def _work():
+    return sum(i * i for i in range(10000))
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test(self):
+        profiler = Profiler(os.path.join(self.tmp_dir, 'profiles'), top=5)
+        with profiler.profile('update', 'not-requested'):
+            _work()
+        self.assertEqual([], profiler.get_results())
+        self.assertFalse(os.path.exists(profiler.directory))
+
+        profiler.request('update', 2, memory=True)
+        for name in ('first', 'second', 'third'):
+            with profiler.profile('update', name):
+                _work()
+        with profiler.profile('endpoints', 'other-target'):
+            _work()
+
+        results = profiler.get_results()
+        self.assertEqual(['first', 'second'], [r['name'] for r in results])
+        for result in results:
+            self.assertTrue(os.path.isfile(result['path']))
+            self.assertTrue(os.path.isfile(result['memory_path']))
+            self.assertIn('_work', result['summary'])
+
+        profiler.request('endpoints', 1)
+        with profiler.profile('endpoints', 'ping'):
+            _work()
+        self.assertIsNone(profiler.get_results()[-1]['memory_path'])
+
+        # runs of the same name within one second do not overwrite each other
+        profiler.request('endpoints', 3)
+        for _ in range(3):
+            with profiler.profile('endpoints', 'ping'):
+                _work()
+        self.assertEqual(3, len({r['path'] for r in profiler.get_results()[-3:]}))
+        self.assertRaises(ValueError, profiler.request, 'unknown', 1)
+
+    def testParseRequest(self):
+        self.assertEqual(('update', 3, False), SolverServer.parse_profile_request('/api/profile/update/3'))
+        self.assertEqual(('endpoints', 1, True), SolverServer.parse_profile_request('/api/profile/endpoints/1/memory'))
+        for endpoint in ('/api/profile/update', '/api/profile/unknown/1', '/api/profile/update/x', '/api/profile/update/1/cpu'):
+            self.assertRaises(ValueError, SolverServer.parse_profile_request, endpoint)
+
+
+if __name__ == '__main__':
+    unittest.main()
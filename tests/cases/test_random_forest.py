@@ -0,0 +1,30 @@
+from __future__ import print_function
+
+import unittest
+
+import numpy as np
+
+from pias.random_forest import RandomForestModelCache
+
+
+class TestRandomForestModelCache(unittest.TestCase):
+
+    def testPredictDoesNotModifyModel(self):
+        rng     = np.random.RandomState(0)
+        samples = rng.rand(200, 3)
+        labels  = (samples[:, 0] > 0.5).astype(np.int64)
+        cache   = RandomForestModelCache(random_forest_kwargs=dict(n_estimators=8, random_state=0))
+        # threads for training are not kept in the (shared) model
+        model   = cache.train_model(samples, labels, n_jobs=2)
+        self.assertIsNone(model.n_jobs)
+
+        expected = cache.predict(samples)
+        np.testing.assert_array_equal(expected, cache.predict(samples, n_jobs=2))
+        self.assertIs(model, cache.get_model())
+        self.assertIsNone(model.n_jobs)
+
+        # n_jobs of random_forest_kwargs is kept
+        cache = RandomForestModelCache(random_forest_kwargs=dict(n_estimators=8, random_state=0, n_jobs=1))
+        self.assertEqual(1, cache.train_model(samples, labels, n_jobs=2).n_jobs)
+        np.testing.assert_array_equal(expected, cache.predict(samples, n_jobs=2))
+        self.assertEqual(1, cache.get_model().n_jobs)
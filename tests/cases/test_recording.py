@@ -0,0 +1,79 @@
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from pias.recording import FETCH, LABELS, SOLUTION, UPDATE_REQUEST, RequestRecorder, edge_agreement, read_recording
+
+
+class TestRequestRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test(self):
+        path     = os.path.join(self.tmp_dir, 'requests.log')
+        uv_pairs = np.array([[0, 1], [1, 2], [2**40, 3]], dtype=np.uint64)
+        labels   = np.array([1, 0, 1], dtype=np.int32)
+        solution = np.array([1, 1, 2, 3], dtype=np.uint64)
+
+        recorder = RequestRecorder(path)
+        recorder.record_labels(uv_pairs, labels)
+        recorder.record_update_request(0)
+        recorder.record_fetch(-1)
+        recorder.record_solution(0, 0, solution)
+        recorder.record_solution(1, 1, None)
+        recorder.close()
+        # records after close are dropped
+        recorder.record_fetch(0)
+
+        _, requests = read_recording(path)
+        self.assertEqual([LABELS, UPDATE_REQUEST, FETCH, SOLUTION, SOLUTION], [r.kind for r in requests])
+        self.assertEqual([-1, 0, -1, 0, 1], [r.solution_id for r in requests])
+        self.assertEqual(sorted(r.time for r in requests), [r.time for r in requests])
+        np.testing.assert_array_equal(uv_pairs, requests[0].uv_pairs)
+        np.testing.assert_array_equal(labels, requests[0].labels)
+        np.testing.assert_array_equal(solution, requests[3].solution)
+        self.assertEqual(1, requests[4].exit_code)
+        self.assertIsNone(requests[4].solution)
+
+        # truncated record at the end of the log is ignored
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:-3])
+        _, requests = read_recording(path)
+        self.assertEqual(4, len(requests))
+
+    def test_invalid_labels(self):
+        path     = os.path.join(self.tmp_dir, 'requests.log')
+        recorder = RequestRecorder(path)
+        self.assertRaises(ValueError, recorder.record_labels, np.array([[0, 1]], dtype=np.uint64), np.array([256]))
+        recorder.close()
+        self.assertEqual([], read_recording(path)[1])
+
+    def test_without_solutions(self):
+        path     = os.path.join(self.tmp_dir, 'requests.log')
+        recorder = RequestRecorder(path, record_solutions=False)
+        recorder.record_solution(3, 0, np.arange(5, dtype=np.uint64))
+        recorder.close()
+        _, requests = read_recording(path)
+        self.assertEqual(1, len(requests))
+        self.assertEqual(3, requests[0].solution_id)
+        self.assertIsNone(requests[0].solution)
+
+
+class TestEdgeAgreement(unittest.TestCase):
+
+    def test(self):
+        edges = np.array([[0, 1], [1, 2], [2, 3]], dtype=np.int64)
+        self.assertEqual(1., edge_agreement(edges, np.array([1, 1, 2, 2]), np.array([5, 5, 7, 7])))
+        self.assertAlmostEqual(1. / 3., edge_agreement(edges, np.array([1, 1, 2, 2]), np.array([1, 1, 1, 2])))
+        self.assertEqual(1., edge_agreement(edges[:0], np.array([1]), np.array([2])))
@@ -0,0 +1,102 @@
+from __future__ import print_function
+
+import unittest
+
+import numpy as np
+
+from pias.graph import Adjacency, concatenated_ranges
+from pias.region import _terminal_pairs, merge_parallel_edges, solve_region
+
+
+def _join_attractive_edges(number_of_nodes, uv_ids, costs):
+    # connected components of attractive edges: exact for the small problems in these tests
+    labels = np.arange(number_of_nodes)
+    for (u, v), cost in zip(uv_ids, costs):
+        if cost > 0:
+            labels[labels == labels[v]] = labels[u]
+    return labels
+
+
+class TestAdjacency(unittest.TestCase):
+
+    def test(self):
+        np.testing.assert_array_equal([3, 4, 7, 0, 1, 2], concatenated_ranges([3, 7, 0], [2, 1, 3]))
+
+        # 0 - 1 - 2 - 3   4
+        edges     = np.array([[0, 1], [2, 1], [2, 3]], dtype=np.uint64)
+        adjacency = Adjacency(5, edges)
+        np.testing.assert_array_equal([0, 2], adjacency.neighbors_of([1]))
+        np.testing.assert_array_equal([0, 1, 2], adjacency.incident_edges([1, 2]))
+        np.testing.assert_array_equal([], adjacency.neighbors_of([4, 10]))
+        np.testing.assert_array_equal([0], adjacency.expand([0], 0))
+        np.testing.assert_array_equal([0, 1, 2], adjacency.expand([0], 2))
+        np.testing.assert_array_equal([0, 1, 2, 3], adjacency.expand([0], 10))
+
+
+class TestSolveRegion(unittest.TestCase):
+
+    def testMergeParallelEdges(self):
+        uv, costs = merge_parallel_edges([[1, 0], [0, 1], [2, 2], [1, 2]], [1., 2., 5., -1.])
+        np.testing.assert_array_equal([[0, 1], [1, 2]], uv)
+        np.testing.assert_array_equal([3., -1.], costs)
+
+    def test(self):
+        # chain 0 - 1 - 2 - 3 - 4 - 5 with global solution {0, 1, 2} {3, 4, 5}
+        edges     = np.array([[0, 1], [1, 2], [2, 3], [3, 4], [4, 5]], dtype=np.uint64)
+        adjacency = Adjacency(6, edges)
+        solution  = np.array([7, 7, 7, 8, 8, 8], dtype=np.uint64)
+
+        # boundary segments are fixed
+        nodes, segments = solve_region(adjacency, edges, np.array([1., 1., -1., 1., 1.]), solution, [2, 3], 0, _join_attractive_edges)
+        np.testing.assert_array_equal([2, 3], nodes)
+        np.testing.assert_array_equal([7, 8], segments)
+
+        # merging 2 and 3 merges with first terminal only: the two terminals repel each other
+        nodes, segments = solve_region(adjacency, edges, np.array([1., 1., 5., 1., 1.]), solution, [2, 3], 0, _join_attractive_edges)
+        np.testing.assert_array_equal([7, 7], segments)
+
+        # split off region from both neighbors: fresh id
+        nodes, segments = solve_region(adjacency, edges, np.array([1., -1., 1., -1., 1.]), solution, [2], 1, _join_attractive_edges)
+        np.testing.assert_array_equal([1, 2, 3], nodes)
+        np.testing.assert_array_equal([7, 9, 9], segments)
+
+        # updated costs of region edges replace the costs, updates outside of the region are ignored
+        costs           = np.array([1., 1., -1., 1., 1.])
+        nodes, segments = solve_region(adjacency, edges, costs, solution, [2, 3], 0, _join_attractive_edges, cost_updates=([0, 2], [-1., 5.]))
+        np.testing.assert_array_equal([7, 7], segments)
+        np.testing.assert_array_equal([1., 1., -1., 1., 1.], costs)
+
+        # fragments that are not in the graph are ignored
+        nodes, segments = solve_region(adjacency, edges, np.array([1., 1., -1., 1., 1.]), solution, [2, 6, 100], 0, _join_attractive_edges)
+        np.testing.assert_array_equal([2], nodes)
+        np.testing.assert_array_equal([7], segments)
+
+        # region without boundary
+        nodes, segments = solve_region(adjacency, edges, np.array([-1., -1., -1., -1., -1.]), solution, [0], 10, _join_attractive_edges)
+        np.testing.assert_array_equal(np.arange(6), nodes)
+        self.assertEqual(6, np.unique(segments).size)
+        self.assertTrue(np.all(segments > 8))
+
+    def testTerminalPairs(self):
+        # component 0 touches terminals 0, 1, 2, component 1 touches terminals 2, 3, component 2 touches terminal 4
+        pairs = _terminal_pairs(np.array([0, 0, 1, 0, 1, 2, 0]), np.array([0, 1, 2, 2, 3, 4, 1]))
+        np.testing.assert_array_equal([[0, 1], [0, 2], [1, 2], [2, 3]], pairs)
+        self.assertEqual((0, 2), _terminal_pairs(np.array([], dtype=np.int64), np.array([], dtype=np.int64)).shape)
+
+    def testSeparateComponents(self):
+        # 0 - 1 - 2   3 - 4 - 5 with region {1, 4}: terminals of separate region components do not repel each other
+        edges     = np.array([[0, 1], [1, 2], [3, 4], [4, 5]], dtype=np.uint64)
+        adjacency = Adjacency(6, edges)
+        solution  = np.array([1, 1, 2, 3, 3, 4], dtype=np.uint64)
+        problems  = []
+        def solve(number_of_nodes, uv_ids, costs):
+            problems.append((number_of_nodes, uv_ids, costs))
+            return _join_attractive_edges(number_of_nodes, uv_ids, costs)
+        nodes, segments = solve_region(adjacency, edges, np.array([1., -1., -1., 1.]), solution, [1, 4], 0, solve)
+        np.testing.assert_array_equal([1, 4], nodes)
+        np.testing.assert_array_equal([1, 4], segments)
+        number_of_nodes, uv_ids, costs = problems[0]
+        self.assertEqual(6, number_of_nodes)
+        # four boundary edges and one repulsive edge between the terminals of each region node
+        self.assertEqual(6, costs.size)
+        self.assertEqual(2, np.count_nonzero(costs < -1))
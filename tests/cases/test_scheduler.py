@@ -0,0 +1,93 @@
+from __future__ import print_function
+
+import threading
+import time
+import unittest
+
+from pias.scheduler import UpdateScheduler
+
+
+class TestUpdateScheduler(unittest.TestCase):
+
+    def test_order_and_concurrency(self):
+        scheduler = UpdateScheduler(num_threads=2)
+        lock      = threading.Lock()
+        order     = {'a': [], 'b': [], 'c': []}
+        running   = dict(total=0, max=0, per_owner={owner: 0 for owner in order})
+        done      = threading.Semaphore(0)
+
+        def task(owner, index):
+            def run():
+                with lock:
+                    running['total'] += 1
+                    running['per_owner'][owner] += 1
+                    running['max'] = max(running['max'], running['total'])
+                    self.assertEqual(1, running['per_owner'][owner])
+                time.sleep(0.005)
+                with lock:
+                    order[owner].append(index)
+                    running['total'] -= 1
+                    running['per_owner'][owner] -= 1
+                done.release()
+            return run
+
+        try:
+            for index in range(10):
+                for owner in order:
+                    scheduler.submit(owner, task(owner, index))
+            for _ in range(30):
+                self.assertTrue(done.acquire(timeout=10))
+            self.assertEqual(2, running['max'])
+            for owner in order:
+                self.assertEqual(list(range(10)), order[owner])
+                self.assertEqual(0, scheduler.num_pending(owner))
+        finally:
+            scheduler.stop()
+
+    def test_round_robin(self):
+        scheduler = UpdateScheduler(num_threads=1)
+        started   = threading.Event()
+        release   = threading.Event()
+        order     = []
+        done      = threading.Semaphore(0)
+
+        def blocking():
+            started.set()
+            release.wait()
+
+        def record(owner):
+            def run():
+                order.append(owner)
+                done.release()
+            return run
+
+        try:
+            scheduler.submit('blocker', blocking)
+            self.assertTrue(started.wait(10))
+            for _ in range(3):
+                scheduler.submit('a', record('a'))
+            for _ in range(3):
+                scheduler.submit('b', record('b'))
+            self.assertEqual(3, scheduler.num_pending('a'))
+            self.assertEqual(1, scheduler.num_pending('blocker'))
+            self.assertEqual(0, scheduler.num_queued('blocker'))
+            release.set()
+            for _ in range(6):
+                self.assertTrue(done.acquire(timeout=10))
+            self.assertEqual(['a', 'b', 'a', 'b', 'a', 'b'], order)
+        finally:
+            scheduler.stop()
+
+    def test_failing_task(self):
+        scheduler = UpdateScheduler(num_threads=1)
+        done      = threading.Event()
+
+        def fail():
+            raise Exception('failing task')
+
+        try:
+            scheduler.submit('a', fail)
+            scheduler.submit('a', done.set)
+            self.assertTrue(done.wait(10))
+        finally:
+            scheduler.stop()
@@ -0,0 +1,44 @@
+from __future__ import print_function
+
+import os
+import unittest
+
+import numpy as np
+
+from pias.shared_solution import SharedSolutionFile, SharedSolutionReader
+
+from .util import tempdir
+
+
+class TestSharedSolutionFile(unittest.TestCase):
+
+    def test(self):
+        with tempdir() as tmpdir:
+            path   = os.path.join(tmpdir, 'solution.bin')
+            writer = SharedSolutionFile(path)
+            writer.write(0, np.array([0, 0, 0, 1], dtype=np.uint64))
+            reader = SharedSolutionReader(path)
+
+            solution_id, slot, solution = reader.current()
+            self.assertEqual(0, solution_id)
+            self.assertEqual(np.dtype('>u8'), solution.dtype)
+            np.testing.assert_array_equal([0, 0, 0, 1], solution)
+            generation = reader.generation(slot)
+
+            # double buffering: previous view is untouched by next solution
+            writer.write(1, np.array([0, 1, 1, 1], dtype=np.uint64))
+            np.testing.assert_array_equal([0, 0, 0, 1], solution)
+            self.assertEqual(generation, reader.generation(slot))
+            solution_id, next_slot, next_solution = reader.current()
+            self.assertEqual(1, solution_id)
+            self.assertNotEqual(slot, next_slot)
+            np.testing.assert_array_equal([0, 1, 1, 1], next_solution)
+
+            # larger solutions replace the file, existing views stay valid
+            writer.write(2, np.arange(100, dtype=np.uint64))
+            np.testing.assert_array_equal([0, 1, 1, 1], next_solution)
+            solution_id, _, solution = reader.current()
+            self.assertEqual(2, solution_id)
+            np.testing.assert_array_equal(np.arange(100), solution)
+
+            writer.close()
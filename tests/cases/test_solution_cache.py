@@ -0,0 +1,124 @@
+from __future__ import print_function
+
+import os
+import unittest
+
+import numpy as np
+
+from pias.checkpoint import StateCheckpoint
+from pias.solution_cache import SolutionCache, checkpoint_bytes, label_fingerprint
+
+from .util import tempdir
+
+
+def _checkpoint(solution_id):
+    return StateCheckpoint(
+        solution_id         = solution_id,
+        model               = dict(solution_id=solution_id),
+        merge_probabilities = np.full((5,), solution_id / 10., dtype=np.float32),
+        solution            = np.full((4,), solution_id, dtype=np.uint64),
+        indices             = np.array([0, 4], dtype=np.uint64),
+        labels              = np.array([1, 0], dtype=np.uint64),
+        uv_pairs            = np.array([[0, 1], [2, 3]], dtype=np.uint64))
+
+
+class TestLabelFingerprint(unittest.TestCase):
+
+    def test(self):
+        fingerprint = label_fingerprint([0, 4, 2], [1, 0, 1], 5, random_forest_kwargs=dict(n_estimators=100))
+        self.assertEqual(fingerprint, label_fingerprint([4, 2, 0], [0, 1, 1], 5, random_forest_kwargs=dict(n_estimators=100)))
+        self.assertNotEqual(fingerprint, label_fingerprint([0, 4, 2], [1, 1, 1], 5, random_forest_kwargs=dict(n_estimators=100)))
+        self.assertNotEqual(fingerprint, label_fingerprint([0, 4], [1, 0], 5, random_forest_kwargs=dict(n_estimators=100)))
+        self.assertNotEqual(fingerprint, label_fingerprint([0, 4, 2], [1, 0, 1], 6, random_forest_kwargs=dict(n_estimators=100)))
+        self.assertNotEqual(fingerprint, label_fingerprint([0, 4, 2], [1, 0, 1], 5, random_forest_kwargs=dict(n_estimators=10)))
+        self.assertNotEqual(fingerprint, label_fingerprint([0, 4, 2], [1, 0, 1], 5, random_forest_kwargs=dict(n_estimators=100), solver='greedy-additive'))
+
+
+# bytes of the arrays of _checkpoint, the model is not counted
+_CHECKPOINT_BYTES = 5 * 4 + 4 * 8 + 2 * 8 + 2 * 8 + 4 * 8
+
+
+class TestSolutionCache(unittest.TestCase):
+
+    def testCheckpointBytes(self):
+        self.assertEqual(_CHECKPOINT_BYTES, checkpoint_bytes(_checkpoint(0)))
+        from sklearn.ensemble import RandomForestClassifier
+        checkpoint       = _checkpoint(0)
+        checkpoint.model = RandomForestClassifier(n_estimators=2).fit(np.random.rand(20, 3), np.arange(20) % 2)
+        self.assertGreater(checkpoint_bytes(checkpoint), _CHECKPOINT_BYTES)
+
+    def testMemoryOnly(self):
+        cache = SolutionCache(max_bytes=2 * _CHECKPOINT_BYTES)
+        for solution_id in range(3):
+            cache.put('%d' % solution_id, _checkpoint(solution_id))
+        self.assertIsNone(cache.get('0'))
+        self.assertEqual(1, cache.get('1').solution_id)
+        cache.put('3', _checkpoint(3))
+        # 2 was used least recently
+        self.assertIsNone(cache.get('2'))
+        self.assertEqual(dict(hits=1, misses=2, memory=2, disk=0, memory_bytes=2 * _CHECKPOINT_BYTES), cache.stats())
+        self.assertEqual(10, len(cache.arrays()))
+
+    def testSpill(self):
+        with tempdir() as tmpdir:
+            directory = os.path.join(tmpdir, 'solution-cache')
+            cache     = SolutionCache(max_bytes=_CHECKPOINT_BYTES, directory=directory, disk_capacity=2)
+            for solution_id in range(4):
+                cache.put('%d' % solution_id, _checkpoint(solution_id))
+                cache.wait()
+            self.assertEqual(['1.npz', '2.npz'], sorted(os.listdir(directory)))
+            self.assertIsNone(cache.get('0'))
+
+            checkpoint = cache.get('1')
+            self.assertEqual(1, checkpoint.solution_id)
+            self.assertEqual(dict(solution_id=1), checkpoint.model)
+            np.testing.assert_array_equal(_checkpoint(1).merge_probabilities, checkpoint.merge_probabilities)
+            np.testing.assert_array_equal(_checkpoint(1).solution, checkpoint.solution)
+            # 1 moved back into memory, 3 was spilled
+            cache.wait()
+            self.assertEqual(['2.npz', '3.npz'], sorted(os.listdir(directory)))
+            self.assertEqual(dict(hits=1, misses=1, memory=1, disk=2, memory_bytes=_CHECKPOINT_BYTES), cache.stats())
+
+            cache.spill()
+            cache.wait()
+            self.assertEqual(0, len(cache.arrays()))
+            self.assertEqual(['1.npz', '3.npz'], sorted(os.listdir(directory)))
+
+            # spilled entries of previous runs are removed
+            self.assertEqual(dict(hits=0, misses=0, memory=0, disk=0, memory_bytes=0), SolutionCache(directory=directory).stats())
+            self.assertEqual([], os.listdir(directory))
+
+    def testClear(self):
+        with tempdir() as tmpdir:
+            cache = SolutionCache(max_bytes=_CHECKPOINT_BYTES, directory=tmpdir)
+            cache.put('0', _checkpoint(0))
+            cache.put('1', _checkpoint(1))
+            cache.wait()
+            cache.clear()
+            self.assertEqual([], os.listdir(tmpdir))
+            self.assertIsNone(cache.get('1'))
+
+    def testPendingSpill(self):
+        with tempdir() as tmpdir:
+            cache = SolutionCache(max_bytes=_CHECKPOINT_BYTES, directory=tmpdir)
+            # the spill thread waits for the lock: entries stay in memory until written
+            with cache.lock:
+                cache.put('0', _checkpoint(0))
+                cache.put('1', _checkpoint(1))
+                self.assertEqual(10, len(cache.arrays()))
+                # 1 is dropped while the spilled entry of 0 waits to be written
+                cache.put('2', _checkpoint(2))
+                self.assertEqual(0, cache.get('0').solution_id)
+            cache.wait()
+            # 0 was not written after it moved back into memory, 2 was spilled
+            self.assertEqual(['2.npz'], os.listdir(tmpdir))
+            self.assertIsNone(cache.get('1'))
+            self.assertEqual(dict(hits=1, misses=1, memory=1, disk=1, memory_bytes=_CHECKPOINT_BYTES), cache.stats())
+
+    def testLargeEntry(self):
+        # the newest entry is kept even if it exceeds the limit on its own
+        cache = SolutionCache(max_bytes=1)
+        cache.put('0', _checkpoint(0))
+        cache.put('1', _checkpoint(1))
+        self.assertIsNone(cache.get('0'))
+        self.assertEqual(1, cache.get('1').solution_id)
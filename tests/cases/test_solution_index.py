@@ -0,0 +1,30 @@
+from __future__ import print_function
+
+import unittest
+
+import numpy as np
+
+from pias.solution_index import INVALID_ID, SolutionIndex
+
+
+class TestSolutionIndex(unittest.TestCase):
+
+    def test(self):
+        index = SolutionIndex(np.array([5, 3, 5, 7, 3, 5], dtype=np.uint64))
+
+        np.testing.assert_array_equal([5, 3, 7, INVALID_ID], index.segments_of([0, 1, 3, 10]))
+
+        counts, fragments = index.fragments_of([5, 8, 3, 7, 5])
+        np.testing.assert_array_equal([3, 0, 2, 1, 3], counts)
+        np.testing.assert_array_equal([0, 2, 5, 1, 4, 3, 0, 2, 5], fragments)
+
+        counts, fragments = index.fragments_of([])
+        self.assertEqual(0, counts.size)
+        self.assertEqual(0, fragments.size)
+
+    def testEmptySolution(self):
+        index = SolutionIndex(np.empty((0,), dtype=np.uint64))
+        np.testing.assert_array_equal([INVALID_ID], index.segments_of([1]))
+        counts, fragments = index.fragments_of([1])
+        np.testing.assert_array_equal([0], counts)
+        self.assertEqual(0, fragments.size)
@@ -0,0 +1,59 @@
+from __future__ import print_function
+
+import os
+import unittest
+
+import numpy as np
+
+from pias.ext import z5py
+from pias.solution_n5 import SolutionN5Writer, changed_blocks, read_solution
+
+from .util import tempdir
+
+
+class TestChangedBlocks(unittest.TestCase):
+
+    def test(self):
+        previous = np.arange(10, dtype=np.uint64)
+        current  = previous.copy()
+        np.testing.assert_array_equal([0, 1, 2, 3], changed_blocks(None, current, 3))
+        np.testing.assert_array_equal([], changed_blocks(previous, current, 3))
+        current[4] = 0
+        current[9] = 0
+        np.testing.assert_array_equal([1, 3], changed_blocks(previous, current, 3))
+        np.testing.assert_array_equal([0, 1], changed_blocks(previous[:5], current, 5))
+
+
+class TestSolutionN5Writer(unittest.TestCase):
+
+    def test(self):
+        with tempdir() as tmpdir:
+            container = os.path.join(tmpdir, 'solution.n5')
+            writer    = SolutionN5Writer(container, dataset='lookup', chunk_size=3, num_threads=2)
+            try:
+                solution = np.array([0, 0, 0, 1, 1, 1, 2, 2], dtype=np.uint64)
+                self.assertEqual(3, writer.submit(0, solution).result())
+                updated = solution.copy()
+                updated[7] = 1
+                self.assertEqual(1, writer.submit(1, updated).result())
+            finally:
+                writer.shutdown()
+
+            self.assertEqual(1, read_solution(container, 'lookup')[0])
+            np.testing.assert_array_equal(updated, read_solution(container, 'lookup')[1])
+            f = z5py.File(container, use_zarr_format=False)
+            self.assertEqual('1', f['lookup'].attrs['current'])
+            np.testing.assert_array_equal(solution, f['lookup']['0'][...])
+
+            # persisted solution of previous run, only the newest pending solution is written
+            writer = SolutionN5Writer(container, dataset='lookup', chunk_size=3, num_threads=2, num_versions=1)
+            try:
+                futures = [writer.submit(solution_id, np.full(8, solution_id, dtype=np.uint64)) for solution_id in range(2, 12)]
+                self.assertEqual(3, futures[-1].result())
+                self.assertTrue(all(future.cancelled() or future.result() == 3 for future in futures[:-1]))
+            finally:
+                writer.shutdown()
+            solution_id, latest = read_solution(container, 'lookup')
+            self.assertEqual(11, solution_id)
+            np.testing.assert_array_equal(np.full(8, 11), latest)
+            self.assertEqual([f['lookup'].attrs['current']], [name for name in os.listdir(os.path.join(container, 'lookup')) if name.isdigit()])
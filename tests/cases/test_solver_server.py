@@ -1,13 +1,13 @@
 from __future__ import print_function
 
 from pias import pias_logging
+import json
 import logging
 
-import contextlib
 import os
 import shutil
-import tempfile
 import threading
+import time
 import unittest
 
 import numpy as np
@@ -16,22 +16,23 @@ import zmq
 
 from pias import SolverServer
 from pias import zmq_util
+from pias.benchmark.load import NOTIFICATION, check_latency_limits, load_test, partition_labels
+from pias.edge_values import COSTS, FLOAT16, FLOAT32, MERGE_PROBABILITIES, UINT8
+from pias.label_consistency import LabelConsistency
 from pias.solver_server import _NO_SOLUTION_AVAILABLE, _SET_EDGE_REQ_EDGE_LIST, _SET_EDGE_REP_SUCCESS, \
-    _SET_EDGE_REP_DO_NOT_UNDERSTAND, _SET_EDGE_REP_EXCEPTION, _PAINTERA_DATA_KEY
+    _SET_EDGE_REP_DO_NOT_UNDERSTAND, _SET_EDGE_REP_EXCEPTION, _SET_EDGE_REP_INCONSISTENT, _PAINTERA_DATA_KEY, \
+    _EDGE_VALUES_REP_EXCEPTION, _EDGE_VALUES_REQ_ALL, _EDGE_VALUES_REQ_IDS, _EDGE_VALUES_REQ_RANGE, _SUCCESS
 
 from pias.solver_server import API_RESPONSE_DATA_STRING, API_RESPONSE_ENDPOINT_UNKNOWN, API_RESPONSE_UNKNOWN_ERROR, \
     API_RESPONSE_DATA_INT, API_RESPONSE_DATA_UNKNOWN, API_RESPONSE_DATA_BYTES, API_HELP_STRING_TEMPLATE, API_RESPONSE_OK
+from pias.multi_server import MultiDatasetServer
+from pias.recording import FETCH, LABELS, SOLUTION, UPDATE_REQUEST, RecordedRequest, read_recording
+from pias.replay import replay
+from pias.scheduler import UpdateScheduler
 from pias.threading import CountDownLatch
 
+from .util import tempdir
 
-@contextlib.contextmanager
-def _tempdir():
-    """A context manager for creating and then deleting a temporary directory."""
-    tmpdir = tempfile.mkdtemp()
-    try:
-        yield tmpdir
-    finally:
-        shutil.rmtree(tmpdir)
 
 def _mk_dummy_edge_data(
         container,
@@ -76,7 +77,7 @@ class TestSolverServerPing(unittest.TestCase):
 
     def test(self):
 
-        with _tempdir() as tmpdir:
+        with tempdir() as tmpdir:
             container    = os.path.join(tmpdir, 'edge-group')
             _mk_dummy_edge_data(container)
             self.logger.debug('Starting solver server')
@@ -115,7 +116,7 @@ class TestSolverCurrentSolution(unittest.TestCase):
 
     def test(self):
 
-        with _tempdir() as tmpdir:
+        with tempdir() as tmpdir:
             container    = os.path.join(tmpdir, 'edge-group')
             _mk_dummy_edge_data(container)
             context = zmq.Context(1)
@@ -148,7 +149,7 @@ class TestSolverSetEdgeLabels(unittest.TestCase):
 
     def test(self):
 
-        with _tempdir() as tmpdir:
+        with tempdir() as tmpdir:
             container    = os.path.join(tmpdir, 'edge-group')
             edges, _, labels = _mk_dummy_edge_data(container)
             context = zmq.Context(1)
@@ -180,6 +181,21 @@ class TestSolverSetEdgeLabels(unittest.TestCase):
                 num_edges = zmq_util.recv_int(edge_label_socket)
                 self.assertEqual(len(labels), num_edges)
 
+                # 0 and 2 are connected through positive labels 0-1 and 1-2
+                zmq_util.send_more_int(edge_label_socket, _SET_EDGE_REQ_EDGE_LIST)
+                edge_label_socket.send(zmq_util._edges_as_bytes(((0, 2, 0),)))
+                response = edge_label_socket.recv_multipart()
+                self.assertEqual(4, len(response))
+                self.assertEqual(_SET_EDGE_REP_INCONSISTENT, zmq_util.util._bytes_as_int(response[0]))
+                self.assertEqual(1, zmq_util.util._bytes_as_int(response[1]))
+                self.assertEqual(1, zmq_util.util._bytes_as_int(response[2]))
+                np.testing.assert_array_equal([3, 0, 1, 2], zmq_util._bytes_as_ndarray(response[3], dtype=np.uint64))
+
+                zmq_util.send_more_int(edge_label_socket, _SET_EDGE_REQ_EDGE_LIST)
+                edge_label_socket.send(zmq_util._edges_as_bytes(((0, 2, 1),)))
+                response_code, num_edges = zmq_util.recv_ints_multipart(edge_label_socket)
+                self.assertEqual(_SET_EDGE_REP_SUCCESS, response_code)
+
                 zmq_util.send_ints_multipart(edge_label_socket, -1, 0)
                 response_code, message_type = zmq_util.recv_ints_multipart(edge_label_socket)
                 self.assertEqual(_SET_EDGE_REP_DO_NOT_UNDERSTAND, response_code)
@@ -192,8 +208,55 @@ class TestSolverSetEdgeLabels(unittest.TestCase):
                 exception = edge_label_socket.recv_string()
                 self.logger.debug('Expected exception is: `%s\'', exception)
 
+                # invalid labels are rejected before they are journaled
+                version     = server.workflow.get_label_version()
+                num_records = server.label_journal.num_records
+                zmq_util.send_more_int(edge_label_socket, _SET_EDGE_REQ_EDGE_LIST)
+                edge_label_socket.send(zmq_util._edges_as_bytes(((0, 2, 1), (2, 3, 2))))
+                self.assertEqual(_SET_EDGE_REP_EXCEPTION, zmq_util.recv_int(edge_label_socket))
+                self.assertIn('Invalid labels [2]', edge_label_socket.recv_string())
+                self.assertEqual(version, server.workflow.get_label_version())
+                self.assertEqual(num_records, server.label_journal.num_records)
+
+            finally:
+                server.shutdown()
+
+class TestSolutionLookupWithoutSolution(unittest.TestCase):
+
+    def test(self):
+
+        with tempdir() as tmpdir:
+            container    = os.path.join(tmpdir, 'edge-group')
+            _mk_dummy_edge_data(container)
+            context = zmq.Context(1)
+            server = SolverServer(
+                context=context,
+                directory=os.path.join(tmpdir, 'pias'),
+                n5_container=container,
+                paintera_dataset='')
+
+            try:
+                fragment_segment_socket = server.context.socket(zmq.REQ)
+                fragment_segment_socket.setsockopt(zmq.SNDTIMEO, 30)
+                fragment_segment_socket.setsockopt(zmq.RCVTIMEO, 30)
+                fragment_segment_socket.connect(server.get_fragment_segment_lookup_address())
+                fragment_segment_socket.send(zmq_util._ndarray_as_bytes(np.array([0, 1], dtype=np.uint64)))
+                response = fragment_segment_socket.recv_multipart()
+                self.assertEqual(3, len(response))
+                self.assertEqual(_NO_SOLUTION_AVAILABLE, zmq_util.util._bytes_as_int(response[0]))
+                self.assertEqual(-1, zmq_util.util._bytes_as_int(response[1]))
+
+                segment_fragment_socket = server.context.socket(zmq.REQ)
+                segment_fragment_socket.setsockopt(zmq.SNDTIMEO, 30)
+                segment_fragment_socket.setsockopt(zmq.RCVTIMEO, 30)
+                segment_fragment_socket.connect(server.get_segment_fragment_lookup_address())
+                segment_fragment_socket.send(zmq_util._ndarray_as_bytes(np.array([0], dtype=np.uint64)))
+                response = segment_fragment_socket.recv_multipart()
+                self.assertEqual(4, len(response))
+                self.assertEqual(_NO_SOLUTION_AVAILABLE, zmq_util.util._bytes_as_int(response[0]))
             finally:
                 server.shutdown()
+                context.destroy()
 
 class TestRequestUpdateSolution(unittest.TestCase):
 
@@ -203,7 +266,7 @@ class TestRequestUpdateSolution(unittest.TestCase):
 
     def test(self):
 
-        with _tempdir() as tmpdir:
+        with tempdir() as tmpdir:
             container    = os.path.join(tmpdir, 'edge-group')
             edges, features, labels = _mk_dummy_edge_data(container)
             context = zmq.Context(1)
@@ -329,7 +392,7 @@ class TestApiEndpoint(unittest.TestCase):
 
     def test(self):
 
-        with _tempdir() as tmpdir:
+        with tempdir() as tmpdir:
             dataset      = 'paintera-dataset'
             container    = os.path.join(tmpdir, 'pias.n5')
             _mk_dummy_edge_data(container, paintera_dataset=dataset)
@@ -399,7 +462,595 @@ class TestApiEndpoint(unittest.TestCase):
                 self.logger.debug('Received all dataset %s (started server with %s)', received_all_dataset, dataset)
                 self.assertEqual(dataset, received_all_dataset)
 
+                api_socket.send_string('/api/metrics')
+                self.assertEqual(API_RESPONSE_OK, zmq_util.recv_int(api_socket))
+                self.assertEqual(1, zmq_util.recv_int(api_socket))
+                self.assertEqual(API_RESPONSE_DATA_STRING, zmq_util.recv_int(api_socket))
+                metrics = json.loads(api_socket.recv_string())
+                self.assertEqual(1, metrics['timers']['endpoint/api/n5/all']['count'])
+                self.assertEqual(1, metrics['timers']['endpoint/help']['count'])
+
+                api_socket.send_string('/api/settings')
+                self.assertEqual(API_RESPONSE_OK, zmq_util.recv_int(api_socket))
+                self.assertEqual(1, zmq_util.recv_int(api_socket))
+                self.assertEqual(API_RESPONSE_DATA_STRING, zmq_util.recv_int(api_socket))
+                settings = json.loads(api_socket.recv_string())
+                self.assertEqual(dict(n_estimators=100), settings['random_forest_kwargs'])
+                self.assertIsNone(settings['latency_controller'])
+
+                api_socket.send_string('/api/resources')
+                self.assertEqual(API_RESPONSE_OK, zmq_util.recv_int(api_socket))
+                self.assertEqual(1, zmq_util.recv_int(api_socket))
+                self.assertEqual(API_RESPONSE_DATA_STRING, zmq_util.recv_int(api_socket))
+                resources = json.loads(api_socket.recv_string())
+                self.assertEqual(server.cpu_budget.cores, resources['cores'])
+                self.assertEqual(['fit', 'predict', 'solve'], sorted(resources['stages']))
+
+
+            finally:
+                server.shutdown()
+                context.destroy()
+class TestRecordAndReplay(unittest.TestCase):
+
+    def test(self):
+
+        with tempdir() as tmpdir:
+            container = os.path.join(tmpdir, 'edge-group')
+            edges, features, labels = _mk_dummy_edge_data(container)
+            # both updates are solved: the first labels already hold a merge and a split
+            session = [
+                RecordedRequest(LABELS, 0.0, -1, 0, edges[[0, 3]], np.array(labels)[[0, 3]], None),
+                RecordedRequest(UPDATE_REQUEST, 0.01, -1, 0, None, None, None),
+                RecordedRequest(LABELS, 0.02, -1, 0, edges[[1, 2, 4]], np.array(labels)[[1, 2, 4]], None),
+                RecordedRequest(UPDATE_REQUEST, 0.03, -1, 0, None, None, None),
+                RecordedRequest(FETCH, 0.04, -1, 0, None, None, None)]
+
+            context = zmq.Context(1)
+            try:
+                server = SolverServer(context=context, directory=os.path.join(tmpdir, 'recorded'), n5_container=container, paintera_dataset='/', record_requests=True)
+                try:
+                    self.assertEqual(2, replay(session, server, speed=0, timeout=30)['num_completed'])
+                finally:
+                    server.shutdown()
+
+                _, requests = read_recording(server.request_log_file)
+                self.assertEqual([LABELS, UPDATE_REQUEST, LABELS, UPDATE_REQUEST, FETCH], [r.kind for r in requests if r.kind != SOLUTION])
+                self.assertEqual(2, sum(r.kind == SOLUTION for r in requests))
+
+                server = SolverServer(context=context, directory=os.path.join(tmpdir, 'replayed'), n5_container=container, paintera_dataset='/')
+                try:
+                    summary = replay(requests, server, speed=0, timeout=30)
+                finally:
+                    server.shutdown()
+                self.assertEqual(2, summary['num_completed'])
+                self.assertEqual(2, summary['recorded_update']['count'])
+                self.assertEqual(2, summary['agreement']['count'])
+                self.assertEqual(1, summary['fetch']['count'])
+            finally:
+                context.destroy()
+
+class TestLoadTest(unittest.TestCase):
+
+    def test(self):
+
+        with tempdir() as tmpdir:
+            container = os.path.join(tmpdir, 'edge-group')
+            edges, features, labels = _mk_dummy_edge_data(container)
+            context = zmq.Context(1)
+            server  = SolverServer(context=context, directory=os.path.join(tmpdir, 'pias'), n5_container=container, paintera_dataset='/')
+            try:
+                # both classes are labeled before the first update, clients submit the same (consistent) labels
+                server.set_edge_labels(edges, np.array(labels))
+                summary = load_test(server.address_base, edges, num_clients=3, duration=1., label_rate=5., label_batch_size=2, update_rate=2., poll_rate=10., api_rate=5., timeout=5., context=context, seed=0, labels=labels)
+            finally:
+                server.shutdown()
+                context.destroy()
+
+            self.assertEqual(3, summary['num_clients'])
+            for endpoint in ('set-edge-labels', 'update-solution', 'current-solution', '/api/metrics', '/api/n5/all', NOTIFICATION):
+                self.assertGreater(summary['endpoints'][endpoint]['count'], 0, endpoint)
+            # no time outs, inconsistent labels, or failed updates
+            self.assertEqual([], check_latency_limits(summary, [(None, 'p99', 5.)]))
+
+    def testPartitionLabels(self):
+        # fragments on a 10x10 grid
+        ids   = np.arange(100, dtype=np.uint64).reshape(10, 10)
+        edges = np.concatenate([np.stack([ids[:, :-1].ravel(), ids[:, 1:].ravel()], axis=1), np.stack([ids[:-1, :].ravel(), ids[1:, :].ravel()], axis=1)])
+        labels = partition_labels(edges, rng=np.random.default_rng(0))
+        self.assertEqual({0, 1}, set(labels.tolist()))
+        consistency = LabelConsistency()
+        consistency.update(edges, labels)
+        self.assertEqual(0, consistency.num_conflicts())
+        np.testing.assert_array_equal(np.ones_like(labels), partition_labels(edges, merge_probability=1.))
+        np.testing.assert_array_equal(np.zeros_like(labels), partition_labels(edges, merge_probability=0.))
+
+class TestMultiDatasetServer(unittest.TestCase):
+
+    def test(self):
+
+        with tempdir() as tmpdir:
+            datasets = []
+            for name in ('a', 'b'):
+                container = os.path.join(tmpdir, 'edge-group-%s' % name)
+                edges, features, labels = _mk_dummy_edge_data(container, paintera_dataset=name)
+                datasets.append((name, container, name))
+            context = zmq.Context(1)
+            server  = MultiDatasetServer(context=context, directory=os.path.join(tmpdir, 'pias'), datasets=datasets, memory_budget=1, eviction_interval=3600)
+            try:
+                self.assertEqual(os.path.join(tmpdir, 'pias', 'a'), server.get_server('a').directory)
+                self.assertTrue(os.path.isfile(os.path.join(tmpdir, 'pias', 'b', 'cache', 'edge-features.npy')))
+
+                api_socket = context.socket(zmq.REQ)
+                api_socket.setsockopt(zmq.RCVTIMEO, 1000)
+                api_socket.connect(server.get_api_endpoint_address())
+                api_socket.send_string('/api/datasets')
+                self.assertEqual(API_RESPONSE_OK, zmq_util.recv_int(api_socket))
+                self.assertEqual(1, zmq_util.recv_int(api_socket))
+                self.assertEqual(API_RESPONSE_DATA_STRING, zmq_util.recv_int(api_socket))
+                listing = json.loads(api_socket.recv_string())
+                api_socket.close()
+                self.assertEqual(['a', 'b'], sorted(listing))
+                self.assertEqual(server.get_server('b').address_base, listing['b']['address_base'])
+                # datasets are evicted while loading to stay within the budget
+                self.assertTrue(all(d['evicted'] for d in listing.values()))
+
+                # a was accessed least recently
+                server.get_server('a').workflow.edge_feature_cache.get_edges_and_features()
+                server.get_server('b').workflow.edge_feature_cache.get_edges_and_features()
+                self.assertEqual(['a', 'b'], server.evict_to_budget())
+                self.assertEqual([], server.evict_to_budget())
+                workflow = server.get_server('a').workflow
+                self.assertTrue(workflow.edge_feature_cache.evicted)
+                self.assertEqual(0, workflow.memory_bytes())
+                self.assertIsNone(workflow.edge_label_cache.edges)
+
+                # reload on demand
+                reloaded = workflow.edge_feature_cache.get_edges_and_features()
+                np.testing.assert_array_equal(edges, reloaded[0])
+                np.testing.assert_array_equal(features, reloaded[1])
+                self.assertFalse(workflow.edge_feature_cache.evicted)
+                self.assertIs(reloaded[0], workflow.edge_label_cache.edges)
+            finally:
+                server.shutdown()
+                context.destroy()
+
+class TestSessions(unittest.TestCase):
+
+    def test(self):
 
+        with tempdir() as tmpdir:
+            container = os.path.join(tmpdir, 'edge-group')
+            edges, features, labels = _mk_dummy_edge_data(container)
+            directory = os.path.join(tmpdir, 'pias')
+            context   = zmq.Context(1)
+            server    = SolverServer(context=context, directory=directory, n5_container=container, paintera_dataset='/', sessions=True)
+            try:
+                api_socket = context.socket(zmq.REQ)
+                api_socket.setsockopt(zmq.RCVTIMEO, 1000)
+                api_socket.connect(server.get_api_endpoint_address())
+                for name in ('a', 'b'):
+                    api_socket.send_string('/api/session/open/%s' % name)
+                    self.assertEqual(API_RESPONSE_OK, zmq_util.recv_int(api_socket))
+                    self.assertEqual(1, zmq_util.recv_int(api_socket))
+                    self.assertEqual(API_RESPONSE_DATA_STRING, zmq_util.recv_int(api_socket))
+                    self.assertEqual('ipc://' + os.path.join(directory, 'sessions', name, 'server'), api_socket.recv_string())
+                api_socket.send_string('/api/session/open/../c')
+                self.assertEqual(API_RESPONSE_UNKNOWN_ERROR, zmq_util.recv_int(api_socket))
+                for _ in range(zmq_util.recv_int(api_socket)):
+                    zmq_util.recv_int(api_socket)
+                    api_socket.recv_string()
+                api_socket.close()
+
+                sessions = {name: server.get_session(name) for name in ('a', 'b')}
+                self.assertEqual(['a', 'b'], sorted(server.list_sessions()))
+                for session in sessions.values():
+                    self.assertIs(server.workflow.edge_feature_cache, session.workflow.edge_feature_cache)
+                    self.assertIs(server.update_scheduler, session.workflow.scheduler)
+
+                # different and consistent labels: fragments {0, 1, 3} and {2} in b
+                session_labels = dict(a=np.array(labels), b=np.array([1, 0, 0, 1, 0]))
+                latch          = CountDownLatch(len(sessions))
+                for name, session in sessions.items():
+                    session.workflow.add_solution_update_listener(lambda solution_id, exit_code, state: latch.count_down())
+                    session.workflow.request_set_edge_labels(edges, session_labels[name])
+                    session.workflow.request_update_state()
+                latch.wait_for_countdown(timeout=30)
+
+                for name, session in sessions.items():
+                    state = session.workflow.get_latest_state()
+                    self.assertIsNotNone(state, name)
+                    self.assertEqual(dict(enumerate(session_labels[name].tolist())), dict(zip(state.indices.tolist(), state.labels.tolist())), name)
+                self.assertEqual(0, len(server.workflow.get_labeled_uv_pairs()[1]))
+
+                self.assertEqual(0, server.close_session('b'))
+                self.assertEqual(1, server.close_session('b'))
             finally:
                 server.shutdown()
-                context.destroy()
\ No newline at end of file
+
+            # sessions are re-opened on restart
+            server = SolverServer(context=context, directory=directory, n5_container=container, paintera_dataset='/', sessions=True)
+            try:
+                self.assertEqual(['a', 'b'], sorted(server.list_sessions()))
+            finally:
+                server.shutdown()
+                context.destroy()
+
+class TestSolutionCacheUndo(unittest.TestCase):
+
+    def test(self):
+
+        with tempdir() as tmpdir:
+            container = os.path.join(tmpdir, 'edge-group')
+            edges, features, labels = _mk_dummy_edge_data(container)
+            context   = zmq.Context(1)
+            server    = SolverServer(context=context, directory=os.path.join(tmpdir, 'pias'), n5_container=container, paintera_dataset='/', solution_cache_megabytes=1e-6)
+            try:
+                workflow = server.workflow
+                states   = []
+                workflow.add_solution_update_listener(lambda solution_id, exit_code, state: states.append(state))
+
+                # label, undo (flip) last label, and redo
+                labeled = [0, 3, 4]
+                for last_label in (labels[4], 1 - labels[4], labels[4]):
+                    workflow.request_set_edge_labels(edges[labeled], np.array([labels[0], labels[3], last_label]))
+                    workflow.request_update_state()
+                    deadline = time.monotonic() + 30
+                    while not workflow.is_idle() and time.monotonic() < deadline:
+                        time.sleep(0.01)
+
+                self.assertEqual([0, 0, 0], [state.solution_state for state in states])
+                # gauge set after each update, not only when updates are queued
+                self.assertEqual(0, workflow.metrics.gauge('update-queue-depth').value)
+                self.assertEqual(9, workflow.metrics.gauge('update-queue-depth').histogram.snapshot()['count'])
+                self.assertIsNotNone(states[0].solve_seconds)
+                # served from cache (spilled): neither trained nor solved
+                self.assertIsNone(states[2].solve_seconds)
+                np.testing.assert_array_equal(states[0].merge_probabilities, states[2].merge_probabilities)
+                np.testing.assert_array_equal(states[0].solution, states[2].solution)
+                self.assertTrue(os.path.isdir(os.path.join(tmpdir, 'pias', 'solution-cache')))
+                server.solution_cache.wait()
+
+                api_socket = context.socket(zmq.REQ)
+                api_socket.setsockopt(zmq.RCVTIMEO, 1000)
+                api_socket.connect(server.get_api_endpoint_address())
+                api_socket.send_string('/api/solution-cache')
+                self.assertEqual(API_RESPONSE_OK, zmq_util.recv_int(api_socket))
+                self.assertEqual(1, zmq_util.recv_int(api_socket))
+                self.assertEqual(API_RESPONSE_DATA_STRING, zmq_util.recv_int(api_socket))
+                stats = json.loads(api_socket.recv_string())
+                api_socket.close()
+                self.assertEqual(dict(enabled=True, hits=1, misses=2, memory=1, disk=1), {k: v for k, v in stats.items() if k != 'memory_bytes'})
+                self.assertGreater(stats['memory_bytes'], 0)
+            finally:
+                server.shutdown()
+                context.destroy()
+
+class TestCheckpointRestart(unittest.TestCase):
+
+    def _wait_until_idle(self, workflow):
+        deadline = time.monotonic() + 30
+        while not workflow.is_idle() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(workflow.is_idle())
+
+    def test(self):
+
+        with tempdir() as tmpdir:
+            container = os.path.join(tmpdir, 'edge-group')
+            edges, _, labels = _mk_dummy_edge_data(container)
+            directory = os.path.join(tmpdir, 'pias')
+            context   = zmq.Context(1)
+            server    = SolverServer(context=context, directory=directory, n5_container=container, paintera_dataset='/')
+            try:
+                server.set_edge_labels(edges, np.array(labels))
+                server.workflow.request_update_state()
+                self._wait_until_idle(server.workflow)
+                solution = server.workflow.get_latest_state().solution
+                self.assertTrue(server.checkpoint_writer.wait(timeout=30))
+                self.assertEqual(0, server.save_checkpoint())
+                # nothing is written without the classifier
+                server.workflow.evict()
+                self.assertEqual(2, server.save_checkpoint())
+            finally:
+                server.shutdown()
+            self.assertTrue(os.path.isfile(server.checkpoint_file))
+
+            # the verification update waits for the blocking task
+            scheduler = UpdateScheduler()
+            release   = threading.Event()
+            scheduler.submit('blocker', release.wait)
+            server    = SolverServer(context=context, directory=directory, n5_container=container, paintera_dataset='/', update_scheduler=scheduler)
+            try:
+                states = []
+                server.workflow.add_solution_update_listener(lambda solution_id, exit_code, state: states.append(state))
+                restored = server.workflow.get_latest_state()
+                self.assertEqual(0, restored.solution_id)
+                self.assertEqual(1, scheduler.num_queued(server.workflow))
+
+                # restored solution is served before it is recomputed
+                current_solution_socket = context.socket(zmq.REQ)
+                current_solution_socket.setsockopt(zmq.RCVTIMEO, 1000)
+                current_solution_socket.connect(server.get_current_solution_address())
+                current_solution_socket.send_string('')
+                self.assertEqual(_SUCCESS, zmq_util.recv_int(current_solution_socket))
+                np.testing.assert_array_equal(solution, zmq_util._bytes_as_ndarray(current_solution_socket.recv(), dtype=np.uint64))
+                current_solution_socket.close()
+
+                new_solution_listener = context.socket(zmq.SUB)
+                new_solution_listener.setsockopt(zmq.RCVTIMEO, 10000)
+                new_solution_listener.setsockopt(zmq.SUBSCRIBE, b'')
+                new_solution_listener.connect(server.get_new_solution_address())
+                # subscriptions are not synchronous
+                time.sleep(0.2)
+
+                release.set()
+                # verification update is published
+                self.assertEqual((1, 0), tuple(zmq_util.recv_ints(new_solution_listener)))
+                new_solution_listener.close()
+                self._wait_until_idle(server.workflow)
+                # trained and solved, not served from the solution cache
+                self.assertEqual([1], [state.solution_id for state in states])
+                self.assertIsNotNone(states[0].fit_seconds)
+                self.assertIsNotNone(states[0].solve_seconds)
+                np.testing.assert_array_equal(solution, states[0].solution)
+            finally:
+                server.shutdown()
+                scheduler.stop()
+                context.destroy()
+
+class TestLabelVersions(unittest.TestCase):
+
+    def _api(self, socket, endpoint):
+        socket.send_string(endpoint)
+        self.assertEqual(API_RESPONSE_OK, zmq_util.recv_int(socket), endpoint)
+        self.assertEqual(1, zmq_util.recv_int(socket))
+        message_type = zmq_util.recv_int(socket)
+        return zmq_util.recv_int(socket) if message_type == API_RESPONSE_DATA_INT else socket.recv()
+
+    def test(self):
+
+        with tempdir() as tmpdir:
+            container = os.path.join(tmpdir, 'edge-group')
+            edges, _, labels = _mk_dummy_edge_data(container)
+            directory = os.path.join(tmpdir, 'pias')
+            context   = zmq.Context(1)
+            server    = SolverServer(context=context, directory=directory, n5_container=container, paintera_dataset='')
+            try:
+                edge_label_socket = context.socket(zmq.REQ)
+                edge_label_socket.setsockopt(zmq.RCVTIMEO, 1000)
+                edge_label_socket.connect(server.get_edge_labels_address())
+                api_socket = context.socket(zmq.REQ)
+                api_socket.setsockopt(zmq.RCVTIMEO, 1000)
+                api_socket.connect(server.get_api_endpoint_address())
+
+                # 0-2 is labeled twice, unset 1-3
+                for batch in (tuple((e[0].item(), e[1].item(), l) for e, l in zip(edges, labels)), ((0, 2, 0), (1, 3, -1)), ((0, 2, 1),)):
+                    zmq_util.send_more_int(edge_label_socket, _SET_EDGE_REQ_EDGE_LIST)
+                    edge_label_socket.send(zmq_util._edges_as_bytes(batch))
+                    edge_label_socket.recv_multipart()
+                self.assertEqual(3, self._api(api_socket, '/api/labels/version'))
+                uv_pairs, current = server.workflow.get_labeled_uv_pairs()
+                self.assertEqual({(0, 1): 1, (1, 2): 1, (0, 2): 1, (2, 3): 0}, {tuple(uv): l for uv, l in zip(uv_pairs.tolist(), current.tolist())})
+
+                diff = zmq_util._bytes_as_edge_arrays(self._api(api_socket, '/api/labels/diff/3/1'))
+                self.assertEqual({(1, 3): 0}, {tuple(uv): l for uv, l in zip(diff[0].tolist(), diff[1].tolist())})
+                diff = zmq_util._bytes_as_edge_arrays(self._api(api_socket, '/api/labels/diff/2/0'))
+                self.assertEqual(4, diff[1].size)
+                self.assertTrue(np.all(diff[1] == -1))
+
+                self.assertEqual(4, self._api(api_socket, '/api/labels/revert/1'))
+                _, current = server.workflow.get_labeled_uv_pairs()
+                self.assertEqual(sorted(labels), sorted(current.tolist()))
+                self.assertEqual(0, server.workflow.label_consistency.num_conflicts())
+
+                api_socket.send_string('/api/labels/revert/7')
+                self.assertEqual(API_RESPONSE_UNKNOWN_ERROR, zmq_util.recv_int(api_socket))
+                for _ in range(zmq_util.recv_int(api_socket)):
+                    zmq_util.recv_int(api_socket)
+                    api_socket.recv_string()
+                api_socket.close()
+                edge_label_socket.close()
+            finally:
+                server.shutdown()
+
+            history_directory = os.path.join(directory, 'label-history')
+            self.assertEqual(['labels.journal.000000001'], os.listdir(history_directory))
+
+            # unset and reverted labels are persisted, versions are restored from the label history
+            server = SolverServer(context=context, directory=directory, n5_container=container, paintera_dataset='', label_history_versions=1)
+            try:
+                self.assertEqual(4, server.workflow.get_label_version())
+                _, current = server.workflow.get_labeled_uv_pairs()
+                self.assertEqual(sorted(labels), sorted(current.tolist()))
+                uv_pairs, diff = server.workflow.diff_labels(4, 3)
+                self.assertEqual({(1, 3): -1}, {tuple(uv): l for uv, l in zip(uv_pairs.tolist(), diff.tolist())})
+                server.set_edge_labels(np.array([[0, 1]], dtype=np.uint64), np.array([0]))
+                self.assertEqual(5, server.workflow.get_label_version())
+            finally:
+                server.shutdown()
+
+            # segments older than the last version are replaced with the labels of version 4
+            self.assertEqual(['base.n5', 'labels.journal.000000005'], sorted(os.listdir(history_directory)))
+            server = SolverServer(context=context, directory=directory, n5_container=container, paintera_dataset='')
+            try:
+                self.assertEqual(5, server.workflow.get_label_version())
+                uv_pairs, diff = server.workflow.diff_labels(5, 4)
+                self.assertEqual({(0, 1): 1}, {tuple(uv): l for uv, l in zip(uv_pairs.tolist(), diff.tolist())})
+                self.assertRaises(ValueError, server.workflow.diff_labels, 5, 3)
+            finally:
+                server.shutdown()
+
+            # ground truth without label history: labels of the ground truth are the version it was compacted at
+            shutil.rmtree(os.path.join(directory, 'label-history'))
+            server = SolverServer(context=context, directory=directory, n5_container=container, paintera_dataset='')
+            try:
+                self.assertEqual(5, server.workflow.get_label_version())
+                self.assertRaises(ValueError, server.workflow.diff_labels, 5, 4)
+            finally:
+                server.shutdown()
+                context.destroy()
+
+class TestSuggestEdges(unittest.TestCase):
+
+    def test(self):
+
+        with tempdir() as tmpdir:
+            container = os.path.join(tmpdir, 'edge-group')
+            edges, _, labels = _mk_dummy_edge_data(container)
+            context   = zmq.Context(1)
+            server    = SolverServer(context=context, directory=os.path.join(tmpdir, 'pias'), n5_container=container, paintera_dataset='')
+            try:
+                api_socket = context.socket(zmq.REQ)
+                api_socket.setsockopt(zmq.RCVTIMEO, 1000)
+                api_socket.connect(server.get_api_endpoint_address())
+
+                def suggest(endpoint):
+                    api_socket.send_string(endpoint)
+                    self.assertEqual(API_RESPONSE_OK, zmq_util.recv_int(api_socket))
+                    self.assertEqual(3, zmq_util.recv_int(api_socket))
+                    self.assertEqual(API_RESPONSE_DATA_INT, zmq_util.recv_int(api_socket))
+                    solution_id = zmq_util.recv_int(api_socket)
+                    self.assertEqual(API_RESPONSE_DATA_BYTES, zmq_util.recv_int(api_socket))
+                    uv_pairs = zmq_util._bytes_as_ndarray(api_socket.recv(), dtype=np.uint64).reshape(-1, 2)
+                    self.assertEqual(API_RESPONSE_DATA_BYTES, zmq_util.recv_int(api_socket))
+                    probabilities = zmq_util._bytes_as_ndarray(api_socket.recv(), dtype=np.float32)
+                    return solution_id, uv_pairs, probabilities
+
+                self.assertEqual(-1, suggest('/api/suggest-edges/3')[0])
+
+                labeled = [0, 3]
+                server.workflow.request_set_edge_labels(edges[labeled], np.array(labels)[labeled])
+                server.workflow.request_update_state()
+                deadline = time.monotonic() + 30
+                while server.workflow.get_latest_state() is None and time.monotonic() < deadline:
+                    time.sleep(0.01)
+
+                state = server.workflow.get_latest_state()
+                # indices and suggestions of the newest solution are built in the background
+                self.assertTrue(server.solution_index_writer.wait(timeout=30))
+                self.assertEqual(1, server.solution_index_writer.num_written)
+                self.assertIsNotNone(state.solution_index)
+                solution_id, uv_pairs, probabilities = suggest('/api/suggest-edges/2')
+                self.assertEqual(state.solution_id, solution_id)
+                self.assertEqual(2, probabilities.size)
+                # most uncertain unlabeled edges first
+                unlabeled = [1, 2, 4]
+                expected  = sorted(unlabeled, key=lambda e: abs(state.merge_probabilities[e] - 0.5))[:2]
+                np.testing.assert_array_equal(np.abs(state.merge_probabilities[expected] - 0.5), np.abs(probabilities - 0.5))
+                for uv in uv_pairs.tolist():
+                    self.assertNotIn(uv, edges[labeled].tolist())
+
+                # only edges incident to fragment 3, 1-3 is labeled
+                solution_id, uv_pairs, probabilities = suggest('/api/suggest-edges/5/cost/3')
+                self.assertEqual([[2, 3]], uv_pairs.tolist())
+
+                api_socket.send_string('/api/suggest-edges/5/votes')
+                self.assertEqual(API_RESPONSE_UNKNOWN_ERROR, zmq_util.recv_int(api_socket))
+                for _ in range(zmq_util.recv_int(api_socket)):
+                    zmq_util.recv_int(api_socket)
+                    api_socket.recv_string()
+                api_socket.close()
+            finally:
+                server.shutdown()
+                context.destroy()
+
+class TestSolveRegionEndpoint(unittest.TestCase):
+
+    def test(self):
+
+        with tempdir() as tmpdir:
+            container = os.path.join(tmpdir, 'edge-group')
+            edges, _, labels = _mk_dummy_edge_data(container)
+            context   = zmq.Context(1)
+            server    = SolverServer(context=context, directory=os.path.join(tmpdir, 'pias'), n5_container=container, paintera_dataset='')
+            try:
+                socket = context.socket(zmq.REQ)
+                socket.setsockopt(zmq.RCVTIMEO, 1000)
+                socket.connect(server.solve_region_address)
+
+                def solve_region(fragments, halo):
+                    zmq_util.send_int(socket, halo, flags=zmq.SNDMORE)
+                    socket.send(zmq_util._ndarray_as_bytes(np.array(fragments, dtype=np.uint64)))
+                    status, solution_id = zmq_util.recv_int(socket), zmq_util.recv_int(socket)
+                    nodes    = zmq_util._bytes_as_ndarray(socket.recv(), dtype=np.uint64)
+                    segments = zmq_util._bytes_as_ndarray(socket.recv(), dtype=np.uint64)
+                    return status, solution_id, nodes, segments
+
+                self.assertEqual((_NO_SOLUTION_AVAILABLE, -1), solve_region([3], 0)[:2])
+
+                server.set_edge_labels(edges, np.array(labels))
+                server.workflow.request_update_state()
+                deadline = time.monotonic() + 30
+                while server.workflow.get_latest_state() is None and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                state = server.workflow.get_latest_state()
+
+                # 3 is split from {0, 1, 2}, fragment 100 is not in the graph
+                status, solution_id, nodes, segments = solve_region([3, 100], 0)
+                self.assertEqual((_SUCCESS, state.solution_id), (status, solution_id))
+                np.testing.assert_array_equal([3], nodes)
+                self.assertNotEqual(state.solution[1], segments[0])
+
+                # labels submitted after the solution: merge 3 into the segment of 1
+                server.set_edge_labels(np.array([[1, 3], [2, 3]], dtype=np.uint64), np.array([1, -1]))
+                status, solution_id, nodes, segments = solve_region([3], 0)
+                self.assertEqual((_SUCCESS, state.solution_id), (status, solution_id))
+                np.testing.assert_array_equal([3], nodes)
+                np.testing.assert_array_equal([state.solution[1]], segments)
+                socket.close()
+            finally:
+                server.shutdown()
+                context.destroy()
+
+class TestEdgeValues(unittest.TestCase):
+
+    def test(self):
+
+        with tempdir() as tmpdir:
+            container = os.path.join(tmpdir, 'edge-group')
+            edges, _, labels = _mk_dummy_edge_data(container)
+            context   = zmq.Context(1)
+            server    = SolverServer(context=context, directory=os.path.join(tmpdir, 'pias'), n5_container=container, paintera_dataset='')
+            try:
+                socket = context.socket(zmq.REQ)
+                socket.setsockopt(zmq.RCVTIMEO, 1000)
+                socket.connect(server.get_edge_values_address())
+
+                def request(quantity, encoding, selection, payload=b''):
+                    zmq_util.send_ints_multipart(socket, quantity, encoding, selection, flags=zmq.SNDMORE)
+                    socket.send(payload)
+                    status, solution_id = zmq_util.recv_int(socket), zmq_util.recv_int(socket)
+                    offset_scale = socket.recv()
+                    data         = socket.recv()
+                    return status, solution_id, offset_scale, data
+
+                self.assertEqual(_NO_SOLUTION_AVAILABLE, request(MERGE_PROBABILITIES, FLOAT32, _EDGE_VALUES_REQ_ALL)[0])
+
+                labeled = [0, 3]
+                server.workflow.request_set_edge_labels(edges[labeled], np.array(labels)[labeled])
+                server.workflow.request_update_state()
+                deadline = time.monotonic() + 30
+                while server.workflow.get_latest_state() is None and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                state = server.workflow.get_latest_state()
+
+                status, solution_id, offset_scale, data = request(MERGE_PROBABILITIES, FLOAT32, _EDGE_VALUES_REQ_ALL)
+                self.assertEqual(_SET_EDGE_REP_SUCCESS, status)
+                self.assertEqual(state.solution_id, solution_id)
+                self.assertEqual([0., 1.], zmq_util._bytes_as_ndarray(offset_scale, dtype=np.float32).tolist())
+                np.testing.assert_array_equal(state.merge_probabilities, zmq_util._bytes_as_ndarray(data, dtype=np.float32))
+
+                _, _, _, data = request(COSTS, FLOAT16, _EDGE_VALUES_REQ_RANGE, zmq_util._ndarray_as_bytes(np.array([1, 3], dtype=np.uint64)))
+                np.testing.assert_allclose(state.costs[1:3], np.frombuffer(data, dtype='>f2'), rtol=1e-3)
+
+                _, _, offset_scale, data = request(MERGE_PROBABILITIES, UINT8, _EDGE_VALUES_REQ_IDS, zmq_util._ndarray_as_bytes(np.array([4, 2], dtype=np.uint64)))
+                offset, scale = zmq_util._bytes_as_ndarray(offset_scale, dtype=np.float32).tolist()
+                np.testing.assert_allclose(state.merge_probabilities[[4, 2]], offset + scale * np.frombuffer(data, dtype=np.uint8), atol=0.51 / 255)
+
+                status, solution_id, _, message = request(MERGE_PROBABILITIES, UINT8, _EDGE_VALUES_REQ_IDS, zmq_util._ndarray_as_bytes(np.array([len(edges)], dtype=np.uint64)))
+                self.assertEqual((_EDGE_VALUES_REP_EXCEPTION, -1), (status, solution_id))
+                self.assertIn('out of range', message.decode('utf-8'))
+                socket.close()
+            finally:
+                server.shutdown()
+                context.destroy()
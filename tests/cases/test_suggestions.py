@@ -0,0 +1,50 @@
+from __future__ import print_function
+
+import unittest
+
+import numpy as np
+
+from pias.suggestions import EdgeSuggestions, uncertainty
+
+
+class TestUncertainty(unittest.TestCase):
+
+    def test(self):
+        np.testing.assert_allclose([0., 0.5, 1., 0.5, 0.], uncertainty('probability', merge_probabilities=[0., 0.25, 0.5, 0.75, 1.]))
+        np.testing.assert_allclose([-2., -0.5, 0., -1.], uncertainty('cost', costs=[2., -0.5, 0., 1.]))
+        self.assertRaises(ValueError, uncertainty, 'votes', merge_probabilities=[0.5])
+
+
+class TestEdgeSuggestions(unittest.TestCase):
+
+    def test(self):
+        edges       = np.array([[0, 1], [1, 2], [0, 2], [1, 3], [2, 3], [4, 5]], dtype=np.uint64)
+        values      = np.array([0.9, 0.8, 0.1, 0.7, 0.8, 0.95])
+        suggestions = EdgeSuggestions(edges, values, labeled=[0])
+
+        edge_ids, edge_uncertainty = suggestions.top(3)
+        np.testing.assert_array_equal([5, 1, 4], edge_ids)
+        np.testing.assert_allclose([0.95, 0.8, 0.8], edge_uncertainty)
+        np.testing.assert_array_equal([5, 4, 3], suggestions.top(3, skip={1: 1})[0])
+        self.assertEqual(5, suggestions.top(10)[0].size)
+        self.assertEqual(0, suggestions.top(0)[0].size)
+
+        # edge 1-2 is incident to both fragments and suggested once
+        np.testing.assert_array_equal([1, 4, 3, 2], suggestions.top(10, fragments=[2, 1])[0])
+        np.testing.assert_array_equal([1], suggestions.top(1, fragments=[1, 2])[0])
+        np.testing.assert_array_equal([2], suggestions.top(10, fragments=[0])[0])
+        self.assertEqual(0, suggestions.top(10, fragments=[17])[0].size)
+
+    def testRandom(self):
+        random      = np.random.RandomState(0)
+        edges       = np.unique(np.sort(random.randint(0, 200, size=(2000, 2)), axis=1), axis=0)
+        edges       = edges[edges[:, 0] != edges[:, 1]].astype(np.uint64)
+        values      = random.random(edges.shape[0])
+        labeled     = random.choice(edges.shape[0], size=100, replace=False)
+        skip        = set(random.choice(edges.shape[0], size=100, replace=False).tolist())
+        fragments   = random.choice(200, size=20, replace=False)
+        suggestions = EdgeSuggestions(edges, values, labeled=labeled)
+
+        incident = np.isin(edges[:, 0], fragments) | np.isin(edges[:, 1], fragments)
+        expected = [e for e in np.argsort(-values, kind='stable').tolist() if incident[e] and e not in skip and e not in set(labeled.tolist())]
+        np.testing.assert_array_equal(expected[:50], suggestions.top(50, fragments=fragments, skip=skip)[0])
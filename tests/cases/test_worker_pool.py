@@ -0,0 +1,167 @@
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import threading
+import unittest
+
+import numpy as np
+import zmq
+
+from pias.worker_pool import NoWorkersAvailable, WorkerPool, WorkerTaskFailed
+
+_NUM_WORKERS = 2
+
+
+def _same_partition(labels1, labels2):
+    _, inverse1 = np.unique(labels1, return_inverse=True)
+    _, inverse2 = np.unique(labels2, return_inverse=True)
+    pairs       = np.unique(np.stack((inverse1.reshape(-1), inverse2.reshape(-1)), axis=1), axis=0)
+    return pairs.shape[0] == np.unique(inverse1).size == np.unique(inverse2).size
+
+
+def _wait_for_workers(pool, num_workers, timeout=30.):
+    start = time.monotonic()
+    while pool.num_workers() < num_workers:
+        if time.monotonic() - start > timeout:
+            raise Exception('Only %d/%d workers connected after %s seconds' % (pool.num_workers(), num_workers, timeout))
+        time.sleep(0.05)
+
+
+class TestWorkerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.address = 'ipc://' + os.path.join(self.tmp_dir, 'server-workers')
+        self.context = zmq.Context(1)
+        self.pool    = WorkerPool(self.address, task_timeout=30.)
+        self.pool.start(self.context)
+        self.workers = []
+
+    def tearDown(self):
+        self.pool.stop()
+        for worker in self.workers:
+            try:
+                worker.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                worker.kill()
+        self.context.term()
+
+    def _start_workers(self, num_workers=_NUM_WORKERS):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        for _ in range(num_workers):
+            self.workers.append(subprocess.Popen(
+                [sys.executable, '-c', 'from pias.worker import worker_main; worker_main()', '--address', self.address, '--heartbeat-interval', '0.1'],
+                env=env))
+        _wait_for_workers(self.pool, num_workers)
+
+    def testNoWorkers(self):
+        self.assertRaises(NoWorkersAvailable, self.pool.solve, 2, [[0, 1]], [1.], 'greedy-additive')
+
+    def testPredictAndSolve(self):
+        from sklearn.ensemble import RandomForestClassifier
+        self._start_workers()
+
+        rng      = np.random.RandomState(1)
+        features = rng.rand(1000, 3)
+        edges    = np.stack((np.arange(1000), np.arange(1, 1001)), axis=1).astype(np.uint64)
+        model    = RandomForestClassifier(n_estimators=10, random_state=1).fit(features[:100], features[:100, 0] > 0.5)
+        self.pool.set_data(edges, features)
+        np.testing.assert_array_equal(model.predict_proba(features)[..., 1].astype(np.float32), self.pool.predict(model, num_chunks=7))
+
+        # two triangles, connected through repulsive edge, and a node without attractive edges
+        uv     = np.array([[0, 1], [1, 2], [0, 2], [2, 3], [3, 4], [4, 5], [3, 5], [5, 6]], dtype=np.uint64)
+        costs  = np.array([1., 2., -0.5, -3., 1., 1., 1., -1.])
+        labels = self.pool.solve(7, uv, costs, 'greedy-additive')
+        self.assertEqual(np.uint64, labels.dtype)
+        self.assertTrue(_same_partition([0, 0, 0, 1, 1, 1, 2], labels))
+        for num_tasks in (1, 5):
+            self.assertTrue(_same_partition([0, 0, 0, 1, 1, 1, 2], self.pool.solve(7, uv, costs, 'greedy-additive', num_tasks=num_tasks)))
+
+        # components of random sizes, packed into bins of similar numbers of edges
+        rng    = np.random.RandomState(2)
+        costs  = np.where(rng.rand(edges.shape[0]) < 0.1, -1., 1.)
+        single = self.pool.solve(1001, edges, costs, 'greedy-additive', num_tasks=1)
+        self.assertEqual(np.count_nonzero(costs < 0) + 1, np.unique(single).size)
+        self.assertTrue(_same_partition(single, self.pool.solve(1001, edges, costs, 'greedy-additive', num_tasks=4)))
+
+    def _fake_worker(self, respond_after=None, heartbeat_interval=0.05):
+        # worker that receives one task, sends heartbeats, and responds after `respond_after' seconds (never if `None')
+        from pias.worker import _array_frames
+        socket = self.context.socket(zmq.DEALER)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(self.address)
+        socket.send(b'HEARTBEAT')
+        stop = threading.Event()
+        def run():
+            received = None
+            while not stop.is_set():
+                if socket.poll(timeout=int(heartbeat_interval * 1000)):
+                    frames   = socket.recv_multipart()
+                    received = (frames[1], time.monotonic())
+                if received is not None and respond_after is not None and time.monotonic() - received[1] > respond_after:
+                    socket.send_multipart([b'RESULT', received[0]] + _array_frames(np.zeros(2, dtype=np.uint64)))
+                    received = None
+                socket.send(b'HEARTBEAT')
+            socket.close()
+        # sockets are not thread-safe: only use the socket from the thread
+        thread = threading.Thread(target=run)
+        thread.start()
+        _wait_for_workers(self.pool, 1)
+        return stop, thread
+
+    def testRetry(self):
+        # worker that accepts tasks but never responds
+        stop, thread = self._fake_worker()
+        self.pool.task_timeout = 0.2
+        self.pool.max_retries  = 0
+        try:
+            self.assertRaises(WorkerTaskFailed, self.pool.solve, 2, [[0, 1]], [1.], 'greedy-additive')
+        finally:
+            stop.set()
+            thread.join()
+
+    def testSilentWorker(self):
+        # worker that accepts tasks, stops sending heartbeats, and never responds
+        socket = self.context.socket(zmq.DEALER)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(self.address)
+        socket.send(b'HEARTBEAT')
+        _wait_for_workers(self.pool, 1)
+        self.pool.heartbeat_timeout = 0.2
+        self.pool.max_retries       = 0
+        try:
+            self.assertRaises(WorkerTaskFailed, self.pool.solve, 2, [[0, 1]], [1.], 'greedy-additive')
+            self.assertEqual(0, self.pool.num_workers())
+        finally:
+            socket.close()
+
+    def testLongTask(self):
+        # tasks of workers that send heartbeats are not re-submitted, however long they take
+        stop, thread = self._fake_worker(respond_after=0.5)
+        self.pool.heartbeat_timeout = 0.2
+        self.pool.max_retries       = 0
+        try:
+            labels = self.pool.solve(2, [[0, 1]], [1.], 'greedy-additive')
+            self.assertEqual(1, np.unique(labels).size)
+        finally:
+            stop.set()
+            thread.join()
+
+    def testSetData(self):
+        edges    = np.zeros((3, 2), dtype=np.uint64)
+        features = np.zeros((3, 4))
+        self.pool.set_data(edges, features)
+        # references only, no serialized copy
+        self.assertIs(edges, self.pool.data[0])
+        self.assertIs(features, self.pool.data[1])
+        self.assertEqual(3, self.pool.num_samples)
+        self.pool.set_data(None, None)
+        self.assertIsNone(self.pool.data)
+        self.assertEqual(0, self.pool.num_samples)
+
+if __name__ == '__main__':
+    unittest.main()
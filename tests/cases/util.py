@@ -0,0 +1,13 @@
+import contextlib
+import shutil
+import tempfile
+
+
+@contextlib.contextmanager
+def tempdir():
+    """A context manager for creating and then deleting a temporary directory."""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        yield tmpdir
+    finally:
+        shutil.rmtree(tmpdir)